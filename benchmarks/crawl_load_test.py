@@ -0,0 +1,109 @@
+##############################################
+######### crawler load test (offline) ########
+##############################################
+''' Crawls the local stand-in site (living_wage_site.py) with the real crawler
+in living_wage.py and reports throughput, retries, throttling and correctness.
+
+The stand-in site serves the recorded Michigan corpus with the latency, jitter,
+error rate and rate limit given on the command line. The crawl starts from an
+empty cache, and every fetched page is checked against the corpus by parsing
+both with scrape_wages_tables() and scrape_expenses_tables().
+
+Usage (from the folder that contains living_wage.py):
+    python3 benchmarks/crawl_load_test.py --latency-ms 20 --jitter-ms 10 --error-rate 0.05 --rate-limit 50
+'''
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import urllib.request
+
+import fixtures
+
+sys.path.insert(0, fixtures.REPO_DIR)
+import living_wage
+import living_wage_metrics
+import living_wage_site
+import living_wage_throttle
+
+
+def parse_page(url, page):
+    ''' Parses one page with the scrapers in living_wage.py, without fetching anything. '''
+    saved_cache = dict(living_wage.CACHE_DICT)
+    living_wage.CACHE_DICT.clear()
+    living_wage.CACHE_DICT[url] = page
+    try:
+        return living_wage.scrape_wages_tables(url), living_wage.scrape_expenses_tables(url)
+    finally:
+        living_wage.CACHE_DICT.clear()
+        living_wage.CACHE_DICT.update(saved_cache)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test the crawler against the local stand-in site.')
+    parser.add_argument('--latency-ms', type=float, default=20.0)
+    parser.add_argument('--jitter-ms', type=float, default=10.0)
+    parser.add_argument('--error-rate', type=float, default=0.05)
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='requests per second (0 = no limit)')
+    parser.add_argument('--burst', type=int, default=5)
+    parser.add_argument('--max-rate', type=float, default=0.0,
+        help='maximum request rate of the adaptive throttle, per second (default: 0 = no limit)')
+    parser.add_argument('--seed', type=int, default=507)
+    args = parser.parse_args()
+
+    corpus = fixtures.load_michigan_corpus()
+    config = living_wage_site.SiteConfig(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate, rate_limit=args.rate_limit, burst=args.burst, seed=args.seed)
+    site = living_wage_site.FakeSite(corpus, config)
+    base_url = site.start()
+
+    living_wage_metrics.enable()
+    living_wage.set_base_url(base_url)
+    living_wage.set_max_rate(args.max_rate)
+
+    failures = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        living_wage.CACHE_FILENAME = os.path.join(temp_dir, 'living_wage_cache.json')
+        living_wage.CACHE_META_FILENAME = os.path.join(temp_dir, 'living_wage_cache_meta.json')
+        living_wage.CACHE_DICT.clear()
+
+        start = time.perf_counter()
+        area_urls = list(living_wage.build_combined_dict().values())
+        for area_url in area_urls:
+            try:
+                living_wage.make_request_with_cache(area_url, living_wage.CACHE_DICT)
+            except Exception as error:
+                failures.append(f"{area_url}: {error}")
+        seconds = time.perf_counter() - start
+
+    with urllib.request.urlopen(base_url + living_wage_site.STATS_PATH) as stats_response:
+        server_stats = json.load(stats_response)
+    site.stop()
+
+    mismatches = []
+    for area_url in area_urls:
+        if area_url not in living_wage.CACHE_DICT:
+            continue
+        recorded_url = fixtures.BASE_URL + area_url[len(base_url):]
+        if parse_page(area_url, living_wage.CACHE_DICT[area_url]) != parse_page(recorded_url, corpus[recorded_url]):
+            mismatches.append(area_url)
+
+    pages_fetched = len(living_wage.CACHE_DICT)
+    print(f"Fetched {pages_fetched} pages in {seconds:.2f} s ({pages_fetched / seconds:.1f} pages/s)")
+    print(f"Retries: {living_wage.RETRIES.value}, seconds slept: {living_wage.SLEEP_SECONDS.value:.2f}")
+    if living_wage.THROTTLE is not None:
+        print(f"Throttle: final rate {living_wage.THROTTLE.rate:.1f} requests/s, "
+            f"{living_wage_throttle.RATE_DECREASES.value} rate cuts")
+    print(f"Server: {server_stats}")
+    print(f"Failed pages: {len(failures)}, pages that parse differently from the corpus: {len(mismatches)}")
+    for failure in failures:
+        print(f"[Error message]: {failure}")
+    for mismatch in mismatches:
+        print(f"[Error message]: {mismatch} does not match the corpus")
+    sys.exit(1 if failures or mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
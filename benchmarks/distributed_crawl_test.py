@@ -0,0 +1,105 @@
+##############################################
+###### distributed crawl test (offline) ######
+##############################################
+''' Runs the distributed crawl in living_wage_queue.py against the local
+stand-in site (living_wage_site.py): seeds the queue, starts several worker
+processes, optionally kills one of them mid-crawl so that its lease runs out
+and another worker takes the job over, merges the records, and checks that
+the database matches one built directly from the recorded corpus.
+
+Usage (from the folder that contains living_wage.py):
+    python3 benchmarks/distributed_crawl_test.py --workers 4 --latency-ms 20 --error-rate 0.05 --kill-after 1
+'''
+import argparse
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import fixtures
+
+sys.path.insert(0, fixtures.REPO_DIR)
+import living_wage
+import living_wage_site
+
+QUEUE_SCRIPT = os.path.join(fixtures.REPO_DIR, 'living_wage_queue.py')
+
+## tables compared between the two databases, without their Id column
+COMPARED_QUERIES = [
+    'SELECT State, [Area Type], Area FROM Areas ORDER BY Id',
+    'SELECT Area, [Number of Adults], [Number of Children], [Living Wage], [Poverty Wage], [Minimum Wage] FROM Wages ORDER BY Id',
+    'SELECT Area, [Number of Adults], [Number of Children], [Required Annual Income Before Taxes] FROM Expenses ORDER BY Id',
+    'SELECT Area, [Number of Adults], [Number of Children], Category, Amount FROM ExpenseItems ORDER BY Id',
+    'SELECT * FROM AreaAggregates ORDER BY Area',
+]
+
+
+def build_reference_db(corpus, db_name):
+    ''' Builds the database straight from the recorded corpus, in this process. '''
+    living_wage.CACHE_DICT.clear()
+    living_wage.CACHE_DICT.update(corpus)
+    living_wage.FRAGMENT_DICT.clear()
+    living_wage.PARSE_DICT.clear()
+    living_wage.DB_NAME = db_name
+    living_wage.build_database()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Test the distributed crawl against the local stand-in site.')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--latency-ms', type=float, default=20.0)
+    parser.add_argument('--jitter-ms', type=float, default=10.0)
+    parser.add_argument('--error-rate', type=float, default=0.05)
+    parser.add_argument('--lease-seconds', type=float, default=3.0)
+    parser.add_argument('--kill-after', type=float, default=None, metavar='SECONDS',
+        help='kill the first worker this many seconds after the start')
+    parser.add_argument('--seed', type=int, default=507)
+    args = parser.parse_args()
+
+    corpus = fixtures.load_michigan_corpus()
+    config = living_wage_site.SiteConfig(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate, seed=args.seed)
+    site = living_wage_site.FakeSite(corpus, config)
+    base_url = site.start()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        common_args = [sys.executable, QUEUE_SCRIPT, '--base-url', base_url, '--max-rate', '0',
+            '--lease-seconds', str(args.lease_seconds), '--queue', 'queue.sqlite', '--db', 'crawled.sqlite']
+        start = time.perf_counter()
+        subprocess.run(common_args + ['seed', '--reset'], cwd=temp_dir, check=True)
+        workers = [subprocess.Popen(common_args + ['worker', '--worker-id', f'worker-{i + 1}'], cwd=temp_dir)
+            for i in range(args.workers)]
+        if args.kill_after is not None:
+            time.sleep(args.kill_after)
+            workers[0].send_signal(signal.SIGKILL)
+            print(f"Killed worker-1 after {args.kill_after} s")
+        for worker in workers:
+            worker.wait()
+        subprocess.run(common_args + ['status'], cwd=temp_dir, check=True)
+        merge = subprocess.run(common_args + ['merge'], cwd=temp_dir)
+        seconds = time.perf_counter() - start
+        site.stop()
+        if merge.returncode != 0:
+            sys.exit(1)
+
+        reference_db_name = os.path.join(temp_dir, 'reference.sqlite')
+        build_reference_db(corpus, reference_db_name)
+        crawled_conn = sqlite3.connect(os.path.join(temp_dir, 'crawled.sqlite'))
+        reference_conn = sqlite3.connect(reference_db_name)
+        mismatches = [query for query in COMPARED_QUERIES
+            if crawled_conn.execute(query).fetchall() != reference_conn.execute(query).fetchall()]
+        crawled_conn.close()
+        reference_conn.close()
+
+    print(f"Crawled and merged {len(corpus) - 1} pages with {args.workers} workers in {seconds:.2f} s")
+    print(f"Server: {site.stats}")
+    for query in mismatches:
+        print(f"[Error message]: the crawled database differs from the corpus: {query}")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
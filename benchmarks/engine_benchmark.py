@@ -0,0 +1,188 @@
+##############################################
+######### SQLite vs DuckDB benchmark #########
+##############################################
+''' Compares the storage engines of living_wage_storage.py on a national-sized
+database: how long each engine takes to open the database and to run each of
+the statewide analyses in ANALYSES, and whether every engine returns the same
+rows.
+
+The national database is made offline from the recorded Michigan pages (see
+fixtures.py): the Michigan database is built with the real pipeline, then
+copied once per synthetic state, with the same area names (names repeat
+across states in the whole country too) and with the wages and expenses of
+each state scaled by its own factor so that the states differ. With the default 51
+states, that is about 5,000 areas, more than the ~3,500 counties and MSAs of
+the whole country.
+
+Usage (from the folder that contains living_wage.py):
+    python3 benchmarks/engine_benchmark.py
+    python3 benchmarks/engine_benchmark.py --states 10 --repeat 3
+
+The exit code is 1 when the engines disagree on a result.
+'''
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import fixtures
+import run_benchmarks
+
+sys.path.insert(0, fixtures.REPO_DIR)
+import living_wage
+import living_wage_storage
+
+
+##############################################
+################# functions ##################
+##############################################
+def build_national_database(db_name, state_count):
+    ''' Builds the Michigan database from the recorded pages, then adds a
+    scaled copy of every Michigan area, under the same name, for each other
+    synthetic state, and refreshes the aggregate and household curve tables
+    over all the states.
+
+    Parameters
+    ----------
+    db_name: string
+        the path of the SQL database to write
+    state_count: int
+        the number of states, Michigan included
+
+    Returns
+    -------
+    None
+    '''
+    run_benchmarks.use_corpus(fixtures.load_michigan_corpus(), db_name)
+    living_wage.build_database()
+
+    conn = sqlite3.connect(db_name)
+    cur = conn.cursor()
+    for state_number in range(1, state_count):
+        ## every state keeps the Michigan area names, as names like 'washington county'
+        ## repeat across the states of the whole country
+        state_code = f'S{state_number:02d}'
+        ## from 20% cheaper to 20% more expensive than Michigan
+        factor = 0.8 + 0.4 * state_number / state_count
+        cur.execute('''
+            INSERT INTO Areas (State, [Area Type], Area, Code)
+            SELECT ?, [Area Type], Area, Code FROM Areas WHERE State = 'MI'
+        ''', [state_code])
+        cur.execute('''
+            INSERT INTO Wages (State, [Area], [Number of Adults], [Number of Children],
+                [Living Wage], [Poverty Wage], [Minimum Wage])
+            SELECT ?, [Area], [Number of Adults], [Number of Children],
+                ROUND([Living Wage] * ?, 2), ROUND([Poverty Wage] * ?, 2), [Minimum Wage]
+            FROM Wages WHERE State = 'MI'
+        ''', [state_code, factor, factor])
+        cur.execute('''
+            INSERT INTO Expenses (State, [Area], [Number of Adults], [Number of Children],
+                [Required Annual Income Before Taxes])
+            SELECT ?, [Area], [Number of Adults], [Number of Children],
+                ROUND([Required Annual Income Before Taxes] * ?)
+            FROM Expenses WHERE State = 'MI'
+        ''', [state_code, factor])
+        cur.execute('''
+            INSERT INTO ExpenseItems (State, [Area], [Number of Adults], [Number of Children], Category, Amount)
+            SELECT ?, [Area], [Number of Adults], [Number of Children], Category, ROUND(Amount * ?)
+            FROM ExpenseItems WHERE State = 'MI'
+        ''', [state_code, factor])
+    conn.commit()
+    conn.close()
+    living_wage.refresh_aggregates(db_name)
+    living_wage.refresh_household_curves(db_name)
+
+
+def normalize_rows(rows):
+    ''' Rounds the numbers of a result so that results of different engines compare equal.
+    Sums and averages can differ in their last bits, depending on the order the rows are added up.
+    '''
+    return [tuple(round(value, 6) if isinstance(value, float) else value for value in row) for row in rows]
+
+
+def time_engine(engine, db_name, duckdb_name, repeat):
+    ''' Opens the database on one engine and times every analysis.
+
+    Returns
+    -------
+    tuple
+        (seconds to open the database, dict of analysis name to (fastest seconds, rows))
+    '''
+    open_start = time.perf_counter()
+    conn = living_wage_storage.connect(engine, db_name, duckdb_name)
+    open_seconds = time.perf_counter() - open_start
+
+    analysis_dict = {}
+    for analysis_name in living_wage_storage.ANALYSES:
+        timings = []
+        for _ in range(repeat):
+            query_start = time.perf_counter()
+            rows = living_wage_storage.run_analysis(conn, analysis_name)
+            timings.append(time.perf_counter() - query_start)
+        analysis_dict[analysis_name] = (min(timings), normalize_rows(rows))
+    conn.close()
+    return open_seconds, analysis_dict
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare SQLite and DuckDB on the statewide analyses of a national-sized database.')
+    parser.add_argument('--states', type=int, default=51, help='number of states in the national database')
+    parser.add_argument('--repeat', type=int, default=5,
+        help='number of times each analysis runs; the fastest run is used')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_name = os.path.join(temp_dir, 'living_wage.sqlite')
+        duckdb_name = os.path.join(temp_dir, 'living_wage.duckdb')
+
+        build_start = time.perf_counter()
+        build_national_database(db_name, args.states)
+        conn = sqlite3.connect(db_name)
+        area_count, wage_count, item_count = conn.execute('''
+            SELECT (SELECT COUNT(*) FROM Areas), (SELECT COUNT(*) FROM Wages), (SELECT COUNT(*) FROM ExpenseItems)
+        ''').fetchone()
+        state_area_count_dict = dict(conn.execute('SELECT State, COUNT(*) FROM Areas GROUP BY State'))
+        aggregate_area_count_dict = dict(conn.execute('SELECT State, COUNT(*) FROM AreaAggregates GROUP BY State'))
+        conn.close()
+        print(f"National database: {args.states} states, {area_count:,} areas, {wage_count:,} wage rows, "
+            f"{item_count:,} expense rows (built in {time.perf_counter() - build_start:.1f} s)")
+
+        export_start = time.perf_counter()
+        living_wage_storage.write_duckdb(db_name, duckdb_name)
+        print(f"DuckDB copy written in {(time.perf_counter() - export_start) * 1000:.0f} ms "
+            f"({os.path.getsize(db_name):,} bytes in SQLite, {os.path.getsize(duckdb_name):,} bytes in DuckDB)")
+
+        engine_dict = {engine: time_engine(engine, db_name, duckdb_name, args.repeat)
+            for engine in living_wage_storage.ENGINES}
+
+    header = f"{'':<16}" + ''.join(f'{engine:>16}' for engine in living_wage_storage.ENGINES)
+    print(f"\n{header}   (ms, fastest of {args.repeat}; speedup over sqlite)")
+    print(f"{'open':<16}" + ''.join(f'{engine_dict[engine][0] * 1000:>16.1f}' for engine in living_wage_storage.ENGINES))
+    mismatches = []
+    ## the area names repeat across states, so an analysis that joins on the
+    ## area name alone counts every area once per state
+    for row in engine_dict['sqlite'][1]['state_summary'][1]:
+        if row[3] != state_area_count_dict[row[0]]:
+            mismatches.append(f"state_summary counts {row[3]} areas in {row[0]}, not {state_area_count_dict[row[0]]}")
+            break
+    if aggregate_area_count_dict != state_area_count_dict:
+        mismatches.append("AreaAggregates does not hold one row per area of every state")
+    for analysis_name in living_wage_storage.ANALYSES:
+        sqlite_seconds, sqlite_rows = engine_dict['sqlite'][1][analysis_name]
+        cells = []
+        for engine in living_wage_storage.ENGINES:
+            seconds, rows = engine_dict[engine][1][analysis_name]
+            cells.append(f'{seconds * 1000:.1f} ({sqlite_seconds / seconds:.1f}x)')
+            if rows != sqlite_rows:
+                mismatches.append(f"{engine} returned different rows than sqlite for {analysis_name}")
+        print(f"{analysis_name:<16}" + ''.join(f'{cell:>16}' for cell in cells))
+
+    for mismatch in mismatches:
+        print(f"[Error message]: {mismatch}")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
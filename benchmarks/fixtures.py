@@ -0,0 +1,311 @@
+##############################################
+######## offline page corpus for benches #####
+##############################################
+''' The recorded page corpus used by the benchmarks, plus the code that builds it.
+
+michigan_pages.json.gz has the same layout as living_wage_cache.json: a dictionary
+that maps each URL to the HTML text of the page (the Michigan locations page and
+one page per county and MSA). The pages follow the markup that the scrapers in
+living_wage.py read. They were rebuilt from the rows in living_wage.sqlite,
+because the original cache file is not part of the repository. The expense
+categories above "required annual income before taxes" are split out of that
+total with fixed shares, since the database only stores the total.
+
+To rebuild the corpus (from the folder that contains living_wage.py):
+    python3 benchmarks/fixtures.py
+'''
+import gzip
+import json
+import os
+import re
+import sqlite3
+import sys
+
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+
+sys.path.insert(0, REPO_DIR)
+import living_wage
+CORPUS_FILENAME = os.path.join(BENCHMARKS_DIR, 'fixtures', 'michigan_pages.json.gz')
+
+BASE_URL = 'https://livingwage.mit.edu'
+STATE_FIPS = '26'
+
+## CBSA codes of the Michigan MSAs on the MIT Living Wage website
+MSA_CODES = {
+    'ann arbor, mi': '11460',
+    'battle creek, mi': '12980',
+    'bay city, mi': '13020',
+    'detroit-warren-dearborn, mi': '19820',
+    'flint, mi': '22420',
+    'grand rapids-wyoming, mi': '24340',
+    'jackson, mi': '27100',
+    'kalamazoo-portage, mi': '28020',
+    'lansing-east lansing, mi': '29620',
+    'midland, mi': '33220',
+    'monroe, mi': '33780',
+    'muskegon, mi': '34740',
+    'niles-benton harbor, mi': '35660',
+    'saginaw, mi': '40980',
+}
+
+ADULTS_LIST = ['one adult', 'two adults (one working)', 'two adults (both working)']
+
+## share of the after-tax income that goes to each expense category
+EXPENSE_SHARES = [
+    ('Food', 0.16),
+    ('Child Care', 0.22),
+    ('Medical', 0.12),
+    ('Housing', 0.27),
+    ('Transportation', 0.14),
+    ('Civic', 0.05),
+    ('Other', 0.04),
+]
+TAX_SHARE = 0.14
+
+
+##############################################
+############### render pages #################
+##############################################
+def area_path(area_name, county_index):
+    ''' Returns the website path of a county or an MSA, e.g. '/counties/26161'. '''
+    if area_name in MSA_CODES:
+        return f'/metros/{MSA_CODES[area_name]}'
+    return f'/counties/{STATE_FIPS}{county_index * 2 + 1:03d}'
+
+
+def render_state_page(county_links, msa_links):
+    ''' Renders the state locations page.
+
+    Parameters
+    ----------
+    county_links: list
+        a list of (display name, path) tuples for the counties
+    msa_links: list
+        a list of (display name, path) tuples for the MSAs
+
+    Returns
+    -------
+    string
+        the HTML text of the page
+    '''
+    def render_listing(links):
+        items = ''.join(f'<li><a href="{path}">{name}</a></li>\n' for name, path in links)
+        return f'<ul>\n{items}</ul>\n'
+
+    return (
+        '<html><head><title>Living Wage Calculator - Michigan</title></head><body>\n'
+        '<div class="container">\n'
+        '<h1>Living Wage Calculation for Michigan</h1>\n'
+        '<h2>Counties</h2>\n'
+        f'<div class="counties list-unstyled">\n{render_listing(county_links)}</div>\n'
+        '<h2>Metropolitan Areas</h2>\n'
+        f'<div class="metros list-unstyled">\n{render_listing(msa_links)}</div>\n'
+        '</div>\n</body></html>\n'
+    )
+
+
+def split_expenses(before_taxes, adults, children):
+    ''' Splits the required annual income before taxes into expense categories.
+
+    Returns
+    -------
+    list
+        a list of (row label, value) tuples in the order of the website's expense table
+    '''
+    taxes = round(before_taxes * TAX_SHARE)
+    after_taxes = before_taxes - taxes
+
+    shares = []
+    for category, share in EXPENSE_SHARES:
+        if category == 'Child Care' and (children == 0 or adults == 'two adults (one working)'):
+            share = 0.0
+        shares.append((category, share))
+    total_share = sum(share for _, share in shares)
+
+    rows = []
+    remaining = after_taxes
+    for category, share in shares[:-1]:
+        value = round(after_taxes * share / total_share)
+        rows.append((category, value))
+        remaining -= value
+    rows.append((shares[-1][0], remaining))
+
+    rows.append(('Required annual income after taxes', after_taxes))
+    rows.append(('Annual taxes', taxes))
+    rows.append(('Required annual income before taxes', before_taxes))
+    return rows
+
+
+def render_area_page(heading, wage_rows, expense_rows):
+    ''' Renders the page of one county or MSA.
+
+    Parameters
+    ----------
+    heading: string
+        the text of the page's h1, e.g. 'Living Wage Calculation for Washtenaw County, Michigan'
+    wage_rows: list
+        12 (living wage, poverty wage, minimum wage) tuples ordered by adults, then children
+    expense_rows: list
+        12 required annual incomes before taxes, in the same order
+
+    Returns
+    -------
+    string
+        the HTML text of the page
+    '''
+    def cells(values, td='<td>'):
+        return ''.join(f'{td}{value}</td>' for value in values)
+
+    children_headers = ''.join('<th>0 Children</th><th>1 Child</th><th>2 Children</th><th>3 Children</th>'
+        for _ in ADULTS_LIST)
+    minimum_wage_cells = cells((f'${row[2]:.2f}' for row in wage_rows), td='<td class="red">')
+    wages_table = (
+        '<table class="results_table table-striped">\n<thead>\n'
+        '<tr><th></th><th colspan="4">1 ADULT</th><th colspan="4">2 ADULTS<br/>(1 WORKING)</th>'
+        '<th colspan="4">2 ADULTS<br/>(BOTH WORKING)</th></tr>\n'
+        f'<tr><th>Hourly Wages</th>{children_headers}</tr>\n</thead>\n<tbody>\n'
+        f'<tr class="odd results"><td>Living Wage</td>{cells(f"${row[0]:.2f}" for row in wage_rows)}</tr>\n'
+        f'<tr class="even"><td>Poverty Wage</td>{cells(f"${row[1]:.2f}" for row in wage_rows)}</tr>\n'
+        f'<tr class="odd"><td>Minimum Wage</td>{minimum_wage_cells}</tr>\n'
+        '</tbody>\n</table>\n'
+    )
+
+    breakdowns = []
+    for i, before_taxes in enumerate(expense_rows):
+        breakdowns.append(split_expenses(int(before_taxes), ADULTS_LIST[i // 4], i % 4))
+    row_classes = ['odd', 'even', 'odd', 'even', 'odd', 'even', 'odd', 'even results', 'even', 'odd results']
+    expense_trs = ''
+    for row_index, row_class in enumerate(row_classes):
+        label = breakdowns[0][row_index][0]
+        values = (f'${breakdown[row_index][1]:,}' for breakdown in breakdowns)
+        expense_trs += f'<tr class="{row_class}"><td>{label}</td>{cells(values)}</tr>\n'
+    expense_table = (
+        '<table class="results_table table-striped expense_table">\n<thead>\n'
+        f'<tr><th>Annual Expenses</th>{children_headers}</tr>\n</thead>\n'
+        f'<tbody>\n{expense_trs}</tbody>\n</table>\n'
+    )
+
+    return (
+        '<html><head><title>Living Wage Calculator</title></head><body>\n'
+        f'<div class="container">\n<h1>\n{heading}\n</h1>\n'
+        f'<h2>Living Wage Calculation</h2>\n{wages_table}'
+        f'<h2>Typical Expenses</h2>\n{expense_table}'
+        '</div>\n</body></html>\n'
+    )
+
+
+def build_michigan_corpus(db_name):
+    ''' Builds the Michigan corpus from the rows of the SQL database.
+
+    Parameters
+    ----------
+    db_name: string
+        the path of a living_wage.sqlite database
+
+    Returns
+    -------
+    dict
+        key is a URL and value is the HTML text of the page
+    '''
+    conn = sqlite3.connect(db_name)
+    cur = conn.cursor()
+    area_names = [row[0] for row in cur.execute('SELECT Area FROM Areas ORDER BY Id')]
+
+    corpus = {}
+    county_links = []
+    msa_links = []
+    county_index = 0
+    for area_name in area_names:
+        path = area_path(area_name, county_index)
+        if area_name in MSA_CODES:
+            msa_links.append((living_wage.display_name(area_name), path))
+            heading = f'Living Wage Calculation for {living_wage.display_name(area_name)}'
+        else:
+            county_links.append((living_wage.display_name(area_name), path))
+            heading = f'Living Wage Calculation for {living_wage.display_name(area_name)}, Michigan'
+            county_index += 1
+
+        wage_rows = cur.execute('''
+            SELECT [Living Wage], [Poverty Wage], [Minimum Wage] FROM Wages
+            WHERE Area = ? ORDER BY Id''', [area_name]).fetchall()
+        expense_rows = [row[0] for row in cur.execute('''
+            SELECT [Required Annual Income Before Taxes] FROM Expenses
+            WHERE Area = ? ORDER BY Id''', [area_name])]
+        corpus[BASE_URL + path] = render_area_page(heading, wage_rows, expense_rows)
+    conn.close()
+
+    corpus[f'{BASE_URL}/states/{STATE_FIPS}/locations'] = render_state_page(county_links, msa_links)
+    return corpus
+
+
+##############################################
+############### load the corpus ##############
+##############################################
+def load_michigan_corpus():
+    ''' Loads the checked-in Michigan corpus.
+
+    Returns
+    -------
+    dict
+        key is a URL and value is the HTML text of the page
+    '''
+    with gzip.open(CORPUS_FILENAME, 'rt', encoding='utf-8') as corpus_file:
+        return json.load(corpus_file)
+
+
+def synthesize_multi_state_corpus(michigan_corpus, state_count):
+    ''' Makes a corpus of several made-up states out of the Michigan corpus.
+    Each synthetic state is a copy of Michigan under its own state code, with
+    its own county and MSA URLs, and with the state code added to every area name
+    so that the areas stay distinct in the database.
+
+    Parameters
+    ----------
+    michigan_corpus: dict
+        the corpus returned by load_michigan_corpus()
+    state_count: int
+        the number of synthetic states to make
+
+    Returns
+    -------
+    tuple
+        (corpus dict, list of the locations page URL of each synthetic state)
+    '''
+    corpus = {}
+    state_urls = []
+    for state_number in range(state_count):
+        state_code = str(60 + state_number)
+
+        def rename(name):
+            if name.endswith(', MI'):
+                return f'{name[:-len(", MI")]} {state_code}, MI'
+            return f'{name} {state_code}'
+
+        def move_path(path):
+            return path.replace(f'/counties/{STATE_FIPS}', f'/counties/{state_code}').replace(
+                '/metros/', f'/metros/{state_code}')
+
+        for url, page in michigan_corpus.items():
+            if url.endswith('/locations'):
+                new_url = f'{BASE_URL}/states/{state_code}/locations'
+                new_page = re.sub(r'<a href="([^"]+)">([^<]+)</a>',
+                    lambda match: f'<a href="{move_path(match.group(1))}">{rename(match.group(2))}</a>', page)
+                state_urls.append(new_url)
+            else:
+                new_url = BASE_URL + move_path(url[len(BASE_URL):])
+                new_page = re.sub(r'<h1>\nLiving Wage Calculation for ([^\n,]+)',
+                    lambda match: f'<h1>\nLiving Wage Calculation for {rename(match.group(1))}', page)
+            corpus[new_url] = new_page
+    return corpus, state_urls
+
+
+if __name__ == "__main__":
+    michigan_corpus = build_michigan_corpus(os.path.join(REPO_DIR, 'living_wage.sqlite'))
+    os.makedirs(os.path.dirname(CORPUS_FILENAME), exist_ok=True)
+    ## mtime=0 keeps the file byte-for-byte identical between rebuilds
+    with open(CORPUS_FILENAME, 'wb') as raw_file:
+        with gzip.GzipFile(fileobj=raw_file, mode='wb', mtime=0) as corpus_file:
+            corpus_file.write(json.dumps(michigan_corpus, sort_keys=True).encode('utf-8'))
+    print(f"Wrote {len(michigan_corpus)} pages to {CORPUS_FILENAME}")
@@ -0,0 +1,103 @@
+##############################################
+######## import-time budget for queries ######
+##############################################
+''' Measures how long it takes to import living_wage.py and run a query against
+the SQL database, using "python -X importtime". The query-only path must stay
+under a time budget and must never load bs4, requests, prettytable or plotly.
+
+Usage (from the folder that contains living_wage.py):
+    python3 benchmarks/import_budget.py
+    python3 benchmarks/import_budget.py --budget-ms 150 --runs 5
+'''
+import argparse
+import os
+import subprocess
+import sys
+
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ['bs4', 'requests', 'prettytable', 'plotly']
+
+QUERY_ONLY_SNIPPET = '''
+import living_wage
+living_wage.access_sql_table('washtenaw county', 'Wages')
+living_wage.avg_living_wage('washtenaw county')
+'''
+
+
+def parse_importtime(stderr_text):
+    ''' Parses the output of "python -X importtime" into a dictionary.
+
+    Parameters
+    ----------
+    stderr_text: string
+        what the interpreter wrote to stderr
+
+    Returns
+    -------
+    dict
+        key is a module name and value is its cumulative import time in microseconds
+    '''
+    cumulative_dict = {}
+    for line in stderr_text.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        fields = line[len('import time:'):].split('|')
+        module_name = fields[2].strip()
+        cumulative_dict[module_name] = int(fields[1].strip())
+    return cumulative_dict
+
+
+def measure_query_only_startup():
+    ''' Runs the query-only path once in a fresh interpreter.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    dict
+        the parsed importtime output (see parse_importtime())
+    '''
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', QUERY_ONLY_SNIPPET],
+        cwd=REPO_DIR, capture_output=True, text=True)
+    if completed.returncode != 0:
+        sys.exit(f"[Error message]: query-only run failed:\n{completed.stderr}")
+    return parse_importtime(completed.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import-time budget check for the query-only path.')
+    parser.add_argument('--budget-ms', type=float, default=50.0,
+        help='maximum cumulative import time of living_wage in milliseconds')
+    parser.add_argument('--runs', type=int, default=3,
+        help='number of fresh interpreters to start; the fastest run is compared to the budget')
+    args = parser.parse_args()
+
+    best_us = None
+    heavy_found = set()
+    for _ in range(args.runs):
+        cumulative_dict = measure_query_only_startup()
+        heavy_found.update(name.split('.')[0] for name in cumulative_dict if name.split('.')[0] in HEAVY_MODULES)
+        module_us = cumulative_dict.get('living_wage', 0)
+        if best_us is None or module_us < best_us:
+            best_us = module_us
+
+    best_ms = best_us / 1000
+    print(f"living_wage import (best of {args.runs}): {best_ms:.1f} ms (budget: {args.budget_ms:.1f} ms)")
+
+    failed = False
+    if heavy_found:
+        print(f"[Error message]: heavy modules loaded on the query-only path: {', '.join(sorted(heavy_found))}")
+        failed = True
+    if best_ms > args.budget_ms:
+        print(f"[Error message]: import time is over budget by {best_ms - args.budget_ms:.1f} ms")
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
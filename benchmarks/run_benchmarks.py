@@ -0,0 +1,325 @@
+##############################################
+############ pipeline benchmarks #############
+##############################################
+''' Times each stage of the living_wage.py pipeline against the recorded page
+corpus in benchmarks/fixtures/ and compares the results to a stored baseline.
+
+Stages: URL discovery, parsing the wages and expense tables of every page,
+loading the SQL database, querying every area (once, and again several times
+through the result cache) and building both plotly figures for every area. Each stage runs against two corpora: the recorded Michigan pages
+and a synthetic multi-state corpus made from them (see fixtures.py).
+
+Everything runs offline. The page cache is filled from the corpus, the database
+is written to a temporary folder and the network is blocked.
+
+Usage (from the folder that contains living_wage.py):
+    python3 benchmarks/run_benchmarks.py                    # compare to baseline.json
+    python3 benchmarks/run_benchmarks.py --update-baseline  # store a new baseline
+    python3 benchmarks/run_benchmarks.py --states 10 --repeat 5 --threshold 0.5
+
+Timings depend on the machine, so store a baseline on the machine that runs the
+comparison. The exit code is 1 when a stage is slower than its baseline by more
+than its threshold.
+'''
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import fixtures
+
+sys.path.insert(0, fixtures.REPO_DIR)
+import living_wage
+
+
+BASELINE_FILENAME = os.path.join(fixtures.BENCHMARKS_DIR, 'baseline.json')
+
+## allowed slowdown relative to the baseline, e.g. 0.25 = 25% slower
+DEFAULT_THRESHOLD = 0.30
+
+## how many times the repeated_queries stage queries every area
+REPEATED_QUERY_PASSES = 5
+
+
+##############################################
+################ offline setup ###############
+##############################################
+class NetworkBlocker:
+    ''' Stands in for the requests module so that any attempt to fetch a page fails. '''
+    def __getattr__(self, name):
+        raise RuntimeError('the benchmarks must run offline, but a page was missing from the corpus')
+
+
+def use_corpus(corpus, db_name):
+    ''' Points living_wage.py at a page corpus and a database file.
+
+    Parameters
+    ----------
+    corpus: dict
+        key is a URL and value is the HTML text of the page
+    db_name: string
+        the path of the SQL database to write
+
+    Returns
+    -------
+    None
+    '''
+    sys.modules['requests'] = NetworkBlocker()
+    living_wage.CACHE_DICT.clear()
+    living_wage.CACHE_DICT.update(corpus)
+    living_wage.DB_NAME = db_name
+
+
+def check_corpus_coverage(corpus, state_urls):
+    ''' Makes sure that every page the pipeline will ask for is in the corpus.
+
+    Parameters
+    ----------
+    corpus: dict
+        key is a URL and value is the HTML text of the page
+    state_urls: list
+        the locations page URL of each state in the corpus
+
+    Returns
+    -------
+    list
+        the URLs of all county and MSA pages, across every state
+    '''
+    area_urls = []
+    for state_url in state_urls:
+        if state_url not in corpus:
+            sys.exit(f"[Error message]: {state_url} is not in the corpus.")
+        living_wage.MICHIGAN_URL = state_url
+        area_urls.extend(living_wage.build_combined_dict().values())
+    missing_urls = [url for url in area_urls if url not in corpus]
+    if missing_urls:
+        sys.exit(f"[Error message]: {len(missing_urls)} pages are not in the corpus, e.g. {missing_urls[0]}")
+    return area_urls
+
+
+##############################################
+################### stages ###################
+##############################################
+def stage_discovery(state_urls, area_urls, area_names):
+    ## time the discovery itself, not the URL frontier
+    living_wage.FRONTIER_DICT.clear()
+    for state_url in state_urls:
+        living_wage.MICHIGAN_URL = state_url
+        living_wage.build_combined_dict()
+
+
+def stage_parse_wages(state_urls, area_urls, area_names):
+    ## time the parsers themselves, not the parse cache
+    living_wage.PARSE_DICT.clear()
+    for area_url in area_urls:
+        living_wage.scrape_wages_tables(area_url)
+
+
+def stage_parse_expenses(state_urls, area_urls, area_names):
+    living_wage.PARSE_DICT.clear()
+    for area_url in area_urls:
+        living_wage.scrape_expenses_tables(area_url)
+
+
+def stage_db_load(state_urls, area_urls, area_names):
+    living_wage.create_db()
+    for state_url in state_urls:
+        living_wage.MICHIGAN_URL = state_url
+        living_wage.load_areas()
+        living_wage.load_wages()
+        living_wage.load_expenses()
+    living_wage.refresh_aggregates()
+    living_wage.refresh_household_curves()
+
+
+def query_every_area(area_names):
+    for area_name in area_names:
+        living_wage.access_sql_table(area_name, 'Wages')
+        living_wage.avg_living_wage(area_name)
+        living_wage.extract_one_adult_expenses(area_name)
+        living_wage.extract_two_adults_one_working_expenses(area_name)
+        living_wage.extract_two_adults_both_working_expenses(area_name)
+
+
+def stage_queries(state_urls, area_urls, area_names):
+    ## time the queries themselves, not the result cache
+    living_wage.QUERY_CACHE.clear()
+    query_every_area(area_names)
+
+
+def stage_repeated_queries(state_urls, area_urls, area_names):
+    ## a session asks for the same areas again (re-selected areas, their graphs),
+    ## which the result cache answers after the first pass
+    living_wage.QUERY_CACHE.clear()
+    for _ in range(REPEATED_QUERY_PASSES):
+        query_every_area(area_names)
+
+
+def stage_figures(state_urls, area_urls, area_names):
+    living_wage.QUERY_CACHE.clear()
+    for area_name in area_names:
+        living_wage.build_avg_gap_figure(area_name)
+        living_wage.build_expenses_figure(area_name)
+
+
+## (name, function, unit of the per-item time) in the order the pipeline runs them
+STAGES = [
+    ('discovery', stage_discovery, 'state'),
+    ('parse_wages', stage_parse_wages, 'page'),
+    ('parse_expenses', stage_parse_expenses, 'page'),
+    ('db_load', stage_db_load, 'state'),
+    ('queries', stage_queries, 'area'),
+    ('repeated_queries', stage_repeated_queries, 'area'),
+    ('figures', stage_figures, 'area'),
+]
+
+
+def plotly_installed():
+    try:
+        import plotly.graph_objs
+    except ImportError:
+        return False
+    return True
+
+
+def run_corpus(corpus, state_urls, repeat):
+    ''' Times every stage against one corpus.
+
+    Parameters
+    ----------
+    corpus: dict
+        key is a URL and value is the HTML text of the page
+    state_urls: list
+        the locations page URL of each state in the corpus
+    repeat: int
+        how many times to run each stage; the fastest run is reported
+
+    Returns
+    -------
+    dict
+        key is a stage name and value is a dictionary with the fastest
+        seconds of the stage and the seconds per state, page or area
+    '''
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        use_corpus(corpus, os.path.join(temp_dir, 'living_wage.sqlite'))
+        area_urls = check_corpus_coverage(corpus, state_urls)
+
+        ## the queries and figures need a loaded database
+        stage_db_load(state_urls, area_urls, None)
+        conn = sqlite3.connect(living_wage.DB_NAME)
+        area_names = [row[0] for row in conn.execute('SELECT Area FROM Areas')]
+        conn.close()
+
+        item_counts = {'state': len(state_urls), 'page': len(area_urls), 'area': len(area_names)}
+        for stage_name, stage_function, unit in STAGES:
+            if stage_name == 'figures' and not plotly_installed():
+                print("  figures: skipped (plotly is not installed)")
+                continue
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                stage_function(state_urls, area_urls, area_names)
+                timings.append(time.perf_counter() - start)
+            seconds = min(timings)
+            results[stage_name] = {
+                'seconds': seconds,
+                f'seconds per {unit}': seconds / item_counts[unit],
+            }
+            print(f"  {stage_name:<15} {seconds * 1000:10.1f} ms   "
+                f"{seconds / item_counts[unit] * 1000:8.3f} ms per {unit}")
+    return results
+
+
+##############################################
+############## baseline compare ##############
+##############################################
+def compare_to_baseline(results, baseline, default_threshold):
+    ''' Compares the results of a run to the stored baseline.
+
+    Parameters
+    ----------
+    results: dict
+        key is a corpus name and value is the dictionary returned by run_corpus()
+    baseline: dict
+        the content of baseline.json; an optional 'thresholds' dictionary maps
+        a stage name to its own allowed slowdown
+    default_threshold: float
+        the allowed slowdown for stages without their own threshold
+
+    Returns
+    -------
+    list
+        a message for each stage that regressed
+    '''
+    thresholds = baseline.get('thresholds', {})
+    regressions = []
+    for corpus_name, stage_results in results.items():
+        for stage_name, stage_result in stage_results.items():
+            baseline_result = baseline.get('results', {}).get(corpus_name, {}).get(stage_name)
+            if baseline_result is None:
+                print(f"  {corpus_name:<10} {stage_name:<15} no baseline")
+                continue
+            threshold = thresholds.get(stage_name, default_threshold)
+            ratio = stage_result['seconds'] / baseline_result['seconds']
+            status = 'REGRESSION' if ratio > 1 + threshold else 'ok'
+            print(f"  {corpus_name:<10} {stage_name:<15} {ratio:6.2f}x baseline "
+                f"(limit {1 + threshold:.2f}x)  {status}")
+            if status == 'REGRESSION':
+                regressions.append(f"{corpus_name}/{stage_name} is {ratio:.2f}x slower than the baseline")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmarks for the living wage pipeline.')
+    parser.add_argument('--states', type=int, default=5,
+        help='number of states in the synthetic multi-state corpus')
+    parser.add_argument('--repeat', type=int, default=3,
+        help='number of times each stage runs; the fastest run is used')
+    parser.add_argument('--threshold', type=float, default=None,
+        help=f'allowed slowdown for every stage, overriding baseline.json (default {DEFAULT_THRESHOLD})')
+    parser.add_argument('--update-baseline', action='store_true',
+        help='store the results as the new baseline instead of comparing')
+    args = parser.parse_args()
+
+    michigan_corpus = fixtures.load_michigan_corpus()
+    synthetic_corpus, synthetic_state_urls = fixtures.synthesize_multi_state_corpus(michigan_corpus, args.states)
+
+    results = {}
+    print(f"Michigan corpus ({len(michigan_corpus)} pages)")
+    results['michigan'] = run_corpus(michigan_corpus, [living_wage.MICHIGAN_URL], args.repeat)
+    print(f"Synthetic corpus ({args.states} states, {len(synthetic_corpus)} pages)")
+    results['synthetic'] = run_corpus(synthetic_corpus, synthetic_state_urls, args.repeat)
+
+    if args.update_baseline:
+        baseline = {'thresholds': {}, 'states': args.states, 'results': results}
+        if os.path.exists(BASELINE_FILENAME):
+            with open(BASELINE_FILENAME) as baseline_file:
+                baseline['thresholds'] = json.load(baseline_file).get('thresholds', {})
+        with open(BASELINE_FILENAME, 'w') as baseline_file:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+        print(f"Stored the baseline in {BASELINE_FILENAME}")
+        return
+
+    if not os.path.exists(BASELINE_FILENAME):
+        sys.exit("[Error message]: no baseline yet; run again with --update-baseline.")
+    with open(BASELINE_FILENAME) as baseline_file:
+        baseline = json.load(baseline_file)
+    if baseline.get('states') != args.states:
+        print(f"[Warning]: the baseline used {baseline.get('states')} synthetic states, this run used {args.states}.")
+
+    default_threshold = DEFAULT_THRESHOLD if args.threshold is None else args.threshold
+    if args.threshold is not None:
+        baseline['thresholds'] = {}
+    print("Compared to the baseline")
+    regressions = compare_to_baseline(results, baseline, default_threshold)
+    for regression in regressions:
+        print(f"[Error message]: {regression}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,36 +6,183 @@
 ##############################################
 ############## import libraries ##############
 ##############################################
-from bs4 import BeautifulSoup
-import requests
+import argparse
+import codecs
+import gzip
+import hashlib
 import json
+import os
+import pickle
+import re
 import time # need this in order to sleep()
-import random
 import webbrowser # open URLs in a web browser
 import sys # to use sys.exit()
 import sqlite3
-from prettytable import PrettyTable
-import plotly.graph_objs as go
+from urllib.parse import urljoin, urlsplit, urlunsplit
+## bs4, requests, prettytable and plotly are slow to import, so they are imported
+## inside the functions that use them (e.g. make_soup()) instead of up here.
+## That way, a session that only queries the database never pays for them.
+
+import living_wage_lock
+import living_wage_metrics as metrics
+import living_wage_prefetch
+import living_wage_query_cache
+import living_wage_search
+import living_wage_throttle
 
 
 ##############################################
 ############## global variables ##############
 ##############################################
-BASE_URL = 'https://livingwage.mit.edu'
+## LIVING_WAGE_BASE_URL points the crawler at another server, e.g. the local
+## stand-in site in living_wage_site.py (see also set_base_url())
+BASE_URL = os.environ.get('LIVING_WAGE_BASE_URL', 'https://livingwage.mit.edu').rstrip('/')
 LOCATIONS_PATH = '/states/26/locations'
 MICHIGAN_URL = BASE_URL + LOCATIONS_PATH
+## the state of every area the crawler loads; area names are only unique within
+## a state, so every table keyed by area name also has a State column
+STATE_CODE = 'MI'
+
+## requests per second, to avoid overloading the website: the crawler starts at
+## INITIAL_REQUESTS_PER_SECOND and adapts between the minimum and the maximum to
+## how the website responds (see living_wage_throttle.py and set_max_rate()).
+## The original crawler slept 5 to 10 seconds between requests: the crawler starts
+## at the slow end of that, and never goes faster than the fast end of it
+INITIAL_REQUESTS_PER_SECOND = 0.1
+MIN_REQUESTS_PER_SECOND = 0.02
+MAX_REQUESTS_PER_SECOND = 0.2
+THROTTLE = living_wage_throttle.AdaptiveThrottle(INITIAL_REQUESTS_PER_SECOND,
+    MIN_REQUESTS_PER_SECOND, MAX_REQUESTS_PER_SECOND)
+
+## fetches that fail with one of these status codes are retried
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+MAX_RETRIES = 3
+REQUEST_TIMEOUT_SECONDS = 30
+
+## pages are downloaded in chunks, and a page bigger than MAX_PAGE_BYTES is refused
+## (see download_page()); pages that don't name their encoding are read as DEFAULT_ENCODING
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
+MAX_PAGE_BYTES = 4 * 1024 * 1024
+## the pages skipped by the current build, and why (see scrape_or_skip())
+SKIPPED_PAGE_DICT = {}
+DEFAULT_ENCODING = 'utf-8'
+## how far into a page to look for a <meta charset> tag
+ENCODING_SNIFF_BYTES = 2048
 
 CACHE_FILENAME = 'living_wage_cache.json'
 CACHE_DICT = {}
 
+## key is a URL in the cache and value is a dictionary with the epoch seconds it
+## was 'fetched' and last 'accessed', for evicting pages (see living_wage_compact.py)
+CACHE_META_FILENAME = 'living_wage_cache_meta.json'
+CACHE_META_DICT = {}
+
+## second cache tier: only the parts of each page that the parsers read
+## (see get_page_fragment()); bump FRAGMENT_VERSION when extract_page_fragment() changes
+FRAGMENT_CACHE_FILENAME = 'living_wage_fragments.json'
+FRAGMENT_DICT = {}
+FRAGMENT_VERSION = 1
+PAGE_ARCHIVE_FILENAME = 'living_wage_pages.json.gz'
+
+## key is a state page URL and value is the county and MSA pages it lists
+## (see discover_areas()); bump FRONTIER_VERSION when discover_areas() changes
+FRONTIER_FILENAME = 'living_wage_frontier.json'
+FRONTIER_DICT = {}
+FRONTIER_VERSION = 1
+
+## key is '<parser>:<hash of the fragment parsed>' and value is the parsed result
+## (see get_parse_result()); bump PARSER_VERSION when scrape_wages_tables() or
+## scrape_expenses_tables() change what they return
+PARSE_CACHE_FILENAME = 'living_wage_parses.json'
+PARSE_DICT = {}
+PARSER_VERSION = '3'
+## key is a URL and value is the page body its fragment was last checked against
+VERIFIED_PAGE_DICT = {}
+
+## key is a cache file and value is its identity (see file_identity()) when this
+## process last read or wrote it; any other identity means another process saved it
+KNOWN_FILE_DICT = {}
+
 DB_NAME = 'living_wage.sqlite'
 
+## tables and columns that the programs reading DB_NAME rely on, which a database
+## built by an older version of this program lacks (see schema_error())
+SCHEMA_COLUMNS_DICT = {
+    'Areas': ['State', 'Area', 'Code'],
+    'Wages': ['State', 'Area'],
+    'Expenses': ['State', 'Area'],
+    'ExpenseItems': ['State', 'Area', 'Category', 'Amount'],
+    'AreaAggregates': ['State', 'Area', 'Gap', 'Rank', 'Percentile'],
+    'CompositionAggregates': ['State', 'Area', 'Gap', 'Rank', 'Percentile'],
+    'StatePercentiles': ['State', 'Percentile', 'Living Wage'],
+    'HouseholdCurves': ['State', 'Area', 'Extra Child', 'Extra Adult', 'Hours Per Year'],
+}
+
+## a DuckDB file that every build also writes, for statewide and national
+## analyses (see living_wage_storage.py), or None to only build DB_NAME
+DUCKDB_NAME = None
+
+## written after a successful build so the next launch can skip it (see load_snapshot());
+## bump SNAPSHOT_VERSION when the contents of the snapshot change
+SNAPSHOT_FILENAME = 'living_wage_snapshot.pickle'
+SNAPSHOT_VERSION = 1
+
+## graphs are shown in one browser tab that PLOT_SERVER keeps up to date, started
+## with the first graph (see living_wage_plot_server.py), or each in a new tab
+## with fig.show() if USE_PLOT_SERVER is False (see show_figure())
+USE_PLOT_SERVER = True
+PLOT_SERVER = None
+
+## what the scripted session of --profile types at the area prompt (see run_profile())
+PROFILE_SCRIPT = ['1', 'washtenaw', '11460', 'detroit', 'grand rapids']
+
+## number of working adults in each family composition on the website
+WORKING_ADULTS_DICT = {
+    'one adult': 1,
+    'two adults (one working)': 1,
+    'two adults (both working)': 2,
+}
+
+## percentiles stored in the StatePercentiles table
+STATE_PERCENTILES = [10, 25, 50, 75, 90]
+
+## used when the aggregate tables haven't been built (see refresh_aggregates())
+MICHIGAN_MINIMUM_WAGE = 9.45
+
 FIPS_AREA_LIST = []
 
+## bumped every time this program writes to the SQL database (see db_generation())
+DB_GENERATION = 0
+## results of the functions that query the SQL database, keyed by db_generation()
+QUERY_CACHE = living_wage_query_cache.QueryCache()
+
+## metrics around the hot paths (no-ops unless metrics are enabled)
+CACHE_HITS = metrics.counter('cache_hits_total', 'Pages served from the cache')
+CACHE_MISSES = metrics.counter('cache_misses_total', 'Pages that had to be fetched')
+FRAGMENT_HITS = metrics.counter('fragment_hits_total', 'Page fragments served from the fragment cache')
+FRAGMENT_MISSES = metrics.counter('fragment_misses_total', 'Page fragments extracted from a full page')
+PARSE_HITS = metrics.counter('parse_hits_total', 'Parsed tables served from the parse cache')
+PARSE_MISSES = metrics.counter('parse_misses_total', 'Tables parsed from a page fragment')
+FETCHED_BYTES = metrics.counter('fetched_bytes_total', 'Bytes downloaded from the website')
+SLEEP_SECONDS = metrics.counter('politeness_sleep_seconds_total', 'Seconds slept before fetching pages')
+RETRIES = metrics.counter('fetch_retries_total', 'Fetches retried after a 429 or 5xx response')
+FETCH_SECONDS = metrics.histogram('fetch_seconds', 'Time to download one page')
+DISCOVERY_SECONDS = metrics.histogram('discovery_seconds', 'Time to build the area URL dictionary')
+PARSE_WAGES_SECONDS = metrics.histogram('parse_wages_seconds', 'Time to parse the wages table of one page')
+PARSE_EXPENSES_SECONDS = metrics.histogram('parse_expenses_seconds', 'Time to parse the expense table of one page')
+ROWS_INSERTED = metrics.counter('db_rows_inserted_total', 'Rows inserted into the SQL database')
+INSERT_SECONDS = metrics.histogram('db_insert_seconds', 'Time to insert the rows of one table')
+ROWS_PER_SECOND = metrics.gauge('db_rows_inserted_per_second', 'Insert rate of the last table load')
+QUERY_SECONDS = metrics.histogram('query_seconds', 'Time to run one query against the SQL database')
+
 
 ##############################################
 ############# classes & objects ##############
 ##############################################
+class PageTooLarge(Exception):
+    ''' Raised when a page is bigger than MAX_PAGE_BYTES. '''
+
+
 class Area:
     ''' Either a county or a metropolitan statistical area (MSA) in Michigan.
 
@@ -46,10 +193,18 @@ class Area:
 
     area_type: string
         the category of the area (e.g. 'County' or 'MSA')
+
+    url: string
+        the URL of the area's page (e.g. 'https://livingwage.mit.edu/counties/26161'), or ''
+
+    code: string
+        the county FIPS code or MSA CBSA code at the end of the URL (e.g. '26161'), or ''
     '''
-    def __init__(self, name, area_type):
+    def __init__(self, name, area_type, url=''):
         self.name = name
         self.area_type = area_type
+        self.url = url
+        self.code = url.rstrip('/').split('/')[-1] if url else ''
 
 
     def info(self):
@@ -68,6 +223,40 @@ class Area:
         return (f"{self.name} (Type: {self.area_type})")
 
 
+    def full_name(self):
+        ''' Get the name of the area as shown to the user, with ', MI' added to MSAs
+        (e.g. 'Washtenaw County' or 'Ann Arbor, MI').
+
+        Parameters
+        ----------
+        none
+
+        Returns
+        -------
+        str
+            the full name of the area
+        '''
+        if self.area_type == 'County':
+            return self.name
+        return f"{self.name}, MI"
+
+
+    def db_name(self):
+        ''' Get the name of the area as stored in the SQL database
+        (e.g. 'washtenaw county' or 'ann arbor, mi').
+
+        Parameters
+        ----------
+        none
+
+        Returns
+        -------
+        str
+            the lowercase full name of the area
+        '''
+        return self.full_name().lower()
+
+
 ##############################################
 ############### cache functions ##############
 ##############################################
@@ -85,31 +274,143 @@ def open_cache():
         The opened cache
     '''
     try:
+        file_identity_before = file_identity(CACHE_FILENAME)
         cache_file = open(CACHE_FILENAME, 'r')
         cache_contents = cache_file.read()
         cache_dict = json.loads(cache_contents)
         cache_file.close()
+        KNOWN_FILE_DICT[CACHE_FILENAME] = file_identity_before
     except:
         cache_dict = {}
     return cache_dict
 
 
-def save_cache(cache_dict):
+def save_cache(cache_dict, merge=True):
     ''' Saves the current state of the cache to disk.
+    Other copies of the program may share the cache file, so the file is locked
+    while saving, the pages they saved in the meantime are merged in first,
+    and the file is replaced in one step (see living_wage_lock.py).
     
     Parameters
     ----------
     cache_dict: dict
         The dictionary to save
+    merge: bool
+        add the pages saved by other copies of the program to cache_dict first;
+        False overwrites them (e.g. after pages were removed on purpose)
     
     Returns
     -------
     None
     '''
-    dumped_json_cache = json.dumps(cache_dict)
-    cache_file = open(CACHE_FILENAME,"w")
-    cache_file.write(dumped_json_cache)
-    cache_file.close()
+    with living_wage_lock.file_lock(CACHE_FILENAME):
+        if merge:
+            merge_cache_from_disk(CACHE_FILENAME, cache_dict)
+        living_wage_lock.write_json_atomically(CACHE_FILENAME, cache_dict)
+        KNOWN_FILE_DICT[CACHE_FILENAME] = file_identity(CACHE_FILENAME)
+        save_cache_meta(CACHE_META_DICT)
+
+
+def open_cache_meta():
+    ''' Opens the cache metadata file if it exists and loads the JSON into a dictionary.
+    If the file doesn't exist, creates a new dictionary.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    dict
+        key is a URL and value is a dictionary with the epoch seconds the page
+        was 'fetched' and last 'accessed'
+    '''
+    try:
+        file_identity_before = file_identity(CACHE_META_FILENAME)
+        with open(CACHE_META_FILENAME, 'r') as meta_file:
+            meta_dict = json.load(meta_file)
+        KNOWN_FILE_DICT[CACHE_META_FILENAME] = file_identity_before
+    except:
+        meta_dict = {}
+    return meta_dict
+
+
+def save_cache_meta(meta_dict, merge=True):
+    ''' Saves the cache metadata to disk. Other copies of the program may have
+    fetched or used the same pages in the meantime, so the latest of both
+    times is kept for every page (see save_cache()).
+
+    Parameters
+    ----------
+    meta_dict: dict
+        The dictionary to save
+    merge: bool
+        add the metadata saved by other copies of the program first
+
+    Returns
+    -------
+    None
+    '''
+    with living_wage_lock.file_lock(CACHE_META_FILENAME):
+        current_identity = file_identity(CACHE_META_FILENAME)
+        if merge and current_identity is not None and current_identity != KNOWN_FILE_DICT.get(CACHE_META_FILENAME):
+            for url, disk_meta in open_cache_meta().items():
+                meta = meta_dict.setdefault(url, disk_meta)
+                for key in ('fetched', 'accessed'):
+                    meta[key] = max(meta.get(key, 0), disk_meta.get(key, 0))
+        living_wage_lock.write_json_atomically(CACHE_META_FILENAME, meta_dict)
+        KNOWN_FILE_DICT[CACHE_META_FILENAME] = file_identity(CACHE_META_FILENAME)
+
+
+def touch_cache_entry(url, fetched=False):
+    ''' Records that a page was used just now (or fetched, if fetched is True),
+    for the LRU and age eviction in living_wage_compact.py. Saved with the cache.
+    '''
+    now = time.time()
+    meta = CACHE_META_DICT.get(url)
+    if meta is None or fetched:
+        CACHE_META_DICT[url] = {'fetched': now, 'accessed': now}
+    else:
+        meta['accessed'] = now
+
+
+def file_identity(filename):
+    ''' Returns (inode, size, modification time) of a file, or None if it doesn't exist.
+    Every save replaces the file, so the identity changes whenever anyone saves it.
+    '''
+    try:
+        file_stat = os.stat(filename)
+    except OSError:
+        return None
+    return (file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns)
+
+
+def merge_cache_from_disk(filename, cache_dict):
+    ''' Adds the entries that another copy of the program saved to a cache file
+    since this process last read or wrote it. Entries already in cache_dict are kept.
+    Call it with the file's lock held.
+
+    Parameters
+    ----------
+    filename: string
+        the cache file, e.g. CACHE_FILENAME
+    cache_dict: dict
+        the cache in memory
+
+    Returns
+    -------
+    None
+    '''
+    current_identity = file_identity(filename)
+    if current_identity is None or current_identity == KNOWN_FILE_DICT.get(filename):
+        return
+    try:
+        with open(filename, 'r') as cache_file:
+            disk_cache_dict = json.load(cache_file)
+    except (OSError, ValueError):
+        return
+    for key, value in disk_cache_dict.items():
+        cache_dict.setdefault(key, value)
 
 
 def make_request_with_cache(url, cache_dict):
@@ -130,56 +431,474 @@ def make_request_with_cache(url, cache_dict):
     '''
     if (url in cache_dict.keys()):
         # print(f"CURRENTLY USING CACHE: {url}")
+        CACHE_HITS.inc()
+        touch_cache_entry(url)
         return cache_dict[url]
     else:
         # print(f"CURRENTLY FETCHING: {url}")
-        time.sleep(random.randint(5,10))
-        response = requests.get(url)
-        cache_dict[url] = response.text
+        import requests
+        CACHE_MISSES.inc()
+
+        for attempt in range(MAX_RETRIES + 1):
+            if THROTTLE is not None:
+                SLEEP_SECONDS.inc(THROTTLE.wait())
+            request_start = time.perf_counter()
+            ## only the headers are read here; the body is streamed by download_page()
+            response = requests.get(url, timeout=REQUEST_TIMEOUT_SECONDS, stream=True)
+            latency_seconds = time.perf_counter() - request_start
+            retry_after_seconds = living_wage_throttle.parse_retry_after(response.headers.get('Retry-After'))
+            if THROTTLE is not None:
+                THROTTLE.record(latency_seconds, response.status_code, retry_after_seconds)
+            if response.status_code not in RETRY_STATUS_CODES or attempt == MAX_RETRIES:
+                break
+            FETCH_SECONDS.observe(latency_seconds)
+            response.close()
+            RETRIES.inc()
+            ## the throttle slows down by itself after a 429/503 or a Retry-After header; without
+            ## a throttle, or after any other server error (500/502/504), back off here: wait as
+            ## long as the server asks for, or exponentially longer after each attempt
+            if THROTTLE is None or (response.status_code not in living_wage_throttle.PUSHBACK_STATUS_CODES
+                    and retry_after_seconds is None):
+                backoff_seconds = retry_after_seconds if retry_after_seconds is not None else 2 ** attempt
+                SLEEP_SECONDS.inc(backoff_seconds)
+                time.sleep(backoff_seconds)
+
+        with response:
+            ## never cache an error page
+            response.raise_for_status()
+            page_body = download_page(response)
+        FETCH_SECONDS.observe(time.perf_counter() - request_start)
+
+        FETCHED_BYTES.inc(len(page_body))
+        cache_dict[url] = decode_page(page_body, response.headers.get('Content-Type'))
+        touch_cache_entry(url, fetched=True)
         save_cache(cache_dict)
         return cache_dict[url]
 
 
-##############################################
-################# instances ##################
-##############################################
-def get_area_instance(specific_location_url):
-    ''' Makes an instance from an area URL.
+def download_page(response, max_bytes=None):
+    ''' Reads the body of a streamed response in chunks of DOWNLOAD_CHUNK_BYTES,
+    and gives up as soon as it is bigger than max_bytes, so a huge or endless
+    response never fills the memory. Compressed bodies are counted after decompression.
+
+    Parameters
+    ----------
+    response: requests.Response
+        a response to a request made with stream=True
+    max_bytes: int
+        the biggest body accepted, or None for MAX_PAGE_BYTES
+
+    Returns
+    -------
+    bytearray
+        the body
+    '''
+    max_bytes = max_bytes or MAX_PAGE_BYTES
+    content_length = response.headers.get('Content-Length', '')
+    if content_length.isdigit() and int(content_length) > max_bytes:
+        raise PageTooLarge(f'{response.url} is {int(content_length):,} bytes (limit: {max_bytes:,})')
+
+    page_body = bytearray()
+    for chunk in response.iter_content(DOWNLOAD_CHUNK_BYTES):
+        page_body += chunk
+        if len(page_body) > max_bytes:
+            raise PageTooLarge(f'{response.url} is over {max_bytes:,} bytes')
+    return page_body
+
+
+def detect_encoding(page_body, content_type=None):
+    ''' Finds the character encoding of a page, from (in this order) the charset
+    of the Content-Type header, a byte order mark, or a <meta charset> tag near the
+    top of the page, and falls back to DEFAULT_ENCODING.
+
+    Parameters
+    ----------
+    page_body: bytes
+        the body of the page
+    content_type: string
+        the Content-Type header of the response, e.g. 'text/html; charset=utf-8', or None
+
+    Returns
+    -------
+    string
+        the name of the encoding, e.g. 'utf-8'
+    '''
+    candidates = []
+    if content_type:
+        header_match = re.search(r'charset\s*=\s*["\']?([\w.:-]+)', content_type, re.IGNORECASE)
+        if header_match:
+            candidates.append(header_match.group(1))
+    for bom, bom_encoding in ((codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16')):
+        if page_body.startswith(bom):
+            candidates.append(bom_encoding)
+    meta_match = re.search(rb'<meta[^>]+charset\s*=\s*["\']?([\w.:-]+)', bytes(page_body[:ENCODING_SNIFF_BYTES]), re.IGNORECASE)
+    if meta_match:
+        candidates.append(meta_match.group(1).decode('ascii'))
+
+    for encoding in candidates:
+        try:
+            return codecs.lookup(encoding).name
+        except LookupError:
+            continue ## e.g. a misspelled charset
+    return DEFAULT_ENCODING
+
+
+def decode_page(page_body, content_type=None):
+    ''' Turns the body of a page into text, in the encoding found by detect_encoding().
+    Bytes that aren't valid in that encoding become U+FFFD instead of failing the crawl.
+
+    Parameters
+    ----------
+    page_body: bytes
+        the body of the page
+    content_type: string
+        the Content-Type header of the response, or None
+
+    Returns
+    -------
+    string
+        the HTML text of the page
+    '''
+    return page_body.decode(detect_encoding(page_body, content_type), errors='replace')
+
+
+def set_base_url(base_url):
+    ''' Points the crawler at another server that serves the same pages as the
+    MIT Living Wage website, e.g. http://127.0.0.1:8026 for the local stand-in site.
     
     Parameters
     ----------
-    specific_location_url: string
-        Thr URL for a county or an MSA in the Michigan page of the MIT Living Wage website,
-        e.g. https://livingwage.mit.edu/counties/26161 for Washtenaw County or 
-        https://livingwage.mit.edu/metros/11460 for Ann Arbor, MI MSA
+    base_url: string
+        the scheme, host and port of the server, without a trailing slash
     
     Returns
     -------
-    instance
-        an area instance
+    None
     '''
-    url_text = make_request_with_cache(specific_location_url, CACHE_DICT)
-    soup = BeautifulSoup(url_text, 'html.parser')
+    global BASE_URL, MICHIGAN_URL
+    BASE_URL = base_url.rstrip('/')
+    MICHIGAN_URL = BASE_URL + LOCATIONS_PATH
 
-    pre_names = soup.find('div', class_="container")
-    names = pre_names.find('h1')
-    for name in names:
-        clean_name_1 = name.strip()
-        clean_name_2 = clean_name_1.replace('Living Wage Calculation for ', '')
-        clean_name_3 = clean_name_2.replace(', Michigan', '').replace(', MI', '')
 
-    area_type = ''
-    if 'county' in clean_name_2.lower():
-        area_type = "County"
+def set_max_rate(max_rate):
+    ''' Sets the highest number of requests per second the crawler may make.
+    
+    Parameters
+    ----------
+    max_rate: float
+        requests per second, e.g. 0.2 for the MIT website; 0 turns the throttle
+        off (e.g. for the local stand-in site), and failed requests are then
+        retried after the server's Retry-After or an exponential backoff
+    
+    Returns
+    -------
+    None
+    '''
+    global THROTTLE
+    if max_rate <= 0:
+        THROTTLE = None
     else:
-        area_type = "MSA"
+        ## keep the initial and minimum rates in the same proportion to the maximum as the defaults
+        THROTTLE = living_wage_throttle.AdaptiveThrottle(
+            max_rate * INITIAL_REQUESTS_PER_SECOND / MAX_REQUESTS_PER_SECOND,
+            max_rate * MIN_REQUESTS_PER_SECOND / MAX_REQUESTS_PER_SECOND, max_rate)
+
+
+def make_soup(url_text):
+    ''' Parses the HTML text of a page into a BeautifulSoup object.
+    bs4 is only imported the first time a page actually has to be parsed.
+
+    Parameters
+    ----------
+    url_text: string
+        The HTML text of a page, e.g. returned by make_request_with_cache()
+
+    Returns
+    -------
+    BeautifulSoup
+        the parsed page
+    '''
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(url_text, 'html.parser')
+
+
+def open_fragment_cache():
+    ''' Opens the fragment cache file if it exists and loads the JSON into a dictionary.
+    If the file doesn't exist, creates a new dictionary.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    dict
+        key is a URL and value is a dictionary with the 'hash' of the page body,
+        the FRAGMENT_VERSION and the 'fragment' HTML (see get_page_fragment())
+    '''
+    try:
+        file_identity_before = file_identity(FRAGMENT_CACHE_FILENAME)
+        with open(FRAGMENT_CACHE_FILENAME, 'r') as fragment_file:
+            fragment_dict = json.load(fragment_file)
+        KNOWN_FILE_DICT[FRAGMENT_CACHE_FILENAME] = file_identity_before
+    except:
+        fragment_dict = {}
+    return fragment_dict
+
+
+def save_fragment_cache(fragment_dict, merge=True):
+    ''' Saves the current state of the fragment cache to disk, merging in the
+    fragments saved by other copies of the program (see save_cache()).
+
+    Parameters
+    ----------
+    fragment_dict: dict
+        The dictionary to save
+    merge: bool
+        add the fragments saved by other copies of the program first
+
+    Returns
+    -------
+    None
+    '''
+    with living_wage_lock.file_lock(FRAGMENT_CACHE_FILENAME):
+        if merge:
+            merge_cache_from_disk(FRAGMENT_CACHE_FILENAME, fragment_dict)
+        living_wage_lock.write_json_atomically(FRAGMENT_CACHE_FILENAME, fragment_dict)
+        KNOWN_FILE_DICT[FRAGMENT_CACHE_FILENAME] = file_identity(FRAGMENT_CACHE_FILENAME)
+
+
+def hash_page(url_text):
+    ''' Returns the SHA-256 hex digest of the HTML text of a page. '''
+    return hashlib.sha256(url_text.encode('utf-8')).hexdigest()
+
+
+def extract_page_fragment(url_text):
+    ''' Cuts the parts of a page that the parsers read out of the full HTML:
+    the page title (h1), the county and MSA lists of the state page, the
+    first table head and body (the wages table) and the expense table.
+    Every attribute other than class and href is dropped.
+
+    The fragment keeps the page's structure, so build_county_url_dict(),
+    build_msa_url_dict(), scrape_wages_tables() and scrape_expenses_tables()
+    parse it exactly like the full page, only faster.
+
+    Parameters
+    ----------
+    url_text: string
+        The HTML text of a page, e.g. returned by make_request_with_cache()
+
+    Returns
+    -------
+    string
+        the HTML of the fragment
+    '''
+    soup = make_soup(url_text)
+
+    container_parts = []
+    container = soup.find('div', class_='container')
+    if container is not None:
+        for tag in (container.find('h1'),
+                    container.find('div', class_='counties list-unstyled'),
+                    container.find('div', class_='metros list-unstyled')):
+            if tag is not None:
+                container_parts.append(tag)
+
+    wages_parts = [tag for tag in (soup.find('thead'), soup.find('tbody')) if tag is not None]
+    expense_table = soup.find('table', class_='results_table table-striped expense_table')
+
+    for tag in container_parts + wages_parts + ([expense_table] if expense_table is not None else []):
+        for each_tag in [tag] + tag.find_all(True):
+            each_tag.attrs = {name: value for name, value in each_tag.attrs.items() if name in ('class', 'href')}
+
+    ## the wages table goes before the expense table, so that find('thead') and
+    ## find('tbody') still return the wages table first
+    fragment = '<div class="container">' + ''.join(str(tag) for tag in container_parts) + '</div>'
+    fragment += '<table>' + ''.join(str(tag) for tag in wages_parts) + '</table>'
+    if expense_table is not None:
+        fragment += str(expense_table)
+    return fragment
+
+
+def get_page_fragment(url):
+    ''' Returns the fragment of a page (see extract_page_fragment()) from the fragment cache.
+    A fragment is only reused while the full page in the cache, if there still
+    is one, has the same hash as the page it was cut from; otherwise it is cut
+    again, and the page is fetched (see make_request_with_cache()) if it isn't cached.
+    Full pages can be moved out of the cache with archive_page_bodies().
+
+    Parameters
+    ----------
+    url: string
+        The URL of the page
+
+    Returns
+    -------
+    string
+        the HTML of the fragment
+    '''
+    url_text = CACHE_DICT.get(url)
+    fragment_entry = FRAGMENT_DICT.get(url)
+    touch_cache_entry(url)
+    if fragment_entry is not None and fragment_entry.get('version') == FRAGMENT_VERSION:
+        ## hash each page body once per session, not on every call
+        if url_text is None or VERIFIED_PAGE_DICT.get(url) is url_text:
+            FRAGMENT_HITS.inc()
+            return fragment_entry['fragment']
+        if fragment_entry['hash'] == hash_page(url_text):
+            VERIFIED_PAGE_DICT[url] = url_text
+            FRAGMENT_HITS.inc()
+            return fragment_entry['fragment']
+
+    if url_text is None:
+        url_text = make_request_with_cache(url, CACHE_DICT)
+    FRAGMENT_MISSES.inc()
+    fragment = extract_page_fragment(url_text)
+    FRAGMENT_DICT[url] = {'hash': hash_page(url_text), 'version': FRAGMENT_VERSION, 'fragment': fragment}
+    VERIFIED_PAGE_DICT[url] = url_text
+    return fragment
+
+
+def open_parse_cache():
+    ''' Opens the parse cache file if it exists and loads the JSON into a dictionary.
+    If the file doesn't exist, creates a new dictionary.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    dict
+        key is '<parser>:<hash of the fragment>' and value is a dictionary with
+        the PARSER_VERSION and the parsed 'result' (see get_parse_result())
+    '''
+    try:
+        file_identity_before = file_identity(PARSE_CACHE_FILENAME)
+        with open(PARSE_CACHE_FILENAME, 'r') as parse_file:
+            parse_dict = json.load(parse_file)
+        KNOWN_FILE_DICT[PARSE_CACHE_FILENAME] = file_identity_before
+    except:
+        parse_dict = {}
+    return parse_dict
+
+
+def save_parse_cache(parse_dict, merge=True):
+    ''' Saves the current state of the parse cache to disk, merging in the
+    results saved by other copies of the program (see save_cache()).
+    Results of an older PARSER_VERSION are dropped.
+
+    Parameters
+    ----------
+    parse_dict: dict
+        The dictionary to save
+    merge: bool
+        add the results saved by other copies of the program first
+
+    Returns
+    -------
+    None
+    '''
+    with living_wage_lock.file_lock(PARSE_CACHE_FILENAME):
+        if merge:
+            merge_cache_from_disk(PARSE_CACHE_FILENAME, parse_dict)
+        for parse_key in [key for key, entry in parse_dict.items() if entry.get('version') != PARSER_VERSION]:
+            del parse_dict[parse_key]
+        living_wage_lock.write_json_atomically(PARSE_CACHE_FILENAME, parse_dict)
+        KNOWN_FILE_DICT[PARSE_CACHE_FILENAME] = file_identity(PARSE_CACHE_FILENAME)
 
-    area_without_info_function = Area(name = clean_name_3, area_type = area_type)
-    return area_without_info_function
 
+def get_parse_result(parser_name, url, parse_function):
+    ''' Returns what parse_function makes of the fragment of a page, from the parse
+    cache if the same parser version already parsed the same fragment, so pages
+    that didn't change are never parsed again, not even after a restart.
+    The result is shared with the cache, so don't modify it.
 
+    Parameters
+    ----------
+    parser_name: string
+        the part of the cache key that names the parser, e.g. 'wages'
+    url: string
+        The URL of the page
+    parse_function: function
+        turns the HTML of the fragment into a result that JSON can store
+
+    Returns
+    -------
+    dict
+        the parsed result
+    '''
+    url_text = get_page_fragment(url)
+    parse_key = f'{parser_name}:{hash_page(url_text)}'
+    parse_entry = PARSE_DICT.get(parse_key)
+    if parse_entry is not None and parse_entry.get('version') == PARSER_VERSION:
+        PARSE_HITS.inc()
+        return parse_entry['result']
+
+    PARSE_MISSES.inc()
+    result = parse_function(url_text)
+    PARSE_DICT[parse_key] = {'version': PARSER_VERSION, 'result': result}
+    return result
+
+
+def archive_page_bodies(archive_filename=None):
+    ''' Moves every full page that has an up-to-date fragment out of the page cache
+    and into a gzipped archive, then saves both caches. The parsers keep working
+    from the fragments; an archived page can be put back into the cache by hand,
+    or will be fetched again if its fragment ever has to be cut again.
+
+    Parameters
+    ----------
+    archive_filename: string
+        the archive to add the pages to, or None for PAGE_ARCHIVE_FILENAME
+
+    Returns
+    -------
+    tuple
+        (number of pages archived, bytes of HTML archived, bytes of HTML in the fragments)
+    '''
+    archive_filename = archive_filename or PAGE_ARCHIVE_FILENAME
+    ## hold the cache lock throughout, so that no other copy of the program
+    ## saves pages between the merge below and the final save
+    with living_wage_lock.file_lock(CACHE_FILENAME), living_wage_lock.file_lock(archive_filename):
+        merge_cache_from_disk(CACHE_FILENAME, CACHE_DICT)
+        try:
+            with gzip.open(archive_filename, 'rt', encoding='utf-8') as archive_file:
+                archive_dict = json.load(archive_file)
+        except (OSError, ValueError):
+            archive_dict = {}
+
+        page_count = 0
+        archived_bytes = 0
+        fragment_bytes = 0
+        for url, url_text in list(CACHE_DICT.items()):
+            fragment_entry = FRAGMENT_DICT.get(url)
+            if (fragment_entry is None or fragment_entry.get('version') != FRAGMENT_VERSION
+                    or fragment_entry['hash'] != hash_page(url_text)):
+                continue
+            archive_dict[url] = url_text
+            page_count += 1
+            archived_bytes += len(url_text.encode('utf-8'))
+            fragment_bytes += len(fragment_entry['fragment'].encode('utf-8'))
+            del CACHE_DICT[url]
+            VERIFIED_PAGE_DICT.pop(url, None)
+
+        ## the fragments and the archive are on disk before the pages leave the cache
+        save_fragment_cache(FRAGMENT_DICT)
+        temp_archive_filename = f'{archive_filename}.{os.getpid()}.tmp'
+        with gzip.open(temp_archive_filename, 'wt', encoding='utf-8') as archive_file:
+            json.dump(archive_dict, archive_file)
+        os.replace(temp_archive_filename, archive_filename)
+        save_cache(CACHE_DICT, merge=False)
+    return page_count, archived_bytes, fragment_bytes
+
+
+##############################################
+################# instances ##################
+##############################################
 def get_areas_for_state(specific_location_url):
-    ''' Makes a list of area instances.
+    ''' Makes a list of area instances from the URL frontier (see discover_areas()),
+    without opening the area pages.
     
     Parameters
     ----------
@@ -193,20 +912,151 @@ def get_areas_for_state(specific_location_url):
     list
         a list of area instances
     '''
-    combined_url_dict = build_combined_dict()
-
     area_instances = []
-    for area_name, area_url in combined_url_dict.items():
-        area_instances.append(get_area_instance(area_url))
+    for area in discover_areas():
+        area_instances.append(Area(name=area['name'], area_type=area['type'], url=area['url']))
     return area_instances
 
 
+def build_area_search_index(area_list):
+    ''' Makes a search index over the names and codes of a list of area instances,
+    so that an area can be found by typing part of its name or its code.
+    
+    Parameters
+    ----------
+    area_list: list
+        a list of area instances, e.g. from get_areas_for_state()
+    
+    Returns
+    -------
+    AreaSearchIndex
+        the index; the value of each entry is the area's number in the list (starting at 1)
+    '''
+    entries = []
+    for number, area in enumerate(area_list, start=1):
+        entries.append(living_wage_search.SearchEntry(area.full_name(), area.area_type,
+            code=area.code, state='MI', value=number))
+    return living_wage_search.AreaSearchIndex(entries)
+
+
 ##############################################
 ################ scrape urls #################
 ##############################################
+def open_frontier():
+    ''' Opens the URL frontier file if it exists and loads the JSON into a dictionary.
+    If the file doesn't exist, creates a new dictionary.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    dict
+        key is a state page URL and value is a dictionary with the 'hash' of the
+        state page fragment, the FRONTIER_VERSION and its 'areas' (see discover_areas())
+    '''
+    try:
+        file_identity_before = file_identity(FRONTIER_FILENAME)
+        with open(FRONTIER_FILENAME, 'r') as frontier_file:
+            frontier_dict = json.load(frontier_file)
+        KNOWN_FILE_DICT[FRONTIER_FILENAME] = file_identity_before
+    except:
+        frontier_dict = {}
+    return frontier_dict
+
+
+def save_frontier(frontier_dict):
+    ''' Saves the URL frontier to disk, merging in the state pages discovered by
+    other copies of the program (see save_cache()).
+
+    Parameters
+    ----------
+    frontier_dict: dict
+        The dictionary to save
+
+    Returns
+    -------
+    None
+    '''
+    with living_wage_lock.file_lock(FRONTIER_FILENAME):
+        merge_cache_from_disk(FRONTIER_FILENAME, frontier_dict)
+        living_wage_lock.write_json_atomically(FRONTIER_FILENAME, frontier_dict)
+        KNOWN_FILE_DICT[FRONTIER_FILENAME] = file_identity(FRONTIER_FILENAME)
+
+
+def normalize_url(href):
+    ''' Turns a link on a page of the website into the URL used as a cache key:
+    absolute, with a lowercase scheme and host, and without a trailing slash,
+    query or fragment, e.g. '/counties/26161/' -> 'https://livingwage.mit.edu/counties/26161'.
+    '''
+    scheme, netloc, path, _, _ = urlsplit(urljoin(BASE_URL + '/', href.strip()))
+    return urlunsplit((scheme.lower(), netloc.lower(), path.rstrip('/'), '', ''))
+
+
+def discover_areas(state_url=None):
+    ''' Lists the county and MSA pages linked from a state page. The state page is
+    parsed only once per version of its content: the list is kept in the URL
+    frontier (FRONTIER_DICT, saved with save_frontier()) together with the hash
+    of the page fragment it came from, and reused while the hash is the same.
+    Every page is listed once, even if it is linked twice.
+
+    Parameters
+    ----------
+    state_url: string
+        the locations page of a state, or None for MICHIGAN_URL
+
+    Returns
+    -------
+    list
+        one dictionary per area, in the order of the page, with its 'key' (the
+        lowercase name used in the dictionaries and the SQL database, e.g.
+        'ann arbor, mi'), display 'name' (e.g. 'Ann Arbor'), 'type' ('County' or
+        'MSA'), 'code' (the county FIPS or MSA CBSA code, e.g. '11460') and 'url';
+        shared with the frontier, so don't modify it
+    '''
+    state_url = state_url or MICHIGAN_URL
+    url_text = get_page_fragment(state_url)
+    page_hash = hash_page(url_text)
+    frontier_entry = FRONTIER_DICT.get(state_url)
+    if (frontier_entry is not None and frontier_entry.get('version') == FRONTIER_VERSION
+            and frontier_entry['hash'] == page_hash):
+        return frontier_entry['areas']
+
+    ## Make the soup for the state page, once for both lists
+    soup = make_soup(url_text)
+    container = soup.find('div', class_='container')
+
+    areas = []
+    seen_keys = set()
+    seen_urls = set()
+    for list_class, area_type in (('counties list-unstyled', 'County'), ('metros list-unstyled', 'MSA')):
+        listing_parent = container.find('div', class_=list_class)
+        for listing_ul in listing_parent.find_all('ul', recursive=False):
+            for link_tag in listing_ul.find_all('a'):
+                link_text = link_tag.text.strip()
+                area_key = link_text.lower()
+                area_url = normalize_url(link_tag['href'])
+                if area_key in seen_keys or area_url in seen_urls:
+                    continue
+                seen_keys.add(area_key)
+                seen_urls.add(area_url)
+                areas.append({
+                    'key': area_key,
+                    'name': link_text.replace(', Michigan', '').replace(', MI', ''),
+                    'type': area_type,
+                    'code': area_url.split('/')[-1],
+                    'url': area_url,
+                })
+
+    FRONTIER_DICT[state_url] = {'hash': page_hash, 'version': FRONTIER_VERSION, 'areas': areas}
+    return areas
+
+
 def build_county_url_dict():
     ''' Makes a dictionary that maps county name to county page url from 
-    the state-specific page (i.e. Michigan) of the MIT Living Wage website.
+    the state-specific page (i.e. Michigan) of the MIT Living Wage website
+    (see discover_areas()).
 
     Parameters
     ----------
@@ -219,34 +1069,17 @@ def build_county_url_dict():
         e.g. {'washtenaw county':'https://livingwage.mit.edu/counties/26161', ...}
     '''
     county_url_dict = {}
-
-    ## Make the soup for the Michigan page
-    url_text = make_request_with_cache(MICHIGAN_URL, CACHE_DICT)
-    soup = BeautifulSoup(url_text, 'html.parser')
-
-    ## For each county listed
-    county_listing_grandparent = soup.find('div', class_='container')
-    county_listing_parent = county_listing_grandparent.find('div', class_='counties list-unstyled')
-    county_listing_uls = county_listing_parent.find_all('ul', recursive=False)
-
-    for county_listing_ul in county_listing_uls:
-        ## extract the county details URL
-        county_link_tags = county_listing_ul.find_all('a')
-        for county_link_tag in county_link_tags:
-            lowercase_county = county_link_tag.text.strip().lower()
-            county_details_path = county_link_tag['href']
-            county_details_url = BASE_URL + county_details_path
-            # print(county_details_url) ## sanity check -- test then delete
-            if lowercase_county not in county_url_dict.keys():
-            # if the county is not in the dictionary
-                county_url_dict[lowercase_county] = county_details_url
+    for area in discover_areas():
+        if area['type'] == 'County':
+            county_url_dict[area['key']] = area['url']
 
     return county_url_dict
 
 
 def build_msa_url_dict():
     ''' Makes a dictionary that maps metropolitan statistical area (MSA) name 
-    to MSA page url from the state-specific page (i.e. Michigan) of the MIT Living Wage website.
+    to MSA page url from the state-specific page (i.e. Michigan) of the MIT Living Wage website
+    (see discover_areas()).
 
     Parameters
     ----------
@@ -259,27 +1092,9 @@ def build_msa_url_dict():
         e.g. {'ann arbor, mi': 'https://livingwage.mit.edu/metros/11460', ...} 
     '''
     msa_url_dict = {}
-
-    ## Make the soup for the Michigan page
-    url_text = make_request_with_cache(MICHIGAN_URL, CACHE_DICT)
-    soup = BeautifulSoup(url_text, 'html.parser')
-
-    ## For each MSA listed
-    msa_listing_grandparent = soup.find('div', class_='container')
-    msa_listing_parent = msa_listing_grandparent.find('div', class_='metros list-unstyled')
-    msa_listing_uls = msa_listing_parent.find_all('ul', recursive=False)
-
-    for msa_listing_ul in msa_listing_uls:
-        ## extract the MSA details URL
-        msa_link_tags = msa_listing_ul.find_all('a')
-        for msa_link_tag in msa_link_tags:
-            lowercase_msa = msa_link_tag.text.strip().lower()
-            msa_details_path = msa_link_tag['href']
-            msa_details_url = BASE_URL + msa_details_path
-            # print(msa_details_url) ## sanity check -- test then delete
-            if lowercase_msa not in msa_url_dict.keys():
-            # if the county is not in the dictionary
-                msa_url_dict[lowercase_msa] = msa_details_url
+    for area in discover_areas():
+        if area['type'] == 'MSA':
+            msa_url_dict[area['key']] = area['url']
 
     return msa_url_dict
 
@@ -302,8 +1117,9 @@ def build_combined_dict():
     '''
     combined_url_dict = {}
 
-    county_url_dict = build_county_url_dict()
-    msa_url_dict = build_msa_url_dict()
+    with DISCOVERY_SECONDS.time():
+        county_url_dict = build_county_url_dict()
+        msa_url_dict = build_msa_url_dict()
 
     ## https://www.geeksforgeeks.org/python-merging-two-dictionaries/
     combined_url_dict.update(county_url_dict)
@@ -317,6 +1133,8 @@ def build_combined_dict():
 ##############################################
 def scrape_wages_tables(specific_location_url):
     ''' Scrapes wage data for each family composition in a certain county or MSA.
+    The page is only parsed (see parse_wages_page()) if the parse cache has no
+    result for its current content.
 
     Parameters
     ----------
@@ -337,11 +1155,27 @@ def scrape_wages_tables(specific_location_url):
         nested value is the wage values in a float type in Python but consider them USD
             (e.g. '39.05', '12.38', '9.45')
     '''
+    return get_parse_result('wages', specific_location_url, parse_wages_page)
+
+
+def parse_wages_page(url_text):
+    ''' Parses the wages table of a page into the nested dict returned by scrape_wages_tables().
+
+    Parameters
+    ----------
+    url_text: string
+        The HTML of the page or of its fragment (see get_page_fragment())
+
+    Returns
+    -------
+    nested dict
+        see scrape_wages_tables()
+    '''
     ################ Make the soup for location page ################
     ######## e.g. https://livingwage.mit.edu/counties/26161 #########
     ######### e.g. https://livingwage.mit.edu/metros/11460 ##########
-    url_text = make_request_with_cache(specific_location_url, CACHE_DICT)
-    soup = BeautifulSoup(url_text, 'html.parser')
+    parse_start = time.perf_counter()
+    soup = make_soup(url_text)
 
     ################ Number of adults list ################
     ## Would have been easier to type, but let's scrape for practice
@@ -468,9 +1302,38 @@ def scrape_wages_tables(specific_location_url):
     wages_dict['two adults (one working)'] = two_adults_one_working_dict
     wages_dict['two adults (both working)'] = two_adults_both_working_dict
 
+    PARSE_WAGES_SECONDS.observe(time.perf_counter() - parse_start)
     return wages_dict
 
 
+def scrape_or_skip(scrape_tables, specific_location_url):
+    ''' Scrapes one area page, or skips the area if its page can't be fetched or
+    parsed (e.g. a page bigger than MAX_PAGE_BYTES), the way a crawl worker of
+    living_wage_queue.py fails a job. A page that failed once in this build is
+    not fetched again by the other scraper (see SKIPPED_PAGE_DICT).
+
+    Parameters
+    ----------
+    scrape_tables: function
+        scrape_wages_tables() or scrape_expenses_tables()
+    specific_location_url: string
+        the URL of a county or MSA page
+
+    Returns
+    -------
+    dict
+        what scrape_tables returns, or None if the area is skipped
+    '''
+    if specific_location_url in SKIPPED_PAGE_DICT:
+        return None
+    try:
+        return scrape_tables(specific_location_url)
+    except Exception as error:
+        SKIPPED_PAGE_DICT[specific_location_url] = f'{type(error).__name__}: {error}'
+        print(f"[Error message]: {specific_location_url} skipped: {SKIPPED_PAGE_DICT[specific_location_url]}")
+        return None
+
+
 def match_location_names_to_wages_dict():
     ''' Scrapes wage data for each family composition in all counties and MSAs 
     in a state and adds the name of each county or MSA as the main key.
@@ -500,13 +1363,18 @@ def match_location_names_to_wages_dict():
 
     complete_wages_dict = {}
     for k, v in combined_url_dict.items():
-        temp_dict = scrape_wages_tables(v)
-        complete_wages_dict[k] = temp_dict
+        temp_dict = scrape_or_skip(scrape_wages_tables, v)
+        if temp_dict is not None:
+            complete_wages_dict[k] = temp_dict
     return complete_wages_dict
 
 
 def scrape_expenses_tables(specific_location_url):
     ''' Scrapes expense data for each family composition in a certain county or MSA.
+    Every row of the expense table (food, child care, medical, housing, ..., taxes and
+    required annual income before taxes) is read in a single pass over the table.
+    The page is only parsed (see parse_expenses_page()) if the parse cache has no
+    result for its current content.
 
     Parameters
     ----------
@@ -522,78 +1390,84 @@ def scrape_expenses_tables(specific_location_url):
             (i.e. 'one adult', 'two adults (one working)', 'two adults (both working))
         main value is the number of children
             (i.e. '0 children', '1 child', '2 children', '3 children')
-        nested key is the type of expense
-            (i.e. 'required annual income before taxes')
+        nested key is the type of expense, i.e. the lowercase row label
+            (e.g. 'food', 'child care', ..., 'required annual income before taxes')
         nested value is the expense values in a float format in Python but consider it USD
             (e.g. '27672', '52942', '64448', '81216')
     '''
+    return get_parse_result('expenses', specific_location_url, parse_expenses_page)
+
+
+def parse_expenses_page(url_text):
+    ''' Parses the expense table of a page into the nested dict returned by scrape_expenses_tables().
+
+    Parameters
+    ----------
+    url_text: string
+        The HTML of the page or of its fragment (see get_page_fragment())
+
+    Returns
+    -------
+    nested dict
+        see scrape_expenses_tables()
+    '''
     ################ Make the soup for location page ################
-    url_text = make_request_with_cache(specific_location_url, CACHE_DICT)
-    soup = BeautifulSoup(url_text, 'html.parser')
+    parse_start = time.perf_counter()
+    soup = make_soup(url_text)
 
     ################ Number of adults list ################
-    household_composition_list = ['1 adult', '2 adults (1 working)', '2 adults (both working)']
+    number_of_adults_list = ['one adult', 'two adults (one working)', 'two adults (both working)']
 
     ################ Number of children list ################
     count_of_children_list = ['0 children', '1 child', '2 children', '3 children']
 
-    ################ Living wage lists ################
-    required_income_before_tax_list = []
+    ################ Every row of the expense table ################
+    ## Output: {'food': [12 floats], 'child care': [12 floats], ...} in the order of the table
+    expense_rows_dict = {}
     expenses_grandparents = soup.find('table', class_='results_table table-striped expense_table')
-    expenses_parents = expenses_grandparents.find('tr', class_="odd") ## multiple 'tr' and 'odd'/'odd results'
-    expenses_parents = expenses_parents.find_next_siblings('tr', class_="odd")
+    expenses_parents = expenses_grandparents.find('tbody') or expenses_grandparents
 
-    for expenses_parent in expenses_parents:
+    for expenses_parent in expenses_parents.find_all('tr', recursive=False):
         expenses = expenses_parent.find_all('td', recursive=False)
-        for expense in expenses:
+        if len(expenses) < 13:
+            continue ## not a row with a label and 12 values
+        expense_type = " ".join(expenses[0].text.split()).lower()
+
+        clean_expense_list = []
+        for expense in expenses[-12:]:
             clean_expenses1 = expense.text.strip().lower()
             clean_expenses2 = clean_expenses1.split('$')[-1]
-            required_income_before_tax_list.append(clean_expenses2)
-    temp_required_income_before_tax_list = required_income_before_tax_list[-12:]
-
-    clean_required_income_before_tax_list = []
-    for temp_required_income in temp_required_income_before_tax_list:
-        each_item = "".join(temp_required_income.split(','))
-        each_item = float(each_item)
-        clean_required_income_before_tax_list.append(each_item)
-
-    expenses_1_adult_list = clean_required_income_before_tax_list[:4]
-    expenses_2_adults_1_working_list = clean_required_income_before_tax_list[4:8]
-    expenses_2_adults_both_working_list = clean_required_income_before_tax_list[8:]
+            each_item = "".join(clean_expenses2.split(','))
+            try:
+                clean_expense_list.append(float(each_item))
+            except ValueError:
+                clean_expense_list.append(None) ## e.g. a blank cell
+        expense_rows_dict[expense_type] = clean_expense_list
+
+    ## the required annual income before taxes is the last row of the table
+    if expense_rows_dict and 'required annual income before taxes' not in expense_rows_dict:
+        last_expense_type = list(expense_rows_dict.keys())[-1]
+        expense_rows_dict['required annual income before taxes'] = expense_rows_dict[last_expense_type]
+    ## the Expenses table needs every total, so a page without them, or with a blank one,
+    ## is skipped (see scrape_or_skip())
+    if 'required annual income before taxes' not in expense_rows_dict:
+        raise ValueError('the page has no required annual income before taxes')
+    if None in expense_rows_dict['required annual income before taxes']:
+        raise ValueError('the page has a blank required annual income before taxes')
 
-    ############### Put scraped data (currently in a list) ###############
-    ######################### into a  dictionary #########################
-    one_adult_dict = {}
-    for i in range(len(count_of_children_list)):
-        one_adult_dict[count_of_children_list[i]] = {
-            'required annual income before taxes': expenses_1_adult_list[i]
-        }
-    # print("one_adult_dict")
-    # print(one_adult_dict)
-
-    two_adults_one_working_dict = {}
-    for i in range(len(count_of_children_list)):
-        two_adults_one_working_dict[count_of_children_list[i]] = {
-            'required annual income before taxes': expenses_2_adults_1_working_list[i]
-        }
-    # print("two_adults_one_working_dict")
-    # print(two_adults_one_working_dict)
-
-    two_adults_both_working_dict = {}
-    for i in range(len(count_of_children_list)):
-        two_adults_both_working_dict[count_of_children_list[i]] = {
-            'required annual income before taxes': expenses_2_adults_both_working_list[i]
-        }
-    # print("two_adults_both_working_dict")
-    # print(two_adults_both_working_dict)
-
-    ## How to insert a dictionary in another dictionary in Python (how to merge two dictionaries)
-    ## https://code-maven.com/how-to-insert-a-dictionary-in-another-dictionary-in-python
+    ############### Put scraped data (currently in lists) ###############
+    ##################### into a  nested dictionary #####################
     expenses_dict = {}
-    expenses_dict['one adult'] = one_adult_dict
-    expenses_dict['two adults (one working)'] = two_adults_one_working_dict
-    expenses_dict['two adults (both working)'] = two_adults_both_working_dict
-
+    for adults_index, number_of_adults in enumerate(number_of_adults_list):
+        children_dict = {}
+        for children_index, number_of_children in enumerate(count_of_children_list):
+            column_index = adults_index * len(count_of_children_list) + children_index
+            children_dict[number_of_children] = {}
+            for expense_type, expense_values in expense_rows_dict.items():
+                children_dict[number_of_children][expense_type] = expense_values[column_index]
+        expenses_dict[number_of_adults] = children_dict
+
+    PARSE_EXPENSES_SECONDS.observe(time.perf_counter() - parse_start)
     return expenses_dict
 
 
@@ -626,45 +1500,85 @@ def match_location_names_to_expenses_dict():
 
     complete_expenses_dict = {}
     for k, v in combined_url_dict.items():
-        temp_dict = scrape_expenses_tables(v)
-        complete_expenses_dict[k] = temp_dict
+        temp_dict = scrape_or_skip(scrape_expenses_tables, v)
+        if temp_dict is not None:
+            complete_expenses_dict[k] = temp_dict
     return complete_expenses_dict
 
 
 ###############################################
 ############# populating database #############
 ###############################################
-def create_db():
+def bump_db_generation():
+    ''' Marks the SQL database as changed, so that no result read before the change
+    is served from QUERY_CACHE again. Called after every write to the database.
+    '''
+    global DB_GENERATION
+    DB_GENERATION += 1
+
+
+def db_generation():
+    ''' Returns the generation of the SQL database: its name, the number of times
+    this program wrote to it, and the inode, size and modification time of the
+    file, which also change when another program rebuilds it.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    tuple
+        a hashable key for QUERY_CACHE
+    '''
+    try:
+        db_stat = os.stat(DB_NAME)
+        return (DB_NAME, DB_GENERATION, db_stat.st_ino, db_stat.st_size, db_stat.st_mtime_ns)
+    except OSError:
+        return (DB_NAME, DB_GENERATION, None, None, None)
+
+
+def create_db(db_name=None):
     ''' Creates a SQL database if it doesn't already exist and populates data in the tables.
     If the database already exists, the function writes over the existing data.
     
     Parameters
     ----------
-    None
+    db_name: string
+        the SQL database to write, or None for DB_NAME
     
     Returns
     -------
     None
     '''
-    conn = sqlite3.connect(DB_NAME)
+    conn = sqlite3.connect(db_name or DB_NAME)
     cur = conn.cursor()
 
     drop_areas_sql = 'DROP TABLE IF EXISTS "Areas"'
     drop_wages_sql = 'DROP TABLE IF EXISTS "Wages"'
     drop_expenses_sql = 'DROP TABLE IF EXISTS "Expenses"'
+    drop_expense_items_sql = 'DROP TABLE IF EXISTS "ExpenseItems"'
+    drop_aggregates_sqls = [
+        'DROP TABLE IF EXISTS "AreaAggregates"',
+        'DROP TABLE IF EXISTS "CompositionAggregates"',
+        'DROP TABLE IF EXISTS "StatePercentiles"',
+        'DROP TABLE IF EXISTS "HouseholdCurves"',
+    ]
 
     create_areas_sql = '''
         CREATE TABLE IF NOT EXISTS "Areas" (
             "Id" INTEGER PRIMARY KEY AUTOINCREMENT,
             "State" TEXT NOT NULL,
             "Area Type" TEXT NOT NULL,
-            "Area" TEXT NOT NULL
+            "Area" TEXT NOT NULL,
+            "Code" TEXT
         )
     '''
 
     create_wages_sql = '''
         CREATE TABLE IF NOT EXISTS "Wages" (
             "Id" INTEGER PRIMARY KEY AUTOINCREMENT,
+            "State" TEXT NOT NULL,
             "Area" TEXT NOT NULL,
             "Number of Adults" TEXT NOT NULL,
             "Number of Children" INTEGER NOT NULL,
@@ -677,6 +1591,7 @@ def create_db():
     create_expenses_sql = '''
         CREATE TABLE IF NOT EXISTS "Expenses" (
             "Id" INTEGER PRIMARY KEY AUTOINCREMENT,
+            "State" TEXT NOT NULL,
             "Area" TEXT NOT NULL,
             "Number of Adults" TEXT NOT NULL,
             "Number of Children" INTEGER NOT NULL,
@@ -684,38 +1599,105 @@ def create_db():
         )
     '''
 
+    ## every row of each area's expense table, in a long format
+    create_expense_items_sql = '''
+        CREATE TABLE IF NOT EXISTS "ExpenseItems" (
+            "Id" INTEGER PRIMARY KEY AUTOINCREMENT,
+            "State" TEXT NOT NULL,
+            "Area" TEXT NOT NULL,
+            "Number of Adults" TEXT NOT NULL,
+            "Number of Children" INTEGER NOT NULL,
+            "Category" TEXT NOT NULL,
+            "Amount" REAL NOT NULL
+        )
+    '''
+
+    ## the State column comes right after Area, so that joins on (State, Area) seek
+    ## straight to the rows of one state when an area name repeats across states
+    create_expense_items_index_sql = '''
+        CREATE INDEX IF NOT EXISTS "ExpenseItemsAreaCategory"
+        ON "ExpenseItems" ("Area", "State", "Category")
+    '''
+
+    ## the wages of one area are looked up far more often than they are loaded
+    create_wages_index_sql = '''
+        CREATE INDEX IF NOT EXISTS "WagesArea"
+        ON "Wages" ("Area", "State")
+    '''
+
+    ## and so are its expenses (see the extract_*_expenses() functions)
+    create_expenses_index_sql = '''
+        CREATE INDEX IF NOT EXISTS "ExpensesArea"
+        ON "Expenses" ("Area", "State")
+    '''
+
     cur.execute(drop_areas_sql)
     cur.execute(drop_wages_sql)
     cur.execute(drop_expenses_sql)
+    cur.execute(drop_expense_items_sql)
+    for drop_aggregates_sql in drop_aggregates_sqls:
+        cur.execute(drop_aggregates_sql)
     cur.execute(create_areas_sql)
     cur.execute(create_wages_sql)
     cur.execute(create_expenses_sql)
+    cur.execute(create_expense_items_sql)
+    cur.execute(create_expense_items_index_sql)
+    cur.execute(create_wages_index_sql)
+    cur.execute(create_expenses_index_sql)
     conn.commit()
     conn.close()
+    bump_db_generation()
 
 
-def load_areas():
+def record_insert_metrics(row_count, seconds):
+    ''' Records how many rows a loader inserted and how long it took.
+
+    Parameters
+    ----------
+    row_count: int
+        the number of rows inserted
+    seconds: float
+        the time spent inserting and committing them
+
+    Returns
+    -------
+    None
+    '''
+    ROWS_INSERTED.inc(row_count)
+    INSERT_SECONDS.observe(seconds)
+    if seconds > 0:
+        ROWS_PER_SECOND.set(row_count / seconds)
+
+
+def load_areas(db_name=None, areas=None):
     ''' Loads the dictionary of scraped data on areas (i.e. counties and MSAs) 
     in Michigan into a SQL database.
 
     Parameters
     ----------
-    None
+    db_name: string
+        the SQL database to write, or None for DB_NAME
+    areas: dict
+        a dictionary whose keys are the area names (e.g. from
+        match_location_names_to_expenses_dict()), or None to scrape it
     
     Returns
     -------
     None
     '''
-    areas = match_location_names_to_expenses_dict()
-    combined_url_dict = build_combined_dict()
+    if areas is None:
+        areas = match_location_names_to_expenses_dict()
 
     insert_areas_sql = '''
         INSERT INTO Areas
-        VALUES (NULL, ?, ?, ?)
+        VALUES (NULL, ?, ?, ?, ?)
     '''
+    ## the county FIPS or MSA CBSA code of each area, from the URL frontier
+    code_dict = {area['key']: area['code'] for area in discover_areas()}
 
-    conn = sqlite3.connect(DB_NAME)
+    conn = sqlite3.connect(db_name or DB_NAME)
     cur = conn.cursor()
+    insert_start = time.perf_counter()
 
     for area in areas.keys():
         area_type = "" ## empty string 
@@ -726,95 +1708,500 @@ def load_areas():
         
         cur.execute(insert_areas_sql,
             [
-                'MI',
+                STATE_CODE,
                 area_type,
-                area
+                area,
+                code_dict.get(area)
             ]
         )
     conn.commit()
     conn.close()
+    bump_db_generation()
+    record_insert_metrics(len(areas), time.perf_counter() - insert_start)
+
+
+def load_wages(db_name=None, wages=None):
+    ''' Loads the dictionary of scraped data on wages in all counties and MSAs
+    in Michigan into a SQL database.
+
+    Parameters
+    ----------
+    db_name: string
+        the SQL database to write, or None for DB_NAME
+    wages: dict
+        the scraped wages (see match_location_names_to_wages_dict()), or None to scrape them
+    
+    Returns
+    -------
+    None
+    '''
+    if wages is None:
+        wages = match_location_names_to_wages_dict()
+
+    insert_wages_sql = '''
+        INSERT INTO Wages
+        VALUES (NULL, ?, ?, ?, ?, ?, ?, ?)
+    '''
+
+    conn = sqlite3.connect(db_name or DB_NAME)
+    cur = conn.cursor()
+    insert_start = time.perf_counter()
+    row_count = 0
+
+    for area_name, adults_dict in wages.items():
+        for number_of_adults, children_dict in adults_dict.items():
+            for number_of_children, wages_dict in children_dict.items():
+                cur.execute(insert_wages_sql,
+                    [
+                        STATE_CODE,
+                        area_name,
+                        number_of_adults,
+                        int(number_of_children.split()[0]), 
+                        wages_dict['living wage'],
+                        wages_dict['poverty wage'],
+                        wages_dict['minimum wage']
+                    ]
+                )
+                row_count += 1
+    conn.commit()
+    conn.close()
+    bump_db_generation()
+    record_insert_metrics(row_count, time.perf_counter() - insert_start)
+
+
+def load_expenses(db_name=None, expenses=None):
+    ''' Loads the dictionary of scraped data on expenses in all counties and MSAs
+    in Michigan into a SQL database: the required annual income before taxes
+    into the Expenses table, and every expense category (food, child care, ...)
+    into the ExpenseItems table.
+
+    Parameters
+    ----------
+    db_name: string
+        the SQL database to write, or None for DB_NAME
+    expenses: dict
+        the scraped expenses (see match_location_names_to_expenses_dict()), or None to scrape them
+    
+    Returns
+    -------
+    None
+    '''
+    if expenses is None:
+        expenses = match_location_names_to_expenses_dict()
+
+    insert_expenses_sql = '''
+        INSERT INTO Expenses
+        VALUES (NULL, ?, ?, ?, ?, ?)
+    '''
+
+    insert_expense_items_sql = '''
+        INSERT INTO ExpenseItems
+        VALUES (NULL, ?, ?, ?, ?, ?, ?)
+    '''
+
+    conn = sqlite3.connect(db_name or DB_NAME)
+    cur = conn.cursor()
+    insert_start = time.perf_counter()
+    row_count = 0
+
+    for area_name, adults_dict in expenses.items():
+        for number_of_adults, children_dict in adults_dict.items():
+            for number_of_children, expenses_dict in children_dict.items():
+                cur.execute(insert_expenses_sql,
+                    [
+                        STATE_CODE,
+                        area_name,
+                        number_of_adults,
+                        int(number_of_children.split()[0]), 
+                        expenses_dict['required annual income before taxes']
+                    ]
+                )
+                row_count += 1
+
+                expense_item_rows = []
+                for expense_type, expense_value in expenses_dict.items():
+                    if expense_value is not None:
+                        expense_item_rows.append([STATE_CODE, area_name, number_of_adults,
+                            int(number_of_children.split()[0]), expense_type, expense_value])
+                cur.executemany(insert_expense_items_sql, expense_item_rows)
+                row_count += len(expense_item_rows)
+    conn.commit()
+    conn.close()
+    bump_db_generation()
+    record_insert_metrics(row_count, time.perf_counter() - insert_start)
+
+
+##############################################
+############## aggregate tables ##############
+##############################################
+def create_aggregate_tables(cur):
+    ''' Creates the tables that hold statewide aggregates of the Wages table,
+    if they don't already exist.
+
+    AreaAggregates has one row per area: its average living wage, the minimum wage,
+    the gap between the two, and the area's rank and percentile within its state.
+    CompositionAggregates has the same figures for each family composition in each area.
+    StatePercentiles has the living wage at the 10th, 25th, 50th, 75th and 90th
+    percentile of each state for each family composition.
+
+    Parameters
+    ----------
+    cur: sqlite3 Cursor
+        a cursor on the SQL database
+
+    Returns
+    -------
+    None
+    '''
+    create_area_aggregates_sql = '''
+        CREATE TABLE IF NOT EXISTS "AreaAggregates" (
+            "Area" TEXT NOT NULL,
+            "State" TEXT NOT NULL,
+            "Average Living Wage" REAL NOT NULL,
+            "Minimum Wage" REAL NOT NULL,
+            "Gap" REAL NOT NULL,
+            "Rank" INTEGER,
+            "Percentile" REAL,
+            PRIMARY KEY ("State", "Area")
+        )
+    '''
+
+    create_composition_aggregates_sql = '''
+        CREATE TABLE IF NOT EXISTS "CompositionAggregates" (
+            "Area" TEXT NOT NULL,
+            "State" TEXT NOT NULL,
+            "Number of Adults" TEXT NOT NULL,
+            "Number of Children" INTEGER NOT NULL,
+            "Living Wage" REAL NOT NULL,
+            "Minimum Wage" REAL NOT NULL,
+            "Gap" REAL NOT NULL,
+            "Rank" INTEGER,
+            "Percentile" REAL,
+            PRIMARY KEY ("State", "Area", "Number of Adults", "Number of Children")
+        )
+    '''
+
+    create_state_percentiles_sql = '''
+        CREATE TABLE IF NOT EXISTS "StatePercentiles" (
+            "State" TEXT NOT NULL,
+            "Number of Adults" TEXT NOT NULL,
+            "Number of Children" INTEGER NOT NULL,
+            "Percentile" INTEGER NOT NULL,
+            "Living Wage" REAL NOT NULL,
+            PRIMARY KEY ("State", "Number of Adults", "Number of Children", "Percentile")
+        )
+    '''
+
+    cur.execute(create_area_aggregates_sql)
+    cur.execute(create_composition_aggregates_sql)
+    cur.execute(create_state_percentiles_sql)
+    cur.execute('CREATE INDEX IF NOT EXISTS "AreaAggregatesRank" ON "AreaAggregates" ("State", "Rank")')
+    cur.execute('''CREATE INDEX IF NOT EXISTS "CompositionAggregatesRank"
+        ON "CompositionAggregates" ("State", "Number of Adults", "Number of Children", "Rank")''')
+
+
+def percentile_of_sorted(sorted_values, percentile):
+    ''' Returns a percentile of a sorted list of numbers, interpolating linearly
+    between the two closest values.
+
+    Parameters
+    ----------
+    sorted_values: list
+        numbers in increasing order
+    percentile: float
+        between 0 and 100
+
+    Returns
+    -------
+    float
+        the value at that percentile
+    '''
+    position = (len(sorted_values) - 1) * percentile / 100
+    lower_index = int(position)
+    upper_index = min(lower_index + 1, len(sorted_values) - 1)
+    fraction = position - lower_index
+    return sorted_values[lower_index] + (sorted_values[upper_index] - sorted_values[lower_index]) * fraction
+
+
+def refresh_aggregates(db_name=None):
+    ''' Materializes the aggregate tables (see create_aggregate_tables()) from the
+    Wages and Areas tables. Run it after the Wages table is loaded or changed.
+
+    Parameters
+    ----------
+    db_name: string
+        the SQL database to write, or None for DB_NAME
+
+    Returns
+    -------
+    None
+    '''
+    conn = sqlite3.connect(db_name or DB_NAME)
+    cur = conn.cursor()
+    create_aggregate_tables(cur)
+
+    cur.execute('DELETE FROM AreaAggregates')
+    cur.execute('DELETE FROM CompositionAggregates')
+
+    insert_area_aggregates_sql = '''
+        INSERT INTO AreaAggregates (Area, State, [Average Living Wage], [Minimum Wage], Gap)
+        SELECT Wages.Area, Areas.State, AVG([Living Wage]), MAX([Minimum Wage]),
+            AVG([Living Wage]) - MAX([Minimum Wage])
+        FROM Wages
+        JOIN Areas ON Areas.State = Wages.State AND Areas.Area = Wages.Area
+        GROUP BY Wages.State, Wages.Area
+    '''
+
+    insert_composition_aggregates_sql = '''
+        INSERT INTO CompositionAggregates
+            (Area, State, [Number of Adults], [Number of Children], [Living Wage], [Minimum Wage], Gap)
+        SELECT Wages.Area, Areas.State, [Number of Adults], [Number of Children],
+            [Living Wage], [Minimum Wage], [Living Wage] - [Minimum Wage]
+        FROM Wages
+        JOIN Areas ON Areas.State = Wages.State AND Areas.Area = Wages.Area
+    '''
+
+    ## rank 1 is the area with the highest living wage; percentile 100 is the same area
+    rank_area_aggregates_sql = '''
+        UPDATE AreaAggregates
+        SET Rank = ranked.area_rank, Percentile = ranked.area_percentile
+        FROM (
+            SELECT State, Area,
+                RANK() OVER (PARTITION BY State ORDER BY [Average Living Wage] DESC) AS area_rank,
+                100.0 * PERCENT_RANK() OVER (PARTITION BY State ORDER BY [Average Living Wage]) AS area_percentile
+            FROM AreaAggregates
+        ) AS ranked
+        WHERE AreaAggregates.State = ranked.State AND AreaAggregates.Area = ranked.Area
+    '''
+
+    rank_composition_aggregates_sql = '''
+        UPDATE CompositionAggregates
+        SET Rank = ranked.area_rank, Percentile = ranked.area_percentile
+        FROM (
+            SELECT State, Area, [Number of Adults], [Number of Children],
+                RANK() OVER (PARTITION BY State, [Number of Adults], [Number of Children]
+                    ORDER BY [Living Wage] DESC) AS area_rank,
+                100.0 * PERCENT_RANK() OVER (PARTITION BY State, [Number of Adults], [Number of Children]
+                    ORDER BY [Living Wage]) AS area_percentile
+            FROM CompositionAggregates
+        ) AS ranked
+        WHERE CompositionAggregates.State = ranked.State
+            AND CompositionAggregates.Area = ranked.Area
+            AND CompositionAggregates.[Number of Adults] = ranked.[Number of Adults]
+            AND CompositionAggregates.[Number of Children] = ranked.[Number of Children]
+    '''
+
+    cur.execute(insert_area_aggregates_sql)
+    cur.execute(insert_composition_aggregates_sql)
+    cur.execute(rank_area_aggregates_sql)
+    cur.execute(rank_composition_aggregates_sql)
+
+    ## percentiles of each state, for each family composition
+    living_wages_dict = {}
+    composition_rows = cur.execute('''
+        SELECT State, [Number of Adults], [Number of Children], [Living Wage]
+        FROM CompositionAggregates
+        ORDER BY [Living Wage]
+    ''').fetchall()
+    for state, number_of_adults, number_of_children, living_wage in composition_rows:
+        living_wages_dict.setdefault((state, number_of_adults, number_of_children), []).append(living_wage)
+
+    cur.execute('DELETE FROM StatePercentiles')
+    for (state, number_of_adults, number_of_children), living_wages in living_wages_dict.items():
+        for percentile in STATE_PERCENTILES:
+            cur.execute('INSERT INTO StatePercentiles VALUES (?, ?, ?, ?, ?)',
+                [state, number_of_adults, number_of_children, percentile,
+                    percentile_of_sorted(living_wages, percentile)])
+
+    conn.commit()
+    conn.close()
+    bump_db_generation()
 
 
-def load_wages():
-    ''' Loads the dictionary of scraped data on wages in all counties and MSAs
-    in Michigan into a SQL database.
+def refresh_household_curves(db_name=None):
+    ''' Materializes the HouseholdCurves table from the Wages and Expenses tables.
+    Run it after both tables are loaded. The curves let living_wage_households.py
+    estimate households outside the 12 compositions on the website (e.g. 5 children
+    or 3 adults) for every area at once.
+
+    Each row describes one area and one number of adults:
+        "Children 0" to "Children 3": the required annual income before taxes
+            with 0 to 3 children
+        "Extra Child": the income added by each child after the third
+            (the increase from 2 to 3 children)
+        "Extra Adult": the income added by each adult after the second
+            (the increase from one adult to two adults (one working), without children)
+        "Hours Per Year": the yearly hours that turn the required income into
+            the hourly living wage of each working adult
 
     Parameters
     ----------
-    None
-    
+    db_name: string
+        the SQL database to write, or None for DB_NAME
+
     Returns
     -------
     None
     '''
-    wages = match_location_names_to_wages_dict()
+    conn = sqlite3.connect(db_name or DB_NAME)
+    cur = conn.cursor()
 
-    insert_wages_sql = '''
-        INSERT INTO Wages
-        VALUES (NULL, ?, ?, ?, ?, ?, ?)
+    create_household_curves_sql = '''
+        CREATE TABLE IF NOT EXISTS "HouseholdCurves" (
+            "Area" TEXT NOT NULL,
+            "State" TEXT NOT NULL,
+            "Number of Adults" TEXT NOT NULL,
+            "Working Adults" INTEGER NOT NULL,
+            "Children 0" REAL NOT NULL,
+            "Children 1" REAL NOT NULL,
+            "Children 2" REAL NOT NULL,
+            "Children 3" REAL NOT NULL,
+            "Extra Child" REAL NOT NULL,
+            "Extra Adult" REAL NOT NULL,
+            "Hours Per Year" REAL NOT NULL,
+            PRIMARY KEY ("State", "Area", "Number of Adults")
+        )
     '''
+    cur.execute(create_household_curves_sql)
+    cur.execute('DELETE FROM HouseholdCurves')
 
-    conn = sqlite3.connect(DB_NAME)
-    cur = conn.cursor()
-
-    for area_name, adults_dict in wages.items():
+    query = '''
+        SELECT Wages.State, Wages.Area, Wages.[Number of Adults], Wages.[Number of Children],
+            Wages.[Living Wage], Expenses.[Required Annual Income Before Taxes]
+        FROM Wages
+        JOIN Expenses ON Expenses.State = Wages.State AND Expenses.Area = Wages.Area
+            AND Expenses.[Number of Adults] = Wages.[Number of Adults]
+            AND Expenses.[Number of Children] = Wages.[Number of Children]
+        ORDER BY Wages.Id
+    '''
+    ## income_dict[(state, area)][number of adults][number of children] = required annual income
+    income_dict = {}
+    hours_dict = {}
+    for state, area_name, number_of_adults, number_of_children, living_wage, required_income in cur.execute(query).fetchall():
+        area_key = (state, area_name)
+        income_dict.setdefault(area_key, {}).setdefault(number_of_adults, {})[number_of_children] = required_income
+        if living_wage:
+            working_adults = WORKING_ADULTS_DICT[number_of_adults]
+            hours_dict.setdefault(area_key, []).append(required_income / (living_wage * working_adults))
+
+    insert_household_curves_sql = 'INSERT INTO HouseholdCurves VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+    for (state, area_name), adults_dict in income_dict.items():
+        if len(adults_dict) != len(WORKING_ADULTS_DICT) or any(len(children) != 4 for children in adults_dict.values()):
+            continue ## incomplete data for this area
+        extra_adult = adults_dict['two adults (one working)'][0] - adults_dict['one adult'][0]
+        hours_list = hours_dict.get((state, area_name), [])
+        hours_per_year = sum(hours_list) / len(hours_list) if hours_list else 2080
         for number_of_adults, children_dict in adults_dict.items():
-            for number_of_children, wages_dict in children_dict.items():
-                cur.execute(insert_wages_sql,
-                    [
-                        area_name,
-                        number_of_adults,
-                        int(number_of_children.split()[0]), 
-                        wages_dict['living wage'],
-                        wages_dict['poverty wage'],
-                        wages_dict['minimum wage']
-                    ]
-                )
+            cur.execute(insert_household_curves_sql,
+                [
+                    area_name,
+                    state,
+                    number_of_adults,
+                    WORKING_ADULTS_DICT[number_of_adults],
+                    children_dict[0],
+                    children_dict[1],
+                    children_dict[2],
+                    children_dict[3],
+                    children_dict[3] - children_dict[2],
+                    extra_adult,
+                    hours_per_year
+                ]
+            )
+
     conn.commit()
     conn.close()
+    bump_db_generation()
 
 
-def load_expenses():
-    ''' Loads the dictionary of scraped data on expenses (i.e. required 
-    annual income before taxes) in all counties and MSAs in Michigan 
-    into a SQL database.
+def build_database(wages=None, expenses=None):
+    ''' Builds the whole SQL database from the cache, safely while other copies of
+    the program use it. The build runs in a temporary database next to DB_NAME,
+    which then replaces DB_NAME in one step, so readers keep querying the
+    previous database until the new one is complete, and never see it half-built.
+    Builds are locked, so two copies of the program never build at the same time.
+    If DUCKDB_NAME is set, the DuckDB file is then written from the new database.
 
     Parameters
     ----------
-    None
-    
+    wages: dict
+        already scraped wages (see match_location_names_to_wages_dict()),
+        e.g. merged from crawl workers, or None to scrape them from the cache
+    expenses: dict
+        already scraped expenses (see match_location_names_to_expenses_dict()),
+        or None to scrape them from the cache
+
     Returns
     -------
     None
     '''
-    expenses = match_location_names_to_expenses_dict()
-
-    insert_expenses_sql = '''
-        INSERT INTO Expenses
-        VALUES (NULL, ?, ?, ?, ?)
-    '''
-
-    conn = sqlite3.connect(DB_NAME)
-    cur = conn.cursor()
-
-    for area_name, adults_dict in expenses.items():
-        for number_of_adults, children_dict in adults_dict.items():
-            for number_of_children, expenses_dict in children_dict.items():
-                cur.execute(insert_expenses_sql,
-                    [
-                        area_name,
-                        number_of_adults,
-                        int(number_of_children.split()[0]), 
-                        expenses_dict['required annual income before taxes']
-                    ]
-                )
-    conn.commit()
-    conn.close()
+    final_db_name = DB_NAME
+    with living_wage_lock.file_lock(final_db_name):
+        temp_db_name = f'{final_db_name}.{os.getpid()}.building'
+        try:
+            SKIPPED_PAGE_DICT.clear()
+            if expenses is None:
+                expenses = match_location_names_to_expenses_dict()
+            if wages is None:
+                wages = match_location_names_to_wages_dict()
+            ## an area skipped by one of the scrapers is left out of every table
+            expenses = {area: expenses[area] for area in expenses if area in wages}
+            wages = {area: wages[area] for area in expenses}
+            create_db(temp_db_name)
+            load_areas(temp_db_name, expenses)
+            load_wages(temp_db_name, wages)
+            load_expenses(temp_db_name, expenses)
+            refresh_aggregates(db_name=temp_db_name)
+            refresh_household_curves(temp_db_name)
+            os.replace(temp_db_name, final_db_name)
+        finally:
+            if os.path.exists(temp_db_name):
+                os.remove(temp_db_name)
+        if DUCKDB_NAME:
+            import living_wage_storage
+            living_wage_storage.write_duckdb(final_db_name, DUCKDB_NAME)
+    bump_db_generation()
 
 
 ##############################################
 ########### interact with database ###########
 ##############################################
+def schema_error(db_name=None):
+    ''' Checks that a SQL database has every table and column in SCHEMA_COLUMNS_DICT,
+    so that the other programs can tell a database built by an older version of
+    this program from a broken query.
+
+    Parameters
+    ----------
+    db_name: string
+        the SQL database to check, or None for DB_NAME
+
+    Returns
+    -------
+    string
+        what is wrong with the database, or None if nothing is
+    '''
+    db_name = db_name or DB_NAME
+    if not os.path.exists(db_name):
+        return f"{db_name} does not exist; build it with living_wage.py first"
+
+    conn = sqlite3.connect(db_name)
+    try:
+        for table_name, column_names in SCHEMA_COLUMNS_DICT.items():
+            present_columns = {row[1] for row in conn.execute(f'PRAGMA table_info("{table_name}")')}
+            missing_columns = [column_name for column_name in column_names if column_name not in present_columns]
+            if not present_columns:
+                return f"{db_name} has no {table_name} table; rebuild with living_wage.py --rebuild"
+            if missing_columns:
+                return (f"{db_name} has no {missing_columns[0]} column in {table_name}; "
+                    f"rebuild with living_wage.py --rebuild")
+    except sqlite3.DatabaseError as error:
+        return f"{db_name} is not a living wage database ({error})"
+    finally:
+        conn.close()
+    return None
+
+
+@QUERY_CACHE.memoize(db_generation)
 def access_sql_table(area_name, sql_table):
     ''' Accesses data of a given area (either a county or an MSA) from 
     a specific table in the SQL database via a computer terminal.
@@ -843,11 +2230,13 @@ def access_sql_table(area_name, sql_table):
         GROUP BY Id
         ORDER BY Id DESC
         '''
-    result = cur.execute(query).fetchall()
+    with QUERY_SECONDS.time():
+        result = cur.execute(query).fetchall()
     conn.close()
     return result
 
 
+@QUERY_CACHE.memoize(db_generation)
 def access_columns(sql_table):
     ''' Accesses the field/column names from a specific table 
     in the SQL database via a computer terminal.
@@ -882,6 +2271,7 @@ def pretty_print_query(raw_query_result):
     None
     '''
     ## Resource: http://zetcode.com/python/prettytable/
+    from prettytable import PrettyTable
     pretty_table = PrettyTable()
 
     pretty_table.field_names = access_columns("Wages")
@@ -893,9 +2283,11 @@ def pretty_print_query(raw_query_result):
     print(pretty_table)
 
 
+@QUERY_CACHE.memoize(db_generation)
 def avg_living_wage(area_name):
-    ''' Accesses wages data of a given area (either a county or an MSA) from 
-    the Wages tables in the SQL database via a computer terminal.
+    ''' Accesses the average living wage of a given area (either a county or an MSA)
+    from the AreaAggregates table in the SQL database via a computer terminal.
+    Falls back to averaging the Wages table if the aggregates haven't been built.
     
     Parameters
     ----------
@@ -908,19 +2300,148 @@ def avg_living_wage(area_name):
     tuple
         sql result
     '''
+    gap_result = area_gap(area_name)
+    if gap_result is not None:
+        return gap_result[:1]
+
     conn = sqlite3.connect(DB_NAME)
     cur = conn.cursor()
 
-    query = f'''
+    query = '''
         SELECT AVG([Living Wage])
         FROM Wages
-        WHERE Wages.Area = "{area_name}"
+        WHERE Wages.Area = ?
+        '''
+    with QUERY_SECONDS.time():
+        result = cur.execute(query, [area_name]).fetchone()
+    conn.close()
+    return result
+
+
+@QUERY_CACHE.memoize(db_generation)
+def area_gap(area_name):
+    ''' Accesses the gap between the average living wage of a given area (either
+    a county or an MSA) and the minimum wage, with the area's rank in its state,
+    from the AreaAggregates table in the SQL database.
+    
+    Parameters
+    ----------
+    area_name: string
+        a county (e.g. 'washtenaw county') or an MSA (e.g. 'ann arbor, mi')
+        in a lowercase format
+    
+    Returns
+    -------
+    tuple
+        (average living wage, minimum wage, gap, rank, percentile, number of areas in the state),
+        or None if the aggregates haven't been built or the area isn't in them
+    '''
+    conn = sqlite3.connect(DB_NAME)
+    cur = conn.cursor()
+
+    query = '''
+        SELECT [Average Living Wage], [Minimum Wage], Gap, Rank, Percentile,
+            (SELECT COUNT(*) FROM AreaAggregates AS state_areas
+             WHERE state_areas.State = AreaAggregates.State)
+        FROM AreaAggregates
+        WHERE State = ? AND Area = ?
+        '''
+    try:
+        with QUERY_SECONDS.time():
+            result = cur.execute(query, [STATE_CODE, area_name]).fetchone()
+    except sqlite3.OperationalError:
+        ## no AreaAggregates table in this database
+        result = None
+    conn.close()
+    return result
+
+
+@QUERY_CACHE.memoize(db_generation)
+def ranked_gaps(state='MI'):
+    ''' Accesses every area of a state ranked from the highest to the lowest
+    average living wage, from the AreaAggregates table in the SQL database.
+    Within a state, that is also the order from the highest to the lowest gap.
+    
+    Parameters
+    ----------
+    state: string
+        the state's abbreviation, as stored in the Areas table, or None for
+        the areas of every state, from the highest to the lowest gap
+    
+    Returns
+    -------
+    list
+        a list of (rank, area, average living wage, minimum wage, gap, percentile, state) tuples,
+        or None if the aggregates haven't been built
+    '''
+    conn = sqlite3.connect(DB_NAME)
+    cur = conn.cursor()
+
+    query = '''
+        SELECT Rank, Area, [Average Living Wage], [Minimum Wage], Gap, Percentile, State
+        FROM AreaAggregates
+        WHERE State = ?
+        ORDER BY Rank, Area
+        '''
+    params = [state]
+    if state is None:
+        ## the minimum wage differs between states, so the gap is what ranks them together
+        query = '''
+            SELECT Rank, Area, [Average Living Wage], [Minimum Wage], Gap, Percentile, State
+            FROM AreaAggregates
+            ORDER BY Gap DESC, State, Area
+            '''
+        params = []
+    try:
+        with QUERY_SECONDS.time():
+            result = cur.execute(query, params).fetchall()
+    except sqlite3.OperationalError:
+        ## no AreaAggregates table in this database
+        result = None
+    conn.close()
+    return result
+
+
+@QUERY_CACHE.memoize(db_generation)
+def state_percentiles(number_of_adults, number_of_children, state='MI'):
+    ''' Accesses the living wage at each percentile in STATE_PERCENTILES for one
+    family composition, from the StatePercentiles table in the SQL database.
+    
+    Parameters
+    ----------
+    number_of_adults: string
+        'one adult', 'two adults (one working)' or 'two adults (both working)'
+    number_of_children: int
+        0, 1, 2 or 3
+    state: string
+        the state's abbreviation, as stored in the Areas table
+    
+    Returns
+    -------
+    dict
+        key is a percentile (e.g. 50) and value is the living wage at that percentile,
+        or None if the aggregates haven't been built
+    '''
+    conn = sqlite3.connect(DB_NAME)
+    cur = conn.cursor()
+
+    query = '''
+        SELECT Percentile, [Living Wage]
+        FROM StatePercentiles
+        WHERE State = ? AND [Number of Adults] = ? AND [Number of Children] = ?
+        ORDER BY Percentile
         '''
-    result = cur.execute(query).fetchone()
+    try:
+        with QUERY_SECONDS.time():
+            result = dict(cur.execute(query, [state, number_of_adults, number_of_children]).fetchall())
+    except sqlite3.OperationalError:
+        ## no StatePercentiles table in this database
+        result = None
     conn.close()
     return result
 
 
+@QUERY_CACHE.memoize(db_generation)
 def extract_one_adult_expenses(area_name):
     ''' Accesses expenses data for the '1 Adult' family composition of a given area 
     (either a county or an MSA) from the Expenses tables in the SQL database via a computer terminal.
@@ -944,7 +2465,8 @@ def extract_one_adult_expenses(area_name):
         FROM Expenses
         WHERE Expenses.Area = "{area_name}"
         '''
-    result = cur.execute(query).fetchall()
+    with QUERY_SECONDS.time():
+        result = cur.execute(query).fetchall()
 
     one_adult_result = result[0:4]
     clean_one_adult_list = []
@@ -957,6 +2479,7 @@ def extract_one_adult_expenses(area_name):
     return clean_one_adult_tup
 
 
+@QUERY_CACHE.memoize(db_generation)
 def extract_two_adults_one_working_expenses(area_name):
     ''' Accesses expenses data for the '2 Adults (1 Working)' family composition of a given area 
     (either a county or an MSA) from the Expenses tables in the SQL database via a computer terminal.
@@ -980,7 +2503,8 @@ def extract_two_adults_one_working_expenses(area_name):
         FROM Expenses
         WHERE Expenses.Area = "{area_name}"
         '''
-    result = cur.execute(query).fetchall()
+    with QUERY_SECONDS.time():
+        result = cur.execute(query).fetchall()
 
     two_adults_one_working_result = result[4:8]
     clean_two_adults_one_working_list = []
@@ -993,6 +2517,7 @@ def extract_two_adults_one_working_expenses(area_name):
     return clean_two_adults_one_working_tup
 
 
+@QUERY_CACHE.memoize(db_generation)
 def extract_two_adults_both_working_expenses(area_name):
     ''' Accesses expenses data for the '2 Adults (Both Working)' family composition of a given area 
     (either a county or an MSA) from the Expenses tables in the SQL database via a computer terminal.
@@ -1016,7 +2541,8 @@ def extract_two_adults_both_working_expenses(area_name):
         FROM Expenses
         WHERE Expenses.Area = "{area_name}"
         '''
-    result = cur.execute(query).fetchall()
+    with QUERY_SECONDS.time():
+        result = cur.execute(query).fetchall()
 
     two_adults_both_working_result = result[8:]
     clean_two_adults_both_working_list = []
@@ -1029,14 +2555,62 @@ def extract_two_adults_both_working_expenses(area_name):
     return(clean_two_adults_both_working_tup)
 
 
+@QUERY_CACHE.memoize(db_generation)
+def expense_breakdown(area_name, expense_type=None):
+    ''' Accesses every expense category (food, child care, medical, ...) of each family
+    composition in a given area (either a county or an MSA) from the ExpenseItems table
+    in the SQL database.
+    
+    Parameters
+    ----------
+    area_name: string
+        a county (e.g. 'washtenaw county') or an MSA (e.g. 'ann arbor, mi')
+        in a lowercase format
+    expense_type: string
+        only return this category (e.g. 'housing'), or None for all of them
+    
+    Returns
+    -------
+    list
+        a list of (number of adults, number of children, category, amount) tuples,
+        ordered by family composition and then by the rows of the website's expense table
+    '''
+    conn = sqlite3.connect(DB_NAME)
+    cur = conn.cursor()
+
+    query = '''
+        SELECT [Number of Adults], [Number of Children], Category, Amount
+        FROM ExpenseItems
+        WHERE Area = ?
+        '''
+    params = [area_name]
+    if expense_type is not None:
+        query += ' AND Category = ?'
+        params.append(expense_type)
+    query += ' ORDER BY Id'
+
+    with QUERY_SECONDS.time():
+        result = cur.execute(query, params).fetchall()
+    conn.close()
+    return result
+
+
 ##############################################
 ################### plotly ###################
 ##############################################
-def plot_avg_gap(area_name):
-    ''' A plotly graph that displays the gap between the average living wage of 
+def display_name(area_name):
+    ''' Turns a lowercase area name from the database into the name shown on the website,
+    e.g. 'washtenaw county' -> 'Washtenaw County', 'ann arbor, mi' -> 'Ann Arbor, MI'.
+    '''
+    if area_name.endswith(', mi'):
+        return area_name[:-len(', mi')].title() + ', MI'
+    return area_name.title()
+
+
+def build_avg_gap_figure(area_name):
+    ''' Builds the plotly graph that displays the gap between the average living wage of 
     the selected area (either a county or an MSA) and the minimum wage of Michigan 
-    as well as a caption that describes the calculated difference/gap will populate 
-    in a web browser.
+    as well as a caption that describes the calculated difference/gap.
     
     Parameters
     ----------
@@ -1046,16 +2620,22 @@ def plot_avg_gap(area_name):
     
     Returns
     -------
-    None
+    plotly Figure
+        the graph, ready to be shown
     '''
+    import plotly.graph_objs as go
+
     wage_types = ['Average Living Wage', 'Minimum Wage']
 
-    avg_living_wage_tup = avg_living_wage(area_name)
-    avg_living_wage_list = list(avg_living_wage_tup)
-    avg_living_wage_in_area = avg_living_wage_list[0]
+    gap_tup = area_gap(area_name)
+    if gap_tup is not None:
+        avg_living_wage_in_area, minimum_wage = gap_tup[0], gap_tup[1]
+    else:
+        avg_living_wage_in_area = avg_living_wage(area_name)[0]
+        minimum_wage = MICHIGAN_MINIMUM_WAGE
 
-    wage_values = [round(avg_living_wage_in_area, 2), 9.45]
-    gap = round((wage_values[0] - 9.45), 2)
+    wage_values = [round(avg_living_wage_in_area, 2), minimum_wage]
+    gap = round((wage_values[0] - minimum_wage), 2)
 
     bar_data = go.Bar(x=wage_types, 
         y=wage_values,
@@ -1084,13 +2664,37 @@ def plot_avg_gap(area_name):
 
     fig = go.Figure(data=bar_data, layout=basic_layout)
 
-    return fig.show()
+    return fig
 
 
-def plot_expenses(area_name):
-    ''' A plotly graph that displays the required annual income before taxes for 
-    each family composition in the selected area (either a county or an MSA)
-    will populate in a web browser.
+def show_figure(fig):
+    ''' Shows a plotly graph in the plot server tab, starting the plot server the
+    first time, or in a new browser tab with fig.show() if USE_PLOT_SERVER is False.
+
+    Parameters
+    ----------
+    fig: plotly Figure
+        the graph to show
+
+    Returns
+    -------
+    None
+    '''
+    global PLOT_SERVER
+    if not USE_PLOT_SERVER:
+        return fig.show()
+    if PLOT_SERVER is None:
+        import living_wage_plot_server
+        PLOT_SERVER = living_wage_plot_server.PlotServer()
+        print(f"Graphs are shown at {PLOT_SERVER.start()} (keep the tab open for the next graphs)")
+    PLOT_SERVER.show(fig)
+
+
+def plot_avg_gap(area_name):
+    ''' A plotly graph that displays the gap between the average living wage of 
+    the selected area (either a county or an MSA) and the minimum wage of Michigan 
+    as well as a caption that describes the calculated difference/gap will populate 
+    in a web browser.
     
     Parameters
     ----------
@@ -1102,6 +2706,26 @@ def plot_expenses(area_name):
     -------
     None
     '''
+    return show_figure(build_avg_gap_figure(area_name))
+
+
+def build_expenses_figure(area_name):
+    ''' Builds the plotly graph that displays the required annual income before taxes for 
+    each family composition in the selected area (either a county or an MSA).
+    
+    Parameters
+    ----------
+    area_name: string
+        a county (e.g. 'washtenaw county') or an MSA (e.g. 'ann arbor, mi')
+        in a lowercase format
+    
+    Returns
+    -------
+    plotly Figure
+        the graph, ready to be shown
+    '''
+    import plotly.graph_objs as go
+
     family_comp = ['1 Adult, No Child', '1 Adult, 1 Child', '1 Adult, 2 Children', '1 Adult, 3 Children',
                 '2 Adults (1 Working), No Child', '2 Adults (1 Working), 1 Child', '2 Adults (1 Working), 2 Children', '2 Adults (1 Working), 3 Children',
                 '2 Adults (Both Working), No Child', '2 Adults (Both Working), 1 Child', '2 Adults (Both Working), 2 Children', '2 Adults (Both Working), 3 Children']
@@ -1129,23 +2753,289 @@ def plot_expenses(area_name):
 
     fig = go.Figure(data=bar_data, layout=basic_layout)
 
-    return fig.show()
+    return fig
+
+
+def plot_expenses(area_name):
+    ''' A plotly graph that displays the required annual income before taxes for 
+    each family composition in the selected area (either a county or an MSA)
+    will populate in a web browser.
+    
+    Parameters
+    ----------
+    area_name: string
+        a county (e.g. 'washtenaw county') or an MSA (e.g. 'ann arbor, mi')
+        in a lowercase format
+    
+    Returns
+    -------
+    None
+    '''
+    return show_figure(build_expenses_figure(area_name))
+
+
+##############################################
+################# warm start #################
+##############################################
+def source_fingerprint():
+    ''' Fingerprints everything the built dataset comes from: the page cache,
+    the fragment cache, the SQL database, this program and the base URL.
+    Files are fingerprinted by size and modification time, so nothing has to be read.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    string
+        the SHA-256 hex digest of the fingerprint
+    '''
+    fingerprint_parts = [str(SNAPSHOT_VERSION), BASE_URL]
+    for filename in (CACHE_FILENAME, FRAGMENT_CACHE_FILENAME, DB_NAME, os.path.abspath(__file__)):
+        try:
+            file_stat = os.stat(filename)
+            fingerprint_parts.append(f'{filename}:{file_stat.st_size}:{file_stat.st_mtime_ns}')
+        except OSError:
+            fingerprint_parts.append(f'{filename}:missing')
+    return hashlib.sha256('\n'.join(fingerprint_parts).encode('utf-8')).hexdigest()
+
+
+def write_snapshot(area_list):
+    ''' Saves the area catalog of a successful build, with the source fingerprint,
+    so that the next launch can reuse the SQL database as it is instead of
+    re-parsing every page and rebuilding it.
+    Call it last, after every write to the caches and the database.
+
+    Parameters
+    ----------
+    area_list: list
+        the area instances, e.g. from get_areas_for_state()
+
+    Returns
+    -------
+    None
+    '''
+    snapshot = {
+        'version': SNAPSHOT_VERSION,
+        'fingerprint': source_fingerprint(),
+        'areas': [(area.name, area.area_type, area.url) for area in area_list],
+    }
+    temp_filename = SNAPSHOT_FILENAME + '.tmp'
+    with open(temp_filename, 'wb') as snapshot_file:
+        pickle.dump(snapshot, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_filename, SNAPSHOT_FILENAME)
+
+
+def load_snapshot():
+    ''' Loads the area catalog saved by write_snapshot(), if the snapshot is
+    still valid: same SNAPSHOT_VERSION and same source fingerprint.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    list
+        the area instances, or None if there is no valid snapshot
+        (the database then has to be built again)
+    '''
+    try:
+        with open(SNAPSHOT_FILENAME, 'rb') as snapshot_file:
+            snapshot = pickle.load(snapshot_file)
+    except Exception:
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get('version') != SNAPSHOT_VERSION:
+        return None
+    if snapshot.get('fingerprint') != source_fingerprint():
+        return None
+    return [Area(name=name, area_type=area_type, url=url) for name, area_type, url in snapshot['areas']]
 
 
 ##############################################
-########### Executing the program ############
+################# profiling ##################
 ##############################################
-if __name__ == "__main__":
+def run_profile(profile_dir, script=None):
+    ''' Runs a full build and a scripted interactive session, one stage at a time,
+    under the profilers in living_wage_profile.py, and writes a .pstats file per
+    stage, the collapsed call stacks and a summary to profile_dir.
+    The caches are used as they are, so the profile shows what a normal launch
+    would do; nothing is fetched for pages that are already cached.
+
+    Parameters
+    ----------
+    profile_dir: string
+        the folder to write the profiles to
+    script: list
+        what the session types at the area prompt, i.e. list numbers, parts of
+        area names or FIPS/CBSA codes, or None for PROFILE_SCRIPT
+
+    Returns
+    -------
+    None
+    '''
+    global CACHE_DICT, CACHE_META_DICT, FRAGMENT_DICT, PARSE_DICT, FRONTIER_DICT
+    import contextlib
+    import io
+    import living_wage_profile
+
+    with living_wage_profile.StageProfiler(profile_dir) as profiler:
+        with profiler.stage('open_caches'):
+            CACHE_DICT = open_cache()
+            CACHE_META_DICT = open_cache_meta()
+            FRAGMENT_DICT = open_fragment_cache()
+            PARSE_DICT = open_parse_cache()
+            FRONTIER_DICT = open_frontier()
+        with profiler.stage('discovery'):
+            combined_url_dict = build_combined_dict()
+        with profiler.stage('parse_wages'):
+            wages = match_location_names_to_wages_dict()
+        with profiler.stage('parse_expenses'):
+            expenses = match_location_names_to_expenses_dict()
+        with profiler.stage('db_load'):
+            build_database(wages, expenses)
+        with profiler.stage('save_caches'):
+            save_fragment_cache(FRAGMENT_DICT)
+            save_parse_cache(PARSE_DICT)
+            save_frontier(FRONTIER_DICT)
+            save_cache_meta(CACHE_META_DICT)
+        with profiler.stage('area_list'):
+            area_list = get_areas_for_state(combined_url_dict)
+            area_search_index = build_area_search_index(area_list)
+
+        ## the same calls as the interactive session, with the tables printed to nowhere
+        area_names = []
+        with profiler.stage('queries'):
+            for query in script or PROFILE_SCRIPT:
+                if query.isnumeric() and 0 < int(query) <= len(area_list):
+                    selected_number = int(query)
+                else:
+                    search_results = area_search_index.search(query, limit=10)
+                    if not search_results:
+                        print(f"[Error message]: No area matches \"{query}\"; skipped.")
+                        continue
+                    selected_number = search_results[0][0].value
+                area_name = area_list[selected_number - 1].full_name().lower()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    pretty_print_query(access_sql_table(area_name, 'Wages'))
+                area_names.append(area_name)
+        with profiler.stage('figures'):
+            for area_name in area_names:
+                build_avg_gap_figure(area_name)
+                build_expenses_figure(area_name)
+
+    print(f"Profiled a build and {len(area_names)} area queries:")
+    profiler.print_summary()
 
-    CACHE_DICT = open_cache()
 
-    ## Uncomment these 4 functions when completely done
-    create_db()
+##############################################
+########### Executing the program ############
+##############################################
+if __name__ == "__main__":
 
-    load_areas()
-    load_wages()
-    load_expenses()
-    ## Uncomment up to here
+    parser = argparse.ArgumentParser(description='Explore the living wages of counties and MSAs in Michigan.')
+    parser.add_argument('--metrics', metavar='FILE',
+        help='record pipeline metrics and write them to FILE on exit (JSON, or Prometheus text if FILE ends in .prom)')
+    parser.add_argument('--base-url', metavar='URL',
+        help='crawl this server instead of https://livingwage.mit.edu (e.g. the local stand-in site)')
+    parser.add_argument('--max-rate', type=float, metavar='N',
+        help=f'at most N requests per second, adapted to how the website responds '
+            f'(default: {MAX_REQUESTS_PER_SECOND}; 0 = no limit)')
+    parser.add_argument('--max-page-bytes', type=int, metavar='N',
+        help=f'refuse pages bigger than N bytes (default: {MAX_PAGE_BYTES:,})')
+    parser.add_argument('--archive-pages', action='store_true',
+        help=f'after loading the database, move the full pages that have a fragment into {PAGE_ARCHIVE_FILENAME}')
+    parser.add_argument('--duckdb', metavar='FILE',
+        help='also write every table to the DuckDB file FILE after building the database (see living_wage_storage.py)')
+    parser.add_argument('--rebuild', action='store_true',
+        help=f'rebuild the database even if {SNAPSHOT_FILENAME} is still valid')
+    parser.add_argument('--no-prefetch', action='store_true',
+        help='build the graphs only when asked for, instead of in the background as soon as an area is picked')
+    parser.add_argument('--no-plot-server', action='store_true',
+        help='open each graph in a new browser tab, instead of updating one tab from a local plot server')
+    parser.add_argument('--profile', metavar='DIR',
+        help='profile a full build and a scripted session stage by stage, write .pstats files '
+            'and collapsed stacks for flame graphs to DIR, and exit')
+    parser.add_argument('--profile-query', action='append', metavar='QUERY',
+        help=f'what the scripted session of --profile types at the area prompt; repeatable '
+            f'(default: {" ".join(PROFILE_SCRIPT)})')
+    parser.add_argument('--find', action='append', metavar='QUERY',
+        help='print the areas that best match QUERY (part of a name, or a FIPS/CBSA code) and exit; repeatable')
+    args = parser.parse_args()
+
+    if args.base_url:
+        set_base_url(args.base_url)
+    if args.max_rate is not None:
+        set_max_rate(args.max_rate)
+    if args.max_page_bytes is not None:
+        if args.max_page_bytes <= 0:
+            sys.exit("[Error message]: --max-page-bytes must be above 0.")
+        MAX_PAGE_BYTES = args.max_page_bytes
+    if args.duckdb:
+        DUCKDB_NAME = args.duckdb
+    if args.no_plot_server:
+        USE_PLOT_SERVER = False
+    if args.metrics:
+        metrics.enable(args.metrics)
+
+    if args.profile:
+        run_profile(args.profile, args.profile_query)
+        sys.exit()
+
+    ## a valid snapshot means the database is already built from the current cache
+    area_list = None
+    if not (args.rebuild or args.archive_pages):
+        area_list = load_snapshot()
+    if area_list is not None and DUCKDB_NAME and (not os.path.exists(DUCKDB_NAME)
+            or os.path.getmtime(DUCKDB_NAME) < os.path.getmtime(DB_NAME)):
+        ## the database is up to date, but the DuckDB file isn't
+        import living_wage_storage
+        living_wage_storage.write_duckdb(DB_NAME, DUCKDB_NAME)
+    if area_list is None:
+        CACHE_DICT = open_cache()
+        CACHE_META_DICT = open_cache_meta()
+        FRAGMENT_DICT = open_fragment_cache()
+        PARSE_DICT = open_parse_cache()
+        FRONTIER_DICT = open_frontier()
+
+    if args.find:
+        ## batch lookup: print the best matches for each query and leave
+        if area_list is None:
+            area_list = get_areas_for_state(build_combined_dict())
+        area_search_index = build_area_search_index(area_list)
+        for query, results in area_search_index.search_many(args.find, limit=5).items():
+            print(f"{query}:")
+            for entry, match_rank, similarity in results:
+                print(f"   {area_list[entry.value - 1].info()} [code: {entry.code}]")
+            if not results:
+                print("   no match")
+        sys.exit()
+
+    if area_list is None:
+        ## builds in a temporary database and swaps it in, so other copies of
+        ## the program can keep using the current database in the meantime
+        build_database()
+
+        area_list = get_areas_for_state(build_combined_dict())
+        if args.archive_pages:
+            page_count, archived_bytes, fragment_bytes = archive_page_bodies()
+            print(f"Archived {page_count} pages ({archived_bytes:,} bytes of HTML kept as {fragment_bytes:,} bytes of fragments)")
+        else:
+            save_fragment_cache(FRAGMENT_DICT)
+        save_parse_cache(PARSE_DICT)
+        save_frontier(FRONTIER_DICT)
+        save_cache_meta(CACHE_META_DICT)
+        write_snapshot(area_list)
+
+    ## builds both graphs of the selected area (and its neighbors in the list, and the
+    ## areas picked more than once) in the background while the user reads its wages table
+    prefetcher = None
+    if not args.no_prefetch:
+        prefetcher = living_wage_prefetch.Prefetcher({
+            'gap': build_avg_gap_figure,
+            'expenses': build_expenses_figure,
+        }, generation_function=db_generation)
 
     switch = True
 
@@ -1174,8 +3064,6 @@ To leave the program, type "exit" and press enter.
 ''')
 
             if search_term_1.lower() != "exit":
-                area_list = get_areas_for_state(build_combined_dict())
-
                 print(f"\n{dash_lines}")
                 print(f"List of areas in Michigan")
                 print(dash_lines)
@@ -1183,8 +3071,9 @@ To leave the program, type "exit" and press enter.
                 counter = 1
                 for area in area_list:
                     print(f'[{counter}] {area.info()}')
-                    FIPS_AREA_LIST.append(area.info())
+                    FIPS_AREA_LIST.append(area)
                     counter += 1
+                area_search_index = build_area_search_index(FIPS_AREA_LIST)
                 switch = False
                 break
             
@@ -1198,49 +3087,61 @@ To leave the program, type "exit" and press enter.
 {dash_lines}
 Enter one of the following:
    * a number in the above area list for detail search,
+   * part of an area name or its FIPS/CBSA code to search for it,
    * "back" to the welcome message, or
    * "exit" to leave the program.
 {dash_lines}
 """)
 
-            if search_term_2.isnumeric():
-                try:
-                    search_term_2 = int(search_term_2)
-
-                    if 0 < search_term_2 <= len(FIPS_AREA_LIST):
-                        for i in range(len(FIPS_AREA_LIST)):
-                            if i == (search_term_2 - 1):
-
-                                area_name = FIPS_AREA_LIST[i].split("(")[0].strip()
-                                if ('county') in area_name.lower():
-                                    area_name = area_name
-                                else:
-                                    area_name = area_name + ', MI'
-
-                                print(f"\n{dash_lines}")
-                                print(f"Let's get details on wages for {area_name}.")
-                                print(dash_lines)
-                                lower_case_area_name = f'{area_name.lower()}'
-                                pretty_print_query(access_sql_table(lower_case_area_name, 'Wages'))
-
-                                print(f"\n{dash_lines}")
-                                follow_up = input(f'Let\'s view some graphs for {area_name}.\nEnter "w" for wages, "e" for expenses, or "exit" to leave.\n{dash_lines}\n')
-
-                                if follow_up.lower() == "w":
-                                    plot_avg_gap(lower_case_area_name)
-                                elif follow_up.lower() == "e":
-                                    plot_expenses(lower_case_area_name)
-                                elif follow_up.lower() == "exit":
-                                    sys.exit()
-                                else:
-                                    print(f"\n[Error message]: Oof, can't you follow instructions? Apparently not.")
-
-                    else: ## if the input number is not within an appropriate range
-                        print(f"\n[Error message]: Please choose a number within range.")
-
-                except KeyError:
-                    print(f"\n[Error message]: Invalid input.")
-                    break
+            selected_number = None
+            if search_term_2.isnumeric() and 0 < int(search_term_2) <= len(FIPS_AREA_LIST):
+                selected_number = int(search_term_2)
+
+            elif search_term_2.isnumeric() and len(search_term_2) < 5:
+                ## too short to be a FIPS/CBSA code, so it was meant as a list number
+                print(f"\n[Error message]: Please choose a number within range.")
+
+            elif search_term_2.lower() not in ("exit", "back") and search_term_2.strip():
+                search_results = area_search_index.search(search_term_2, limit=10)
+                if not search_results:
+                    print(f"\n[Error message]: No area matches \"{search_term_2}\".")
+                elif len(search_results) == 1 or search_results[0][1] == living_wage_search.EXACT_MATCH:
+                    selected_number = search_results[0][0].value
+                else:
+                    print(f"\n{dash_lines}")
+                    print(f"Areas matching \"{search_term_2}\"")
+                    print(dash_lines)
+                    for entry, match_rank, similarity in search_results:
+                        print(f'[{entry.value}] {FIPS_AREA_LIST[entry.value - 1].info()}')
+
+            if selected_number is not None:
+                area_name = FIPS_AREA_LIST[selected_number - 1].full_name()
+                lower_case_area_name = f'{area_name.lower()}'
+                if prefetcher is not None:
+                    neighbor_names = [FIPS_AREA_LIST[i].full_name().lower()
+                        for i in (selected_number, selected_number - 2) if 0 <= i < len(FIPS_AREA_LIST)]
+                    prefetcher.prefetch(lower_case_area_name, neighbor_names)
+
+                print(f"\n{dash_lines}")
+                print(f"Let's get details on wages for {area_name}.")
+                print(dash_lines)
+                pretty_print_query(access_sql_table(lower_case_area_name, 'Wages'))
+
+                print(f"\n{dash_lines}")
+                follow_up = input(f'Let\'s view some graphs for {area_name}.\nEnter "w" for wages, "e" for expenses, or "exit" to leave.\n{dash_lines}\n')
+
+                if follow_up.lower() == "w" and prefetcher is not None:
+                    show_figure(prefetcher.get('gap', lower_case_area_name))
+                elif follow_up.lower() == "w":
+                    plot_avg_gap(lower_case_area_name)
+                elif follow_up.lower() == "e" and prefetcher is not None:
+                    show_figure(prefetcher.get('expenses', lower_case_area_name))
+                elif follow_up.lower() == "e":
+                    plot_expenses(lower_case_area_name)
+                elif follow_up.lower() == "exit":
+                    sys.exit()
+                else:
+                    print(f"\n[Error message]: Oof, can't you follow instructions? Apparently not.")
 
             elif search_term_2.lower() == "exit":
                 sys.exit()
@@ -1250,7 +3151,7 @@ Enter one of the following:
                 switch = True
                 break
 
-            else:
+            elif not search_term_2.strip():
                 print(f"\n[Error message]: Invalid input.")
                 break
 
@@ -0,0 +1,369 @@
+##############################################
+######  Library API for the living wage  #####
+######  database                         #####
+##############################################
+''' Reads a SQL database built by living_wage.py from other programs, without
+the interactive session and without the program's global state.
+
+Opening a dataset only opens the database file, read-only: nothing is
+fetched, parsed or rebuilt, and nothing is written. Each accessor runs one
+query, so a long-running service pays only for the data it asks for. If the
+database is rebuilt while a dataset is open (see build_database() in
+living_wage.py), the next query reads the new one.
+
+Accessors return either records (named tuples, one per row) or, for many
+areas at once, numpy arrays with one row per area:
+
+    import living_wage_api
+
+    with living_wage_api.open_dataset('living_wage.sqlite') as dataset:
+        dataset.areas(state='MI')                    # [AreaRecord(name='alcona county', ...), ...]
+        dataset.area('26161')                        # by name or FIPS/CBSA code
+        dataset.wages('washtenaw county')            # [WageRecord(...), ...]
+        dataset.expenses('ann arbor, mi', categories=['housing', 'food'])
+        dataset.gaps(state='MI')                     # [GapRecord(...), ...] highest gap first
+        dataset.wage_arrays(state='MI')['living_wages']    # numpy array (areas, compositions)
+        dataset.expense_arrays()['amounts']                # numpy array (areas, compositions, categories)
+
+The array accessors require numpy.
+'''
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+from urllib.parse import quote
+
+import living_wage
+
+
+##############################################
+############# classes & objects ##############
+##############################################
+## one row of the Areas table: name (str, lowercase, e.g. 'ann arbor, mi'), state (str, e.g. 'MI'),
+## area_type (str, 'county' or 'MSA'), code (str, county FIPS or MSA CBSA code, or None)
+AreaRecord = namedtuple('AreaRecord', ['name', 'state', 'area_type', 'code'])
+
+## one row of the Wages table: number_of_adults (str, e.g. 'one adult'), number_of_children (int),
+## and the hourly wages in US dollars (float)
+WageRecord = namedtuple('WageRecord', ['area', 'state', 'number_of_adults', 'number_of_children',
+    'living_wage', 'poverty_wage', 'minimum_wage'])
+
+## one row of the ExpenseItems table: category (str, e.g. 'housing'), amount (float, US dollars per year)
+ExpenseRecord = namedtuple('ExpenseRecord', ['area', 'state', 'number_of_adults', 'number_of_children',
+    'category', 'amount'])
+
+## one row of the AreaAggregates table: the average living wage, minimum wage and their gap
+## (float, US dollars per hour), rank (int, 1 = highest gap in the state) and percentile (float)
+GapRecord = namedtuple('GapRecord', ['area', 'state', 'average_living_wage', 'minimum_wage', 'gap', 'rank', 'percentile'])
+
+
+class Dataset:
+    ''' A read-only handle on a SQL database built by living_wage.py, safe to share between threads.
+    Use open_dataset() to make one.
+
+    Instance Attributes
+    -------------------
+    db_name: string
+        the path of the SQL database
+    '''
+    def __init__(self, db_name):
+        self.db_name = os.path.abspath(db_name)
+        self.lock = threading.Lock()
+        self.conn = None
+        self.file_identity = None
+        self.connect()
+
+    def connect(self):
+        ''' Opens the database file read-only, replacing the current connection if there is one. '''
+        if self.conn is not None:
+            self.conn.close()
+        self.file_identity = living_wage.file_identity(self.db_name)
+        self.conn = sqlite3.connect(f'file:{quote(self.db_name)}?mode=ro', uri=True, check_same_thread=False)
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def query(self, sql, params=()):
+        ''' Runs one query and returns every row. A rebuild replaces the database
+        file, so the database is reopened first if the file changed.
+        '''
+        with self.lock:
+            if self.conn is None:
+                raise ValueError('the dataset is closed')
+            if living_wage.file_identity(self.db_name) != self.file_identity:
+                self.connect()
+            return self.conn.execute(sql, params).fetchall()
+
+    ############### records ###############
+    def areas(self, state=None):
+        ''' Lists the areas in the database, in the order they were loaded.
+
+        Parameters
+        ----------
+        state: string
+            only list the areas of this state (e.g. 'MI'), or None for every state
+
+        Returns
+        -------
+        list
+            an AreaRecord per area
+        '''
+        sql = 'SELECT Area, State, [Area Type], Code FROM Areas'
+        params = []
+        if state is not None:
+            sql += ' WHERE State = ?'
+            params.append(state)
+        return [AreaRecord(*row) for row in self.query(sql + ' ORDER BY Id', params)]
+
+    def area(self, name_or_code):
+        ''' Finds one area by its name (any case, e.g. 'Washtenaw County') or its FIPS/CBSA code.
+
+        Returns
+        -------
+        AreaRecord
+            the area, or None if there is no such area
+        '''
+        rows = self.query('''
+            SELECT Area, State, [Area Type], Code FROM Areas
+            WHERE Area = ? OR Code = ?
+            ORDER BY Id
+            LIMIT 1
+        ''', [name_or_code.strip().lower(), name_or_code.strip()])
+        return AreaRecord(*rows[0]) if rows else None
+
+    def wages(self, area_names, state=None):
+        ''' Returns the wages of every family composition of one or more areas.
+        Area names repeat across states, so without a state the records of every
+        state with that name are returned.
+
+        Parameters
+        ----------
+        area_names: string or list
+            an area name as stored in the database (e.g. 'washtenaw county'), or a list of them
+        state: string
+            only return the areas of this state (e.g. 'MI'), or None for every state
+
+        Returns
+        -------
+        list
+            a WageRecord per area and family composition
+        '''
+        sql, params = filter_areas_sql('''
+            SELECT Area, State, [Number of Adults], [Number of Children], [Living Wage], [Poverty Wage], [Minimum Wage]
+            FROM Wages
+        ''', 'Area', as_list(area_names), state, 'State')
+        return [WageRecord(*row) for row in self.query(sql + ' ORDER BY Id', params)]
+
+    def expenses(self, area_names, categories=None, state=None):
+        ''' Returns the yearly expenses of every family composition of one or more areas.
+
+        Parameters
+        ----------
+        area_names: string or list
+            an area name as stored in the database, or a list of them
+        categories: list
+            only return these categories (e.g. ['housing', 'food']), or None for all of them
+        state: string
+            only return the areas of this state (e.g. 'MI'), or None for every state
+
+        Returns
+        -------
+        list
+            an ExpenseRecord per area, family composition and category
+        '''
+        sql, params = filter_areas_sql('''
+            SELECT Area, State, [Number of Adults], [Number of Children], Category, Amount
+            FROM ExpenseItems
+        ''', 'Area', as_list(area_names), state, 'State')
+        if categories is not None:
+            sql += f' AND Category IN ({placeholders(categories)})'
+            params.extend(categories)
+        return [ExpenseRecord(*row) for row in self.query(sql + ' ORDER BY Id', params)]
+
+    def gaps(self, area_names=None, state=None):
+        ''' Returns the gap between the average living wage and the minimum wage
+        of areas, from the highest to the lowest gap.
+
+        Parameters
+        ----------
+        area_names: string or list
+            an area name as stored in the database, a list of them, or None for every area
+        state: string
+            only return the areas of this state (e.g. 'MI'), or None for every state
+
+        Returns
+        -------
+        list
+            a GapRecord per area
+        '''
+        sql, params = filter_areas_sql('''
+            SELECT Area, State, [Average Living Wage], [Minimum Wage], Gap, Rank, Percentile
+            FROM AreaAggregates
+        ''', 'Area', area_names, state, 'State')
+        return [GapRecord(*row) for row in self.query(sql + ' ORDER BY Gap DESC, State, Area', params)]
+
+    ############### numpy arrays ###############
+    def wage_arrays(self, area_names=None, state=None):
+        ''' Loads the wages of many areas into numpy arrays, one row per area
+        and one column per family composition.
+
+        Parameters
+        ----------
+        area_names: string or list
+            an area name as stored in the database, a list of them, or None for every area
+        state: string
+            only load the areas of this state (e.g. 'MI'), or None for every state
+
+        Returns
+        -------
+        dict
+            'areas': list of area names (rows)
+            'states': list of the state of each area, as the same names repeat across states
+            'compositions': list of (number of adults, number of children) tuples (columns)
+            'living_wages', 'poverty_wages', 'minimum_wages': numpy arrays of shape
+            (areas, compositions), NaN where the database has no wage
+        '''
+        import numpy as np
+
+        sql, params = filter_areas_sql('''
+            SELECT Wages.State, Wages.Area, [Number of Adults], [Number of Children],
+                [Living Wage], [Poverty Wage], [Minimum Wage]
+            FROM Wages
+                JOIN Areas ON Areas.State = Wages.State AND Areas.Area = Wages.Area
+        ''', 'Wages.Area', area_names, state, 'Areas.State')
+        rows = self.query(sql + ' ORDER BY Wages.Id', params)
+
+        area_index_dict = {}
+        composition_index_dict = {}
+        row_indexes = [area_index_dict.setdefault((row[0], row[1]), len(area_index_dict)) for row in rows]
+        column_indexes = [composition_index_dict.setdefault((row[2], row[3]), len(composition_index_dict)) for row in rows]
+        values = np.array([row[4:] for row in rows], dtype=float).reshape(len(rows), 3)
+
+        arrays = {
+            'areas': [area_name for _, area_name in area_index_dict],
+            'states': [state_code for state_code, _ in area_index_dict],
+            'compositions': list(composition_index_dict),
+        }
+        for value_index, key in enumerate(('living_wages', 'poverty_wages', 'minimum_wages')):
+            array = np.full((len(area_index_dict), len(composition_index_dict)), np.nan)
+            array[row_indexes, column_indexes] = values[:, value_index]
+            arrays[key] = array
+        return arrays
+
+    def expense_arrays(self, area_names=None, state=None, categories=None):
+        ''' Loads the yearly expenses of many areas into one numpy array.
+
+        Parameters
+        ----------
+        area_names: string or list
+            an area name as stored in the database, a list of them, or None for every area
+        state: string
+            only load the areas of this state (e.g. 'MI'), or None for every state
+        categories: list
+            only load these categories (e.g. ['housing', 'food']), or None for all of them
+
+        Returns
+        -------
+        dict
+            'areas', 'compositions' and 'categories': the labels of the three axes
+            'states': the state of each area, as the same names repeat across states
+            'amounts': numpy array of shape (areas, compositions, categories), NaN where missing
+        '''
+        import numpy as np
+
+        sql, params = filter_areas_sql('''
+            SELECT ExpenseItems.State, ExpenseItems.Area, [Number of Adults], [Number of Children], Category, Amount
+            FROM ExpenseItems
+                JOIN Areas ON Areas.State = ExpenseItems.State AND Areas.Area = ExpenseItems.Area
+        ''', 'ExpenseItems.Area', area_names, state, 'Areas.State')
+        if categories is not None:
+            sql += f' AND Category IN ({placeholders(categories)})'
+            params.extend(categories)
+        rows = self.query(sql + ' ORDER BY ExpenseItems.Id', params)
+
+        area_index_dict = {}
+        composition_index_dict = {}
+        category_index_dict = {}
+        indexes = tuple(np.array(axis_indexes, dtype=int).reshape(len(rows)) for axis_indexes in (
+            [area_index_dict.setdefault((row[0], row[1]), len(area_index_dict)) for row in rows],
+            [composition_index_dict.setdefault((row[2], row[3]), len(composition_index_dict)) for row in rows],
+            [category_index_dict.setdefault(row[4], len(category_index_dict)) for row in rows],
+        ))
+        amounts = np.full((len(area_index_dict), len(composition_index_dict), len(category_index_dict)), np.nan)
+        amounts[indexes] = [row[5] for row in rows]
+        return {
+            'areas': [area_name for _, area_name in area_index_dict],
+            'states': [state_code for state_code, _ in area_index_dict],
+            'compositions': list(composition_index_dict),
+            'categories': list(category_index_dict),
+            'amounts': amounts,
+        }
+
+
+##############################################
+################# functions ##################
+##############################################
+def open_dataset(db_name=None):
+    ''' Opens a SQL database built by living_wage.py for reading.
+    Nothing is fetched or built: the database has to exist already, and a
+    database built by an older version of living_wage.py raises a ValueError
+    (see living_wage.schema_error()).
+
+    Parameters
+    ----------
+    db_name: string
+        the path of the SQL database, or None for living_wage.DB_NAME
+
+    Returns
+    -------
+    Dataset
+        the handle, to be closed with close() or used in a with statement
+    '''
+    db_name = db_name or living_wage.DB_NAME
+    if not os.path.exists(db_name):
+        raise FileNotFoundError(f'{db_name} does not exist; build it with living_wage.py first')
+    schema_error = living_wage.schema_error(db_name)
+    if schema_error:
+        raise ValueError(schema_error)
+    return Dataset(db_name)
+
+
+def as_list(area_names):
+    ''' Turns one area name into a list of one, and leaves a list of names as it is. '''
+    return [area_names] if isinstance(area_names, str) else list(area_names)
+
+
+def placeholders(values):
+    ''' Returns '?, ?, ?' with one question mark per value, for an IN (...) clause. '''
+    return ', '.join('?' * len(values))
+
+
+def filter_areas_sql(sql, area_column, area_names, state, state_column):
+    ''' Adds a WHERE clause for the area names and state filters of an accessor.
+
+    Returns
+    -------
+    tuple
+        (the SQL, the list of its parameters)
+    '''
+    conditions = []
+    params = []
+    if area_names is not None:
+        area_names = as_list(area_names)
+        conditions.append(f'{area_column} IN ({placeholders(area_names)})')
+        params.extend(area_names)
+    if state is not None:
+        conditions.append(f'{state_column} = ?')
+        params.append(state)
+    ## always end with a WHERE clause, so that callers can add AND conditions
+    conditions = conditions or ['1 = 1']
+    return f"{sql} WHERE {' AND '.join(conditions)}", params
@@ -0,0 +1,209 @@
+##############################################
+######  Cache eviction and compaction  #######
+##############################################
+''' Keeps the page cache of living_wage.py from growing forever.
+
+compact_cache() evicts pages from the cache files by two policies:
+    * age: pages fetched more than max_age_seconds ago are evicted, and
+    * size: while the pages and their fragments add up to more than max_bytes,
+      the least recently used page is evicted (LRU, by the last time a page or
+      its fragment was read; see touch_cache_entry() in living_wage.py).
+The pages the current SQL database was built from (the state page and every
+county and MSA page it lists) are pinned and never evicted, so the database
+can always be rebuilt without fetching anything.
+
+Compaction also drops what nothing refers to anymore: fragments of an old
+FRAGMENT_VERSION, parse results of fragments that are gone, and metadata of
+pages that are gone. Then it rewrites each cache file in one step (see
+write_json_atomically() in living_wage_lock.py). The cache files are locked
+while it runs, so other copies of the program wait before saving, but
+programs that only read the caches are never blocked.
+
+Usage:
+    python3 living_wage_compact.py --max-mb 200 --max-age-days 365
+    python3 living_wage_compact.py --max-mb 50 --dry-run
+'''
+import argparse
+import os
+import sys
+import time
+
+import living_wage
+import living_wage_lock
+
+
+##############################################
+################# functions ##################
+##############################################
+def choose_evictions(page_dict, max_bytes=None, max_age_seconds=None, pinned_urls=(), now=None):
+    ''' Chooses the pages to evict: every unpinned page older than max_age_seconds,
+    then the least recently used unpinned pages until the rest fit in max_bytes.
+
+    Parameters
+    ----------
+    page_dict: dict
+        key is a URL and value is (bytes, epoch seconds fetched, epoch seconds last accessed)
+    max_bytes: int
+        the most bytes the pages may add up to, or None for no limit; pinned
+        pages count, so the limit may be out of reach
+    max_age_seconds: float
+        evict pages fetched longer ago than this, or None for no limit
+    pinned_urls: set
+        pages that are never evicted
+    now: float
+        the current epoch seconds, or None for time.time()
+
+    Returns
+    -------
+    tuple
+        (list of URLs evicted for their age, list of URLs evicted by LRU)
+    '''
+    now = time.time() if now is None else now
+    candidates = [url for url in page_dict if url not in pinned_urls]
+
+    expired_urls = []
+    if max_age_seconds is not None:
+        expired_urls = [url for url in candidates if now - page_dict[url][1] > max_age_seconds]
+
+    lru_urls = []
+    if max_bytes is not None:
+        expired_url_set = set(expired_urls)
+        total_bytes = sum(size for url, (size, _, _) in page_dict.items() if url not in expired_url_set)
+        for url in sorted((url for url in candidates if url not in expired_url_set), key=lambda url: page_dict[url][2]):
+            if total_bytes <= max_bytes:
+                break
+            lru_urls.append(url)
+            total_bytes -= page_dict[url][0]
+    return expired_urls, lru_urls
+
+
+def pinned_urls():
+    ''' Returns the URLs the current SQL database is built from: the state page and
+    every county and MSA page it lists, or an empty set if the state page isn't cached.
+    '''
+    if living_wage.MICHIGAN_URL not in living_wage.CACHE_DICT and living_wage.MICHIGAN_URL not in living_wage.FRAGMENT_DICT:
+        return set() ## don't fetch anything just to find the pins
+    return {living_wage.MICHIGAN_URL} | {area['url'] for area in living_wage.discover_areas()}
+
+
+def cache_file_bytes():
+    ''' Returns the total size of the cache files, in bytes. '''
+    total_bytes = 0
+    for filename in (living_wage.CACHE_FILENAME, living_wage.CACHE_META_FILENAME,
+                     living_wage.FRAGMENT_CACHE_FILENAME, living_wage.PARSE_CACHE_FILENAME):
+        if os.path.exists(filename):
+            total_bytes += os.path.getsize(filename)
+    return total_bytes
+
+
+def compact_cache(max_bytes=None, max_age_seconds=None, dry_run=False):
+    ''' Evicts pages from the caches by age and LRU, drops what nothing refers
+    to anymore, and rewrites the cache files.
+
+    Parameters
+    ----------
+    max_bytes: int
+        the most bytes of HTML the pages and their fragments may add up to, or None
+    max_age_seconds: float
+        evict pages fetched longer ago than this, or None
+    dry_run: bool
+        only count what would be evicted, without changing any file
+
+    Returns
+    -------
+    dict
+        'expired' and 'lru' (lists of evicted URLs), 'pinned', 'kept_pages',
+        'kept_bytes', 'dropped_fragments', 'dropped_parses', 'file_bytes_before'
+        and 'file_bytes_after'
+    '''
+    file_bytes_before = cache_file_bytes()
+    with living_wage_lock.file_lock(living_wage.CACHE_FILENAME), \
+            living_wage_lock.file_lock(living_wage.FRAGMENT_CACHE_FILENAME), \
+            living_wage_lock.file_lock(living_wage.PARSE_CACHE_FILENAME), \
+            living_wage_lock.file_lock(living_wage.CACHE_META_FILENAME):
+        ## nobody can save while the locks are held, so these are the latest files
+        living_wage.CACHE_DICT = living_wage.open_cache()
+        if (not living_wage.CACHE_DICT and os.path.exists(living_wage.CACHE_FILENAME)
+                and os.path.getsize(living_wage.CACHE_FILENAME) > len('{}')):
+            sys.exit(f"[Error message]: Can't read {living_wage.CACHE_FILENAME}; nothing was changed.")
+        living_wage.CACHE_META_DICT = living_wage.open_cache_meta()
+        living_wage.FRAGMENT_DICT = living_wage.open_fragment_cache()
+        living_wage.PARSE_DICT = living_wage.open_parse_cache()
+        living_wage.FRONTIER_DICT = living_wage.open_frontier()
+        cache_dict = living_wage.CACHE_DICT
+        meta_dict = living_wage.CACHE_META_DICT
+        fragment_dict = living_wage.FRAGMENT_DICT
+        parse_dict = living_wage.PARSE_DICT
+
+        pins = pinned_urls()
+        now = time.time()
+        page_dict = {}
+        for url in set(cache_dict) | set(fragment_dict):
+            ## pages saved before the metadata existed start aging now
+            meta = meta_dict.setdefault(url, {'fetched': now, 'accessed': now})
+            page_bytes = len(cache_dict.get(url, '').encode('utf-8'))
+            page_bytes += len(fragment_dict.get(url, {}).get('fragment', '').encode('utf-8'))
+            page_dict[url] = (page_bytes, meta['fetched'], meta['accessed'])
+        expired_urls, lru_urls = choose_evictions(page_dict, max_bytes, max_age_seconds, pins, now)
+
+        evicted_url_set = set(expired_urls) | set(lru_urls)
+        for url in evicted_url_set:
+            cache_dict.pop(url, None)
+            fragment_dict.pop(url, None)
+            living_wage.VERIFIED_PAGE_DICT.pop(url, None)
+
+        stale_fragment_urls = [url for url, fragment_entry in fragment_dict.items()
+            if fragment_entry.get('version') != living_wage.FRAGMENT_VERSION]
+        for url in stale_fragment_urls:
+            del fragment_dict[url]
+
+        fragment_hashes = {living_wage.hash_page(fragment_entry['fragment']) for fragment_entry in fragment_dict.values()}
+        orphan_parse_keys = [parse_key for parse_key, parse_entry in parse_dict.items()
+            if parse_key.split(':', 1)[-1] not in fragment_hashes or parse_entry.get('version') != living_wage.PARSER_VERSION]
+        for parse_key in orphan_parse_keys:
+            del parse_dict[parse_key]
+
+        for url in [url for url in meta_dict if url not in cache_dict and url not in fragment_dict]:
+            del meta_dict[url]
+
+        if not dry_run:
+            living_wage.save_fragment_cache(fragment_dict, merge=False)
+            living_wage.save_parse_cache(parse_dict, merge=False)
+            ## also saves the metadata, as it is: the metadata file was read above with its lock held
+            living_wage.save_cache(cache_dict, merge=False)
+
+    return {
+        'expired': expired_urls,
+        'lru': lru_urls,
+        'pinned': len(pins),
+        'kept_pages': len(page_dict) - len(evicted_url_set),
+        'kept_bytes': sum(size for url, (size, _, _) in page_dict.items() if url not in evicted_url_set),
+        'dropped_fragments': len(stale_fragment_urls),
+        'dropped_parses': len(orphan_parse_keys),
+        'file_bytes_before': file_bytes_before,
+        'file_bytes_after': file_bytes_before if dry_run else cache_file_bytes(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evict old and least recently used pages from the cache and compact the cache files.')
+    parser.add_argument('--max-mb', type=float, help='keep at most this many megabytes of pages (LRU)')
+    parser.add_argument('--max-age-days', type=float, help='evict pages fetched more than this many days ago')
+    parser.add_argument('--dry-run', action='store_true', help='only print what would be evicted')
+    args = parser.parse_args()
+
+    stats = compact_cache(
+        max_bytes=None if args.max_mb is None else int(args.max_mb * 1024 * 1024),
+        max_age_seconds=None if args.max_age_days is None else args.max_age_days * 24 * 60 * 60,
+        dry_run=args.dry_run)
+
+    verb = 'Would evict' if args.dry_run else 'Evicted'
+    print(f"{verb} {len(stats['expired'])} pages for their age and {len(stats['lru'])} least recently used pages")
+    print(f"Kept {stats['kept_pages']} pages ({stats['kept_bytes']:,} bytes of HTML), {stats['pinned']} of them pinned by the database")
+    print(f"Dropped {stats['dropped_fragments']} outdated fragments and {stats['dropped_parses']} unused parse results")
+    if not args.dry_run:
+        print(f"Cache files: {stats['file_bytes_before']:,} -> {stats['file_bytes_after']:,} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+##############################################
+######  Multi-area comparison graphs  ########
+##############################################
+''' Compares every area in the database in one plotly graph, instead of one
+browser tab per area:
+    * ranked: the gap between the average living wage and the minimum wage
+      of every area, highest first,
+    * heatmap: the gap of every area (rows) and family composition (columns), and
+    * multiples: one small histogram per family composition of the living wages
+      across areas, with the minimum wage marked.
+
+The wages of every view are loaded with one query (see load_wage_matrix() in
+living_wage_policy.py) into numpy arrays; the ranked and heatmap views take
+the order of the areas from a second query on the AreaAggregates table (see
+ranked_gaps() in living_wage.py). They stay responsive with thousands of
+areas: above WEBGL_AREA_THRESHOLD areas the ranked view draws WebGL markers
+instead of one bar per area, above MAX_HEATMAP_ROWS areas the heatmap averages
+neighboring rows (in ranked order) into bins, and the histograms are always
+binned here rather than in the browser.
+
+Usage:
+    python3 living_wage_compare.py --view ranked
+    python3 living_wage_compare.py --view heatmap --state MI --html heatmap.html
+
+Requires numpy and plotly.
+'''
+import argparse
+import sys
+
+import living_wage
+import living_wage_policy
+
+
+##############################################
+############## global variables ##############
+##############################################
+## above this many areas, the ranked view draws WebGL markers instead of bars
+WEBGL_AREA_THRESHOLD = 500
+
+## above this many areas, heatmap rows are averaged into this many bins
+MAX_HEATMAP_ROWS = 200
+
+## number of bars in each histogram of the small multiples
+HISTOGRAM_BINS = 30
+
+FONT = dict(family="Courier New, monospace", size=14, color="#7f7f7f")
+
+
+##############################################
+################# functions ##################
+##############################################
+def composition_label(composition):
+    ''' Turns a (number of adults, number of children) tuple into a label, e.g. 'one adult, 2 children'. '''
+    number_of_adults, number_of_children = composition
+    return f"{number_of_adults}, {number_of_children} child{'' if number_of_children == 1 else 'ren'}"
+
+
+def ranked_area_gaps(wage_matrix):
+    ''' Ranks the areas of a wage matrix by the gap between their average living wage
+    and minimum wage, as already ranked in the AreaAggregates table (see living_wage.ranked_gaps()).
+
+    Parameters
+    ----------
+    wage_matrix: dict
+        the arrays returned by living_wage_policy.load_wage_matrix()
+
+    Returns
+    -------
+    tuple
+        (row indexes of the areas from the highest to the lowest gap, numpy array of their gaps in the same order)
+    '''
+    import numpy as np
+
+    ranked_rows = living_wage.ranked_gaps(None)
+    if ranked_rows is None:
+        raise LookupError('the AreaAggregates table is missing; rebuild with living_wage.py --rebuild')
+    row_index_dict = {area_key: i for i, area_key in enumerate(zip(wage_matrix['states'], wage_matrix['areas']))}
+    ranked_rows = [row for row in ranked_rows if (row[6], row[1]) in row_index_dict]
+    order = np.array([row_index_dict[(row[6], row[1])] for row in ranked_rows], dtype=int)
+    return order, np.array([row[4] for row in ranked_rows], dtype=float)
+
+
+def area_labels(wage_matrix, order):
+    ''' Names the areas at the given rows of a wage matrix for the graphs. When the
+    matrix holds several states, each name ends with its state, e.g. 'Washington County (MI)',
+    as the same area names repeat across states.
+    '''
+    several_states = len(set(wage_matrix['states'])) > 1
+    labels = []
+    for i in order:
+        label = living_wage.display_name(wage_matrix['areas'][i])
+        if several_states:
+            label = f"{label} ({wage_matrix['states'][i]})"
+        labels.append(label)
+    return labels
+
+
+def build_ranked_gap_figure(wage_matrix):
+    ''' Builds the plotly graph of the gap between the average living wage and the
+    minimum wage of every area, from the highest to the lowest gap.
+
+    Parameters
+    ----------
+    wage_matrix: dict
+        the arrays returned by living_wage_policy.load_wage_matrix()
+
+    Returns
+    -------
+    plotly Figure
+        the graph, ready to be shown
+    '''
+    import numpy as np
+    import plotly.graph_objs as go
+
+    order, gaps = ranked_area_gaps(wage_matrix)
+    names = area_labels(wage_matrix, order)
+    ranked_gaps = np.round(gaps, 2)
+
+    if len(order) <= WEBGL_AREA_THRESHOLD:
+        trace = go.Bar(x=ranked_gaps, y=names, orientation='h',
+            marker_color='#72B7B2',
+            hovertemplate='%{y}: $%{x:.2f}<extra></extra>')
+        layout = go.Layout(title="Gap between the Average Living Wage and the Minimum Wage, by Area",
+            xaxis_title="US Dollars per Hour",
+            yaxis=dict(autorange='reversed', dtick=1),
+            height=max(400, 18 * len(order) + 150),
+            font=FONT)
+    else:
+        trace = go.Scattergl(x=np.arange(1, len(order) + 1), y=ranked_gaps, mode='markers',
+            text=names,
+            marker=dict(color='#72B7B2', size=4),
+            hovertemplate='#%{x} %{text}: $%{y:.2f}<extra></extra>')
+        layout = go.Layout(title=f"Gap between the Average Living Wage and the Minimum Wage, {len(order):,} Areas",
+            xaxis_title="Rank",
+            yaxis_title="US Dollars per Hour",
+            font=FONT)
+
+    return go.Figure(data=trace, layout=layout)
+
+
+def build_gap_heatmap_figure(wage_matrix, max_rows=MAX_HEATMAP_ROWS):
+    ''' Builds the plotly heatmap of the gap between the living wage and the minimum
+    wage for every area (rows, highest average gap first) and family composition (columns).
+    With more than max_rows areas, consecutive rows are averaged into max_rows bins.
+
+    Parameters
+    ----------
+    wage_matrix: dict
+        the arrays returned by living_wage_policy.load_wage_matrix()
+    max_rows: int
+        the maximum number of rows drawn
+
+    Returns
+    -------
+    plotly Figure
+        the graph, ready to be shown
+    '''
+    import numpy as np
+    import plotly.graph_objs as go
+
+    order, _ = ranked_area_gaps(wage_matrix)
+    cell_gaps = (wage_matrix['living_wages'] - wage_matrix['minimum_wages'])[order]
+    names = area_labels(wage_matrix, order)
+
+    if len(order) > max_rows:
+        ## average each run of consecutive ranked rows, ignoring missing cells
+        bin_starts = np.linspace(0, len(order), max_rows + 1).astype(int)[:-1]
+        bin_starts = np.unique(bin_starts)
+        bin_ends = np.append(bin_starts[1:], len(order))
+        cell_counts = np.add.reduceat(~np.isnan(cell_gaps), bin_starts, axis=0)
+        cell_sums = np.add.reduceat(np.nan_to_num(cell_gaps), bin_starts, axis=0)
+        with np.errstate(invalid='ignore'):
+            cell_gaps = cell_sums / cell_counts
+        row_labels = [f"#{start + 1}-{end} ({names[start]} ... {names[end - 1]})"
+            for start, end in zip(bin_starts, bin_ends)]
+        title = f"Gap between the Living Wage and the Minimum Wage, {len(order):,} Areas in {len(row_labels)} Bins"
+    else:
+        row_labels = names
+        title = "Gap between the Living Wage and the Minimum Wage, by Area and Family Composition"
+
+    trace = go.Heatmap(z=np.round(cell_gaps, 2),
+        x=[composition_label(composition) for composition in wage_matrix['compositions']],
+        y=row_labels,
+        colorscale='Reds',
+        colorbar=dict(title='US Dollars<br>per Hour'),
+        hovertemplate='%{y}<br>%{x}: $%{z:.2f}<extra></extra>')
+    layout = go.Layout(title=title,
+        yaxis=dict(autorange='reversed'),
+        height=max(400, 14 * len(row_labels) + 250),
+        font=FONT)
+
+    return go.Figure(data=trace, layout=layout)
+
+
+def build_small_multiples_figure(wage_matrix, bins=HISTOGRAM_BINS):
+    ''' Builds one histogram per family composition of the living wages across
+    areas, with the minimum wage marked by a dashed line. The histograms are binned
+    here with numpy, so the browser only draws a few bars whatever the number of areas.
+
+    Parameters
+    ----------
+    wage_matrix: dict
+        the arrays returned by living_wage_policy.load_wage_matrix()
+    bins: int
+        the number of bars in each histogram
+
+    Returns
+    -------
+    plotly Figure
+        the graph, ready to be shown
+    '''
+    import numpy as np
+    import plotly.graph_objs as go
+    from plotly.subplots import make_subplots
+
+    compositions = wage_matrix['compositions']
+    living_wages = wage_matrix['living_wages']
+    adults_list = list(dict.fromkeys(number_of_adults for number_of_adults, _ in compositions))
+    children_list = list(dict.fromkeys(number_of_children for _, number_of_children in compositions))
+
+    ## the same bins for every histogram, so they can be compared
+    bin_edges = np.histogram_bin_edges(living_wages[~np.isnan(living_wages)], bins=bins)
+    bin_centers = (bin_edges[:-1] + bin_edges[1:]) / 2
+    minimum_wage = float(np.nanmedian(wage_matrix['minimum_wages']))
+
+    fig = make_subplots(rows=len(adults_list), cols=len(children_list),
+        shared_xaxes=True, shared_yaxes=True,
+        subplot_titles=[composition_label((number_of_adults, number_of_children))
+            for number_of_adults in adults_list for number_of_children in children_list])
+
+    for j, (number_of_adults, number_of_children) in enumerate(compositions):
+        row = adults_list.index(number_of_adults) + 1
+        col = children_list.index(number_of_children) + 1
+        composition_wages = living_wages[:, j]
+        counts, _ = np.histogram(composition_wages[~np.isnan(composition_wages)], bins=bin_edges)
+        fig.add_trace(go.Bar(x=bin_centers, y=counts, width=np.diff(bin_edges),
+            marker_color='#72B7B2',
+            hovertemplate='$%{x:.2f}: %{y} areas<extra></extra>',
+            showlegend=False), row=row, col=col)
+        fig.add_vline(x=minimum_wage, line_dash='dash', line_color='red', row=row, col=col)
+
+    fig.update_layout(title=f"Living Wages across {len(wage_matrix['areas']):,} Areas by Family Composition "
+            f"(dashed line: minimum wage ${minimum_wage:.2f})",
+        height=250 * len(adults_list) + 150,
+        bargap=0,
+        font=FONT)
+    fig.update_annotations(font_size=12)
+
+    return fig
+
+
+VIEW_BUILDERS = {
+    'ranked': build_ranked_gap_figure,
+    'heatmap': build_gap_heatmap_figure,
+    'multiples': build_small_multiples_figure,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the living wages of every area in one graph.')
+    parser.add_argument('--view', choices=list(VIEW_BUILDERS), default='ranked',
+        help='ranked gaps, area x composition heatmap, or small multiples (default: ranked)')
+    parser.add_argument('--state', help='only compare the areas of this state (e.g. MI)')
+    parser.add_argument('--db', default=living_wage.DB_NAME, help='SQL database to read')
+    parser.add_argument('--html', metavar='FILE', help='write the graph to FILE instead of opening it in a browser')
+    args = parser.parse_args()
+
+    schema_error = living_wage.schema_error(args.db)
+    if schema_error:
+        sys.exit(f"[Error message]: {schema_error}.")
+    living_wage.DB_NAME = args.db
+    wage_matrix = living_wage_policy.load_wage_matrix(args.db, state=args.state)
+    if not wage_matrix['areas']:
+        sys.exit("[Error message]: No matching areas in the database.")
+
+    try:
+        fig = VIEW_BUILDERS[args.view](wage_matrix)
+    except LookupError as error:
+        sys.exit(f"[Error message]: {error}.")
+    if args.html:
+        fig.write_html(args.html)
+    else:
+        fig.show()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+##############################################
+#####  Custom household living wage  #########
+#####  estimator                     #########
+##############################################
+''' Estimates the living wage and the required annual income of any household,
+including households outside the 12 family compositions on the website
+(e.g. 5 children, or 3 adults with 2 working), for every area at once.
+
+The estimates come from the HouseholdCurves table, which living_wage.py builds
+from the Wages and Expenses tables when it loads the database (see
+refresh_household_curves() in living_wage.py):
+    * the number of adults and working adults picks the closest composition
+      on the website: one adult, two adults (one working) or two adults (both working),
+    * up to 3 children, the website's own figures are used; each child after
+      the third adds the increase from 2 to 3 children,
+    * each adult after the second adds the increase from one adult to two
+      adults (one working), and
+    * the living wage is the required income divided by the yearly hours of
+      all working adults.
+
+Usage:
+    python3 living_wage_households.py --adults 2 --working 2 --children 5
+    python3 living_wage_households.py --adults 3 --working 1 --children 2 --top 10
+
+Requires numpy.
+'''
+import argparse
+import sqlite3
+import sys
+
+import living_wage
+
+
+##############################################
+############## global variables ##############
+##############################################
+## order of the second axis of the 'income' array
+NUMBER_OF_ADULTS_LIST = ['one adult', 'two adults (one working)', 'two adults (both working)']
+
+
+##############################################
+############# classes & objects ##############
+##############################################
+class Household:
+    ''' A household to estimate.
+
+    Instance Attributes
+    -------------------
+    adults: int
+        the number of adults (1 or more)
+    working_adults: int
+        the number of adults who work (1 to adults)
+    children: int
+        the number of children (0 or more)
+    '''
+    def __init__(self, adults, working_adults, children):
+        if adults < 1:
+            raise ValueError('a household needs at least one adult')
+        if not 1 <= working_adults <= adults:
+            raise ValueError('the number of working adults must be between 1 and the number of adults')
+        if children < 0:
+            raise ValueError('the number of children cannot be negative')
+        self.adults = adults
+        self.working_adults = working_adults
+        self.children = children
+
+    def info(self):
+        return (f"{self.adults} adult(s) ({self.working_adults} working), {self.children} child(ren)")
+
+    def base_composition(self):
+        ''' Returns the index in NUMBER_OF_ADULTS_LIST of the closest composition on the website. '''
+        if self.adults == 1:
+            return 0
+        if self.working_adults == 1:
+            return 1
+        return 2
+
+
+##############################################
+################# functions ##################
+##############################################
+def load_household_curves(db_name=None):
+    ''' Loads the HouseholdCurves table into arrays with one row per area.
+
+    Parameters
+    ----------
+    db_name: string
+        the SQL database to read, or None for living_wage.DB_NAME
+
+    Returns
+    -------
+    dict
+        'areas': list of area names
+        'states': list of the state of each area, as the same names repeat across states
+        'income': numpy array (areas, 3 compositions, 4 children counts) of the
+            required annual income before taxes
+        'extra_child': numpy array (areas, 3 compositions) of the income per child after the third
+        'extra_adult': numpy array (areas,) of the income per adult after the second
+        'hours_per_year': numpy array (areas,) of the yearly hours of one working adult
+    '''
+    import numpy as np
+
+    conn = sqlite3.connect(db_name or living_wage.DB_NAME)
+    query = '''
+        SELECT State, Area, [Number of Adults], [Children 0], [Children 1], [Children 2], [Children 3],
+            [Extra Child], [Extra Adult], [Hours Per Year]
+        FROM HouseholdCurves
+        ORDER BY State, Area
+    '''
+    try:
+        rows = conn.execute(query).fetchall()
+    except sqlite3.OperationalError:
+        rows = []
+    conn.close()
+    if not rows:
+        raise LookupError('the HouseholdCurves table is empty; load the database with living_wage.py first')
+
+    area_index_dict = {}
+    for row in rows:
+        area_index_dict.setdefault((row[0], row[1]), len(area_index_dict))
+
+    income = np.full((len(area_index_dict), len(NUMBER_OF_ADULTS_LIST), 4), np.nan)
+    extra_child = np.full((len(area_index_dict), len(NUMBER_OF_ADULTS_LIST)), np.nan)
+    extra_adult = np.full(len(area_index_dict), np.nan)
+    hours_per_year = np.full(len(area_index_dict), np.nan)
+    for state_code, area_name, number_of_adults, *children_incomes, extra_child_income, extra_adult_income, hours in rows:
+        area_index = area_index_dict[(state_code, area_name)]
+        composition_index = NUMBER_OF_ADULTS_LIST.index(number_of_adults)
+        income[area_index, composition_index] = children_incomes
+        extra_child[area_index, composition_index] = extra_child_income
+        extra_adult[area_index] = extra_adult_income
+        hours_per_year[area_index] = hours
+
+    return {
+        'areas': [area_name for _, area_name in area_index_dict],
+        'states': [state_code for state_code, _ in area_index_dict],
+        'income': income,
+        'extra_child': extra_child,
+        'extra_adult': extra_adult,
+        'hours_per_year': hours_per_year,
+    }
+
+
+def estimate_household(curves, household):
+    ''' Estimates one household in every area at once.
+
+    Parameters
+    ----------
+    curves: dict
+        the arrays returned by load_household_curves()
+    household: Household
+        the household to estimate
+
+    Returns
+    -------
+    dict
+        'areas': list of area names
+        'states': list of the state of each area
+        'required_income': numpy array (areas,) of the required annual income before taxes
+        'living_wage': numpy array (areas,) of the hourly living wage of each working adult
+    '''
+    composition_index = household.base_composition()
+    children_index = min(household.children, 3)
+    extra_children = max(household.children - 3, 0)
+    extra_adults = max(household.adults - 2, 0)
+
+    required_income = (curves['income'][:, composition_index, children_index]
+        + extra_children * curves['extra_child'][:, composition_index]
+        + extra_adults * curves['extra_adult'])
+    living_wage_estimate = required_income / (curves['hours_per_year'] * household.working_adults)
+
+    return {
+        'areas': curves['areas'],
+        'states': curves['states'],
+        'required_income': required_income,
+        'living_wage': living_wage_estimate,
+    }
+
+
+def estimate_households(curves, households):
+    ''' Estimates several households in every area at once.
+
+    Parameters
+    ----------
+    curves: dict
+        the arrays returned by load_household_curves()
+    households: list
+        the Household instances to estimate
+
+    Returns
+    -------
+    dict
+        'areas': list of area names
+        'states': list of the state of each area
+        'required_income': numpy array (households, areas)
+        'living_wage': numpy array (households, areas)
+    '''
+    import numpy as np
+
+    estimates = [estimate_household(curves, household) for household in households]
+    return {
+        'areas': curves['areas'],
+        'states': curves['states'],
+        'required_income': np.array([estimate['required_income'] for estimate in estimates]),
+        'living_wage': np.array([estimate['living_wage'] for estimate in estimates]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Estimate the living wage of any household in every area.')
+    parser.add_argument('--adults', type=int, default=1)
+    parser.add_argument('--working', type=int, default=None, help='working adults (default: all adults)')
+    parser.add_argument('--children', type=int, default=0)
+    parser.add_argument('--top', type=int, default=None, help='only show the N areas with the highest living wage')
+    parser.add_argument('--db', default=living_wage.DB_NAME, help='SQL database to read')
+    args = parser.parse_args()
+
+    try:
+        household = Household(args.adults, args.adults if args.working is None else args.working, args.children)
+        schema_error = living_wage.schema_error(args.db)
+        if schema_error:
+            raise LookupError(schema_error)
+        estimate = estimate_household(load_household_curves(args.db), household)
+    except (ValueError, LookupError) as error:
+        sys.exit(f"[Error message]: {error}")
+
+    order = sorted(range(len(estimate['areas'])), key=lambda i: -estimate['living_wage'][i])
+    if args.top:
+        order = order[:args.top]
+
+    dash_lines = ("-" * 50)
+    print(dash_lines)
+    print(f"Estimates for {household.info()}")
+    print(dash_lines)
+    print(f"{'Area':<32}  {'Living wage':>11}  {'Required income':>15}")
+    several_states = len(set(estimate['states'])) > 1
+    for i in order:
+        area_name = living_wage.display_name(estimate['areas'][i])
+        if several_states:
+            area_name = f"{area_name} ({estimate['states'][i]})"
+        print(f"{area_name:<32}  {estimate['living_wage'][i]:>11.2f}  "
+            f"{estimate['required_income'][i]:>15,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+##############################################
+#####  Inter-process file locks for the  #####
+#####  caches and the SQL database       #####
+##############################################
+''' Lets several copies of living_wage.py (e.g. a scheduled refresh and an
+interactive session, or several crawl workers) share one data folder.
+
+A FileLock is an exclusive lock on a small '.lock' file next to the file it
+protects, held with flock() on Linux and macOS or msvcrt.locking() on
+Windows. The operating system releases it if the process dies, so a crashed
+program never leaves the data folder locked. Within a process, a FileLock
+is also a re-entrant thread lock, so the same thread can take it again
+(e.g. save_cache() inside archive_page_bodies()).
+
+write_json_atomically() writes to a temporary file and renames it over the
+old one, so readers see either the old or the new file, never half of one.
+'''
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+import living_wage_metrics as metrics
+
+
+##############################################
+############## global variables ##############
+##############################################
+## seconds between attempts while waiting for a lock with a timeout
+POLL_SECONDS = 0.05
+
+## key is the absolute path of a lock file and value is its FileLock (see file_lock())
+FILE_LOCK_DICT = {}
+FILE_LOCK_DICT_LOCK = threading.Lock()
+
+LOCK_WAIT_SECONDS = metrics.histogram('lock_wait_seconds', 'Time spent waiting for a file lock')
+
+
+##############################################
+############# classes & objects ##############
+##############################################
+class LockTimeout(Exception):
+    ''' Raised when a FileLock can't be taken within its timeout. '''
+
+
+class FileLock:
+    ''' An exclusive lock shared by every process that uses the same lock file.
+
+    Instance Attributes
+    -------------------
+    path: string
+        the lock file, e.g. 'living_wage_cache.json.lock'
+    depth: int
+        how many times the thread that holds the lock has taken it
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.depth = 0
+        self.lock_file = None
+        self.thread_lock = threading.RLock()
+
+    def acquire(self, timeout=None):
+        ''' Takes the lock, waiting for other processes and threads to release it.
+
+        Parameters
+        ----------
+        timeout: float
+            the maximum number of seconds to wait, or None to wait as long as it takes
+
+        Returns
+        -------
+        None
+        '''
+        wait_start = time.perf_counter()
+        if not self.thread_lock.acquire(timeout=-1 if timeout is None else timeout):
+            raise LockTimeout(f'timed out waiting for {self.path}')
+        if self.depth == 0:
+            lock_file = open(self.path, 'a+')
+            try:
+                while not try_lock_file(lock_file, blocking=timeout is None):
+                    if time.perf_counter() - wait_start >= timeout:
+                        raise LockTimeout(f'timed out waiting for {self.path}')
+                    time.sleep(POLL_SECONDS)
+            except BaseException:
+                lock_file.close()
+                self.thread_lock.release()
+                raise
+            self.lock_file = lock_file
+            LOCK_WAIT_SECONDS.observe(time.perf_counter() - wait_start)
+        self.depth += 1
+
+    def release(self):
+        ''' Releases the lock once it has been released as many times as it was taken. '''
+        self.depth -= 1
+        if self.depth == 0:
+            unlock_file(self.lock_file)
+            self.lock_file.close()
+            self.lock_file = None
+        self.thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+##############################################
+################# functions ##################
+##############################################
+def try_lock_file(lock_file, blocking=True):
+    ''' Takes the operating system lock on an open lock file.
+    Returns True once the lock is held, or False if blocking is False and another process holds it.
+    '''
+    if fcntl is not None:
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            return True
+        except BlockingIOError:
+            return False
+    while True:
+        try:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            if not blocking:
+                return False
+            time.sleep(POLL_SECONDS)
+
+
+def unlock_file(lock_file):
+    ''' Releases the operating system lock on an open lock file. '''
+    if fcntl is not None:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+    else:
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def file_lock(protected_filename):
+    ''' Returns the FileLock that protects a file, shared by every caller in this process.
+
+    Parameters
+    ----------
+    protected_filename: string
+        the file to protect, e.g. 'living_wage_cache.json'; the lock file is the
+        same name with '.lock' added
+
+    Returns
+    -------
+    FileLock
+        the lock, to be used in a with statement
+    '''
+    lock_path = os.path.abspath(protected_filename) + '.lock'
+    with FILE_LOCK_DICT_LOCK:
+        if lock_path not in FILE_LOCK_DICT:
+            FILE_LOCK_DICT[lock_path] = FileLock(lock_path)
+        return FILE_LOCK_DICT[lock_path]
+
+
+def write_json_atomically(filename, data):
+    ''' Writes data as JSON to a temporary file next to filename, then renames it
+    over filename, so that readers never see a half-written file.
+
+    Parameters
+    ----------
+    filename: string
+        the file to write
+    data: object
+        anything json.dump() accepts
+
+    Returns
+    -------
+    None
+    '''
+    temp_filename = f'{filename}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(temp_filename, 'w') as temp_file:
+            json.dump(data, temp_file)
+        os.replace(temp_filename, filename)
+    except BaseException:
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+        raise
@@ -0,0 +1,263 @@
+##############################################
+########   Metrics for living_wage.py  #######
+##############################################
+''' A small metrics layer: counters, gauges, histograms and timers that
+living_wage.py wraps around its hot paths (cache lookups, fetches, parsing,
+database loads and queries).
+
+Metrics are off by default, and while they are off every call returns right
+away. Turn them on with enable(), or by setting the LIVING_WAGE_METRICS
+environment variable to the file to write (e.g. metrics.json or metrics.prom).
+The metrics are then dumped to that file when the program exits, as JSON or in
+the Prometheus text format (chosen by the file extension or the format argument).
+'''
+import atexit
+import json
+import os
+import time
+
+
+##############################################
+############## global variables ##############
+##############################################
+METRICS_ENABLED = False
+
+## key is a metric name and value is the metric object, in registration order
+REGISTRY = {}
+
+## upper bounds (in seconds) of the histogram buckets for timings
+TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+##############################################
+############# classes & objects ##############
+##############################################
+class Counter:
+    ''' A value that only goes up, e.g. the number of cache hits.
+
+    Instance Attributes
+    -------------------
+    name: string
+        the metric name, e.g. 'cache_hits_total'
+    help_text: string
+        a one-line description of the metric
+    value: float
+        the current count
+    '''
+    metric_type = 'counter'
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.value = 0
+
+    def inc(self, amount=1):
+        if METRICS_ENABLED:
+            self.value += amount
+
+    def to_dict(self):
+        return {'type': self.metric_type, 'help': self.help_text, 'value': self.value}
+
+    def to_prometheus(self):
+        return [f'{self.name} {self.value}']
+
+
+class Gauge(Counter):
+    ''' A value that can go up and down, e.g. the current request rate. '''
+    metric_type = 'gauge'
+
+    def set(self, value):
+        if METRICS_ENABLED:
+            self.value = value
+
+
+class Histogram:
+    ''' Counts observations (usually durations in seconds) in cumulative buckets.
+
+    Instance Attributes
+    -------------------
+    name: string
+        the metric name, e.g. 'query_seconds'
+    help_text: string
+        a one-line description of the metric
+    buckets: tuple
+        the upper bound of each bucket, in increasing order
+    bucket_counts: list
+        the number of observations that fell in each bucket (not cumulative),
+        with one extra bucket at the end for values above the last bound
+    total: float
+        the sum of all observations
+    count: int
+        the number of observations
+    '''
+    metric_type = 'histogram'
+
+    def __init__(self, name, help_text, buckets=TIME_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        if not METRICS_ENABLED:
+            return
+        for i, upper_bound in enumerate(self.buckets):
+            if value <= upper_bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.bucket_counts[i] += 1
+        self.total += value
+        self.count += 1
+
+    def time(self):
+        ''' Returns a context manager that observes how long its block took. '''
+        if not METRICS_ENABLED:
+            return NULL_TIMER
+        return Timer(self)
+
+    def cumulative_counts(self):
+        counts = []
+        running_count = 0
+        for bucket_count in self.bucket_counts:
+            running_count += bucket_count
+            counts.append(running_count)
+        return counts
+
+    def to_dict(self):
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        return {
+            'type': self.metric_type,
+            'help': self.help_text,
+            'count': self.count,
+            'sum': self.total,
+            'buckets': dict(zip(bounds, self.cumulative_counts())),
+        }
+
+    def to_prometheus(self):
+        lines = []
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        for bound, cumulative_count in zip(bounds, self.cumulative_counts()):
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative_count}')
+        lines.append(f'{self.name}_sum {self.total}')
+        lines.append(f'{self.name}_count {self.count}')
+        return lines
+
+
+class Timer:
+    ''' Context manager that adds the duration of its block to a histogram. '''
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class NullTimer:
+    ''' Context manager that does nothing; handed out while metrics are off. '''
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+##############################################
+############ register & export ###############
+##############################################
+def counter(name, help_text):
+    ''' Registers a counter, or returns the one already registered under that name. '''
+    if name not in REGISTRY:
+        REGISTRY[name] = Counter(name, help_text)
+    return REGISTRY[name]
+
+
+def gauge(name, help_text):
+    ''' Registers a gauge, or returns the one already registered under that name. '''
+    if name not in REGISTRY:
+        REGISTRY[name] = Gauge(name, help_text)
+    return REGISTRY[name]
+
+
+def histogram(name, help_text, buckets=TIME_BUCKETS):
+    ''' Registers a histogram, or returns the one already registered under that name. '''
+    if name not in REGISTRY:
+        REGISTRY[name] = Histogram(name, help_text, buckets)
+    return REGISTRY[name]
+
+
+def to_json():
+    ''' Returns every registered metric as a JSON string. '''
+    return json.dumps({name: metric.to_dict() for name, metric in REGISTRY.items()}, indent=2)
+
+
+def to_prometheus():
+    ''' Returns every registered metric in the Prometheus text exposition format. '''
+    lines = []
+    for name, metric in REGISTRY.items():
+        lines.append(f'# HELP {name} {metric.help_text}')
+        lines.append(f'# TYPE {name} {metric.metric_type}')
+        lines.extend(metric.to_prometheus())
+    return '\n'.join(lines) + '\n'
+
+
+def dump(path, fmt=None):
+    ''' Writes every registered metric to a file.
+
+    Parameters
+    ----------
+    path: string
+        the file to write
+    fmt: string
+        'json' or 'prometheus'; if None, a path ending in '.prom' or '.txt'
+        gets the Prometheus format and anything else gets JSON
+
+    Returns
+    -------
+    None
+    '''
+    if fmt is None:
+        fmt = 'prometheus' if path.endswith(('.prom', '.txt')) else 'json'
+    text = to_prometheus() if fmt == 'prometheus' else to_json()
+    with open(path, 'w') as metrics_file:
+        metrics_file.write(text)
+
+
+def enable(dump_path=None, fmt=None):
+    ''' Turns metrics on, and optionally dumps them to a file when the program exits.
+
+    Parameters
+    ----------
+    dump_path: string
+        the file to write at exit, or None to only keep the metrics in memory
+    fmt: string
+        'json' or 'prometheus' (see dump())
+
+    Returns
+    -------
+    None
+    '''
+    global METRICS_ENABLED
+    METRICS_ENABLED = True
+    if dump_path:
+        atexit.register(dump, dump_path, fmt)
+
+
+def disable():
+    ''' Turns metrics off. Values recorded so far are kept. '''
+    global METRICS_ENABLED
+    METRICS_ENABLED = False
+
+
+if os.environ.get('LIVING_WAGE_METRICS'):
+    enable(os.environ['LIVING_WAGE_METRICS'])
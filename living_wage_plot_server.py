@@ -0,0 +1,280 @@
+##############################################
+######  Local plot server: one browser  ######
+######  tab that shows every graph      ######
+##############################################
+''' A long-lived local web server that shows the graphs of living_wage.py in a
+single browser tab, instead of the new tab (and new server) that fig.show()
+opens for every graph.
+
+The tab loads plotly.js once, from /plotly-<version>.min.js, which the
+browser then keeps in its cache. It listens to /events, a stream of
+server-sent events: every call to PlotServer.show() sends only the JSON of
+the new figure (a few kilobytes) down the stream, and the page redraws it
+with Plotly.react(). A browser tab is opened only when no tab is connected,
+e.g. for the first graph, or after the tab was closed. The server listens on
+DEFAULT_PORT if it is free, so a tab left open by an earlier session
+reconnects to the next one by itself.
+
+Usage:
+    python3 living_wage.py                     # graphs go to the plot server
+    python3 living_wage.py --no-plot-server    # one new tab per graph (fig.show())
+    python3 living_wage_plot_server.py --area "washtenaw county" --area "ann arbor, mi"
+'''
+import argparse
+import select
+import threading
+import time
+import webbrowser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import living_wage_metrics as metrics
+
+
+##############################################
+############## global variables ##############
+##############################################
+DEFAULT_PORT = 8027
+
+## seconds between two keep-alive comments on an idle event stream
+HEARTBEAT_SECONDS = 15
+## seconds between two checks that the tab of an event stream is still open
+DISCONNECT_CHECK_SECONDS = 0.25
+## seconds show() waits for a tab it opened to connect before it returns
+BROWSER_CONNECT_SECONDS = 10
+
+PAGE_HTML = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Living Wage</title>
+<script src="{plotly_path}"></script>
+<style>
+  html, body {{ height: 100%; margin: 0; font-family: "Courier New", monospace; color: #7f7f7f; }}
+  #graph {{ height: calc(100% - 2em); }}
+  #status {{ height: 2em; line-height: 2em; padding: 0 1em; font-size: 0.8em; }}
+</style>
+</head>
+<body>
+<div id="graph"></div>
+<div id="status">Waiting for a graph from living_wage.py...</div>
+<script>
+  var statusLine = document.getElementById('status');
+  var events = new EventSource('/events');
+  events.addEventListener('figure', function (event) {{
+    var figure = JSON.parse(event.data);
+    Plotly.react('graph', figure.data, figure.layout, {{responsive: true}});
+    statusLine.textContent = 'Graph ' + event.lastEventId + ' from living_wage.py';
+  }});
+  events.onerror = function () {{
+    statusLine.textContent = 'living_wage.py is not running; this page reconnects when it starts again.';
+  }};
+</script>
+</body>
+</html>
+'''
+
+PLOT_UPDATES = metrics.counter('plot_updates_total', 'Graphs pushed to the plot server tab')
+PLOT_UPDATE_SECONDS = metrics.histogram('plot_update_seconds', 'Time to serialize a graph and hand it to the plot server tab')
+PLOT_TABS_OPENED = metrics.counter('plot_tabs_opened_total', 'Browser tabs opened by the plot server')
+
+
+##############################################
+############# classes & objects ##############
+##############################################
+class PlotServer:
+    ''' A threaded HTTP server with one page that always shows the latest figure.
+
+    Instance Attributes
+    -------------------
+    figure_json: string
+        the JSON of the latest figure, or None before the first one
+    figure_version: int
+        the number of figures shown so far; each event stream sends every
+        version it hasn't sent yet (only the latest, if it fell behind)
+    client_count: int
+        the number of tabs connected to the event stream
+    '''
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT):
+        import plotly.offline
+
+        self.plotly_path = f'/plotly-{plotly.offline.get_plotlyjs_version()}.min.js'
+        self.plotly_js = plotly.offline.get_plotlyjs().encode('utf-8')
+        self.page = PAGE_HTML.format(plotly_path=self.plotly_path).encode('utf-8')
+        self.figure_json = None
+        self.figure_version = 0
+        self.client_count = 0
+        self.condition = threading.Condition()
+        try:
+            self.server = ThreadingHTTPServer((host, port), self.make_handler())
+        except OSError:
+            ## the port is taken, e.g. by another copy of the program
+            self.server = ThreadingHTTPServer((host, 0), self.make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/'
+
+    def start(self):
+        ''' Starts serving in a background thread and returns the URL of the page. '''
+        self.thread = threading.Thread(target=self.server.serve_forever, name='plot-server', daemon=True)
+        self.thread.start()
+        return self.url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def show(self, fig, open_browser=True):
+        ''' Shows a figure in the plot server tab, and opens the tab if none is connected.
+
+        Parameters
+        ----------
+        fig: plotly Figure
+            the graph to show
+        open_browser: bool
+            open a browser tab if no tab is connected
+
+        Returns
+        -------
+        None
+        '''
+        with PLOT_UPDATE_SECONDS.time():
+            figure_json = fig.to_json()
+            with self.condition:
+                self.figure_json = figure_json
+                self.figure_version += 1
+                self.condition.notify_all()
+                needs_tab = self.client_count == 0
+        PLOT_UPDATES.inc()
+        if needs_tab and open_browser:
+            PLOT_TABS_OPENED.inc()
+            webbrowser.open(self.url)
+            self.wait_for_client(BROWSER_CONNECT_SECONDS)
+
+    def wait_for_client(self, timeout_seconds):
+        ''' Waits until a tab connects to the event stream.
+
+        Returns
+        -------
+        bool
+            True if a tab is connected, False if none connected within timeout_seconds
+        '''
+        with self.condition:
+            return self.condition.wait_for(lambda: self.client_count > 0, timeout_seconds)
+
+    def make_handler(self):
+        plot_server = self
+
+        class PlotServerHandler(BaseHTTPRequestHandler):
+            ## keeps the event stream open on HTTP/1.1 clients
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                path = urlsplit(self.path).path
+                if path == '/':
+                    self.send_body(plot_server.page, 'text/html; charset=utf-8', {'Cache-Control': 'no-cache'})
+                elif path == plot_server.plotly_path:
+                    ## the version is in the path, so the browser can keep it for good
+                    self.send_body(plot_server.plotly_js, 'text/javascript; charset=utf-8',
+                        {'Cache-Control': 'public, max-age=31536000, immutable'})
+                elif path == '/figure':
+                    with plot_server.condition:
+                        figure_json = plot_server.figure_json
+                    if figure_json is None:
+                        self.send_body(b'', 'application/json', status_code=204)
+                    else:
+                        self.send_body(figure_json.encode('utf-8'), 'application/json')
+                elif path == '/events':
+                    self.stream_events()
+                else:
+                    self.send_body(b'Not Found', 'text/plain; charset=utf-8', status_code=404)
+
+            def send_body(self, body, content_type, headers=None, status_code=200):
+                self.send_response(status_code)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def stream_events(self):
+                ''' Sends each new figure to one tab until the tab is closed. '''
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Cache-Control', 'no-cache')
+                self.end_headers()
+                self.close_connection = True
+
+                with plot_server.condition:
+                    plot_server.client_count += 1
+                    plot_server.condition.notify_all()
+                try:
+                    sent_version = 0
+                    last_write = time.monotonic()
+                    while True:
+                        with plot_server.condition:
+                            plot_server.condition.wait_for(lambda: plot_server.figure_version != sent_version,
+                                DISCONNECT_CHECK_SECONDS)
+                            figure_json = plot_server.figure_json
+                            figure_version = plot_server.figure_version
+                        if figure_version != sent_version and figure_json is not None:
+                            self.wfile.write(f'id: {figure_version}\nevent: figure\ndata: {figure_json}\n\n'.encode('utf-8'))
+                            sent_version = figure_version
+                        elif time.monotonic() - last_write >= HEARTBEAT_SECONDS:
+                            self.wfile.write(b': heartbeat\n\n')
+                        elif self.tab_closed():
+                            break
+                        else:
+                            continue
+                        self.wfile.flush()
+                        last_write = time.monotonic()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with plot_server.condition:
+                        plot_server.client_count -= 1
+
+            def tab_closed(self):
+                ''' Returns True if the browser closed the connection. A tab never sends
+                anything on an event stream, so anything readable means it's gone.
+                '''
+                readable, _, _ = select.select([self.connection], [], [], 0)
+                return bool(readable)
+
+            def log_message(self, format, *args):
+                pass
+
+        return PlotServerHandler
+
+
+##############################################
+################# functions ##################
+##############################################
+def main():
+    import living_wage
+
+    parser = argparse.ArgumentParser(description='Show the graphs of some areas, one after the other, in one browser tab.')
+    parser.add_argument('--area', action='append', required=True,
+        help='area to show, as stored in the database (e.g. "washtenaw county"); repeatable')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--seconds', type=float, default=3, help='seconds each graph stays on screen')
+    args = parser.parse_args()
+
+    plot_server = PlotServer(port=args.port)
+    print(f"Serving the graphs at {plot_server.start()}")
+    for area_name in args.area:
+        for build_figure in (living_wage.build_avg_gap_figure, living_wage.build_expenses_figure):
+            update_start = time.perf_counter()
+            plot_server.show(build_figure(area_name.lower()))
+            print(f"{build_figure.__name__}('{area_name}') shown in {(time.perf_counter() - update_start) * 1000:.1f} ms")
+            time.sleep(args.seconds)
+    plot_server.stop()
+
+
+if __name__ == "__main__":
+    main()
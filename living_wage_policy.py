@@ -0,0 +1,283 @@
+##############################################
+######  Minimum wage policy simulator  #######
+##############################################
+''' Answers "what if the minimum wage were $X?" for every area and family
+composition in the Wages table at once, for many candidate minimum wages.
+
+For each candidate minimum wage the simulator computes, in one vectorized pass
+over every area x family composition:
+    * the gap between the living wage and the minimum wage,
+    * the share of household types (area x composition) whose living wage is
+      above the minimum wage, i.e. that a full-time minimum wage job leaves
+      below the living wage, and
+    * the hours per week each working adult would need at the minimum wage to
+      earn the living wage of a 40-hour week.
+
+Usage:
+    python3 living_wage_policy.py --from 9.45 --to 20 --step 0.25
+    python3 living_wage_policy.py --wages 10 12 15 --area "washtenaw county" --csv sweep.csv
+
+Requires numpy.
+'''
+import argparse
+import csv
+import math
+import sqlite3
+import sys
+
+import living_wage
+
+
+##############################################
+############## global variables ##############
+##############################################
+FULL_TIME_HOURS = 40
+
+## cells (scenarios x areas x compositions) computed at once when only summaries are kept
+CHUNK_CELLS = 4_000_000
+
+
+##############################################
+################# functions ##################
+##############################################
+def load_wage_matrix(db_name=None, area_names=None, state=None):
+    ''' Loads the Wages table into arrays, once, so that any number of scenarios
+    can be simulated without querying the database again.
+
+    Parameters
+    ----------
+    db_name: string
+        the SQL database to read, or None for living_wage.DB_NAME
+    area_names: list
+        only load these areas (e.g. ['washtenaw county']), or None for all of them
+    state: string
+        only load the areas of this state (e.g. 'MI'), or None for every state
+
+    Returns
+    -------
+    dict
+        'areas': list of area names (rows of the matrices)
+        'states': list of the state of each area; names like 'washington county'
+            repeat across states, so an area is its (state, area name) pair
+        'compositions': list of (number of adults, number of children) tuples (columns)
+        'living_wages': numpy array of shape (areas, compositions)
+        'minimum_wages': numpy array of the current minimum wage, same shape
+    '''
+    import numpy as np
+
+    conn = sqlite3.connect(db_name or living_wage.DB_NAME)
+    query = '''
+        SELECT State, Area, [Number of Adults], [Number of Children], [Living Wage], [Minimum Wage]
+        FROM Wages
+        ORDER BY Id
+    '''
+    params = []
+    if state is not None:
+        query = '''
+            SELECT Wages.State, Wages.Area, [Number of Adults], [Number of Children], [Living Wage], [Minimum Wage]
+            FROM Wages
+                JOIN Areas ON Areas.State = Wages.State AND Areas.Area = Wages.Area
+            WHERE Areas.State = ?
+            ORDER BY Wages.Id
+        '''
+        params.append(state)
+    rows = conn.execute(query, params).fetchall()
+    conn.close()
+
+    area_index_dict = {}
+    composition_index_dict = {}
+    for state_code, area_name, number_of_adults, number_of_children, _, _ in rows:
+        if area_names is not None and area_name not in area_names:
+            continue
+        area_index_dict.setdefault((state_code, area_name), len(area_index_dict))
+        composition_index_dict.setdefault((number_of_adults, number_of_children), len(composition_index_dict))
+
+    living_wages = np.full((len(area_index_dict), len(composition_index_dict)), np.nan)
+    minimum_wages = np.full_like(living_wages, np.nan)
+    for state_code, area_name, number_of_adults, number_of_children, living_wage_value, minimum_wage_value in rows:
+        if (state_code, area_name) not in area_index_dict:
+            continue
+        cell = (area_index_dict[(state_code, area_name)], composition_index_dict[(number_of_adults, number_of_children)])
+        living_wages[cell] = living_wage_value
+        minimum_wages[cell] = minimum_wage_value
+
+    return {
+        'areas': [area_name for _, area_name in area_index_dict],
+        'states': [state_code for state_code, _ in area_index_dict],
+        'compositions': list(composition_index_dict),
+        'living_wages': living_wages,
+        'minimum_wages': minimum_wages,
+    }
+
+
+def simulate_minimum_wages(wage_matrix, candidate_minimum_wages, keep_cells=False):
+    ''' Simulates every candidate minimum wage against every area and family composition.
+
+    Parameters
+    ----------
+    wage_matrix: dict
+        the arrays returned by load_wage_matrix()
+    candidate_minimum_wages: list
+        the minimum wages to try, in US dollars per hour
+    keep_cells: bool
+        also return the full (scenarios, areas, compositions) arrays;
+        otherwise only the summaries are kept, which needs far less memory
+
+    Returns
+    -------
+    dict
+        'minimum_wages': the candidates, shape (scenarios,)
+        'mean_gap': average living wage minus minimum wage, shape (scenarios,)
+        'share_below': share of area x composition cells below the living wage, shape (scenarios,)
+        'mean_hours_needed': average weekly hours needed per working adult, shape (scenarios,)
+        'gap_by_composition', 'share_below_by_composition', 'hours_needed_by_composition':
+            the same averages for each family composition, shape (scenarios, compositions)
+        'share_below_by_area': shape (scenarios, areas)
+        and, if keep_cells is True, 'gap', 'below_living_wage' and 'hours_needed'
+        with shape (scenarios, areas, compositions)
+    '''
+    import numpy as np
+
+    minimum_wages = np.asarray(candidate_minimum_wages, dtype=float)
+    if np.any(minimum_wages <= 0):
+        raise ValueError('every candidate minimum wage must be above 0')
+    living_wages = wage_matrix['living_wages']
+    area_count, composition_count = living_wages.shape
+    ## cells without a living wage in the database count in no share
+    known_cells = ~np.isnan(living_wages)[None, :, :]
+
+    results = {
+        'minimum_wages': minimum_wages,
+        'mean_gap': np.empty(len(minimum_wages)),
+        'share_below': np.empty(len(minimum_wages)),
+        'mean_hours_needed': np.empty(len(minimum_wages)),
+        'gap_by_composition': np.empty((len(minimum_wages), composition_count)),
+        'share_below_by_composition': np.empty((len(minimum_wages), composition_count)),
+        'hours_needed_by_composition': np.empty((len(minimum_wages), composition_count)),
+        'share_below_by_area': np.empty((len(minimum_wages), area_count)),
+    }
+    if keep_cells:
+        chunk_size = len(minimum_wages)
+        for name in ('gap', 'hours_needed'):
+            results[name] = np.empty((len(minimum_wages), area_count, composition_count))
+        results['below_living_wage'] = np.empty((len(minimum_wages), area_count, composition_count), dtype=bool)
+    else:
+        chunk_size = max(1, CHUNK_CELLS // max(1, living_wages.size))
+
+    for start in range(0, len(minimum_wages), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        scenario_wages = minimum_wages[chunk, None, None]
+
+        gap = living_wages[None, :, :] - scenario_wages
+        below_living_wage = gap > 0
+        hours_needed = FULL_TIME_HOURS * living_wages[None, :, :] / scenario_wages
+
+        results['mean_gap'][chunk] = np.nanmean(gap, axis=(1, 2))
+        results['share_below'][chunk] = share_of_known(below_living_wage, known_cells, axis=(1, 2))
+        results['mean_hours_needed'][chunk] = np.nanmean(hours_needed, axis=(1, 2))
+        results['gap_by_composition'][chunk] = np.nanmean(gap, axis=1)
+        results['share_below_by_composition'][chunk] = share_of_known(below_living_wage, known_cells, axis=1)
+        results['hours_needed_by_composition'][chunk] = np.nanmean(hours_needed, axis=1)
+        results['share_below_by_area'][chunk] = share_of_known(below_living_wage, known_cells, axis=2)
+        if keep_cells:
+            results['gap'][chunk] = gap
+            results['below_living_wage'][chunk] = below_living_wage
+            results['hours_needed'][chunk] = hours_needed
+
+    return results
+
+
+def share_of_known(below_living_wage, known_cells, axis):
+    ''' Returns the share of the known cells that are below the living wage, along axis
+    (NaN where no cell is known).
+    '''
+    import numpy as np
+
+    below_count = (below_living_wage & known_cells).sum(axis=axis)
+    known_count = np.broadcast_to(known_cells, below_living_wage.shape).sum(axis=axis)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return below_count / known_count
+
+
+def candidate_range(start, stop, step):
+    ''' Returns the candidate minimum wages from start to stop (inclusive) in steps of step.
+    The last candidate is never above stop, e.g. 9.45, 10.45 and 11.45 from 9.45 to 12 in steps of 1.
+
+    Parameters
+    ----------
+    start: float
+        the first candidate
+    stop: float
+        the highest candidate allowed
+    step: float
+        the step between two candidates, above 0
+
+    Returns
+    -------
+    numpy array
+        the candidates, rounded to the cent (empty if stop is below start)
+    '''
+    import numpy as np
+
+    if step <= 0:
+        raise ValueError('the step must be above 0')
+    ## the small tolerance keeps stop itself when (stop - start) / step falls just short of a whole number
+    count = max(0, math.floor((stop - start) / step + 1e-9) + 1)
+    return np.round(start + step * np.arange(count), 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sweep candidate minimum wages across every area and family composition.')
+    parser.add_argument('--wages', nargs='+', type=float, metavar='WAGE', help='candidate minimum wages')
+    parser.add_argument('--from', dest='start', type=float, default=9.45, help='first candidate (default 9.45)')
+    parser.add_argument('--to', dest='stop', type=float, default=20.0, help='last candidate (default 20)')
+    parser.add_argument('--step', type=float, default=0.25, help='step between candidates (default 0.25)')
+    parser.add_argument('--area', action='append', metavar='AREA',
+        help='only simulate this area (lowercase, e.g. "washtenaw county"); repeatable')
+    parser.add_argument('--db', default=living_wage.DB_NAME, help='SQL database to read')
+    parser.add_argument('--csv', metavar='FILE', help='also write the summary for each candidate to FILE')
+    args = parser.parse_args()
+
+    if args.wages and min(args.wages) <= 0:
+        sys.exit("[Error message]: Every value of --wages must be above 0.")
+    if not args.wages and args.step <= 0:
+        sys.exit("[Error message]: --step must be above 0.")
+    if not args.wages and args.stop < args.start:
+        sys.exit("[Error message]: --to must not be below --from.")
+
+    schema_error = living_wage.schema_error(args.db)
+    if schema_error:
+        sys.exit(f"[Error message]: {schema_error}.")
+    wage_matrix = load_wage_matrix(args.db, args.area)
+    if not wage_matrix['areas']:
+        sys.exit("[Error message]: No matching areas in the database.")
+    if args.wages:
+        candidates = args.wages
+    else:
+        candidates = candidate_range(args.start, args.stop, args.step)
+    results = simulate_minimum_wages(wage_matrix, candidates)
+
+    dash_lines = ("-" * 50)
+    print(dash_lines)
+    print(f"{len(results['minimum_wages'])} minimum wages x {len(wage_matrix['areas'])} areas "
+        f"x {len(wage_matrix['compositions'])} family compositions")
+    print(dash_lines)
+    print(f"{'Minimum wage':>12}  {'Mean gap':>9}  {'Below living wage':>17}  {'Hours needed/week':>17}")
+    for i, minimum_wage in enumerate(results['minimum_wages']):
+        print(f"{minimum_wage:>12.2f}  {results['mean_gap'][i]:>9.2f}  "
+            f"{results['share_below'][i]:>16.1%}  {results['mean_hours_needed'][i]:>17.1f}")
+
+    if args.csv:
+        with open(args.csv, 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            header = ['minimum wage', 'mean gap', 'share below living wage', 'mean hours needed']
+            for number_of_adults, number_of_children in wage_matrix['compositions']:
+                header.append(f'share below: {number_of_adults}, {number_of_children} children')
+            writer.writerow(header)
+            for i, minimum_wage in enumerate(results['minimum_wages']):
+                writer.writerow([minimum_wage, results['mean_gap'][i], results['share_below'][i],
+                    results['mean_hours_needed'][i]] + list(results['share_below_by_composition'][i]))
+
+
+if __name__ == "__main__":
+    main()
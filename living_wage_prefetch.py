@@ -0,0 +1,193 @@
+##############################################
+######  Background prefetch of graphs  #######
+######  for the interactive session    #######
+##############################################
+''' Builds the plotly graphs of an area on a background thread while the user
+is still reading its wages table, so that "w" and "e" in living_wage.py show
+the graph right away instead of querying and building it on demand.
+
+When an area is selected, its graphs are queued first, then the graphs of its
+neighbors in the area list, then those of the areas picked most often in the
+session (the popular ones, which the user keeps coming back to). Graphs queued
+for an earlier selection that haven't started yet are dropped, so the worker is
+never busy with areas the user has moved away from. Finished graphs are kept
+for the last max_areas areas (least recently used are dropped first).
+
+Like the query cache of living_wage.py, graphs are keyed by the generation of
+the database as well as by the area, so a rebuild never serves a graph of the
+old database: old graphs are no longer asked for, and their queued builds are
+dropped on the next selection.
+
+The prefetcher knows nothing about the database: living_wage.py passes in the
+functions that build each kind of graph, e.g. build_avg_gap_figure().
+'''
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import living_wage_metrics as metrics
+
+
+##############################################
+############## global variables ##############
+##############################################
+## number of areas whose graphs are kept
+DEFAULT_MAX_AREAS = 8
+
+## number of popular areas queued after the neighbors of the selected area
+DEFAULT_POPULAR_AREAS = 2
+
+PREFETCH_HITS = metrics.counter('prefetch_hits_total', 'Graphs that were already built or being built when asked for')
+PREFETCH_MISSES = metrics.counter('prefetch_misses_total', 'Graphs that had to be built when asked for')
+PREFETCH_WAIT_SECONDS = metrics.histogram('prefetch_wait_seconds', 'Time spent waiting for a graph when asked for')
+
+
+##############################################
+############# classes & objects ##############
+##############################################
+class Prefetcher:
+    ''' Builds results (e.g. plotly figures) for areas on one background thread.
+
+    Instance Attributes
+    -------------------
+    builders: dict
+        key is a kind of result (e.g. 'gap') and value is a function that takes
+        an area name and builds that result
+    max_areas: int
+        the number of areas whose results are kept
+    popular_areas: int
+        the number of popular areas queued after the neighbors (see popular_names())
+    generation_function: function
+        called without arguments; returns the current generation of the
+        database (e.g. living_wage.db_generation()), or None if it never changes
+    futures: OrderedDict
+        key is (database generation, area name) and value is a dictionary that maps
+        each kind to the Future of its result, least recently used area first
+    pick_counts: dict
+        key is an area name and value is the number of times it was selected
+    '''
+    def __init__(self, builders, max_areas=DEFAULT_MAX_AREAS, popular_areas=DEFAULT_POPULAR_AREAS,
+            generation_function=None):
+        self.builders = builders
+        self.max_areas = max_areas
+        self.popular_areas = popular_areas
+        self.generation_function = generation_function or (lambda: None)
+        self.futures = OrderedDict()
+        self.pick_counts = {}
+        self.lock = threading.Lock()
+        self.work_queue = queue.Queue()
+        ## a daemon thread, so that leaving the program never waits for a graph
+        self.thread = threading.Thread(target=self.work, name='prefetch', daemon=True)
+        self.thread.start()
+
+    def work(self):
+        while True:
+            future, builder, area_name = self.work_queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(builder(area_name))
+            except BaseException as error:
+                future.set_exception(error)
+
+    def submit(self, area_key):
+        ''' Queues every kind of result of an area that isn't kept or queued yet. Call with the lock held. '''
+        area_futures = self.futures.setdefault(area_key, {})
+        self.futures.move_to_end(area_key)
+        for kind, builder in self.builders.items():
+            if kind not in area_futures:
+                future = Future()
+                area_futures[kind] = future
+                self.work_queue.put((future, builder, area_key[1]))
+
+    def trim(self):
+        ''' Drops the least recently used areas beyond max_areas. Call with the lock held. '''
+        while len(self.futures) > self.max_areas:
+            _, area_futures = self.futures.popitem(last=False)
+            for future in area_futures.values():
+                future.cancel()
+
+    def popular_names(self, excluded_names=()):
+        ''' Returns up to popular_areas areas selected more than once, most selected
+        first (the earliest selected first among equals). Call with the lock held.
+        '''
+        popular_names = sorted((name for name, count in self.pick_counts.items()
+            if count > 1 and name not in excluded_names), key=lambda name: -self.pick_counts[name])
+        return popular_names[:self.popular_areas]
+
+    def prefetch(self, area_name, neighbor_names=()):
+        ''' Starts building the results of an area, then of its neighbors, then of
+        the popular areas (see popular_names()).
+
+        Parameters
+        ----------
+        area_name: string
+            the selected area, in the format the builders expect (e.g. 'washtenaw county')
+        neighbor_names: list
+            areas the user is likely to pick next, most likely first
+
+        Returns
+        -------
+        None
+        '''
+        generation = self.generation_function()
+        with self.lock:
+            self.pick_counts[area_name] = self.pick_counts.get(area_name, 0) + 1
+            wanted_names = [area_name] + [name for name in neighbor_names if name != area_name]
+            wanted_names += self.popular_names(wanted_names)
+            wanted_keys = [(generation, name) for name in wanted_names]
+
+            ## drop queued work for areas that are no longer wanted, or for an older database
+            for other_key, area_futures in list(self.futures.items()):
+                if other_key in wanted_keys:
+                    continue
+                for kind, future in list(area_futures.items()):
+                    if future.cancel():
+                        del area_futures[kind]
+                if not area_futures:
+                    del self.futures[other_key]
+
+            for area_key in wanted_keys:
+                self.submit(area_key)
+            ## the selected area is the most recently used one
+            self.futures.move_to_end((generation, area_name))
+            self.trim()
+
+    def get(self, kind, area_name):
+        ''' Returns a result, waiting for it if it is being built, or building it now if it was never queued.
+
+        Parameters
+        ----------
+        kind: string
+            a key of builders, e.g. 'gap'
+        area_name: string
+            the area, in the format the builders expect
+
+        Returns
+        -------
+        object
+            whatever the builder returns; an error raised by the builder is raised again here
+        '''
+        area_key = (self.generation_function(), area_name)
+        with self.lock:
+            future = self.futures.get(area_key, {}).get(kind)
+            if future is not None and future.cancelled():
+                future = None
+            if future is not None:
+                self.futures.move_to_end(area_key)
+
+        if future is None:
+            PREFETCH_MISSES.inc()
+            result = self.builders[kind](area_name)
+            with self.lock:
+                done_future = Future()
+                done_future.set_result(result)
+                self.futures.setdefault(area_key, {})[kind] = done_future
+                self.futures.move_to_end(area_key)
+                self.trim()
+            return result
+
+        PREFETCH_HITS.inc()
+        with PREFETCH_WAIT_SECONDS.time():
+            return future.result()
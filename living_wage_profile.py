@@ -0,0 +1,188 @@
+##############################################
+#######  Profiler for a full run,  ###########
+#######  stage by stage            ###########
+##############################################
+''' Profiles the stages of a run of living_wage.py (see run_profile() there,
+started with "python3 living_wage.py --profile DIR"), and writes to DIR:
+    * one cProfile file per stage, e.g. 03-parse_wages.pstats, to open with
+      "python3 -m pstats", snakeviz, or any other pstats viewer,
+    * profile.collapsed, the call stacks sampled every SAMPLE_INTERVAL_SECONDS
+      in the collapsed format read by flamegraph.pl, speedscope and inferno,
+      with the stage as the root of every stack and the microseconds spent
+      in each stack as its count, and
+    * summary.txt, the wall time of each stage and its slowest functions.
+
+The stacks are sampled from a background thread while cProfile runs, so the
+flame graph includes cProfile's overhead, which makes Python-heavy code look
+a little slower than it is next to time spent in C (e.g. SQLite). The
+interpreter's thread switch interval is lowered to the sample interval while
+profiling, so the sampler isn't held back by the main thread.
+'''
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+
+##############################################
+############## global variables ##############
+##############################################
+## seconds between two samples of the call stack
+SAMPLE_INTERVAL_SECONDS = 0.001
+
+## functions listed per stage in summary.txt
+SUMMARY_FUNCTIONS = 15
+
+COLLAPSED_FILENAME = 'profile.collapsed'
+SUMMARY_FILENAME = 'summary.txt'
+
+
+##############################################
+############# classes & objects ##############
+##############################################
+class StackSampler:
+    ''' Samples the call stack of one thread at a fixed interval, from a background thread.
+
+    Instance Attributes
+    -------------------
+    stack_counts: Counter
+        key is a collapsed stack ('stage;outer function;...;inner function')
+        and value is the microseconds attributed to it: each sample counts
+        the time since the previous one
+    stage: string
+        the root of the stacks sampled from now on, or None to pause sampling
+    '''
+    def __init__(self, thread_id, interval_seconds=SAMPLE_INTERVAL_SECONDS):
+        self.thread_id = thread_id
+        self.interval_seconds = interval_seconds
+        self.stack_counts = Counter()
+        self.stage = None
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def run(self):
+        previous_sample_time = time.perf_counter()
+        while not self.stop_event.wait(self.interval_seconds):
+            sample_time = time.perf_counter()
+            elapsed_microseconds = round((sample_time - previous_sample_time) * 1e6)
+            previous_sample_time = sample_time
+            stage = self.stage
+            frame = sys._current_frames().get(self.thread_id)
+            if stage is None or frame is None:
+                continue
+            frame_names = []
+            while frame is not None:
+                frame_names.append(frame_name(frame))
+                frame = frame.f_back
+            frame_names.append(stage)
+            self.stack_counts[';'.join(reversed(frame_names))] += elapsed_microseconds
+
+
+class StageProfiler:
+    ''' Profiles one stage at a time with cProfile and samples its call stacks.
+    Use it as a context manager, and profile each stage in a with stage() block.
+
+    Instance Attributes
+    -------------------
+    output_dir: string
+        the folder the profiles are written to
+    stage_list: list
+        (stage name, seconds, pstats.Stats) of every stage profiled so far
+    '''
+    def __init__(self, output_dir, interval_seconds=SAMPLE_INTERVAL_SECONDS):
+        self.output_dir = output_dir
+        self.stage_list = []
+        self.sampler = StackSampler(threading.get_ident(), interval_seconds)
+        self.switch_interval = None
+
+    def __enter__(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self.switch_interval, self.sampler.interval_seconds))
+        self.sampler.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.sampler.stop()
+        sys.setswitchinterval(self.switch_interval)
+        self.write_collapsed_stacks()
+        self.write_summary()
+
+    @contextmanager
+    def stage(self, stage_name):
+        ''' Profiles the code in the with block as the stage stage_name.
+
+        Parameters
+        ----------
+        stage_name: string
+            e.g. 'parse_wages'; used in the name of the .pstats file and as
+            the root of the collapsed stacks
+
+        Returns
+        -------
+        None
+        '''
+        profile = cProfile.Profile()
+        self.sampler.stage = stage_name
+        stage_start = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            seconds = time.perf_counter() - stage_start
+            self.sampler.stage = None
+            pstats_filename = os.path.join(self.output_dir, f'{len(self.stage_list) + 1:02d}-{stage_name}.pstats')
+            profile.dump_stats(pstats_filename)
+            self.stage_list.append((stage_name, seconds, pstats.Stats(profile)))
+
+    def write_collapsed_stacks(self):
+        ''' Writes the sampled stacks to COLLAPSED_FILENAME, one 'stack count' line each. '''
+        with open(os.path.join(self.output_dir, COLLAPSED_FILENAME), 'w') as collapsed_file:
+            for stack, count in sorted(self.sampler.stack_counts.items()):
+                collapsed_file.write(f'{stack} {count}\n')
+
+    def write_summary(self):
+        ''' Writes the wall time of every stage and its slowest functions to SUMMARY_FILENAME. '''
+        total_seconds = sum(seconds for _, seconds, _ in self.stage_list)
+        with open(os.path.join(self.output_dir, SUMMARY_FILENAME), 'w') as summary_file:
+            summary_file.write(f'{"stage":<20}{"seconds":>10}{"share":>8}\n')
+            for stage_name, seconds, _ in self.stage_list:
+                share = seconds / total_seconds if total_seconds else 0
+                summary_file.write(f'{stage_name:<20}{seconds:>10.3f}{share:>8.1%}\n')
+            summary_file.write(f'{"total":<20}{total_seconds:>10.3f}\n')
+            for stage_name, seconds, stats in self.stage_list:
+                stats_text = io.StringIO()
+                stats.stream = stats_text
+                stats.sort_stats('cumulative').print_stats(SUMMARY_FUNCTIONS)
+                summary_file.write(f'\n{"=" * 20} {stage_name} ({seconds:.3f} s) {"=" * 20}\n')
+                summary_file.write(stats_text.getvalue())
+
+    def print_summary(self):
+        ''' Prints the wall time of every stage. '''
+        for stage_name, seconds, _ in self.stage_list:
+            print(f'{stage_name:<20}{seconds:>10.3f} s')
+        print(f'Profiles written to {self.output_dir}')
+
+
+##############################################
+################# functions ##################
+##############################################
+def frame_name(frame):
+    ''' Names the function of a stack frame for the collapsed stacks,
+    e.g. 'scrape_wages_tables (living_wage.py:886)'.
+    '''
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
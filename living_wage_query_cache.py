@@ -0,0 +1,207 @@
+##############################################
+######  Result cache for the SQL queries  ####
+######  of living_wage.py                 ####
+##############################################
+''' A bounded, least-recently-used cache for the results of the functions in
+living_wage.py that query the SQL database (access_sql_table(),
+avg_living_wage(), the extract_*_expenses() functions, ...).
+
+The database only changes when it is built or loaded again, so every cached
+result is keyed by the generation of the database it was read from, as well
+as by the function and its arguments. Once the database changes, the old
+entries are simply never asked for again, and are dropped as the least
+recently used.
+
+The cache is bounded both by the number of entries and by the approximate
+size of the results in bytes. The rows of a query function's results all have
+the same shape, so a row is only measured in its first result and every later
+result is sized from its row count, which keeps a miss cheap next to the query.
+stats() returns the hits, misses, evictions
+and size, for tuning max_entries and max_bytes.
+'''
+import functools
+import sys
+import threading
+from collections import OrderedDict
+
+import living_wage_metrics as metrics
+
+
+##############################################
+############## global variables ##############
+##############################################
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+QUERY_CACHE_HITS = metrics.counter('query_cache_hits_total', 'Query results served from the result cache')
+QUERY_CACHE_MISSES = metrics.counter('query_cache_misses_total', 'Query results that had to be read from the database')
+QUERY_CACHE_EVICTIONS = metrics.counter('query_cache_evictions_total', 'Query results dropped from the result cache')
+QUERY_CACHE_BYTES = metrics.gauge('query_cache_bytes', 'Approximate size of the results in the result cache')
+
+
+##############################################
+############# classes & objects ##############
+##############################################
+class QueryCache:
+    ''' A thread-safe LRU cache of query results, bounded by entries and bytes.
+
+    Instance Attributes
+    -------------------
+    max_entries: int
+        the maximum number of results kept
+    max_bytes: int
+        the maximum approximate size of the results kept, in bytes
+    entries: OrderedDict
+        key is (function name, database generation, arguments) and value is
+        (result, size in bytes), least recently used first
+    size_bytes: int
+        the approximate size of the results kept, in bytes
+    row_size_dict: dict
+        key is a query function name and value is the approximate size of one
+        row of its results, in bytes (see result_size())
+    hits, misses, evictions: int
+        counts since the cache was made or last cleared
+    '''
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size_bytes = 0
+        self.row_size_dict = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get_or_compute(self, key, compute, size_key=None):
+        ''' Returns the result kept under key, or computes, keeps and returns it.
+
+        Parameters
+        ----------
+        key: tuple
+            a hashable key that includes the database generation
+        compute: function
+            called without arguments to get the result on a miss
+        size_key: string
+            the name of the query function, whose results all have rows of the
+            same shape (see result_size()), or None to measure every result in full
+
+        Returns
+        -------
+        object
+            the result; lists and dictionaries are copied, so callers can change them freely
+        '''
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                QUERY_CACHE_HITS.inc()
+                return copy_result(entry[0])
+            self.misses += 1
+        QUERY_CACHE_MISSES.inc()
+
+        result = compute()
+        result_size = estimate_size(result) if size_key is None else self.result_size(size_key, result)
+        if result_size > self.max_bytes:
+            return result
+
+        with self.lock:
+            old_entry = self.entries.pop(key, None)
+            if old_entry is not None:
+                self.size_bytes -= old_entry[1]
+            self.entries[key] = (result, result_size)
+            self.size_bytes += result_size
+            while len(self.entries) > self.max_entries or self.size_bytes > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.size_bytes -= evicted_size
+                self.evictions += 1
+                QUERY_CACHE_EVICTIONS.inc()
+            QUERY_CACHE_BYTES.set(self.size_bytes)
+        return copy_result(result)
+
+    def result_size(self, size_key, result):
+        ''' Returns the approximate size of a result in bytes. The size of one row
+        is measured in the first result of each size_key (see estimate_size()),
+        and later results are sized from their number of rows.
+        '''
+        if not isinstance(result, (tuple, list, dict)) or not result:
+            return estimate_size(result)
+        row_size = self.row_size_dict.get(size_key)
+        if row_size is None:
+            row_size = (estimate_size(result) - sys.getsizeof(result)) / len(result)
+            self.row_size_dict[size_key] = row_size
+        return sys.getsizeof(result) + int(len(result) * row_size)
+
+    def memoize(self, generation_function):
+        ''' Makes a decorator that caches the results of a query function.
+
+        Parameters
+        ----------
+        generation_function: function
+            called without arguments on every call; returns the current
+            generation of the database (anything hashable)
+
+        Returns
+        -------
+        function
+            the decorator
+        '''
+        def decorator(query_function):
+            @functools.wraps(query_function)
+            def cached_query_function(*args, **kwargs):
+                key = (query_function.__name__, generation_function(), args, tuple(sorted(kwargs.items())) if kwargs else ())
+                return self.get_or_compute(key, lambda: query_function(*args, **kwargs), query_function.__name__)
+            cached_query_function.uncached = query_function
+            return cached_query_function
+        return decorator
+
+    def clear(self):
+        ''' Drops every result and resets the counts. '''
+        with self.lock:
+            self.entries.clear()
+            self.size_bytes = 0
+            self.hits = self.misses = self.evictions = 0
+            QUERY_CACHE_BYTES.set(0)
+
+    def stats(self):
+        ''' Returns the hits, misses, hit rate, evictions, entries and size of the cache as a dictionary. '''
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': self.size_bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+            }
+
+
+##############################################
+################# functions ##################
+##############################################
+def estimate_size(value):
+    ''' Returns the approximate size of a query result in bytes. The rows of a
+    query result all have the same shape, so only the first item of each
+    tuple, list or dictionary is measured and counted once per item.
+    '''
+    size = sys.getsizeof(value)
+    if isinstance(value, (tuple, list)) and value:
+        if isinstance(value[0], (tuple, list, dict)):
+            size += len(value) * estimate_size(value[0])
+        else:
+            size += sum(sys.getsizeof(item) for item in value)
+    elif isinstance(value, dict) and value:
+        key, item = next(iter(value.items()))
+        size += len(value) * (estimate_size(key) + estimate_size(item))
+    return size
+
+
+def copy_result(result):
+    ''' Copies the outer list or dictionary of a result; tuples and numbers are returned as they are. '''
+    if isinstance(result, (list, dict)):
+        return result.copy()
+    return result
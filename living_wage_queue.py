@@ -0,0 +1,413 @@
+##############################################
+######  Distributed crawl: a durable   #######
+######  work queue, workers and a      #######
+######  coordinator                    #######
+##############################################
+''' Splits the crawl in living_wage.py across several worker processes, on one
+machine or on several machines that share a folder.
+
+The queue is a SQLite database (living_wage_queue.sqlite by default):
+    * seed fills it with one job per county and MSA page, found on the state
+      page just like build_combined_dict() does,
+    * each worker claims one job at a time with a lease, fetches and parses the
+      page with the scrapers in living_wage.py, and submits the record (the
+      area's wages and expenses). While it works, a heartbeat thread keeps
+      extending the lease. If a worker dies, its lease runs out and another
+      worker claims the job again; a job that fails MAX_ATTEMPTS times is
+      marked failed,
+    * merge (the coordinator) builds the SQL database from the submitted
+      records, with build_database() in living_wage.py, once every job is done.
+
+Usage:
+    python3 living_wage_queue.py seed
+    python3 living_wage_queue.py worker --worker-id laptop-1      (as many as you like)
+    python3 living_wage_queue.py status
+    python3 living_wage_queue.py merge
+    python3 living_wage_queue.py run --workers 4                  (all of the above, locally)
+
+Add --base-url http://127.0.0.1:8026 --max-rate 0 before the command to crawl
+the local stand-in site (living_wage_site.py) instead of the MIT website.
+Workers on other machines need the queue on a shared folder whose file
+system supports locks.
+'''
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+
+import living_wage
+import living_wage_metrics as metrics
+
+
+##############################################
+############## global variables ##############
+##############################################
+QUEUE_FILENAME = 'living_wage_queue.sqlite'
+
+## seconds a claimed job stays with its worker without a heartbeat
+LEASE_SECONDS = 60
+## a job that failed this many times is not tried again
+MAX_ATTEMPTS = 3
+## seconds an idle worker waits before asking for work again
+POLL_SECONDS = 0.5
+
+JOBS_CLAIMED = metrics.counter('queue_jobs_claimed_total', 'Jobs claimed from the work queue')
+JOBS_COMPLETED = metrics.counter('queue_jobs_completed_total', 'Jobs whose record was submitted')
+JOBS_FAILED = metrics.counter('queue_jobs_failed_total', 'Jobs that raised an error')
+LEASES_LOST = metrics.counter('queue_leases_lost_total', 'Records dropped because the lease had run out')
+
+
+##############################################
+############# classes & objects ##############
+##############################################
+class WorkQueue:
+    ''' A durable queue of crawl jobs, with leases, stored in a SQLite database.
+    Every method opens its own connection, so a WorkQueue can be shared by threads.
+
+    Instance Attributes
+    -------------------
+    queue_filename: string
+        the SQLite database of the queue
+    '''
+    def __init__(self, queue_filename=QUEUE_FILENAME):
+        self.queue_filename = queue_filename
+        conn = self.connect()
+        ## write-ahead logging lets workers read while another one writes
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS "Jobs" (
+                "Id" INTEGER PRIMARY KEY AUTOINCREMENT,
+                "Url" TEXT NOT NULL UNIQUE,
+                "Area" TEXT NOT NULL,
+                "Status" TEXT NOT NULL DEFAULT 'pending',
+                "Worker" TEXT,
+                "Lease Expires" REAL,
+                "Attempts" INTEGER NOT NULL DEFAULT 0,
+                "Error" TEXT,
+                "Record" TEXT
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS "JobsStatus" ON "Jobs" ("Status", "Id")')
+        conn.close()
+
+    def connect(self):
+        ## autocommit mode; the methods that change several rows use BEGIN IMMEDIATE
+        return sqlite3.connect(self.queue_filename, timeout=30, isolation_level=None)
+
+    def add_jobs(self, area_url_dict, reset=False):
+        ''' Adds one job per area; areas already in the queue are skipped.
+
+        Parameters
+        ----------
+        area_url_dict: dict
+            key is an area name and value is the URL of its page (see build_combined_dict())
+        reset: bool
+            empty the queue first, e.g. for a new refresh
+
+        Returns
+        -------
+        int
+            the number of jobs added
+        '''
+        conn = self.connect()
+        conn.execute('BEGIN IMMEDIATE')
+        if reset:
+            conn.execute('DELETE FROM Jobs')
+        cur = conn.executemany('INSERT OR IGNORE INTO Jobs (Url, Area) VALUES (?, ?)',
+            [(url, area_name) for area_name, url in area_url_dict.items()])
+        added_count = cur.rowcount
+        conn.execute('COMMIT')
+        conn.close()
+        return added_count
+
+    def claim(self, worker_id, lease_seconds=LEASE_SECONDS):
+        ''' Claims the oldest pending job, or a job whose lease ran out.
+
+        Parameters
+        ----------
+        worker_id: string
+            the worker claiming the job
+        lease_seconds: float
+            how long the job stays with the worker without a heartbeat
+
+        Returns
+        -------
+        tuple
+            (job id, URL, area name), or None if no job can be claimed right now
+        '''
+        now = time.time()
+        conn = self.connect()
+        conn.execute('BEGIN IMMEDIATE')
+        job = conn.execute('''
+            SELECT Id, Url, Area
+            FROM Jobs
+            WHERE (Status = 'pending' OR (Status = 'leased' AND [Lease Expires] < ?))
+                AND Attempts < ?
+            ORDER BY Id
+            LIMIT 1
+        ''', [now, MAX_ATTEMPTS]).fetchone()
+        if job is not None:
+            conn.execute('''
+                UPDATE Jobs
+                SET Status = 'leased', Worker = ?, [Lease Expires] = ?, Attempts = Attempts + 1
+                WHERE Id = ?
+            ''', [worker_id, now + lease_seconds, job[0]])
+            JOBS_CLAIMED.inc()
+        ## jobs whose last lease ran out on their final attempt will never be claimed again
+        conn.execute('''
+            UPDATE Jobs
+            SET Status = 'failed', Error = COALESCE(Error, 'lease expired')
+            WHERE Status = 'leased' AND [Lease Expires] < ? AND Attempts >= ?
+        ''', [now, MAX_ATTEMPTS])
+        conn.execute('COMMIT')
+        conn.close()
+        return job
+
+    def heartbeat(self, worker_id, job_id, lease_seconds=LEASE_SECONDS):
+        ''' Extends the lease of a job. Returns False if the job is no longer leased to this worker. '''
+        conn = self.connect()
+        cur = conn.execute('''
+            UPDATE Jobs
+            SET [Lease Expires] = ?
+            WHERE Id = ? AND Worker = ? AND Status = 'leased'
+        ''', [time.time() + lease_seconds, job_id, worker_id])
+        conn.close()
+        return cur.rowcount == 1
+
+    def complete(self, worker_id, job_id, record):
+        ''' Submits the record of a job. Returns False (and drops the record) if the
+        job is no longer leased to this worker, e.g. because its lease ran out.
+        '''
+        conn = self.connect()
+        cur = conn.execute('''
+            UPDATE Jobs
+            SET Status = 'done', Record = ?, Error = NULL, [Lease Expires] = NULL
+            WHERE Id = ? AND Worker = ? AND Status = 'leased'
+        ''', [json.dumps(record), job_id, worker_id])
+        conn.close()
+        return cur.rowcount == 1
+
+    def fail(self, worker_id, job_id, error):
+        ''' Gives a job back after an error; it is tried again until MAX_ATTEMPTS. '''
+        conn = self.connect()
+        conn.execute('''
+            UPDATE Jobs
+            SET Status = CASE WHEN Attempts >= ? THEN 'failed' ELSE 'pending' END,
+                Error = ?, [Lease Expires] = NULL
+            WHERE Id = ? AND Worker = ? AND Status = 'leased'
+        ''', [MAX_ATTEMPTS, str(error), job_id, worker_id])
+        conn.close()
+
+    def counts(self):
+        ''' Returns a dictionary that maps each status (pending, leased, done, failed) to its number of jobs. '''
+        conn = self.connect()
+        rows = conn.execute('SELECT Status, COUNT(*) FROM Jobs GROUP BY Status').fetchall()
+        conn.close()
+        status_counts = {'pending': 0, 'leased': 0, 'done': 0, 'failed': 0}
+        status_counts.update(dict(rows))
+        return status_counts
+
+    def failures(self):
+        ''' Returns a list of (URL, error) tuples of the failed jobs. '''
+        conn = self.connect()
+        rows = conn.execute("SELECT Url, Error FROM Jobs WHERE Status = 'failed' ORDER BY Id").fetchall()
+        conn.close()
+        return rows
+
+    def records(self):
+        ''' Returns a list of (area name, record) tuples of the done jobs, in the order they were added. '''
+        conn = self.connect()
+        rows = conn.execute("SELECT Area, Record FROM Jobs WHERE Status = 'done' ORDER BY Id").fetchall()
+        conn.close()
+        return [(area_name, json.loads(record)) for area_name, record in rows]
+
+
+##############################################
+################# functions ##################
+##############################################
+def crawl_job(url):
+    ''' Fetches (or reads from the cache) and parses one area page.
+
+    Parameters
+    ----------
+    url: string
+        the URL of a county or MSA page
+
+    Returns
+    -------
+    dict
+        'wages': see scrape_wages_tables(), 'expenses': see scrape_expenses_tables()
+    '''
+    return {
+        'wages': living_wage.scrape_wages_tables(url),
+        'expenses': living_wage.scrape_expenses_tables(url),
+    }
+
+
+def run_worker(work_queue, worker_id, lease_seconds=LEASE_SECONDS):
+    ''' Claims, crawls and submits jobs until every job is done or failed.
+
+    Parameters
+    ----------
+    work_queue: WorkQueue
+        the queue
+    worker_id: string
+        the name of this worker, unique across machines
+    lease_seconds: float
+        how long a claimed job stays with this worker without a heartbeat
+
+    Returns
+    -------
+    int
+        the number of records this worker submitted
+    '''
+    submitted_count = 0
+    while True:
+        job = work_queue.claim(worker_id, lease_seconds)
+        if job is None:
+            status_counts = work_queue.counts()
+            if status_counts['pending'] == 0 and status_counts['leased'] == 0:
+                return submitted_count
+            ## other workers hold the remaining jobs; wait in case one of them dies
+            time.sleep(POLL_SECONDS)
+            continue
+
+        job_id, url, area_name = job
+        job_finished = threading.Event()
+
+        def keep_lease():
+            while not job_finished.wait(lease_seconds / 3):
+                if not work_queue.heartbeat(worker_id, job_id, lease_seconds):
+                    return
+
+        heartbeat_thread = threading.Thread(target=keep_lease, daemon=True)
+        heartbeat_thread.start()
+        try:
+            record = crawl_job(url)
+        except Exception as error:
+            JOBS_FAILED.inc()
+            work_queue.fail(worker_id, job_id, f'{type(error).__name__}: {error}')
+            continue
+        finally:
+            job_finished.set()
+            heartbeat_thread.join()
+
+        if work_queue.complete(worker_id, job_id, record):
+            JOBS_COMPLETED.inc()
+            submitted_count += 1
+        else:
+            LEASES_LOST.inc()
+
+
+def merge_records(work_queue):
+    ''' Builds the SQL database from the records submitted by the workers (see build_database()).
+
+    Parameters
+    ----------
+    work_queue: WorkQueue
+        the queue, with every job done
+
+    Returns
+    -------
+    int
+        the number of areas loaded
+    '''
+    wages = {}
+    expenses = {}
+    for area_name, record in work_queue.records():
+        wages[area_name] = record['wages']
+        expenses[area_name] = record['expenses']
+    living_wage.build_database(wages=wages, expenses=expenses)
+    return len(wages)
+
+
+def print_status(work_queue):
+    status_counts = work_queue.counts()
+    print(", ".join(f"{status}: {count}" for status, count in status_counts.items()))
+    for url, error in work_queue.failures():
+        print(f"[Error message]: {url} failed: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Crawl the MIT Living Wage website with several workers.')
+    parser.add_argument('--queue', default=QUEUE_FILENAME, help=f'SQLite file of the queue (default: {QUEUE_FILENAME})')
+    parser.add_argument('--base-url', metavar='URL', help='crawl this server instead of https://livingwage.mit.edu')
+    parser.add_argument('--max-rate', type=float, metavar='N',
+        help='at most N requests per second for each worker (0 = no limit)')
+    parser.add_argument('--max-page-bytes', type=int, metavar='N',
+        help=f'refuse pages bigger than N bytes (default: {living_wage.MAX_PAGE_BYTES:,})')
+    parser.add_argument('--lease-seconds', type=float, default=LEASE_SECONDS)
+    parser.add_argument('--db', default=living_wage.DB_NAME, help='SQL database that merge builds')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    seed_parser = subparsers.add_parser('seed', help='fill the queue with every county and MSA page')
+    seed_parser.add_argument('--reset', action='store_true', help='empty the queue first')
+    worker_parser = subparsers.add_parser('worker', help='claim and crawl jobs until the queue is empty')
+    worker_parser.add_argument('--worker-id', default=f'{socket.gethostname()}-{os.getpid()}')
+    subparsers.add_parser('status', help='print the number of jobs in each status')
+    subparsers.add_parser('merge', help='build the SQL database from the submitted records')
+    run_parser = subparsers.add_parser('run', help='seed, run local workers, then merge')
+    run_parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    if args.base_url:
+        living_wage.set_base_url(args.base_url)
+    if args.max_rate is not None:
+        living_wage.set_max_rate(args.max_rate)
+    if args.max_page_bytes is not None:
+        if args.max_page_bytes <= 0:
+            sys.exit("[Error message]: --max-page-bytes must be above 0.")
+        living_wage.MAX_PAGE_BYTES = args.max_page_bytes
+    living_wage.DB_NAME = args.db
+    work_queue = WorkQueue(args.queue)
+
+    if args.command in ('seed', 'worker', 'run', 'merge'):
+        living_wage.CACHE_DICT.update(living_wage.open_cache())
+        living_wage.CACHE_META_DICT.update(living_wage.open_cache_meta())
+        living_wage.FRAGMENT_DICT.update(living_wage.open_fragment_cache())
+        living_wage.PARSE_DICT.update(living_wage.open_parse_cache())
+        living_wage.FRONTIER_DICT.update(living_wage.open_frontier())
+
+    if args.command in ('seed', 'run'):
+        added_count = work_queue.add_jobs(living_wage.build_combined_dict(), reset=args.command == 'run' or args.reset)
+        living_wage.save_frontier(living_wage.FRONTIER_DICT)
+        print(f"Added {added_count} jobs")
+
+    if args.command == 'worker':
+        submitted_count = run_worker(work_queue, args.worker_id, args.lease_seconds)
+        living_wage.save_fragment_cache(living_wage.FRAGMENT_DICT)
+        living_wage.save_parse_cache(living_wage.PARSE_DICT)
+        living_wage.save_cache_meta(living_wage.CACHE_META_DICT)
+        print(f"{args.worker_id} submitted {submitted_count} records")
+
+    elif args.command == 'run':
+        worker_command = [sys.executable, os.path.abspath(__file__), '--queue', args.queue,
+            '--lease-seconds', str(args.lease_seconds), '--db', args.db]
+        if args.base_url:
+            worker_command += ['--base-url', args.base_url]
+        if args.max_rate is not None:
+            worker_command += ['--max-rate', str(args.max_rate)]
+        if args.max_page_bytes is not None:
+            worker_command += ['--max-page-bytes', str(args.max_page_bytes)]
+        workers = [subprocess.Popen(worker_command + ['worker', '--worker-id', f'{socket.gethostname()}-worker-{i + 1}'])
+            for i in range(args.workers)]
+        for worker in workers:
+            worker.wait()
+
+    if args.command in ('status', 'run'):
+        print_status(work_queue)
+
+    if args.command in ('merge', 'run'):
+        status_counts = work_queue.counts()
+        if status_counts['done'] == 0 or status_counts['done'] != sum(status_counts.values()):
+            sys.exit("[Error message]: Every job must be done before merging; see the status command.")
+        area_count = merge_records(work_queue)
+        print(f"Loaded {area_count} areas into {living_wage.DB_NAME}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+##############################################
+######  In-memory search over area names  ####
+##############################################
+''' An in-memory search index over counties and MSAs, used by living_wage.py so
+that the user can type part of a name (or a FIPS/CBSA code) instead of looking up
+the area's number in the printed list.
+
+Two indexes are kept:
+    * a sorted list of (token, entry id) pairs, searched with bisect, that finds
+      every entry with a word, the full name, the code or the state starting with
+      the query (prefix matches), and
+    * a trigram index (trigram -> entry ids) that finds names that are close to
+      the query even with a typo, e.g. 'washtenow' -> 'Washtenaw County'.
+
+Results are ranked: exact name or code, then full-name prefix, then word prefix,
+then trigram similarity.
+'''
+import bisect
+import re
+
+
+##############################################
+############## global variables ##############
+##############################################
+## rank of each kind of match (lower is better)
+EXACT_MATCH = 0
+NAME_PREFIX_MATCH = 1
+WORD_PREFIX_MATCH = 2
+FUZZY_MATCH = 3
+
+## trigram matches with a lower similarity than this are dropped
+MIN_SIMILARITY = 0.4
+
+
+##############################################
+############# classes & objects ##############
+##############################################
+class SearchEntry:
+    ''' One area in the search index.
+
+    Instance Attributes
+    -------------------
+    name: string
+        the area name as displayed, e.g. 'Washtenaw County' or 'Ann Arbor, MI'
+    area_type: string
+        'County' or 'MSA'
+    code: string
+        the county FIPS code or the MSA CBSA code, e.g. '26161', or '' if unknown
+    state: string
+        the state abbreviation, e.g. 'MI'
+    value: object
+        whatever the caller wants back for this entry (e.g. the area's number in a list)
+    '''
+    def __init__(self, name, area_type, code='', state='', value=None):
+        self.name = name
+        self.area_type = area_type
+        self.code = code
+        self.state = state
+        self.value = value
+
+
+class AreaSearchIndex:
+    ''' Prefix and typo-tolerant search over area names, codes and states.
+
+    Instance Attributes
+    -------------------
+    entries: list
+        the SearchEntry objects, in the order they were added
+    prefix_keys: list
+        sorted (token, entry id, is full name) tuples for prefix search
+    trigram_dict: dict
+        key is a trigram and value is the set of entry ids whose name contains it
+    trigram_counts: list
+        the number of distinct trigrams in the name of each entry
+    '''
+    def __init__(self, entries=()):
+        self.entries = []
+        self.prefix_keys = []
+        self.trigram_dict = {}
+        self.trigram_counts = []
+        for entry in entries:
+            self.add(entry)
+
+    def add(self, entry):
+        ''' Adds one SearchEntry to the index. '''
+        entry_id = len(self.entries)
+        self.entries.append(entry)
+
+        full_name = normalize(entry.name)
+        keys = [(full_name, entry_id, True)]
+        for word in full_name.split():
+            keys.append((word, entry_id, False))
+        if entry.code:
+            keys.append((entry.code.lower(), entry_id, False))
+        if entry.state:
+            keys.append((entry.state.lower(), entry_id, False))
+        for key in keys:
+            bisect.insort(self.prefix_keys, key)
+
+        name_trigrams = trigrams(full_name)
+        self.trigram_counts.append(len(name_trigrams))
+        for trigram in name_trigrams:
+            self.trigram_dict.setdefault(trigram, set()).add(entry_id)
+
+    def prefix_matches(self, query):
+        ''' Returns a dictionary that maps the id of every entry with a token starting
+        with the query to its match rank (EXACT_MATCH, NAME_PREFIX_MATCH or WORD_PREFIX_MATCH).
+        '''
+        matches = {}
+        position = bisect.bisect_left(self.prefix_keys, (query,))
+        while position < len(self.prefix_keys):
+            token, entry_id, is_full_name = self.prefix_keys[position]
+            if not token.startswith(query):
+                break
+            position += 1
+            if token == query and (is_full_name or token == self.entries[entry_id].code.lower()):
+                match_rank = EXACT_MATCH
+            elif is_full_name:
+                match_rank = NAME_PREFIX_MATCH
+            else:
+                match_rank = WORD_PREFIX_MATCH
+            matches[entry_id] = min(match_rank, matches.get(entry_id, FUZZY_MATCH))
+        return matches
+
+    def fuzzy_matches(self, query):
+        ''' Returns a dictionary that maps the id of every entry whose name shares enough
+        trigrams with the query to its similarity (Dice coefficient, 0 to 1).
+        '''
+        query_trigrams = trigrams(query)
+        if not query_trigrams:
+            return {}
+        shared_counts = {}
+        for trigram in query_trigrams:
+            for entry_id in self.trigram_dict.get(trigram, ()):
+                shared_counts[entry_id] = shared_counts.get(entry_id, 0) + 1
+
+        similarities = {}
+        for entry_id, shared_count in shared_counts.items():
+            similarity = 2 * shared_count / (len(query_trigrams) + self.trigram_counts[entry_id])
+            ## a query that is a fragment of a long name still counts if most of it is found
+            coverage = shared_count / len(query_trigrams)
+            similarity = max(similarity, coverage * 0.9)
+            if similarity >= MIN_SIMILARITY:
+                similarities[entry_id] = similarity
+        return similarities
+
+    def search(self, query, limit=10):
+        ''' Searches the index.
+
+        Parameters
+        ----------
+        query: string
+            part of an area name, a FIPS/CBSA code or a state abbreviation,
+            e.g. 'wash', 'washtenow county', '26161' or 'ann arbor'
+        limit: int
+            the maximum number of results
+
+        Returns
+        -------
+        list
+            a list of (SearchEntry, match rank, similarity) tuples, best first
+        '''
+        query = normalize(query)
+        if not query:
+            return []
+
+        prefix_dict = self.prefix_matches(query)
+        fuzzy_dict = self.fuzzy_matches(query)
+
+        results = []
+        for entry_id in set(prefix_dict) | set(fuzzy_dict):
+            match_rank = prefix_dict.get(entry_id, FUZZY_MATCH)
+            similarity = fuzzy_dict.get(entry_id, 0.0)
+            results.append((match_rank, -similarity, self.entries[entry_id].name, entry_id))
+        results.sort()
+
+        return [(self.entries[entry_id], match_rank, -negative_similarity)
+            for match_rank, negative_similarity, _, entry_id in results[:limit]]
+
+    def search_many(self, queries, limit=1):
+        ''' Searches the index once per query, for batch lookups.
+
+        Parameters
+        ----------
+        queries: list
+            the queries (see search())
+        limit: int
+            the maximum number of results per query
+
+        Returns
+        -------
+        dict
+            key is a query and value is its list of results (see search())
+        '''
+        return {query: self.search(query, limit) for query in queries}
+
+
+##############################################
+################# functions ##################
+##############################################
+def normalize(text):
+    ''' Lowercases text and turns punctuation (other than '-') into single spaces. '''
+    return ' '.join(re.sub(r'[^a-z0-9\-]+', ' ', text.lower()).split())
+
+
+def trigrams(text):
+    ''' Returns the set of 3-character substrings of text, padded with spaces so
+    that the start and end of each word count too.
+    '''
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
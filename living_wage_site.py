@@ -0,0 +1,235 @@
+##############################################
+###  Local stand-in for the MIT Living Wage ###
+###  website, for crawler load testing     ###
+##############################################
+''' A local web server that serves the Michigan locations page and the county
+and MSA pages from a recorded page corpus, so that the crawler in
+living_wage.py can be load-tested without touching the real website.
+
+The server can add latency and jitter to every response, fail a share of the
+requests with a 500 error, and throttle clients with 429 responses (with a
+Retry-After header) once they go over a request rate. GET /__stats returns
+the number of requests, errors and throttled requests so far as JSON.
+
+Usage:
+    python3 living_wage_site.py --port 8026 --latency-ms 50 --jitter-ms 20 --error-rate 0.05 --rate-limit 20
+    python3 living_wage.py --base-url http://127.0.0.1:8026 --max-rate 0
+'''
+import argparse
+import gzip
+import json
+import math
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+
+##############################################
+############## global variables ##############
+##############################################
+DEFAULT_CORPUS_FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    'benchmarks', 'fixtures', 'michigan_pages.json.gz')
+
+STATS_PATH = '/__stats'
+
+
+##############################################
+############# classes & objects ##############
+##############################################
+class SiteConfig:
+    ''' How the stand-in site behaves.
+
+    Instance Attributes
+    -------------------
+    latency_ms: float
+        the delay added to every response, in milliseconds
+    jitter_ms: float
+        a random amount between -jitter_ms and +jitter_ms added to the latency
+    error_rate: float
+        the share of requests (0 to 1) that fail with a 500 error
+    rate_limit: float
+        the number of requests per second allowed before clients get a 429
+        response, or 0 for no limit
+    burst: int
+        the number of requests that may go over the rate limit at once
+    seed: int
+        the seed of the random number generator, so runs are repeatable
+    '''
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, rate_limit=0.0, burst=1, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.seed = seed
+
+
+class TokenBucket:
+    ''' Allows rate_limit requests per second on average, with bursts of up to burst requests. '''
+    def __init__(self, rate_limit, burst):
+        self.rate_limit = rate_limit
+        self.capacity = max(burst, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        ''' Returns True if the request may go through, or False if it should be throttled. '''
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate_limit)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class FakeSite:
+    ''' The stand-in website: a threaded HTTP server plus the pages it serves.
+
+    Instance Attributes
+    -------------------
+    pages: dict
+        key is a URL path (e.g. '/counties/26161') and value is the HTML text of the page
+    config: SiteConfig
+        latency, errors and throttling settings
+    stats: dict
+        counts of requests, pages served, errors, throttled requests and unknown pages
+    '''
+    def __init__(self, corpus, config=None, host='127.0.0.1', port=0):
+        self.pages = {urlsplit(url).path: page for url, page in corpus.items()}
+        self.config = config or SiteConfig()
+        self.random = random.Random(self.config.seed)
+        self.random_lock = threading.Lock()
+        self.bucket = TokenBucket(self.config.rate_limit, self.config.burst) if self.config.rate_limit else None
+        self.stats = {'requests': 0, 'served': 0, 'errors': 0, 'throttled': 0, 'not_found': 0}
+        self.stats_lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self.make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def count(self, key):
+        with self.stats_lock:
+            self.stats[key] += 1
+
+    def draw_latency_and_error(self):
+        with self.random_lock:
+            jitter_ms = self.random.uniform(-self.config.jitter_ms, self.config.jitter_ms)
+            fails = self.random.random() < self.config.error_rate
+        return max(self.config.latency_ms + jitter_ms, 0) / 1000, fails
+
+    def make_handler(self):
+        site = self
+
+        class FakeSiteHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = urlsplit(self.path).path
+                if path == STATS_PATH:
+                    with site.stats_lock:
+                        self.send_body(200, json.dumps(site.stats), 'application/json')
+                    return
+
+                site.count('requests')
+                if site.bucket and not site.bucket.take():
+                    site.count('throttled')
+                    retry_after = max(1, math.ceil(1 / site.config.rate_limit))
+                    self.send_body(429, 'Too Many Requests', headers={'Retry-After': str(retry_after)})
+                    return
+
+                latency_seconds, fails = site.draw_latency_and_error()
+                time.sleep(latency_seconds)
+                if fails:
+                    site.count('errors')
+                    self.send_body(500, 'Internal Server Error')
+                elif path not in site.pages:
+                    site.count('not_found')
+                    self.send_body(404, 'Not Found')
+                else:
+                    site.count('served')
+                    self.send_body(200, site.pages[path])
+
+            def send_body(self, status_code, text, content_type='text/html; charset=utf-8', headers=None):
+                body = text.encode('utf-8')
+                self.send_response(status_code)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return FakeSiteHandler
+
+    def start(self):
+        ''' Starts serving in a background thread and returns the base URL. '''
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+##############################################
+################# functions ##################
+##############################################
+def load_corpus(corpus_filename=DEFAULT_CORPUS_FILENAME):
+    ''' Loads a page corpus: a JSON dictionary that maps each URL to the HTML text of the page,
+    like living_wage_cache.json or the gzipped corpus in benchmarks/fixtures.
+
+    Parameters
+    ----------
+    corpus_filename: string
+        the path of the corpus; files ending in '.gz' are decompressed
+
+    Returns
+    -------
+    dict
+        key is a URL and value is the HTML text of the page
+    '''
+    opener = gzip.open if corpus_filename.endswith('.gz') else open
+    with opener(corpus_filename, 'rt', encoding='utf-8') as corpus_file:
+        return json.load(corpus_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve recorded MIT Living Wage pages locally.')
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS_FILENAME,
+        help='page corpus to serve (a cache JSON file, optionally gzipped)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8026)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='delay added to every response')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='random +/- variation of the delay')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests that fail with a 500 error')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='requests per second before 429 responses (0 = no limit)')
+    parser.add_argument('--burst', type=int, default=1, help='requests allowed over the rate limit at once')
+    parser.add_argument('--seed', type=int, default=None, help='seed for latency jitter and errors')
+    args = parser.parse_args()
+
+    config = SiteConfig(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        rate_limit=args.rate_limit, burst=args.burst, seed=args.seed)
+    site = FakeSite(load_corpus(args.corpus), config, host=args.host, port=args.port)
+    print(f"Serving {len(site.pages)} pages at {site.base_url} (stats at {site.base_url}{STATS_PATH})")
+    try:
+        site.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        site.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
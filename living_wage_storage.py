@@ -0,0 +1,374 @@
+##############################################
+######  Storage engines for the living  ######
+######  wage database                   ######
+##############################################
+''' Runs the statewide and national analyses of the living wage database on
+one of three engines:
+    * 'sqlite': SQLite itself, on living_wage.sqlite. Its row store is best
+      for what the interactive program does: the rows of one area at a time.
+    * 'duckdb': DuckDB, on a copy of every table in a DuckDB file (see
+      write_duckdb()). DuckDB stores each column on its own and runs queries
+      on batches of values at once, which is much faster for queries that
+      group, rank or pivot every row.
+    * 'duckdb-sqlite': DuckDB, on living_wage.sqlite without a DuckDB file.
+      DuckDB reads the SQLite file through its sqlite extension if it is
+      installed ("INSTALL sqlite" in DuckDB, which needs the internet once),
+      and otherwise copies the tables into memory first.
+
+SQLite stays the database the loaders build (see build_database() in
+living_wage.py); "python3 living_wage.py --duckdb FILE" also writes FILE
+after every build. The analyses in ANALYSES are written in SQL that both
+engines run as is, so their results can be compared row for row.
+
+Usage:
+    python3 living_wage_storage.py --export living_wage.duckdb
+    python3 living_wage_storage.py --engine duckdb --analysis state_summary
+    python3 living_wage_storage.py --engine duckdb-sqlite --analysis expense_pivot --state MI
+
+duckdb and numpy are only needed by the DuckDB engines.
+'''
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from urllib.parse import quote
+
+import living_wage
+import living_wage_lock
+
+
+##############################################
+############## global variables ##############
+##############################################
+DUCKDB_NAME = 'living_wage.duckdb'
+
+ENGINES = ['sqlite', 'duckdb', 'duckdb-sqlite']
+
+## the tables copied into DuckDB, in the order build_database() writes them
+TABLES = ['Areas', 'Wages', 'Expenses', 'ExpenseItems',
+    'AreaAggregates', 'CompositionAggregates', 'StatePercentiles', 'HouseholdCurves']
+
+## key is the type of a SQLite column (see create_db() in living_wage.py) and value is its DuckDB type
+DUCKDB_TYPE_DICT = {
+    'INTEGER': 'BIGINT',
+    'REAL': 'DOUBLE',
+    'TEXT': 'VARCHAR',
+}
+
+## the family compositions, as pivoted into columns by the expense_pivot analysis
+COMPOSITIONS = [(number_of_adults, number_of_children)
+    for number_of_adults in living_wage.WORKING_ADULTS_DICT for number_of_children in range(4)]
+
+## every analysis groups, ranks or pivots every row it reads; {state_filter} becomes
+## 'AND Areas.State = ?' when an analysis is run for one state, and '' otherwise
+ANALYSES = {
+    ## living wages of each state and family composition
+    'state_summary': '''
+        SELECT "Areas"."State", "Wages"."Number of Adults", "Wages"."Number of Children",
+            COUNT(*) AS "Areas",
+            AVG("Wages"."Living Wage") AS "Average Living Wage",
+            MIN("Wages"."Living Wage") AS "Lowest Living Wage",
+            MAX("Wages"."Living Wage") AS "Highest Living Wage",
+            AVG("Wages"."Living Wage" - "Wages"."Minimum Wage") AS "Average Gap"
+        FROM "Wages"
+            JOIN "Areas" ON "Areas"."State" = "Wages"."State" AND "Areas"."Area" = "Wages"."Area"
+        WHERE 1 = 1 {state_filter}
+        GROUP BY "Areas"."State", "Wages"."Number of Adults", "Wages"."Number of Children"
+        ORDER BY "Areas"."State", "Wages"."Number of Adults", "Wages"."Number of Children"
+    ''',
+    ## the 5 areas with the highest gap of each state and family composition,
+    ## with their percentile among every area in the database
+    'gap_ranks': '''
+        SELECT "State", "Area", "Number of Adults", "Number of Children", "Gap", "State Rank", "National Percentile"
+        FROM (
+            SELECT "Areas"."State", "Wages"."Area", "Wages"."Number of Adults", "Wages"."Number of Children",
+                "Wages"."Living Wage" - "Wages"."Minimum Wage" AS "Gap",
+                RANK() OVER (
+                    PARTITION BY "Areas"."State", "Wages"."Number of Adults", "Wages"."Number of Children"
+                    ORDER BY "Wages"."Living Wage" - "Wages"."Minimum Wage" DESC) AS "State Rank",
+                100.0 * PERCENT_RANK() OVER (
+                    PARTITION BY "Wages"."Number of Adults", "Wages"."Number of Children"
+                    ORDER BY "Wages"."Living Wage" - "Wages"."Minimum Wage") AS "National Percentile"
+            FROM "Wages"
+                JOIN "Areas" ON "Areas"."State" = "Wages"."State" AND "Areas"."Area" = "Wages"."Area"
+            WHERE 1 = 1 {state_filter}
+        ) AS ranked
+        WHERE "State Rank" <= 5
+        ORDER BY "State", "Number of Adults", "Number of Children", "State Rank", "Area"
+    ''',
+    ## average yearly amount of each expense category in each state, one column per family composition
+    'expense_pivot': '''
+        SELECT "Areas"."State", "ExpenseItems"."Category",
+            {pivot_columns}
+        FROM "ExpenseItems"
+            JOIN "Areas" ON "Areas"."State" = "ExpenseItems"."State" AND "Areas"."Area" = "ExpenseItems"."Area"
+        WHERE 1 = 1 {state_filter}
+        GROUP BY "Areas"."State", "ExpenseItems"."Category"
+        ORDER BY "Areas"."State", "ExpenseItems"."Category"
+    ''',
+    ## share of the required income before taxes that goes to each expense category, per state
+    'expense_shares': '''
+        SELECT "Areas"."State", "ExpenseItems"."Category",
+            SUM("ExpenseItems"."Amount") / SUM("Expenses"."Required Annual Income Before Taxes") AS "Share"
+        FROM "ExpenseItems"
+            JOIN "Expenses" ON "Expenses"."State" = "ExpenseItems"."State"
+                AND "Expenses"."Area" = "ExpenseItems"."Area"
+                AND "Expenses"."Number of Adults" = "ExpenseItems"."Number of Adults"
+                AND "Expenses"."Number of Children" = "ExpenseItems"."Number of Children"
+            JOIN "Areas" ON "Areas"."State" = "ExpenseItems"."State" AND "Areas"."Area" = "ExpenseItems"."Area"
+        WHERE "ExpenseItems"."Category" NOT IN
+            ('required annual income before taxes', 'required annual income after taxes') {state_filter}
+        GROUP BY "Areas"."State", "ExpenseItems"."Category"
+        ORDER BY "Areas"."State", "ExpenseItems"."Category"
+    ''',
+}
+
+
+##############################################
+################# functions ##################
+##############################################
+def import_duckdb():
+    ''' Imports duckdb, or exits with an error message if it isn't installed. '''
+    try:
+        import duckdb
+    except ImportError:
+        sys.exit("[Error message]: The DuckDB engines need duckdb; install it with 'pip install duckdb'.")
+    return duckdb
+
+
+def copy_tables(sqlite_name, duck_conn, tables=TABLES):
+    ''' Copies tables of a SQLite database into a DuckDB connection, one column
+    at a time as numpy arrays, with the same column names and types.
+    Tables missing from the SQLite database are skipped.
+
+    Parameters
+    ----------
+    sqlite_name: string
+        the path of the SQLite database to read
+    duck_conn: duckdb.DuckDBPyConnection
+        the DuckDB database to write
+    tables: list
+        the names of the tables to copy
+
+    Returns
+    -------
+    int
+        the number of rows copied
+    '''
+    import numpy as np
+
+    sqlite_conn = sqlite3.connect(f'file:{quote(sqlite_name)}?mode=ro', uri=True)
+    row_count = 0
+    for table in tables:
+        column_list = [(row[1], DUCKDB_TYPE_DICT.get(row[2].upper(), 'VARCHAR'))
+            for row in sqlite_conn.execute(f'PRAGMA table_info("{table}")')]
+        if not column_list:
+            continue
+        rows = sqlite_conn.execute(f'SELECT * FROM "{table}"').fetchall()
+        value_lists = list(zip(*rows)) if rows else [()] * len(column_list)
+
+        ## row_number keeps the rows in the SQLite order through the joins below
+        columns = {'row_number': np.arange(len(rows))}
+        label_tables = {}
+        select_list = []
+        join_list = []
+        for column_index, ((column_name, duck_type), values) in enumerate(zip(column_list, value_lists)):
+            column_key = f'c{column_index}'
+            if duck_type == 'VARCHAR':
+                ## text travels as a number per row and a table of the distinct values, since
+                ## DuckDB reads arrays of Python strings one value at a time, which is far slower;
+                ## None gets no number in the table, so the join turns it into NULL
+                label_dict = {None: -1}
+                columns[column_key] = np.fromiter((label_dict.setdefault(value, len(label_dict) - 1) for value in values),
+                    dtype=np.int64, count=len(values))
+                del label_dict[None]
+                label_tables[f'{column_key}_labels'] = {
+                    'code': np.arange(len(label_dict)),
+                    'label': np.array(list(label_dict), dtype=str),
+                }
+                select_list.append(f'{column_key}_labels.label')
+                join_list.append(f'LEFT JOIN {column_key}_labels ON {column_key}_labels.code = sqlite_columns.{column_key}')
+                continue
+            ## numpy has no NULL for numbers, so NULLs travel in a separate mask column
+            null_mask = np.array([value is None for value in values], dtype=bool)
+            dtype = np.int64 if duck_type == 'BIGINT' else np.float64
+            columns[column_key] = np.array([0 if value is None else value for value in values], dtype=dtype)
+            if null_mask.any():
+                columns[f'{column_key}_null'] = null_mask
+                select_list.append(f'CASE WHEN {column_key}_null THEN NULL ELSE sqlite_columns.{column_key} END')
+            else:
+                select_list.append(f'sqlite_columns.{column_key}')
+
+        column_sql = ', '.join(f'"{column_name}" {duck_type}' for column_name, duck_type in column_list)
+        duck_conn.execute(f'CREATE OR REPLACE TABLE "{table}" ({column_sql})')
+        if rows:
+            duck_conn.register('sqlite_columns', columns)
+            for label_table, label_columns in label_tables.items():
+                duck_conn.register(label_table, label_columns)
+            duck_conn.execute(f'''
+                INSERT INTO "{table}"
+                SELECT {", ".join(select_list)}
+                FROM sqlite_columns {" ".join(join_list)}
+                ORDER BY sqlite_columns.row_number
+            ''')
+            for view_name in ['sqlite_columns', *label_tables]:
+                duck_conn.unregister(view_name)
+        row_count += len(rows)
+    sqlite_conn.close()
+    return row_count
+
+
+def write_duckdb(sqlite_name=None, duckdb_name=None):
+    ''' Writes every table of the SQLite database to a DuckDB file. Like
+    build_database() in living_wage.py, it writes a temporary file next to
+    duckdb_name and then replaces duckdb_name with it in one step.
+
+    Parameters
+    ----------
+    sqlite_name: string
+        the SQLite database to copy, or None for living_wage.DB_NAME
+    duckdb_name: string
+        the DuckDB file to write, or None for DUCKDB_NAME
+
+    Returns
+    -------
+    int
+        the number of rows written
+    '''
+    duckdb = import_duckdb()
+    sqlite_name = sqlite_name or living_wage.DB_NAME
+    duckdb_name = duckdb_name or DUCKDB_NAME
+    with living_wage_lock.file_lock(duckdb_name):
+        temp_duckdb_name = f'{duckdb_name}.{os.getpid()}.building'
+        try:
+            duck_conn = duckdb.connect(temp_duckdb_name)
+            row_count = copy_tables(sqlite_name, duck_conn)
+            duck_conn.close()
+            os.replace(temp_duckdb_name, duckdb_name)
+        finally:
+            for filename in (temp_duckdb_name, f'{temp_duckdb_name}.wal'):
+                if os.path.exists(filename):
+                    os.remove(filename)
+    return row_count
+
+
+def connect(engine='sqlite', sqlite_name=None, duckdb_name=None):
+    ''' Opens the living wage database read-only on one of the ENGINES.
+
+    Parameters
+    ----------
+    engine: string
+        'sqlite', 'duckdb' or 'duckdb-sqlite' (see the top of this file)
+    sqlite_name: string
+        the SQLite database, or None for living_wage.DB_NAME
+    duckdb_name: string
+        the DuckDB file of the 'duckdb' engine, or None for DUCKDB_NAME
+
+    Returns
+    -------
+    sqlite3.Connection or duckdb.DuckDBPyConnection
+        both run conn.execute(sql, params).fetchall() the same way
+    '''
+    sqlite_name = os.path.abspath(sqlite_name or living_wage.DB_NAME)
+    if engine == 'sqlite':
+        return sqlite3.connect(f'file:{quote(sqlite_name)}?mode=ro', uri=True)
+
+    duckdb = import_duckdb()
+    if engine == 'duckdb':
+        return duckdb.connect(duckdb_name or DUCKDB_NAME, read_only=True)
+    if engine != 'duckdb-sqlite':
+        raise ValueError(f'unknown engine {engine!r}; use one of {", ".join(ENGINES)}')
+
+    ## never download the sqlite extension in the middle of a query
+    duck_conn = duckdb.connect(config={'autoinstall_known_extensions': False})
+    try:
+        duck_conn.execute('LOAD sqlite')
+        duck_conn.execute("ATTACH ? AS source (TYPE sqlite, READ_ONLY)", [sqlite_name])
+        duck_conn.execute('USE source')
+    except duckdb.Error:
+        copy_tables(sqlite_name, duck_conn)
+    return duck_conn
+
+
+def analysis_sql(analysis_name, state=None):
+    ''' Returns the SQL of one of the ANALYSES and its parameters.
+
+    Parameters
+    ----------
+    analysis_name: string
+        a key of ANALYSES, e.g. 'state_summary'
+    state: string
+        only analyze the areas of this state (e.g. 'MI'), or None for every area
+
+    Returns
+    -------
+    tuple
+        (the SQL, the list of its parameters)
+    '''
+    pivot_columns = ',\n            '.join(
+        f'''AVG(CASE WHEN "ExpenseItems"."Number of Adults" = '{number_of_adults}' '''
+        f'''AND "ExpenseItems"."Number of Children" = {number_of_children} '''
+        f'''THEN "ExpenseItems"."Amount" END) AS "{number_of_adults}, {number_of_children} children"'''
+        for number_of_adults, number_of_children in COMPOSITIONS)
+    sql = ANALYSES[analysis_name].format(
+        state_filter='' if state is None else 'AND "Areas"."State" = ?',
+        pivot_columns=pivot_columns)
+    return sql, [] if state is None else [state]
+
+
+def run_analysis(conn, analysis_name, state=None):
+    ''' Runs one of the ANALYSES on a connection made by connect().
+
+    Parameters
+    ----------
+    conn: sqlite3.Connection or duckdb.DuckDBPyConnection
+        the database to analyze
+    analysis_name: string
+        a key of ANALYSES, e.g. 'state_summary'
+    state: string
+        only analyze the areas of this state (e.g. 'MI'), or None for every area
+
+    Returns
+    -------
+    list
+        the rows of the result, as tuples
+    '''
+    sql, params = analysis_sql(analysis_name, state)
+    return conn.execute(sql, params).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Copy the living wage database to DuckDB, or run a statewide analysis on SQLite or DuckDB.')
+    parser.add_argument('--db', default=living_wage.DB_NAME, help='SQLite database to read')
+    parser.add_argument('--duckdb', default=DUCKDB_NAME, help='DuckDB file to write with --export, or to read with --engine duckdb')
+    parser.add_argument('--export', action='store_true', help='copy every table of the SQLite database to the DuckDB file')
+    parser.add_argument('--engine', choices=ENGINES, default='sqlite', help='engine that runs the analysis')
+    parser.add_argument('--analysis', choices=list(ANALYSES), help='analysis to run and print')
+    parser.add_argument('--state', help='only analyze the areas of this state (e.g. MI)')
+    args = parser.parse_args()
+
+    schema_error = living_wage.schema_error(args.db)
+    if schema_error:
+        sys.exit(f"[Error message]: {schema_error}.")
+    if args.export:
+        export_start = time.perf_counter()
+        row_count = write_duckdb(args.db, args.duckdb)
+        print(f"Wrote {row_count:,} rows to {args.duckdb} in {time.perf_counter() - export_start:.2f} s")
+    if args.analysis:
+        if args.engine == 'duckdb' and not os.path.exists(args.duckdb):
+            sys.exit(f"[Error message]: {args.duckdb} does not exist; write it with --export first.")
+        conn = connect(args.engine, args.db, args.duckdb)
+        query_start = time.perf_counter()
+        rows = run_analysis(conn, args.analysis, args.state)
+        seconds = time.perf_counter() - query_start
+        conn.close()
+        for row in rows:
+            print(' | '.join(f'{value:.2f}' if isinstance(value, float) else str(value) for value in row))
+        print(f"{len(rows):,} rows in {seconds * 1000:.1f} ms ({args.engine})")
+    if not (args.export or args.analysis):
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
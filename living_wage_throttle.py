@@ -0,0 +1,149 @@
+##############################################
+######  Adaptive rate limiter for the  #######
+######  crawler                        #######
+##############################################
+''' Decides how long the crawler in living_wage.py waits before each request,
+so that it crawls as fast as the website can handle and no faster.
+
+The throttle follows AIMD (additive increase, multiplicative decrease), like
+TCP congestion control:
+    * while responses are healthy, the request rate goes up by a small fixed
+      step per second, up to max_rate,
+    * after a 429 (Too Many Requests) or 503 (Service Unavailable) response,
+      or a response much slower than usual (a latency spike), the rate is cut
+      by decrease_factor, down to min_rate, and
+    * a Retry-After header stops every request until the time it gives.
+
+The current rate is exported as the crawl_rate_requests_per_second metric.
+'''
+import threading
+import time
+
+import living_wage_metrics as metrics
+
+
+##############################################
+############## global variables ##############
+##############################################
+## status codes that mean the website wants fewer requests
+PUSHBACK_STATUS_CODES = (429, 503)
+
+## while responses are healthy, the rate goes up by max_rate / INCREASE_SECONDS every second,
+## so it takes INCREASE_SECONDS to go from nothing to max_rate
+INCREASE_SECONDS = 20
+DECREASE_FACTOR = 0.5
+
+## a response this many times slower than the moving average latency is a spike
+LATENCY_SPIKE_FACTOR = 3.0
+## weight of the newest latency in the moving average
+LATENCY_SMOOTHING = 0.2
+## responses needed before spikes are detected
+MIN_LATENCY_SAMPLES = 5
+
+CRAWL_RATE = metrics.gauge('crawl_rate_requests_per_second', 'Current request rate allowed by the adaptive throttle')
+RATE_DECREASES = metrics.counter('crawl_rate_decreases_total', 'Times the throttle cut the request rate')
+
+
+##############################################
+############# classes & objects ##############
+##############################################
+class AdaptiveThrottle:
+    ''' An AIMD request rate limiter, safe to share between threads.
+
+    Instance Attributes
+    -------------------
+    rate: float
+        the current number of requests allowed per second
+    min_rate: float
+        the rate is never cut below this
+    max_rate: float
+        the rate never goes above this
+    increase: float
+        the step added to the rate per second of healthy responses
+    decrease_factor: float
+        the rate is multiplied by this after a 429/503 response or a latency spike
+    average_latency: float
+        the moving average of the latency of healthy responses, in seconds, or None
+    '''
+    def __init__(self, initial_rate, min_rate, max_rate, decrease_factor=DECREASE_FACTOR):
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.rate = min(max(initial_rate, min_rate), max_rate)
+        self.increase = max_rate / INCREASE_SECONDS
+        self.decrease_factor = decrease_factor
+        self.average_latency = None
+        self.latency_samples = 0
+        self.next_request_time = 0.0
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+        CRAWL_RATE.set(self.rate)
+
+    def wait(self):
+        ''' Sleeps until the next request is allowed, and returns the seconds slept. '''
+        with self.lock:
+            now = time.monotonic()
+            request_time = max(now, self.next_request_time, self.blocked_until)
+            self.next_request_time = request_time + 1 / self.rate
+        sleep_seconds = request_time - now
+        if sleep_seconds > 0:
+            time.sleep(sleep_seconds)
+        return max(sleep_seconds, 0.0)
+
+    def record(self, latency_seconds, status_code, retry_after_seconds=None):
+        ''' Adapts the rate to one response.
+
+        Parameters
+        ----------
+        latency_seconds: float
+            how long the request took
+        status_code: int
+            the HTTP status code of the response
+        retry_after_seconds: float
+            the Retry-After header of the response in seconds, or None
+
+        Returns
+        -------
+        None
+        '''
+        with self.lock:
+            if retry_after_seconds is not None:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after_seconds)
+
+            is_spike = (self.latency_samples >= MIN_LATENCY_SAMPLES
+                and latency_seconds > LATENCY_SPIKE_FACTOR * self.average_latency)
+            if status_code in PUSHBACK_STATUS_CODES or is_spike:
+                self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+                RATE_DECREASES.inc()
+            elif status_code < 400:
+                ## one response comes every 1 / rate seconds
+                self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+            if status_code < 400:
+                if self.average_latency is None:
+                    self.average_latency = latency_seconds
+                else:
+                    self.average_latency += LATENCY_SMOOTHING * (latency_seconds - self.average_latency)
+                self.latency_samples += 1
+            CRAWL_RATE.set(self.rate)
+
+
+##############################################
+################# functions ##################
+##############################################
+def parse_retry_after(header_value):
+    ''' Returns the seconds in a Retry-After header, given either as seconds or
+    as an HTTP date, or None if there is no usable header.
+    '''
+    if not header_value:
+        return None
+    header_value = header_value.strip()
+    try:
+        return max(float(header_value), 0.0)
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime
+    try:
+        retry_time = parsedate_to_datetime(header_value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_time.timestamp() - time.time(), 0.0)
@@ -0,0 +1,94 @@
+''' Tests of the benchmark suite: the recorded page corpus (benchmarks/fixtures.py)
+and the comparison to the baseline (benchmarks/run_benchmarks.py).
+
+Run from the folder that contains living_wage.py:
+    python3 -m pytest tests
+'''
+import os
+import sqlite3
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'benchmarks'))
+import fixtures
+import living_wage
+import run_benchmarks
+
+
+STATE_URL = fixtures.BASE_URL + f'/states/{fixtures.STATE_FIPS}/locations'
+
+
+@pytest.fixture(scope='module')
+def corpus():
+    return fixtures.load_michigan_corpus()
+
+
+##############################################
+############## recorded corpus ###############
+##############################################
+def test_corpus_has_every_linked_page(corpus):
+    area_paths = fixtures.re.findall(r'<a href="([^"]+)">', corpus[STATE_URL])
+
+    assert len(area_paths) == len(corpus) - 1
+    assert {fixtures.BASE_URL + path for path in area_paths} == set(corpus) - {STATE_URL}
+
+
+def test_corpus_pages_parse_to_the_database_rows(corpus):
+    conn = sqlite3.connect(os.path.join(REPO_DIR, 'living_wage.sqlite'))
+    living_wage_value = conn.execute('''
+        SELECT [Living Wage] FROM Wages
+        WHERE Area = 'alcona county' AND [Number of Adults] = 'one adult' AND [Number of Children] = 0
+    ''').fetchone()[0]
+    conn.close()
+
+    wages_dict = living_wage.parse_wages_page(corpus[fixtures.BASE_URL + '/counties/26001'])
+
+    assert list(wages_dict) == fixtures.ADULTS_LIST
+    assert wages_dict['one adult']['0 children']['living wage'] == pytest.approx(living_wage_value)
+
+
+def test_expense_shares_add_up_to_the_after_tax_income(corpus):
+    expenses_dict = living_wage.parse_expenses_page(corpus[fixtures.BASE_URL + '/counties/26001'])
+    expenses = expenses_dict['two adults (both working)']['2 children']
+
+    shared_total = sum(expenses[category.lower()] for category, _ in fixtures.EXPENSE_SHARES)
+    assert shared_total == pytest.approx(expenses['required annual income after taxes'], abs=len(fixtures.EXPENSE_SHARES))
+    assert expenses['required annual income before taxes'] > expenses['required annual income after taxes']
+
+
+def test_synthetic_states_are_distinct(corpus):
+    multi_state_corpus, state_urls = fixtures.synthesize_multi_state_corpus(corpus, 3)
+
+    assert len(multi_state_corpus) == 3 * len(corpus)
+    assert state_urls == [fixtures.BASE_URL + f'/states/{60 + i}/locations' for i in range(3)]
+    assert not set(multi_state_corpus) & set(corpus)
+    assert 'Alcona County 61' in multi_state_corpus[fixtures.BASE_URL + '/counties/61001']
+
+
+##############################################
+############# compare_to_baseline ############
+##############################################
+BASELINE = {
+    'results': {'michigan': {'queries': {'seconds': 1.0}, 'figures': {'seconds': 2.0}}},
+    'thresholds': {'figures': 0.5},
+}
+
+
+def test_slower_stage_is_a_regression(capsys):
+    results = {'michigan': {'queries': {'seconds': 1.31}, 'figures': {'seconds': 2.9}}}
+
+    regressions = run_benchmarks.compare_to_baseline(results, BASELINE, 0.30)
+
+    assert regressions == ['michigan/queries is 1.31x slower than the baseline']
+    assert 'limit 1.50x' in capsys.readouterr().out
+
+
+def test_stage_without_baseline_is_reported(capsys):
+    results = {'michigan': {'repeated_queries': {'seconds': 5.0}}, 'national': {'queries': {'seconds': 9.0}}}
+
+    assert run_benchmarks.compare_to_baseline(results, BASELINE, 0.30) == []
+    output = capsys.readouterr().out
+    assert output.count('no baseline') == 2
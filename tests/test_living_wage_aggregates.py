@@ -0,0 +1,167 @@
+''' Tests of the aggregate tables (refresh_aggregates() and refresh_household_curves()
+in living_wage.py) and of the accessors that read them.
+
+Run from the folder that contains living_wage.py:
+    python3 -m pytest tests
+'''
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import living_wage
+
+
+## (state, area): the living wage of one adult without children; the other
+## compositions add OFFSET_DICT and $1 per child, so the average is base + 0.5
+BASE_WAGE_DICT = {
+    ('MI', 'alpha county'): 20,
+    ('MI', 'beta county'): 15,
+    ('MI', 'gamma county'): 10,
+    ## the same name in another state
+    ('OH', 'alpha county'): 30,
+}
+OFFSET_DICT = {'one adult': 0, 'two adults (one working)': 2, 'two adults (both working)': -5}
+MINIMUM_WAGE_DICT = {'MI': 9.45, 'OH': 10.0}
+HOURS_PER_YEAR = 2000
+
+
+def living_wage_of(state, area_name, number_of_adults, number_of_children):
+    return BASE_WAGE_DICT[(state, area_name)] + OFFSET_DICT[number_of_adults] + number_of_children
+
+
+@pytest.fixture
+def db_name(tmp_path, monkeypatch):
+    ''' A database of BASE_WAGE_DICT with its aggregate tables refreshed. '''
+    db_name = str(tmp_path / 'living_wage.sqlite')
+    living_wage.create_db(db_name)
+    conn = sqlite3.connect(db_name)
+    for state, area_name in BASE_WAGE_DICT:
+        conn.execute('INSERT INTO Areas (State, [Area Type], Area) VALUES (?, ?, ?)', [state, 'county', area_name])
+        for number_of_adults, working_adults in living_wage.WORKING_ADULTS_DICT.items():
+            for number_of_children in range(4):
+                wage = living_wage_of(state, area_name, number_of_adults, number_of_children)
+                conn.execute('''INSERT INTO Wages (State, Area, [Number of Adults], [Number of Children],
+                    [Living Wage], [Poverty Wage], [Minimum Wage]) VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                    [state, area_name, number_of_adults, number_of_children, wage, 5, MINIMUM_WAGE_DICT[state]])
+                conn.execute('''INSERT INTO Expenses (State, Area, [Number of Adults], [Number of Children],
+                    [Required Annual Income Before Taxes]) VALUES (?, ?, ?, ?, ?)''',
+                    [state, area_name, number_of_adults, number_of_children, wage * HOURS_PER_YEAR * working_adults])
+    conn.commit()
+    conn.close()
+
+    living_wage.refresh_aggregates(db_name)
+    living_wage.refresh_household_curves(db_name)
+    monkeypatch.setattr(living_wage, 'DB_NAME', db_name)
+    return db_name
+
+
+def query(db_name, sql, params=()):
+    conn = sqlite3.connect(db_name)
+    rows = conn.execute(sql, params).fetchall()
+    conn.close()
+    return rows
+
+
+##############################################
+############# refresh_aggregates #############
+##############################################
+def test_area_aggregates_keep_same_named_areas_apart(db_name):
+    rows = query(db_name, '''
+        SELECT State, Area, [Average Living Wage], [Minimum Wage], Gap FROM AreaAggregates ORDER BY State, Area
+    ''')
+
+    assert [(state, area_name) for state, area_name, *_ in rows] == sorted(BASE_WAGE_DICT)
+    assert rows[0][2:] == pytest.approx((20.5, 9.45, 20.5 - 9.45))
+    assert rows[-1][2:] == pytest.approx((30.5, 10.0, 20.5))
+
+
+def test_areas_are_ranked_within_their_state(db_name):
+    rows = query(db_name, 'SELECT State, Area, Rank, Percentile FROM AreaAggregates ORDER BY State, Rank')
+
+    assert rows == [
+        ('MI', 'alpha county', 1, 100.0),
+        ('MI', 'beta county', 2, 50.0),
+        ('MI', 'gamma county', 3, 0.0),
+        ('OH', 'alpha county', 1, 0.0),
+    ]
+
+
+def test_composition_aggregates_rank_each_composition(db_name):
+    rows = query(db_name, '''
+        SELECT Area, [Living Wage], Gap, Rank FROM CompositionAggregates
+        WHERE State = 'MI' AND [Number of Adults] = 'two adults (one working)' AND [Number of Children] = 2
+        ORDER BY Rank
+    ''')
+
+    assert rows == [
+        ('alpha county', 24.0, pytest.approx(24 - 9.45), 1),
+        ('beta county', 19.0, pytest.approx(19 - 9.45), 2),
+        ('gamma county', 14.0, pytest.approx(14 - 9.45), 3),
+    ]
+
+
+def test_state_percentiles(db_name):
+    percentile_dict = dict(query(db_name, '''
+        SELECT Percentile, [Living Wage] FROM StatePercentiles
+        WHERE State = 'MI' AND [Number of Adults] = 'one adult' AND [Number of Children] = 0
+    '''))
+
+    assert list(percentile_dict) == living_wage.STATE_PERCENTILES
+    assert percentile_dict[50] == pytest.approx(15)
+    assert percentile_dict[25] == pytest.approx(12.5)
+
+
+def test_refresh_twice_gives_the_same_tables(db_name):
+    before = query(db_name, 'SELECT * FROM AreaAggregates ORDER BY State, Area')
+    living_wage.refresh_aggregates(db_name)
+
+    assert query(db_name, 'SELECT * FROM AreaAggregates ORDER BY State, Area') == before
+
+
+def test_percentile_of_sorted_interpolates():
+    assert living_wage.percentile_of_sorted([10, 20, 30, 40], 50) == pytest.approx(25)
+    assert living_wage.percentile_of_sorted([10, 20, 30, 40], 100) == 40
+    assert living_wage.percentile_of_sorted([7], 90) == 7
+
+
+##############################################
+######### refresh_household_curves ###########
+##############################################
+def test_household_curves(db_name):
+    rows = query(db_name, '''
+        SELECT [Working Adults], [Children 0], [Children 3], [Extra Child], [Extra Adult], [Hours Per Year]
+        FROM HouseholdCurves
+        WHERE State = 'OH' AND Area = 'alpha county' AND [Number of Adults] = 'two adults (both working)'
+    ''')
+
+    assert rows == [(2, 25 * 2 * HOURS_PER_YEAR, 28 * 2 * HOURS_PER_YEAR, 2 * HOURS_PER_YEAR,
+        (32 - 30) * HOURS_PER_YEAR, pytest.approx(HOURS_PER_YEAR))]
+    assert query(db_name, 'SELECT COUNT(*) FROM HouseholdCurves') == [(len(BASE_WAGE_DICT) * 3,)]
+
+
+##############################################
+################# accessors ##################
+##############################################
+def test_area_gap_reads_the_area_of_the_crawled_state(db_name):
+    average, minimum_wage, gap, rank, percentile, area_count = living_wage.area_gap('alpha county')
+
+    assert (average, minimum_wage, rank, area_count) == (pytest.approx(20.5), 9.45, 1, 3)
+    assert living_wage.area_gap('delta county') is None
+
+
+def test_ranked_gaps(db_name):
+    assert [row[1] for row in living_wage.ranked_gaps('MI')] == ['alpha county', 'beta county', 'gamma county']
+    ## every state, by gap: the alpha county of OH is $20.50 above its minimum wage
+    assert [(row[6], row[1]) for row in living_wage.ranked_gaps(None)] == [
+        ('OH', 'alpha county'), ('MI', 'alpha county'), ('MI', 'beta county'), ('MI', 'gamma county')]
+
+
+def test_accessors_return_none_without_aggregate_tables(db_name):
+    living_wage.create_db(db_name)
+
+    assert living_wage.area_gap('alpha county') is None
+    assert living_wage.ranked_gaps('MI') is None
+    assert living_wage.state_percentiles('one adult', 0) is None
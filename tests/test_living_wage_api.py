@@ -0,0 +1,179 @@
+''' Tests of the read-only library API (living_wage_api.py).
+
+Run from the folder that contains living_wage.py:
+    python3 -m pytest tests
+'''
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import living_wage
+import living_wage_api
+
+
+## (state, area, type, code): living wage of every composition; 'alpha county' is in both states
+AREA_WAGE_DICT = {
+    ('MI', 'alpha county', 'county', '26001'): 20.0,
+    ('MI', 'ann arbor, mi', 'MSA', '11460'): 25.0,
+    ('OH', 'alpha county', 'county', '39001'): 15.0,
+}
+MINIMUM_WAGE = 10.0
+COMPOSITIONS = [(number_of_adults, number_of_children)
+    for number_of_adults in living_wage.WORKING_ADULTS_DICT for number_of_children in range(4)]
+
+
+def make_db(db_name, wage_offset=0.0, skip_composition=None):
+    ''' Builds a database of AREA_WAGE_DICT, with its aggregate tables. '''
+    living_wage.create_db(db_name)
+    conn = sqlite3.connect(db_name)
+    for (state, area_name, area_type, code), wage in AREA_WAGE_DICT.items():
+        conn.execute('INSERT INTO Areas (State, [Area Type], Area, Code) VALUES (?, ?, ?, ?)',
+            [state, area_type, area_name, code])
+        for number_of_adults, number_of_children in COMPOSITIONS:
+            if (area_name, number_of_adults, number_of_children) == skip_composition:
+                continue
+            conn.execute('''INSERT INTO Wages (State, Area, [Number of Adults], [Number of Children],
+                [Living Wage], [Poverty Wage], [Minimum Wage]) VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                [state, area_name, number_of_adults, number_of_children, wage + wage_offset, 5.0, MINIMUM_WAGE])
+            conn.execute('''INSERT INTO Expenses (State, Area, [Number of Adults], [Number of Children],
+                [Required Annual Income Before Taxes]) VALUES (?, ?, ?, ?, ?)''',
+                [state, area_name, number_of_adults, number_of_children, wage * 2080])
+            for category, share in (('housing', 0.3), ('food', 0.2)):
+                conn.execute('''INSERT INTO ExpenseItems (State, Area, [Number of Adults], [Number of Children],
+                    Category, Amount) VALUES (?, ?, ?, ?, ?, ?)''',
+                    [state, area_name, number_of_adults, number_of_children, category, wage * 2080 * share])
+    conn.commit()
+    conn.close()
+    living_wage.refresh_aggregates(db_name)
+    living_wage.refresh_household_curves(db_name)
+
+
+@pytest.fixture
+def db_name(tmp_path):
+    db_name = str(tmp_path / 'living_wage.sqlite')
+    make_db(db_name, skip_composition=('ann arbor, mi', 'one adult', 3))
+    return db_name
+
+
+@pytest.fixture
+def dataset(db_name):
+    with living_wage_api.open_dataset(db_name) as dataset:
+        yield dataset
+
+
+##############################################
+################ open_dataset ################
+##############################################
+def test_missing_database(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        living_wage_api.open_dataset(str(tmp_path / 'missing.sqlite'))
+    assert not os.path.exists(tmp_path / 'missing.sqlite')
+
+
+def test_old_schema(db_name):
+    conn = sqlite3.connect(db_name)
+    conn.execute('DROP TABLE HouseholdCurves')
+    conn.close()
+
+    with pytest.raises(ValueError, match='HouseholdCurves'):
+        living_wage_api.open_dataset(db_name)
+
+
+def test_dataset_is_read_only(dataset):
+    with pytest.raises(sqlite3.OperationalError):
+        dataset.query('DELETE FROM Areas')
+
+
+def test_closed_dataset(db_name):
+    dataset = living_wage_api.open_dataset(db_name)
+    dataset.close()
+
+    with pytest.raises(ValueError):
+        dataset.areas()
+
+
+def test_rebuilt_database_is_read(dataset, db_name, tmp_path):
+    assert dataset.wages('ann arbor, mi')[0].living_wage == 25.0
+
+    make_db(str(tmp_path / 'rebuilt.sqlite'), wage_offset=1.0)
+    os.replace(tmp_path / 'rebuilt.sqlite', db_name)
+
+    assert dataset.wages('ann arbor, mi')[0].living_wage == 26.0
+
+
+##############################################
+################## records ###################
+##############################################
+def test_areas(dataset):
+    assert [area.name for area in dataset.areas()] == ['alpha county', 'ann arbor, mi', 'alpha county']
+    assert dataset.areas(state='OH') == [living_wage_api.AreaRecord('alpha county', 'OH', 'county', '39001')]
+
+
+def test_area_by_name_or_code(dataset):
+    assert dataset.area(' Ann Arbor, MI ').code == '11460'
+    assert dataset.area('39001').state == 'OH'
+    assert dataset.area('nowhere county') is None
+
+
+def test_wages_of_same_named_areas(dataset):
+    records = dataset.wages('alpha county')
+
+    assert len(records) == 2 * len(COMPOSITIONS)
+    assert {record.state for record in records} == {'MI', 'OH'}
+    assert {record.living_wage for record in dataset.wages(['alpha county'], state='OH')} == {15.0}
+
+
+def test_expenses_of_some_categories(dataset):
+    records = dataset.expenses(['alpha county', 'ann arbor, mi'], categories=['food'], state='MI')
+
+    assert {record.category for record in records} == {'food'}
+    assert {(record.state, record.area) for record in records} == {('MI', 'alpha county'), ('MI', 'ann arbor, mi')}
+    assert records[0].amount == pytest.approx(20.0 * 2080 * 0.2)
+
+
+def test_gaps_highest_first(dataset):
+    records = dataset.gaps()
+
+    assert [(record.state, record.area) for record in records] == [
+        ('MI', 'ann arbor, mi'), ('MI', 'alpha county'), ('OH', 'alpha county')]
+    assert records[0].gap == pytest.approx(25.0 - MINIMUM_WAGE)
+    assert [record.rank for record in dataset.gaps(state='MI')] == [1, 2]
+
+
+##############################################
+################ numpy arrays ################
+##############################################
+def test_wage_arrays(dataset):
+    np = pytest.importorskip('numpy')
+    arrays = dataset.wage_arrays()
+
+    assert list(zip(arrays['states'], arrays['areas'])) == [
+        ('MI', 'alpha county'), ('MI', 'ann arbor, mi'), ('OH', 'alpha county')]
+    assert arrays['compositions'] == COMPOSITIONS
+    assert arrays['living_wages'].shape == (3, len(COMPOSITIONS))
+    assert arrays['living_wages'][2, 0] == 15.0
+    missing_column = COMPOSITIONS.index(('one adult', 3))
+    assert np.isnan(arrays['living_wages'][1, missing_column])
+    assert (arrays['minimum_wages'][0] == MINIMUM_WAGE).all()
+
+
+def test_expense_arrays(dataset):
+    pytest.importorskip('numpy')
+    arrays = dataset.expense_arrays('alpha county', state='OH', categories=['housing', 'food'])
+
+    assert arrays['areas'] == ['alpha county']
+    assert arrays['states'] == ['OH']
+    assert arrays['categories'] == ['housing', 'food']
+    assert arrays['amounts'].shape == (1, len(COMPOSITIONS), 2)
+    assert arrays['amounts'][0, 0].tolist() == pytest.approx([15.0 * 2080 * 0.3, 15.0 * 2080 * 0.2])
+
+
+def test_arrays_of_no_areas(dataset):
+    pytest.importorskip('numpy')
+    arrays = dataset.wage_arrays('nowhere county')
+
+    assert arrays['areas'] == []
+    assert arrays['living_wages'].shape == (0, 0)
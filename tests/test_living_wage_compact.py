@@ -0,0 +1,160 @@
+''' Tests of cache eviction and compaction (living_wage_compact.py).
+
+Run from the folder that contains living_wage.py:
+    python3 -m pytest tests
+'''
+import json
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import living_wage
+import living_wage_compact
+from living_wage_compact import choose_evictions
+
+
+DAY_SECONDS = 24 * 60 * 60
+NOW = 1000 * DAY_SECONDS
+
+
+##############################################
+############## choose_evictions ##############
+##############################################
+## url: (bytes, fetched, accessed)
+PAGE_DICT = {
+    'old': (100, NOW - 400 * DAY_SECONDS, NOW - 1),
+    'recent': (100, NOW - 10 * DAY_SECONDS, NOW - 2),
+    'unused': (100, NOW - 10 * DAY_SECONDS, NOW - 50),
+    'pinned': (100, NOW - 500 * DAY_SECONDS, NOW - 100),
+}
+
+
+def test_no_limits_evict_nothing():
+    assert choose_evictions(PAGE_DICT, now=NOW) == ([], [])
+
+
+def test_old_pages_are_evicted():
+    assert choose_evictions(PAGE_DICT, max_age_seconds=365 * DAY_SECONDS, now=NOW) == (['old', 'pinned'], [])
+
+
+def test_least_recently_used_pages_are_evicted_until_they_fit():
+    assert choose_evictions(PAGE_DICT, max_bytes=250, now=NOW) == ([], ['pinned', 'unused'])
+
+
+def test_pinned_pages_are_never_evicted():
+    expired_urls, lru_urls = choose_evictions(PAGE_DICT, max_bytes=0, max_age_seconds=365 * DAY_SECONDS,
+        pinned_urls={'pinned'}, now=NOW)
+
+    assert expired_urls == ['old']
+    assert lru_urls == ['unused', 'recent']
+
+
+def test_expired_pages_count_towards_the_size():
+    assert choose_evictions(PAGE_DICT, max_bytes=200, max_age_seconds=365 * DAY_SECONDS, now=NOW) == (
+        ['old', 'pinned'], [])
+
+
+##############################################
+################ compact_cache ###############
+##############################################
+def fragment_entry(page):
+    return {'hash': living_wage.hash_page(page), 'version': living_wage.FRAGMENT_VERSION, 'fragment': page.lower()}
+
+
+@pytest.fixture
+def cache_files(tmp_path, monkeypatch):
+    ''' Writes cache files of three pages to a temporary folder: a pinned state
+    page, a page read just now and a page nobody read for a month, plus the
+    fragment of an archived page cut by an older FRAGMENT_VERSION.
+    '''
+    monkeypatch.chdir(tmp_path)
+    for name in ('CACHE_FILENAME', 'CACHE_META_FILENAME', 'FRAGMENT_CACHE_FILENAME',
+                 'PARSE_CACHE_FILENAME', 'FRONTIER_FILENAME'):
+        monkeypatch.setattr(living_wage, name, str(tmp_path / getattr(living_wage, name)))
+    for name in ('CACHE_DICT', 'CACHE_META_DICT', 'FRAGMENT_DICT', 'PARSE_DICT', 'FRONTIER_DICT',
+                 'VERIFIED_PAGE_DICT', 'KNOWN_FILE_DICT'):
+        monkeypatch.setattr(living_wage, name, {})
+    monkeypatch.setattr(living_wage_compact, 'pinned_urls', lambda: {'https://example.org/state'})
+
+    now = time.time()
+    cache_dict = {
+        'https://example.org/state': '<html>STATE</html>' * 10,
+        'https://example.org/recent': '<html>RECENT</html>' * 10,
+        'https://example.org/unused': '<html>UNUSED</html>' * 10,
+    }
+    meta_dict = {
+        'https://example.org/state': {'fetched': now - 400 * DAY_SECONDS, 'accessed': now - 400 * DAY_SECONDS},
+        'https://example.org/recent': {'fetched': now, 'accessed': now},
+        'https://example.org/unused': {'fetched': now - 30 * DAY_SECONDS, 'accessed': now - 30 * DAY_SECONDS},
+        'https://example.org/gone': {'fetched': now, 'accessed': now},
+    }
+    fragment_dict = {url: fragment_entry(page) for url, page in cache_dict.items()}
+    fragment_dict['https://example.org/archived'] = dict(fragment_entry('<p>OLD VERSION</p>'),
+        version=living_wage.FRAGMENT_VERSION - 1)
+    meta_dict['https://example.org/archived'] = {'fetched': now - DAY_SECONDS, 'accessed': now - DAY_SECONDS}
+    parse_dict = {f'wages:{living_wage.hash_page(entry["fragment"])}': {'version': living_wage.PARSER_VERSION, 'result': {}}
+        for entry in fragment_dict.values()}
+    for filename, data in ((living_wage.CACHE_FILENAME, cache_dict), (living_wage.CACHE_META_FILENAME, meta_dict),
+                           (living_wage.FRAGMENT_CACHE_FILENAME, fragment_dict), (living_wage.PARSE_CACHE_FILENAME, parse_dict)):
+        with open(filename, 'w') as cache_file:
+            json.dump(data, cache_file)
+    return cache_dict
+
+
+def read_json(filename):
+    with open(filename) as json_file:
+        return json.load(json_file)
+
+
+def test_compact_by_age_keeps_the_pins(cache_files):
+    stats = living_wage_compact.compact_cache(max_age_seconds=7 * DAY_SECONDS)
+
+    assert stats['expired'] == ['https://example.org/unused']
+    assert stats['pinned'] == 1
+    assert sorted(read_json(living_wage.CACHE_FILENAME)) == ['https://example.org/recent', 'https://example.org/state']
+    assert sorted(read_json(living_wage.CACHE_META_FILENAME)) == ['https://example.org/recent', 'https://example.org/state']
+
+
+def test_compact_by_size_evicts_the_least_recently_used(cache_files):
+    page_bytes = 2 * len(cache_files['https://example.org/unused'])
+
+    stats = living_wage_compact.compact_cache(max_bytes=2 * page_bytes)
+
+    assert stats['lru'] == ['https://example.org/unused']
+    assert stats['kept_pages'] == 3
+    assert 'https://example.org/unused' not in read_json(living_wage.FRAGMENT_CACHE_FILENAME)
+    assert stats['file_bytes_after'] < stats['file_bytes_before']
+
+
+def test_compact_drops_stale_fragments_and_orphan_parses(cache_files):
+    stats = living_wage_compact.compact_cache()
+
+    assert stats['dropped_fragments'] == 1
+    assert stats['dropped_parses'] == 1
+    assert sorted(read_json(living_wage.FRAGMENT_CACHE_FILENAME)) == sorted(cache_files)
+    assert len(read_json(living_wage.PARSE_CACHE_FILENAME)) == 3
+    assert 'https://example.org/gone' not in read_json(living_wage.CACHE_META_FILENAME)
+
+
+def test_dry_run_changes_no_file(cache_files):
+    file_dict = {filename: read_json(filename) for filename in (living_wage.CACHE_FILENAME,
+        living_wage.CACHE_META_FILENAME, living_wage.FRAGMENT_CACHE_FILENAME, living_wage.PARSE_CACHE_FILENAME)}
+
+    stats = living_wage_compact.compact_cache(max_bytes=0, dry_run=True)
+
+    assert stats['lru'] == ['https://example.org/unused', 'https://example.org/archived', 'https://example.org/recent']
+    assert {filename: read_json(filename) for filename in file_dict} == file_dict
+
+
+def test_unreadable_cache_is_left_alone(cache_files):
+    with open(living_wage.CACHE_FILENAME, 'w') as cache_file:
+        cache_file.write('{"https://example.org/state": "<html>')
+
+    with pytest.raises(SystemExit):
+        living_wage_compact.compact_cache(max_bytes=0)
+
+    with open(living_wage.CACHE_FILENAME) as cache_file:
+        assert cache_file.read() == '{"https://example.org/state": "<html>'
@@ -0,0 +1,159 @@
+''' Tests of the comparison graphs of every area (living_wage_compare.py).
+
+Run from the folder that contains living_wage.py:
+    python3 -m pytest tests
+'''
+import os
+import sqlite3
+import sys
+
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('plotly')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import living_wage
+import living_wage_compare
+import living_wage_policy
+
+
+## (state, area): living wage of every composition; the minimum wage is $10
+WAGE_DICT = {
+    ('MI', 'alpha county'): 20.0,
+    ('MI', 'ann arbor, mi'): 30.0,
+    ('MI', 'beta county'): 12.0,
+    ('OH', 'alpha county'): 25.0,
+}
+COMPOSITIONS = [(number_of_adults, number_of_children)
+    for number_of_adults in living_wage.WORKING_ADULTS_DICT for number_of_children in range(4)]
+
+
+@pytest.fixture
+def db_name(tmp_path, monkeypatch):
+    db_name = str(tmp_path / 'living_wage.sqlite')
+    living_wage.create_db(db_name)
+    conn = sqlite3.connect(db_name)
+    for (state, area_name), wage in WAGE_DICT.items():
+        conn.execute('INSERT INTO Areas (State, [Area Type], Area) VALUES (?, ?, ?)', [state, 'county', area_name])
+        for number_of_adults, number_of_children in COMPOSITIONS:
+            conn.execute('''INSERT INTO Wages (State, Area, [Number of Adults], [Number of Children],
+                [Living Wage], [Poverty Wage], [Minimum Wage]) VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                [state, area_name, number_of_adults, number_of_children, wage, 5.0, 10.0])
+            conn.execute('''INSERT INTO Expenses (State, Area, [Number of Adults], [Number of Children],
+                [Required Annual Income Before Taxes]) VALUES (?, ?, ?, ?, ?)''',
+                [state, area_name, number_of_adults, number_of_children, wage * 2080])
+    conn.commit()
+    conn.close()
+    living_wage.refresh_aggregates(db_name)
+    living_wage.refresh_household_curves(db_name)
+    monkeypatch.setattr(living_wage, 'DB_NAME', db_name)
+    return db_name
+
+
+def labels_in_order(wage_matrix):
+    order, _ = living_wage_compare.ranked_area_gaps(wage_matrix)
+    return living_wage_compare.area_labels(wage_matrix, order)
+
+
+##############################################
+############## ranked_area_gaps ##############
+##############################################
+def test_areas_of_every_state_are_ranked_by_gap(db_name):
+    wage_matrix = living_wage_policy.load_wage_matrix(db_name)
+
+    order, gaps = living_wage_compare.ranked_area_gaps(wage_matrix)
+
+    assert [(wage_matrix['states'][i], wage_matrix['areas'][i]) for i in order] == [
+        ('MI', 'ann arbor, mi'), ('OH', 'alpha county'), ('MI', 'alpha county'), ('MI', 'beta county')]
+    assert gaps.tolist() == pytest.approx([20.0, 15.0, 10.0, 2.0])
+
+
+def test_only_the_areas_of_the_matrix_are_ranked(db_name):
+    wage_matrix = living_wage_policy.load_wage_matrix(db_name, state='OH')
+
+    order, gaps = living_wage_compare.ranked_area_gaps(wage_matrix)
+
+    assert order.tolist() == [0]
+    assert gaps.tolist() == pytest.approx([15.0])
+
+
+def test_missing_aggregates(db_name):
+    conn = sqlite3.connect(db_name)
+    conn.execute('DROP TABLE AreaAggregates')
+    conn.close()
+    living_wage.bump_db_generation()
+
+    with pytest.raises(LookupError, match='rebuild'):
+        living_wage_compare.ranked_area_gaps(living_wage_policy.load_wage_matrix(db_name))
+
+
+##############################################
+################ area_labels #################
+##############################################
+def test_labels_name_the_state_when_there_are_several(db_name):
+    assert labels_in_order(living_wage_policy.load_wage_matrix(db_name))[:2] == [
+        'Ann Arbor, MI (MI)', 'Alpha County (OH)']
+
+
+def test_labels_of_one_state(db_name):
+    assert labels_in_order(living_wage_policy.load_wage_matrix(db_name, state='MI')) == [
+        'Ann Arbor, MI', 'Alpha County', 'Beta County']
+
+
+def test_composition_label():
+    assert living_wage_compare.composition_label(('one adult', 1)) == 'one adult, 1 child'
+    assert living_wage_compare.composition_label(('two adults (both working)', 0)) == 'two adults (both working), 0 children'
+
+
+##############################################
+################### graphs ###################
+##############################################
+def test_ranked_gaps_switch_to_webgl_for_many_areas(db_name, monkeypatch):
+    wage_matrix = living_wage_policy.load_wage_matrix(db_name)
+    assert living_wage_compare.build_ranked_gap_figure(wage_matrix).data[0].type == 'bar'
+
+    monkeypatch.setattr(living_wage_compare, 'WEBGL_AREA_THRESHOLD', 3)
+    figure = living_wage_compare.build_ranked_gap_figure(wage_matrix)
+
+    assert figure.data[0].type == 'scattergl'
+    assert list(figure.data[0].y) == pytest.approx([20.0, 15.0, 10.0, 2.0])
+
+
+def test_heatmap_bins_ranked_rows(db_name):
+    wage_matrix = living_wage_policy.load_wage_matrix(db_name)
+
+    heatmap = living_wage_compare.build_gap_heatmap_figure(wage_matrix, max_rows=2).data[0]
+
+    assert len(heatmap.y) == 2
+    assert heatmap.y[0].startswith('#1-2 (Ann Arbor, MI (MI) ... Alpha County (OH))')
+    assert heatmap.z[0][0] == pytest.approx(17.5)
+    assert heatmap.z[1][0] == pytest.approx(6.0)
+
+
+def test_small_multiples_have_one_histogram_per_composition(db_name):
+    wage_matrix = living_wage_policy.load_wage_matrix(db_name)
+
+    figure = living_wage_compare.build_small_multiples_figure(wage_matrix, bins=4)
+
+    assert len(figure.data) == len(COMPOSITIONS)
+    assert sum(figure.data[0].y) == len(WAGE_DICT)
+
+
+##############################################
+#################### main ####################
+##############################################
+def test_main_writes_the_graph(db_name, tmp_path, monkeypatch):
+    html_name = str(tmp_path / 'compare.html')
+    monkeypatch.setattr(sys, 'argv', ['living_wage_compare.py', '--db', db_name, '--view', 'heatmap', '--html', html_name])
+
+    living_wage_compare.main()
+
+    assert os.path.getsize(html_name) > 0
+
+
+def test_main_rejects_an_unknown_state(db_name, monkeypatch):
+    monkeypatch.setattr(sys, 'argv', ['living_wage_compare.py', '--db', db_name, '--state', 'ZZ'])
+
+    with pytest.raises(SystemExit, match='No matching areas'):
+        living_wage_compare.main()
@@ -0,0 +1,102 @@
+''' Tests of the streamed page download (download_page(), detect_encoding() and
+decode_page() in living_wage.py).
+
+Run from the folder that contains living_wage.py:
+    python3 -m pytest tests
+'''
+import codecs
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import living_wage
+from living_wage import PageTooLarge
+
+
+class Response:
+    ''' Stands in for a streamed requests.Response, and counts the chunks read. '''
+    def __init__(self, body, headers=None, chunk_bytes=4):
+        self.url = 'https://example.org/counties/26161'
+        self.body = body
+        self.headers = headers or {}
+        self.chunk_bytes = chunk_bytes
+        self.chunk_count = 0
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), self.chunk_bytes):
+            self.chunk_count += 1
+            yield self.body[start:start + self.chunk_bytes]
+
+
+##############################################
+################ download_page ###############
+##############################################
+def test_small_page_is_read_whole():
+    assert living_wage.download_page(Response(b'<html></html>'), max_bytes=100) == b'<html></html>'
+
+
+def test_page_of_exactly_max_bytes():
+    assert len(living_wage.download_page(Response(b'x' * 16), max_bytes=16)) == 16
+
+
+def test_big_content_length_is_refused_before_reading():
+    response = Response(b'x' * 16, headers={'Content-Length': '1000'})
+
+    with pytest.raises(PageTooLarge, match='1,000 bytes'):
+        living_wage.download_page(response, max_bytes=100)
+    assert response.chunk_count == 0
+
+
+def test_endless_page_stops_at_max_bytes():
+    response = Response(b'x' * 10000, headers={'Content-Length': 'unknown'})
+
+    with pytest.raises(PageTooLarge):
+        living_wage.download_page(response, max_bytes=100)
+    assert response.chunk_count == 26
+
+
+def test_default_limit(monkeypatch):
+    monkeypatch.setattr(living_wage, 'MAX_PAGE_BYTES', 8)
+    with pytest.raises(PageTooLarge):
+        living_wage.download_page(Response(b'x' * 9))
+
+
+##############################################
+############### detect_encoding ##############
+##############################################
+def test_header_charset_comes_first():
+    page_body = b'<meta charset="iso-8859-1"><p>caf\xc3\xa9</p>'
+    assert living_wage.detect_encoding(page_body, 'text/html; charset="UTF-8"') == 'utf-8'
+
+
+def test_byte_order_mark():
+    assert living_wage.detect_encoding(codecs.BOM_UTF8 + b'<p>cafe</p>') == 'utf-8-sig'
+    assert living_wage.detect_encoding('<p>cafe</p>'.encode('utf-16')) == 'utf-16'
+
+
+def test_meta_charset():
+    assert living_wage.detect_encoding(b'<head><meta charset=windows-1252></head>', 'text/html') == 'cp1252'
+
+
+def test_misspelled_charset_falls_through():
+    page_body = b'<meta charset="latin-1">'
+    assert living_wage.detect_encoding(page_body, 'text/html; charset=utf-nine') == 'iso8859-1'
+    assert living_wage.detect_encoding(b'<p>no charset</p>', 'text/html; charset=bogus') == living_wage.DEFAULT_ENCODING
+
+
+def test_meta_charset_after_the_sniffed_bytes_is_ignored():
+    page_body = b' ' * living_wage.ENCODING_SNIFF_BYTES + b'<meta charset="iso-8859-1">'
+    assert living_wage.detect_encoding(page_body) == living_wage.DEFAULT_ENCODING
+
+
+##############################################
+################# decode_page ################
+##############################################
+def test_decode_page():
+    assert living_wage.decode_page('<p>café</p>'.encode('cp1252'), 'text/html; charset=windows-1252') == '<p>café</p>'
+
+
+def test_invalid_bytes_become_replacement_characters():
+    assert living_wage.decode_page(b'<p>caf\xe9</p>') == '<p>caf�</p>'
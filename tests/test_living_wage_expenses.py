@@ -0,0 +1,72 @@
+''' Tests of the expense page parser (parse_expenses_page() in living_wage.py).
+
+Run from the folder that contains living_wage.py:
+    python3 -m pytest tests
+'''
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import living_wage
+
+
+def make_expenses_page(rows):
+    ''' Builds the expense table of an area page, one <tr> per (label, 12 cells) row. '''
+    html_rows = ''.join('<tr><td>{}</td>{}</tr>'.format(label, ''.join(f'<td>{cell}</td>' for cell in cells))
+        for label, cells in rows)
+    return f'<table class="results_table table-striped expense_table"><tbody>{html_rows}</tbody></table>'
+
+
+FOOD_CELLS = [f'${1000 * (i + 1):,}' for i in range(12)]
+BEFORE_TAXES_CELLS = [f'${10000 * (i + 1):,}' for i in range(12)]
+
+
+##############################################
+############# parse_expenses_page ############
+##############################################
+def test_parse_every_composition():
+    expenses_dict = living_wage.parse_expenses_page(make_expenses_page([
+        ('Food', FOOD_CELLS),
+        ('Required annual income before taxes', BEFORE_TAXES_CELLS),
+    ]))
+
+    assert expenses_dict['one adult']['0 children'] == {'food': 1000.0, 'required annual income before taxes': 10000.0}
+    assert expenses_dict['two adults (both working)']['3 children']['required annual income before taxes'] == 120000.0
+
+
+def test_parse_uses_the_last_row_when_the_total_is_renamed():
+    expenses_dict = living_wage.parse_expenses_page(make_expenses_page([
+        ('Food', FOOD_CELLS),
+        ('Annual income needed', BEFORE_TAXES_CELLS),
+    ]))
+
+    assert expenses_dict['two adults (one working)']['1 child']['required annual income before taxes'] == 60000.0
+
+
+def test_parse_rejects_a_blank_total():
+    with pytest.raises(ValueError):
+        living_wage.parse_expenses_page(make_expenses_page([
+            ('Food', FOOD_CELLS),
+            ('Required annual income before taxes', BEFORE_TAXES_CELLS[:11] + ['']),
+        ]))
+
+
+def test_parse_rejects_a_table_without_rows_of_12_values():
+    with pytest.raises(ValueError):
+        living_wage.parse_expenses_page(make_expenses_page([('Food', FOOD_CELLS[:6])]))
+
+
+##############################################
+############### scrape_or_skip ###############
+##############################################
+def test_scrape_or_skip_records_the_page(monkeypatch, capsys):
+    monkeypatch.setattr(living_wage, 'SKIPPED_PAGE_DICT', {})
+    page = make_expenses_page([('Food', FOOD_CELLS[:6])])
+
+    assert living_wage.scrape_or_skip(living_wage.parse_expenses_page, page) is None
+    assert living_wage.SKIPPED_PAGE_DICT[page].startswith('ValueError: ')
+    assert '[Error message]' in capsys.readouterr().out
+    ## skipped pages are not tried again in the same build
+    assert living_wage.scrape_or_skip(pytest.fail, page) is None
@@ -0,0 +1,125 @@
+''' Tests of the page fragment cache (extract_page_fragment() and
+get_page_fragment() in living_wage.py), on the recorded Michigan pages.
+
+Run from the folder that contains living_wage.py:
+    python3 -m pytest tests
+'''
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'benchmarks'))
+import fixtures
+import living_wage
+
+
+@pytest.fixture(scope='module')
+def corpus():
+    return fixtures.load_michigan_corpus()
+
+
+@pytest.fixture
+def area_url(corpus):
+    return sorted(url for url in corpus if url != fixtures.BASE_URL + living_wage.LOCATIONS_PATH)[0]
+
+
+@pytest.fixture
+def caches(monkeypatch):
+    ''' Gives every test empty caches, and fails any attempt to fetch a page. '''
+    def no_request(url, cache_dict):
+        raise AssertionError(f'fetched {url}')
+    for name in ('CACHE_DICT', 'FRAGMENT_DICT', 'VERIFIED_PAGE_DICT', 'CACHE_META_DICT'):
+        monkeypatch.setattr(living_wage, name, {})
+    monkeypatch.setattr(living_wage, 'make_request_with_cache', no_request)
+    return living_wage
+
+
+##############################################
+########### extract_page_fragment ############
+##############################################
+def test_fragment_parses_like_the_full_page(corpus, area_url):
+    page = corpus[area_url]
+    fragment = living_wage.extract_page_fragment(page)
+
+    assert len(fragment) < len(page)
+    assert living_wage.parse_wages_page(fragment) == living_wage.parse_wages_page(page)
+    assert living_wage.parse_expenses_page(fragment) == living_wage.parse_expenses_page(page)
+
+
+def test_fragment_keeps_the_area_lists(corpus):
+    page = corpus[fixtures.BASE_URL + living_wage.LOCATIONS_PATH]
+    fragment = living_wage.extract_page_fragment(page)
+
+    assert 'counties list-unstyled' in fragment
+    assert 'metros list-unstyled' in fragment
+    assert fragment.count('href=') == page.count('<a href=')
+
+
+def test_fragment_of_a_page_without_tables():
+    fragment = living_wage.extract_page_fragment('<html><body><p>moved</p></body></html>')
+    assert fragment == '<div class="container"></div><table></table>'
+
+
+##############################################
+############### get_page_fragment ############
+##############################################
+def test_fragment_is_cut_once(caches, corpus, area_url, monkeypatch):
+    caches.CACHE_DICT[area_url] = corpus[area_url]
+    cut_list = []
+    extract_page_fragment = living_wage.extract_page_fragment
+    monkeypatch.setattr(living_wage, 'extract_page_fragment',
+        lambda url_text: cut_list.append(url_text) or extract_page_fragment(url_text))
+
+    first_fragment = living_wage.get_page_fragment(area_url)
+    second_fragment = living_wage.get_page_fragment(area_url)
+
+    assert first_fragment == second_fragment
+    assert len(cut_list) == 1
+    assert caches.FRAGMENT_DICT[area_url]['hash'] == living_wage.hash_page(corpus[area_url])
+    assert area_url in caches.CACHE_META_DICT
+
+
+def test_fragment_is_cut_again_when_the_page_changes(caches, corpus, area_url):
+    caches.CACHE_DICT[area_url] = corpus[area_url]
+    living_wage.get_page_fragment(area_url)
+
+    other_url = sorted(url for url in corpus if url != area_url and url.startswith(area_url.rsplit('/', 1)[0]))[0]
+    caches.CACHE_DICT[area_url] = corpus[other_url]
+    fragment = living_wage.get_page_fragment(area_url)
+
+    assert fragment == living_wage.extract_page_fragment(corpus[other_url])
+    assert caches.FRAGMENT_DICT[area_url]['hash'] == living_wage.hash_page(corpus[other_url])
+
+
+def test_fragment_of_an_older_version_is_cut_again(caches, corpus, area_url):
+    caches.CACHE_DICT[area_url] = corpus[area_url]
+    caches.FRAGMENT_DICT[area_url] = {'hash': living_wage.hash_page(corpus[area_url]),
+        'version': living_wage.FRAGMENT_VERSION - 1, 'fragment': 'stale'}
+
+    assert living_wage.get_page_fragment(area_url) != 'stale'
+    assert caches.FRAGMENT_DICT[area_url]['version'] == living_wage.FRAGMENT_VERSION
+
+
+def test_fragment_is_used_without_the_full_page(caches, corpus, area_url):
+    caches.CACHE_DICT[area_url] = corpus[area_url]
+    fragment = living_wage.get_page_fragment(area_url)
+
+    del caches.CACHE_DICT[area_url]
+    caches.VERIFIED_PAGE_DICT.clear()
+
+    assert living_wage.get_page_fragment(area_url) == fragment
+
+
+def test_missing_page_and_fragment_is_fetched(caches, corpus, area_url, monkeypatch):
+    def fetch(url, cache_dict):
+        cache_dict[url] = corpus[url]
+        return corpus[url]
+    monkeypatch.setattr(living_wage, 'make_request_with_cache', fetch)
+
+    fragment = living_wage.get_page_fragment(area_url)
+
+    assert fragment == living_wage.extract_page_fragment(corpus[area_url])
+    assert caches.CACHE_DICT[area_url] == corpus[area_url]
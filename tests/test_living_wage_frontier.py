@@ -0,0 +1,113 @@
+''' Tests of the URL frontier (discover_areas() and normalize_url() in living_wage.py).
+
+Run from the folder that contains living_wage.py:
+    python3 -m pytest tests
+'''
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import living_wage
+
+
+STATE_URL = 'https://example.org/states/26/locations'
+
+
+def make_state_page(county_links, msa_links):
+    ''' Builds a state page with one <ul> of (text, href) links per list. '''
+    def listing(list_class, links):
+        items = ''.join(f'<li><a href="{href}">{text}</a></li>' for text, href in links)
+        return f'<div class="{list_class}"><ul>{items}</ul></div>'
+    return ('<html><body><div class="container"><h1>Michigan</h1>'
+        + listing('counties list-unstyled', county_links) + listing('metros list-unstyled', msa_links)
+        + '</div></body></html>')
+
+
+STATE_PAGE = make_state_page(
+    [('Washtenaw County, Michigan', '/counties/26161'), ('Wayne County, Michigan', '/counties/26163/')],
+    [('Ann Arbor, MI', '/metros/11460'), ('Ann Arbor, MI', '/metros/11460?year=2020')])
+
+
+@pytest.fixture
+def caches(tmp_path, monkeypatch):
+    ''' Gives every test empty caches, with STATE_PAGE cached under STATE_URL. '''
+    for name in ('CACHE_DICT', 'FRAGMENT_DICT', 'VERIFIED_PAGE_DICT', 'CACHE_META_DICT', 'FRONTIER_DICT', 'KNOWN_FILE_DICT'):
+        monkeypatch.setattr(living_wage, name, {})
+    monkeypatch.setattr(living_wage, 'FRONTIER_FILENAME', str(tmp_path / 'living_wage_frontier.json'))
+    living_wage.CACHE_DICT[STATE_URL] = STATE_PAGE
+    return living_wage
+
+
+##############################################
+############### normalize_url ################
+##############################################
+def test_normalize_url():
+    base_url = living_wage.BASE_URL
+    assert living_wage.normalize_url('/counties/26161/') == base_url + '/counties/26161'
+    assert living_wage.normalize_url(' /metros/11460?year=2020#top ') == base_url + '/metros/11460'
+    assert living_wage.normalize_url('HTTPS://Example.ORG/counties/26161') == 'https://example.org/counties/26161'
+
+
+##############################################
+############### discover_areas ###############
+##############################################
+def test_areas_are_listed_once_in_page_order(caches):
+    areas = living_wage.discover_areas(STATE_URL)
+
+    assert [(area['key'], area['name'], area['type'], area['code']) for area in areas] == [
+        ('washtenaw county, michigan', 'Washtenaw County', 'County', '26161'),
+        ('wayne county, michigan', 'Wayne County', 'County', '26163'),
+        ('ann arbor, mi', 'Ann Arbor', 'MSA', '11460'),
+    ]
+    assert areas[1]['url'] == living_wage.BASE_URL + '/counties/26163'
+
+
+def test_state_page_is_parsed_once(caches, monkeypatch):
+    first_areas = living_wage.discover_areas(STATE_URL)
+    monkeypatch.setattr(living_wage, 'make_soup', lambda url_text: pytest.fail('parsed the state page again'))
+
+    assert living_wage.discover_areas(STATE_URL) is first_areas
+
+
+def test_changed_state_page_is_parsed_again(caches):
+    living_wage.discover_areas(STATE_URL)
+
+    caches.CACHE_DICT[STATE_URL] = make_state_page([('Monroe County, Michigan', '/counties/26115')], [])
+
+    assert [area['key'] for area in living_wage.discover_areas(STATE_URL)] == ['monroe county, michigan']
+
+
+def test_new_frontier_version_parses_again(caches, monkeypatch):
+    living_wage.discover_areas(STATE_URL)
+    caches.FRONTIER_DICT[STATE_URL]['areas'] = []
+
+    monkeypatch.setattr(living_wage, 'FRONTIER_VERSION', living_wage.FRONTIER_VERSION + 1)
+
+    assert len(living_wage.discover_areas(STATE_URL)) == 3
+
+
+##############################################
+############ save_frontier / open ############
+##############################################
+def test_frontier_survives_a_restart(caches):
+    areas = living_wage.discover_areas(STATE_URL)
+    living_wage.save_frontier(caches.FRONTIER_DICT)
+
+    caches.FRONTIER_DICT.clear()
+    caches.FRONTIER_DICT.update(living_wage.open_frontier())
+
+    assert caches.FRONTIER_DICT[STATE_URL]['areas'] == areas
+
+
+def test_save_merges_state_pages_of_other_processes(caches):
+    with open(living_wage.FRONTIER_FILENAME, 'w') as frontier_file:
+        json.dump({'https://example.org/states/39/locations': {'hash': '', 'version': 1, 'areas': []}}, frontier_file)
+    living_wage.discover_areas(STATE_URL)
+
+    living_wage.save_frontier(caches.FRONTIER_DICT)
+
+    assert sorted(living_wage.open_frontier()) == ['https://example.org/states/26/locations',
+        'https://example.org/states/39/locations']
@@ -0,0 +1,92 @@
+''' Tests of the household estimates (living_wage_households.py).
+
+Run from the folder that contains living_wage.py:
+    python3 -m pytest tests
+'''
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import living_wage_households
+
+
+def make_curves():
+    ## two areas; the second one costs twice as much as the first
+    income = np.array([
+        [[20000, 30000, 40000, 50000], [30000, 40000, 50000, 60000], [32000, 42000, 52000, 62000]],
+        [[40000, 60000, 80000, 100000], [60000, 80000, 100000, 120000], [64000, 84000, 104000, 124000]],
+    ], dtype=float)
+    return {
+        'areas': ['area a', 'area b'],
+        'states': ['MI', 'MI'],
+        'income': income,
+        'extra_child': income[:, :, 3] - income[:, :, 2],
+        'extra_adult': income[:, 1, 0] - income[:, 0, 0],
+        'hours_per_year': np.array([2000.0, 2000.0]),
+    }
+
+
+##############################################
+################# Household ##################
+##############################################
+@pytest.mark.parametrize('adults, working_adults, children', [
+    (0, 0, 0),
+    (2, 0, 1),
+    (2, 3, 1),
+    (1, 1, -1),
+])
+def test_household_rejects_impossible_households(adults, working_adults, children):
+    with pytest.raises(ValueError):
+        living_wage_households.Household(adults, working_adults, children)
+
+
+@pytest.mark.parametrize('adults, working_adults, composition_index', [
+    (1, 1, 0),
+    (2, 1, 1),
+    (2, 2, 2),
+    (4, 1, 1),
+    (4, 3, 2),
+])
+def test_household_base_composition(adults, working_adults, composition_index):
+    assert living_wage_households.Household(adults, working_adults, 0).base_composition() == composition_index
+
+
+##############################################
+############# estimate_household #############
+##############################################
+def test_estimate_matches_the_website_compositions():
+    estimate = living_wage_households.estimate_household(make_curves(), living_wage_households.Household(2, 2, 3))
+
+    assert estimate['required_income'] == pytest.approx([62000, 124000])
+    assert estimate['living_wage'] == pytest.approx([62000 / 4000, 124000 / 4000])
+    assert estimate['states'] == ['MI', 'MI']
+
+
+def test_estimate_adds_extra_children_and_adults():
+    ## 3 adults, one working, 5 children: 2 children and 1 adult past the curves
+    estimate = living_wage_households.estimate_household(make_curves(), living_wage_households.Household(3, 1, 5))
+
+    assert estimate['required_income'] == pytest.approx([60000 + 2 * 10000 + 10000, 120000 + 2 * 20000 + 20000])
+    assert estimate['living_wage'] == pytest.approx(estimate['required_income'] / 2000)
+
+
+def test_estimate_households_stacks_one_row_per_household():
+    households = [living_wage_households.Household(1, 1, 0), living_wage_households.Household(2, 1, 1)]
+    estimates = living_wage_households.estimate_households(make_curves(), households)
+
+    assert estimates['required_income'].shape == (2, 2)
+    assert estimates['required_income'][:, 0] == pytest.approx([20000, 40000])
+
+
+##############################################
+#################### main ####################
+##############################################
+@pytest.mark.parametrize('working', ['0', '3'])
+def test_main_rejects_working_adults_out_of_range(monkeypatch, working):
+    monkeypatch.setattr(sys, 'argv', ['living_wage_households.py', '--adults', '2', '--working', working])
+    with pytest.raises(SystemExit) as exit_info:
+        living_wage_households.main()
+    assert 'working adults' in str(exit_info.value)
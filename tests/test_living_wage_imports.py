@@ -0,0 +1,53 @@
+''' Tests that importing the programs stays cheap: no module loads bs4, requests,
+prettytable, plotly, numpy or duckdb until a function that needs it runs.
+benchmarks/import_budget.py times the same thing for living_wage.py.
+
+Run from the folder that contains living_wage.py:
+    python3 -m pytest tests
+'''
+import glob
+import os
+import subprocess
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ['bs4', 'requests', 'prettytable', 'plotly', 'numpy', 'duckdb']
+
+MODULE_NAMES = sorted(os.path.splitext(os.path.basename(filename))[0]
+    for filename in glob.glob(os.path.join(REPO_DIR, 'living_wage*.py')))
+
+
+def loaded_heavy_modules(snippet):
+    ''' Runs snippet in a new interpreter and returns the HEAVY_MODULES it loaded. '''
+    check = f'{snippet}\nimport sys\nprint(" ".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))'
+    completed = subprocess.run([sys.executable, '-c', check], cwd=REPO_DIR,
+        capture_output=True, text=True, timeout=60, check=True)
+    return completed.stdout.split()
+
+
+##############################################
+################ lazy imports ################
+##############################################
+@pytest.mark.parametrize('module_name', MODULE_NAMES)
+def test_import_loads_no_heavy_module(module_name):
+    assert loaded_heavy_modules(f'import {module_name}') == []
+
+
+def test_queries_load_no_heavy_module():
+    snippet = '''
+import living_wage
+living_wage.access_sql_table('washtenaw county', 'Wages')
+living_wage.avg_living_wage('washtenaw county')
+'''
+    assert loaded_heavy_modules(snippet) == []
+
+
+def test_parsing_loads_bs4_only():
+    snippet = '''
+import living_wage
+living_wage.extract_page_fragment('<html><body></body></html>')
+'''
+    assert loaded_heavy_modules(snippet) == ['bs4']
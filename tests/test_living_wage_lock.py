@@ -0,0 +1,192 @@
+''' Tests of the inter-process file locks (living_wage_lock.py) and of the
+atomic database swap in build_database() (living_wage.py).
+
+Run from the folder that contains living_wage.py:
+    python3 -m pytest tests
+'''
+import json
+import os
+import sqlite3
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import living_wage
+import living_wage_lock
+from living_wage_lock import FileLock, LockTimeout
+
+
+##############################################
+################# file_lock ##################
+##############################################
+def test_one_lock_per_file(tmp_path):
+    filename = str(tmp_path / 'living_wage_cache.json')
+
+    assert living_wage_lock.file_lock(filename) is living_wage_lock.file_lock(filename)
+    assert living_wage_lock.file_lock(filename).path == filename + '.lock'
+    assert living_wage_lock.file_lock(filename) is not living_wage_lock.file_lock(filename + '.other')
+
+
+def test_lock_is_re_entrant(tmp_path):
+    lock = living_wage_lock.file_lock(str(tmp_path / 'living_wage_cache.json'))
+
+    with lock:
+        with lock:
+            assert lock.depth == 2
+        assert lock.lock_file is not None
+    assert lock.depth == 0
+    assert lock.lock_file is None
+
+
+def test_other_thread_waits_for_the_lock(tmp_path):
+    lock = living_wage_lock.file_lock(str(tmp_path / 'living_wage_cache.json'))
+    error_list = []
+
+    def take_lock():
+        try:
+            lock.acquire(timeout=0.1)
+        except LockTimeout as error:
+            error_list.append(error)
+
+    with lock:
+        thread = threading.Thread(target=take_lock)
+        thread.start()
+        thread.join()
+    assert len(error_list) == 1
+
+    thread = threading.Thread(target=lambda: (lock.acquire(timeout=0.1), lock.release()))
+    thread.start()
+    thread.join()
+    assert lock.depth == 0
+
+
+def test_other_process_waits_for_the_lock(tmp_path):
+    ''' A second FileLock on the same lock file opens its own file description,
+    like another process would, so only the operating system lock keeps it out.
+    '''
+    filename = str(tmp_path / 'living_wage_cache.json')
+    other_process_lock = FileLock(filename + '.lock')
+
+    with living_wage_lock.file_lock(filename):
+        with pytest.raises(LockTimeout):
+            other_process_lock.acquire(timeout=0.1)
+        assert other_process_lock.depth == 0
+
+    other_process_lock.acquire(timeout=0.1)
+    other_process_lock.release()
+
+
+##############################################
+############ write_json_atomically ###########
+##############################################
+def test_write_json_atomically(tmp_path):
+    filename = str(tmp_path / 'living_wage_cache.json')
+
+    living_wage_lock.write_json_atomically(filename, {'a': 1})
+    living_wage_lock.write_json_atomically(filename, {'b': 2})
+
+    with open(filename) as json_file:
+        assert json.load(json_file) == {'b': 2}
+    assert os.listdir(tmp_path) == ['living_wage_cache.json']
+
+
+def test_failed_write_keeps_the_old_file(tmp_path):
+    filename = str(tmp_path / 'living_wage_cache.json')
+    living_wage_lock.write_json_atomically(filename, {'a': 1})
+
+    with pytest.raises(TypeError):
+        living_wage_lock.write_json_atomically(filename, {'b': object()})
+
+    with open(filename) as json_file:
+        assert json.load(json_file) == {'a': 1}
+    assert os.listdir(tmp_path) == ['living_wage_cache.json']
+
+
+##############################################
+############## build_database ################
+##############################################
+def make_scraped(living_wage_value):
+    ''' Scraped wages and expenses of one area, in the layout of match_location_names_to_*_dict(). '''
+    wages = {}
+    expenses = {}
+    for number_of_adults in living_wage.WORKING_ADULTS_DICT:
+        wages[number_of_adults] = {}
+        expenses[number_of_adults] = {}
+        for number_of_children in range(4):
+            children_key = f'{number_of_children} children'
+            wages[number_of_adults][children_key] = {
+                'living wage': living_wage_value, 'poverty wage': 5.0, 'minimum wage': 9.45}
+            expenses[number_of_adults][children_key] = {
+                'food': 1000.0, 'required annual income before taxes': living_wage_value * 2080}
+    return {'washtenaw county': wages}, {'washtenaw county': expenses}
+
+
+@pytest.fixture
+def db_name(tmp_path, monkeypatch):
+    db_name = str(tmp_path / 'living_wage.sqlite')
+    monkeypatch.setattr(living_wage, 'DB_NAME', db_name)
+    monkeypatch.setattr(living_wage, 'DUCKDB_NAME', None)
+    monkeypatch.setattr(living_wage, 'discover_areas', lambda: [])
+    return db_name
+
+
+def living_wages(db_name):
+    conn = sqlite3.connect(db_name)
+    rows = conn.execute('SELECT DISTINCT [Living Wage] FROM Wages').fetchall()
+    conn.close()
+    return rows
+
+
+def test_build_replaces_the_database(db_name, tmp_path):
+    wages, expenses = make_scraped(20.0)
+    living_wage.build_database(wages, expenses)
+    generation = living_wage.db_generation()
+
+    wages, expenses = make_scraped(25.0)
+    living_wage.build_database(wages, expenses)
+
+    assert living_wages(db_name) == [(25.0,)]
+    assert living_wage.schema_error(db_name) is None
+    assert living_wage.db_generation() != generation
+    assert not [filename for filename in os.listdir(tmp_path) if filename.endswith('.building')]
+
+
+def test_failed_build_keeps_the_old_database(db_name, tmp_path, monkeypatch):
+    wages, expenses = make_scraped(20.0)
+    living_wage.build_database(wages, expenses)
+
+    def fail(*args, **kwargs):
+        assert os.path.exists(f'{db_name}.{os.getpid()}.building')
+        assert living_wages(db_name) == [(20.0,)]
+        raise RuntimeError('scraper broke')
+    monkeypatch.setattr(living_wage, 'refresh_aggregates', fail)
+
+    wages, expenses = make_scraped(25.0)
+    with pytest.raises(RuntimeError):
+        living_wage.build_database(wages, expenses)
+
+    assert living_wages(db_name) == [(20.0,)]
+    assert not [filename for filename in os.listdir(tmp_path) if filename.endswith('.building')]
+
+
+def test_build_holds_the_database_lock(db_name, monkeypatch):
+    held_list = []
+    create_db = living_wage.create_db
+
+    def create_db_and_check(temp_db_name):
+        other_process_lock = FileLock(db_name + '.lock')
+        try:
+            other_process_lock.acquire(timeout=0.05)
+            other_process_lock.release()
+            held_list.append(False)
+        except LockTimeout:
+            held_list.append(True)
+        create_db(temp_db_name)
+    monkeypatch.setattr(living_wage, 'create_db', create_db_and_check)
+
+    wages, expenses = make_scraped(20.0)
+    living_wage.build_database(wages, expenses)
+
+    assert held_list == [True]
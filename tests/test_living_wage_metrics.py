@@ -0,0 +1,110 @@
+''' Tests of the metrics layer (living_wage_metrics.py).
+
+Run from the folder that contains living_wage.py:
+    python3 -m pytest tests
+'''
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import living_wage_metrics as metrics
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    ''' Turns metrics on with an empty registry, for the length of one test. '''
+    monkeypatch.setattr(metrics, 'METRICS_ENABLED', True)
+    monkeypatch.setattr(metrics, 'REGISTRY', {})
+
+
+##############################################
+############# counters & gauges ##############
+##############################################
+def test_counter_only_counts_while_enabled(monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_ENABLED', False)
+    counter = metrics.Counter('pages_total', 'Pages')
+    counter.inc()
+    assert counter.value == 0
+
+    monkeypatch.setattr(metrics, 'METRICS_ENABLED', True)
+    counter.inc()
+    counter.inc(2)
+    assert counter.value == 3
+
+
+def test_gauge_keeps_the_last_value(enabled):
+    gauge = metrics.Gauge('rate', 'Rate')
+    gauge.set(5)
+    gauge.set(0.5)
+    assert gauge.value == 0.5
+
+
+def test_registering_a_name_twice_returns_the_same_metric(enabled):
+    assert metrics.counter('hits_total', 'Hits') is metrics.counter('hits_total', 'Hits again')
+    assert list(metrics.REGISTRY) == ['hits_total']
+
+
+##############################################
+################# histograms #################
+##############################################
+def test_histogram_buckets_are_cumulative(enabled):
+    histogram = metrics.Histogram('seconds', 'Seconds', buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value)
+
+    assert histogram.cumulative_counts() == [2, 3, 4]
+    assert histogram.count == 4
+    assert histogram.total == pytest.approx(3.65)
+    assert histogram.to_dict()['buckets'] == {'0.1': 2, '1': 3, '+Inf': 4}
+
+
+def test_timer_observes_its_block(enabled):
+    histogram = metrics.Histogram('seconds', 'Seconds')
+    with histogram.time():
+        pass
+    assert histogram.count == 1
+
+
+def test_timer_is_a_no_op_while_disabled(monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_ENABLED', False)
+    histogram = metrics.Histogram('seconds', 'Seconds')
+    assert histogram.time() is metrics.NULL_TIMER
+    with histogram.time():
+        pass
+    assert histogram.count == 0
+
+
+##############################################
+################## exports ###################
+##############################################
+def test_prometheus_text(enabled):
+    metrics.counter('hits_total', 'Cache hits').inc(3)
+    metrics.histogram('query_seconds', 'Query time', buckets=(1,)).observe(0.5)
+
+    assert metrics.to_prometheus().splitlines() == [
+        '# HELP hits_total Cache hits',
+        '# TYPE hits_total counter',
+        'hits_total 3',
+        '# HELP query_seconds Query time',
+        '# TYPE query_seconds histogram',
+        'query_seconds_bucket{le="1"} 1',
+        'query_seconds_bucket{le="+Inf"} 1',
+        'query_seconds_sum 0.5',
+        'query_seconds_count 1',
+    ]
+
+
+@pytest.mark.parametrize('filename, fmt', [('metrics.json', 'json'), ('metrics.prom', 'prometheus')])
+def test_dump_picks_the_format_from_the_extension(enabled, tmp_path, filename, fmt):
+    metrics.counter('hits_total', 'Cache hits').inc()
+    path = tmp_path / filename
+    metrics.dump(str(path))
+
+    text = path.read_text()
+    if fmt == 'json':
+        assert json.loads(text)['hits_total']['value'] == 1
+    else:
+        assert 'hits_total 1' in text.splitlines()
@@ -0,0 +1,118 @@
+''' Tests of the parse cache (get_parse_result() and save_parse_cache() in living_wage.py).
+
+Run from the folder that contains living_wage.py:
+    python3 -m pytest tests
+'''
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import living_wage
+
+
+URL = 'https://example.org/counties/26161'
+PAGE = '<html><body><table><thead></thead><tbody><tr><td>Living Wage</td></tr></tbody></table></body></html>'
+
+
+@pytest.fixture
+def caches(tmp_path, monkeypatch):
+    ''' Gives every test empty caches, with PAGE cached under URL. '''
+    for name in ('CACHE_DICT', 'FRAGMENT_DICT', 'VERIFIED_PAGE_DICT', 'CACHE_META_DICT', 'PARSE_DICT', 'KNOWN_FILE_DICT'):
+        monkeypatch.setattr(living_wage, name, {})
+    monkeypatch.setattr(living_wage, 'PARSE_CACHE_FILENAME', str(tmp_path / 'living_wage_parses.json'))
+    living_wage.CACHE_DICT[URL] = PAGE
+    return living_wage
+
+
+class Parser:
+    ''' A parse function that counts its calls. '''
+    def __init__(self):
+        self.call_count = 0
+
+    def __call__(self, url_text):
+        self.call_count += 1
+        return {'length': len(url_text)}
+
+
+##############################################
+############## get_parse_result ##############
+##############################################
+def test_fragment_is_parsed_once(caches):
+    parser = Parser()
+
+    first_result = living_wage.get_parse_result('wages', URL, parser)
+    second_result = living_wage.get_parse_result('wages', URL, parser)
+
+    assert first_result == second_result == {'length': len(living_wage.get_page_fragment(URL))}
+    assert parser.call_count == 1
+
+
+def test_each_parser_has_its_own_results(caches):
+    wages_parser = Parser()
+    expenses_parser = Parser()
+
+    living_wage.get_parse_result('wages', URL, wages_parser)
+    living_wage.get_parse_result('expenses', URL, expenses_parser)
+
+    assert wages_parser.call_count == expenses_parser.call_count == 1
+    assert sorted(key.split(':')[0] for key in caches.PARSE_DICT) == ['expenses', 'wages']
+
+
+def test_changed_page_is_parsed_again(caches):
+    parser = Parser()
+    living_wage.get_parse_result('wages', URL, parser)
+
+    caches.CACHE_DICT[URL] = PAGE.replace('Living Wage', 'Living Wage (2024)')
+    result = living_wage.get_parse_result('wages', URL, parser)
+
+    assert parser.call_count == 2
+    assert result == {'length': len(living_wage.get_page_fragment(URL))}
+
+
+def test_new_parser_version_parses_again(caches, monkeypatch):
+    parser = Parser()
+    living_wage.get_parse_result('wages', URL, parser)
+
+    monkeypatch.setattr(living_wage, 'PARSER_VERSION', living_wage.PARSER_VERSION + '-next')
+    living_wage.get_parse_result('wages', URL, parser)
+
+    assert parser.call_count == 2
+
+
+##############################################
+############## save_parse_cache ##############
+##############################################
+def test_saved_results_survive_a_restart(caches):
+    parser = Parser()
+    living_wage.get_parse_result('wages', URL, parser)
+    living_wage.save_parse_cache(caches.PARSE_DICT)
+
+    caches.PARSE_DICT.clear()
+    caches.PARSE_DICT.update(living_wage.open_parse_cache())
+    living_wage.get_parse_result('wages', URL, parser)
+
+    assert parser.call_count == 1
+
+
+def test_save_drops_older_versions(caches):
+    caches.PARSE_DICT['wages:old'] = {'version': '0', 'result': {}}
+    caches.PARSE_DICT['wages:new'] = {'version': living_wage.PARSER_VERSION, 'result': {}}
+
+    living_wage.save_parse_cache(caches.PARSE_DICT)
+
+    with open(living_wage.PARSE_CACHE_FILENAME) as parse_file:
+        assert list(json.load(parse_file)) == ['wages:new']
+
+
+def test_save_merges_results_of_other_processes(caches):
+    with open(living_wage.PARSE_CACHE_FILENAME, 'w') as parse_file:
+        json.dump({'expenses:other': {'version': living_wage.PARSER_VERSION, 'result': {}}}, parse_file)
+    caches.PARSE_DICT['wages:mine'] = {'version': living_wage.PARSER_VERSION, 'result': {}}
+
+    living_wage.save_parse_cache(caches.PARSE_DICT)
+
+    with open(living_wage.PARSE_CACHE_FILENAME) as parse_file:
+        assert sorted(json.load(parse_file)) == ['expenses:other', 'wages:mine']
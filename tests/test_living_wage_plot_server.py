@@ -0,0 +1,162 @@
+''' Tests of the local plot server (living_wage_plot_server.py).
+
+Run from the folder that contains living_wage.py:
+    python3 -m pytest tests
+'''
+import http.client
+import json
+import os
+import sys
+import time
+
+import pytest
+
+pytest.importorskip('plotly')
+import plotly.graph_objs as go
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import living_wage_plot_server
+
+
+@pytest.fixture
+def plot_server(monkeypatch):
+    ''' A plot server on a free port that never opens a browser tab. '''
+    monkeypatch.setattr(living_wage_plot_server, 'BROWSER_CONNECT_SECONDS', 0.1)
+    opened_list = []
+    monkeypatch.setattr(living_wage_plot_server.webbrowser, 'open', opened_list.append)
+    plot_server = living_wage_plot_server.PlotServer(port=0)
+    plot_server.opened_list = opened_list
+    plot_server.start()
+    yield plot_server
+    plot_server.stop()
+
+
+def get(plot_server, path):
+    ''' Returns (status code, headers, body) of a GET request to the plot server. '''
+    host, port = plot_server.server.server_address[:2]
+    conn = http.client.HTTPConnection(host, port, timeout=5)
+    conn.request('GET', path)
+    response = conn.getresponse()
+    result = (response.status, dict(response.getheaders()), response.read())
+    conn.close()
+    return result
+
+
+class EventStream:
+    ''' A tab connected to /events, reading one event at a time. '''
+    def __init__(self, plot_server):
+        host, port = plot_server.server.server_address[:2]
+        self.conn = http.client.HTTPConnection(host, port, timeout=5)
+        self.conn.request('GET', '/events')
+        self.response = self.conn.getresponse()
+
+    def next_event(self):
+        event = {}
+        while True:
+            line = self.response.fp.readline().decode('utf-8').rstrip('\n')
+            if not line:
+                return event
+            name, _, value = line.partition(': ')
+            event[name] = value
+
+    def close(self):
+        self.response.close()
+        self.conn.close()
+
+
+def figure(title):
+    return go.Figure(data=go.Bar(x=[1, 2], y=[3, 4]), layout=go.Layout(title=title))
+
+
+##############################################
+################### pages ####################
+##############################################
+def test_page_loads_the_versioned_plotly(plot_server):
+    status_code, headers, page = get(plot_server, '/')
+
+    assert status_code == 200
+    assert plot_server.plotly_path.encode('utf-8') in page
+    assert headers['Cache-Control'] == 'no-cache'
+
+    status_code, headers, plotly_js = get(plot_server, plot_server.plotly_path)
+    assert status_code == 200
+    assert 'immutable' in headers['Cache-Control']
+    assert plotly_js == plot_server.plotly_js
+
+
+def test_figure_before_and_after_show(plot_server):
+    assert get(plot_server, '/figure')[0] == 204
+
+    plot_server.show(figure('Washtenaw County'), open_browser=False)
+
+    status_code, _, figure_json = get(plot_server, '/figure')
+    assert status_code == 200
+    assert json.loads(figure_json)['layout']['title']['text'] == 'Washtenaw County'
+
+
+def test_unknown_path(plot_server):
+    assert get(plot_server, '/nowhere')[0] == 404
+
+
+##############################################
+################ event stream ################
+##############################################
+def test_each_figure_is_sent_down_the_stream(plot_server):
+    event_stream = EventStream(plot_server)
+    assert plot_server.wait_for_client(5)
+
+    for version, title in enumerate(['Washtenaw County', 'Ann Arbor'], start=1):
+        plot_server.show(figure(title))
+        event = event_stream.next_event()
+        assert event['id'] == str(version)
+        assert event['event'] == 'figure'
+        assert json.loads(event['data'])['layout']['title']['text'] == title
+
+    assert plot_server.opened_list == []
+    event_stream.close()
+
+
+def test_new_tab_gets_the_latest_figure(plot_server):
+    plot_server.show(figure('Washtenaw County'), open_browser=False)
+    plot_server.show(figure('Ann Arbor'), open_browser=False)
+
+    event_stream = EventStream(plot_server)
+    event = event_stream.next_event()
+
+    assert event['id'] == '2'
+    assert json.loads(event['data'])['layout']['title']['text'] == 'Ann Arbor'
+    event_stream.close()
+
+
+def test_tab_is_opened_only_when_none_is_connected(plot_server):
+    plot_server.show(figure('Washtenaw County'))
+    assert plot_server.opened_list == [plot_server.url]
+
+    event_stream = EventStream(plot_server)
+    plot_server.wait_for_client(5)
+    plot_server.show(figure('Ann Arbor'))
+    assert plot_server.opened_list == [plot_server.url]
+    event_stream.close()
+
+
+def test_closed_tab_is_noticed(plot_server):
+    event_stream = EventStream(plot_server)
+    plot_server.wait_for_client(5)
+
+    event_stream.close()
+
+    ## nothing is notified when a tab leaves, so check again and again
+    for _ in range(100):
+        if plot_server.client_count == 0:
+            break
+        time.sleep(living_wage_plot_server.DISCONNECT_CHECK_SECONDS / 5)
+    assert plot_server.client_count == 0
+
+
+def test_port_in_use_falls_back_to_a_free_port(plot_server):
+    port = plot_server.server.server_address[1]
+    other_server = living_wage_plot_server.PlotServer(port=port)
+    try:
+        assert other_server.server.server_address[1] not in (port, 0)
+    finally:
+        other_server.server.server_close()
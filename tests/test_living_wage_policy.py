@@ -0,0 +1,101 @@
+''' Tests of the minimum wage policy simulator (living_wage_policy.py).
+
+Run from the folder that contains living_wage.py:
+    python3 -m pytest tests
+'''
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import living_wage_policy
+
+
+def make_wage_matrix(living_wages, minimum_wage=9.45):
+    living_wages = np.array(living_wages, dtype=float)
+    return {
+        'areas': [f'area {i}' for i in range(living_wages.shape[0])],
+        'compositions': [('one adult', j) for j in range(living_wages.shape[1])],
+        'living_wages': living_wages,
+        'minimum_wages': np.where(np.isnan(living_wages), np.nan, minimum_wage),
+    }
+
+
+##############################################
+############### candidate_range ##############
+##############################################
+def test_candidate_range_includes_stop():
+    assert list(living_wage_policy.candidate_range(9.45, 10.45, 0.25)) == [9.45, 9.7, 9.95, 10.2, 10.45]
+
+
+def test_candidate_range_never_goes_above_stop():
+    assert list(living_wage_policy.candidate_range(9.45, 12, 1)) == [9.45, 10.45, 11.45]
+
+
+def test_candidate_range_keeps_stop_despite_rounding_errors():
+    assert list(living_wage_policy.candidate_range(0.1, 0.3, 0.1)) == [0.1, 0.2, 0.3]
+
+
+def test_candidate_range_single_value_and_empty():
+    assert list(living_wage_policy.candidate_range(12, 12, 0.5)) == [12]
+    assert len(living_wage_policy.candidate_range(12, 10, 0.5)) == 0
+
+
+@pytest.mark.parametrize('step', [0, -0.25])
+def test_candidate_range_rejects_steps_below_or_at_zero(step):
+    with pytest.raises(ValueError):
+        living_wage_policy.candidate_range(9.45, 12, step)
+
+
+##############################################
+########### simulate_minimum_wages ###########
+##############################################
+def test_simulation_summaries():
+    wage_matrix = make_wage_matrix([[10, 20], [16, 8]])
+    results = living_wage_policy.simulate_minimum_wages(wage_matrix, [8, 16])
+
+    assert results['mean_gap'] == pytest.approx([(2 + 12 + 8 + 0) / 4, (-6 + 4 + 0 - 8) / 4])
+    assert results['share_below'] == pytest.approx([3 / 4, 1 / 4])
+    assert results['mean_hours_needed'] == pytest.approx([40 * 54 / 4 / 8, 40 * 54 / 4 / 16])
+    assert results['share_below_by_composition'][0] == pytest.approx([1, 1 / 2])
+    assert results['share_below_by_area'][1] == pytest.approx([1 / 2, 0])
+
+
+def test_simulation_shares_ignore_missing_cells():
+    ## one missing cell: 2 of the 3 known cells are below the living wage at $8
+    wage_matrix = make_wage_matrix([[10, np.nan], [20, 5]])
+    results = living_wage_policy.simulate_minimum_wages(wage_matrix, [8])
+
+    assert results['share_below'] == pytest.approx([2 / 3])
+    assert results['share_below_by_composition'][0] == pytest.approx([1, 0])
+    assert results['share_below_by_area'][0] == pytest.approx([1, 1 / 2])
+    assert results['mean_gap'] == pytest.approx([(2 + 12 - 3) / 3])
+
+
+def test_simulation_share_of_a_composition_without_data_is_nan():
+    wage_matrix = make_wage_matrix([[10, np.nan], [20, np.nan]])
+    with np.errstate(invalid='ignore'), pytest.warns(RuntimeWarning):
+        results = living_wage_policy.simulate_minimum_wages(wage_matrix, [8])
+    assert results['share_below_by_composition'][0][0] == 1
+    assert np.isnan(results['share_below_by_composition'][0][1])
+
+
+def test_simulation_chunks_match_full_cells(monkeypatch):
+    rng = np.random.default_rng(0)
+    wage_matrix = make_wage_matrix(rng.uniform(8, 40, size=(30, 12)))
+    candidates = living_wage_policy.candidate_range(9.45, 20, 0.25)
+    full = living_wage_policy.simulate_minimum_wages(wage_matrix, candidates, keep_cells=True)
+    ## force several chunks
+    monkeypatch.setattr(living_wage_policy, 'CHUNK_CELLS', 1000)
+    chunked = living_wage_policy.simulate_minimum_wages(wage_matrix, candidates)
+
+    for name in ('mean_gap', 'share_below', 'mean_hours_needed', 'share_below_by_area'):
+        assert chunked[name] == pytest.approx(full[name])
+    assert full['share_below'] == pytest.approx(full['below_living_wage'].mean(axis=(1, 2)))
+
+
+def test_simulation_rejects_minimum_wages_at_or_below_zero():
+    with pytest.raises(ValueError):
+        living_wage_policy.simulate_minimum_wages(make_wage_matrix([[10]]), [12, 0])
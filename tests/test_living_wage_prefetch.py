@@ -0,0 +1,122 @@
+''' Tests of the background prefetch of graphs (living_wage_prefetch.py).
+
+Run from the folder that contains living_wage.py:
+    python3 -m pytest tests
+'''
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import living_wage_prefetch
+
+
+class RecordingBuilder:
+    ''' Stands in for a graph builder: returns (area name, generation) and records each build. '''
+    def __init__(self, generation_box):
+        self.generation_box = generation_box
+        self.built_names = []
+        self.lock = threading.Lock()
+
+    def __call__(self, area_name):
+        with self.lock:
+            self.built_names.append(area_name)
+        return (area_name, self.generation_box[0])
+
+
+def make_prefetcher(generation_box=None, **kwargs):
+    generation_box = generation_box if generation_box is not None else [1]
+    builder = RecordingBuilder(generation_box)
+    prefetcher = living_wage_prefetch.Prefetcher({'gap': builder}, generation_function=lambda: generation_box[0], **kwargs)
+    return prefetcher, builder
+
+
+def wait_for_queue(prefetcher):
+    ''' Waits until the worker has taken every queued build and finished the last one. '''
+    done = threading.Event()
+    prefetcher.work_queue.put((_Marker(done), None, None))
+    assert done.wait(5)
+
+
+class _Marker:
+    ''' A queue item that only sets an event when the worker reaches it. '''
+    def __init__(self, done):
+        self.done = done
+
+    def set_running_or_notify_cancel(self):
+        self.done.set()
+        return False
+
+
+##############################################
+################## prefetch ##################
+##############################################
+def test_prefetch_builds_the_area_then_its_neighbors():
+    prefetcher, builder = make_prefetcher()
+    prefetcher.prefetch('area a', ['area b', 'area c'])
+    wait_for_queue(prefetcher)
+
+    assert builder.built_names == ['area a', 'area b', 'area c']
+    assert prefetcher.get('gap', 'area b') == ('area b', 1)
+    assert builder.built_names == ['area a', 'area b', 'area c']
+
+
+def test_prefetch_queues_areas_picked_more_than_once():
+    prefetcher, builder = make_prefetcher(max_areas=20, popular_areas=1)
+    for area_name in ['area a', 'area b', 'area a', 'area c']:
+        prefetcher.prefetch(area_name)
+    wait_for_queue(prefetcher)
+
+    assert prefetcher.popular_names() == ['area a']
+    ## area a was already kept; dropping it shows that the next pick queues it again
+    with prefetcher.lock:
+        prefetcher.futures.clear()
+    builder.built_names.clear()
+    prefetcher.prefetch('area d', ['area e'])
+    wait_for_queue(prefetcher)
+
+    assert builder.built_names == ['area d', 'area e', 'area a']
+
+
+def test_prefetch_keeps_the_last_max_areas():
+    prefetcher, builder = make_prefetcher(max_areas=2)
+    for area_name in ['area a', 'area b', 'area c']:
+        prefetcher.prefetch(area_name)
+        wait_for_queue(prefetcher)
+
+    assert [area_name for _, area_name in prefetcher.futures] == ['area b', 'area c']
+
+
+##############################################
+#################### get #####################
+##############################################
+def test_get_builds_an_area_that_was_never_queued():
+    prefetcher, builder = make_prefetcher()
+
+    assert prefetcher.get('gap', 'area a') == ('area a', 1)
+    assert prefetcher.get('gap', 'area a') == ('area a', 1)
+    assert builder.built_names == ['area a']
+
+
+def test_get_never_serves_a_graph_of_an_older_database():
+    generation_box = [1]
+    prefetcher, builder = make_prefetcher(generation_box)
+    prefetcher.prefetch('area a')
+    wait_for_queue(prefetcher)
+
+    ## the database is rebuilt
+    generation_box[0] = 2
+    assert prefetcher.get('gap', 'area a') == ('area a', 2)
+    assert builder.built_names == ['area a', 'area a']
+
+
+def test_get_raises_the_error_of_the_builder():
+    def failing_builder(area_name):
+        raise ValueError(area_name)
+
+    prefetcher = living_wage_prefetch.Prefetcher({'gap': failing_builder})
+    prefetcher.prefetch('area a')
+    with pytest.raises(ValueError, match='area a'):
+        prefetcher.get('gap', 'area a')
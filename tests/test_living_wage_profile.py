@@ -0,0 +1,99 @@
+''' Tests of the stage profiler (living_wage_profile.py).
+
+Run from the folder that contains living_wage.py:
+    python3 -m pytest tests
+'''
+import os
+import pstats
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import living_wage_profile
+from living_wage_profile import COLLAPSED_FILENAME, SUMMARY_FILENAME, StageProfiler
+
+
+def busy_parse(seconds):
+    ''' Keeps the main thread busy in Python code for a while. '''
+    busy_until = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < busy_until:
+        total += sum(range(100))
+    return total
+
+
+def busy_query(seconds):
+    return busy_parse(seconds)
+
+
+@pytest.fixture
+def profile_dir(tmp_path):
+    ''' Profiles two stages into a temporary folder. '''
+    profile_dir = str(tmp_path / 'profile')
+    with StageProfiler(profile_dir) as profiler:
+        with profiler.stage('parse_wages'):
+            busy_parse(0.2)
+        with profiler.stage('queries'):
+            busy_query(0.1)
+        time.sleep(0.05) ## between stages: not sampled
+    return profile_dir
+
+
+##############################################
+################ StageProfiler ###############
+##############################################
+def test_one_pstats_file_per_stage(profile_dir):
+    assert sorted(os.listdir(profile_dir)) == [
+        '01-parse_wages.pstats', '02-queries.pstats', COLLAPSED_FILENAME, SUMMARY_FILENAME]
+
+    stats = pstats.Stats(os.path.join(profile_dir, '01-parse_wages.pstats'))
+    assert any(function_name == 'busy_parse' for _, _, function_name in stats.stats)
+
+
+def test_collapsed_stacks_start_at_their_stage(profile_dir):
+    with open(os.path.join(profile_dir, COLLAPSED_FILENAME)) as collapsed_file:
+        lines = collapsed_file.read().splitlines()
+
+    stage_microseconds = {}
+    for line in lines:
+        stack, count = line.rsplit(' ', 1)
+        stage_name = stack.split(';')[0]
+        stage_microseconds[stage_name] = stage_microseconds.get(stage_name, 0) + int(count)
+
+    assert set(stage_microseconds) == {'parse_wages', 'queries'}
+    assert stage_microseconds['parse_wages'] > 0 and stage_microseconds['queries'] > 0
+    assert any('busy_query (test_living_wage_profile.py' in line and line.startswith('queries;') for line in lines)
+
+
+def test_summary_lists_every_stage(profile_dir):
+    with open(os.path.join(profile_dir, SUMMARY_FILENAME)) as summary_file:
+        summary = summary_file.read()
+
+    stage_lines = summary.splitlines()[1:4]
+    assert [line.split()[0] for line in stage_lines] == ['parse_wages', 'queries', 'total']
+    assert float(stage_lines[0].split()[1]) >= 0.2
+    assert '==================== queries' in summary
+
+
+def test_switch_interval_is_restored(tmp_path):
+    switch_interval = sys.getswitchinterval()
+    with StageProfiler(str(tmp_path / 'profile'), interval_seconds=0.002):
+        assert sys.getswitchinterval() == pytest.approx(0.002)
+    assert sys.getswitchinterval() == switch_interval
+
+
+def test_failing_stage_is_still_profiled(tmp_path):
+    with StageProfiler(str(tmp_path / 'profile')) as profiler:
+        with pytest.raises(ValueError):
+            with profiler.stage('build'):
+                raise ValueError('the page has no required annual income before taxes')
+
+    assert [stage_name for stage_name, _, _ in profiler.stage_list] == ['build']
+    assert os.path.exists(tmp_path / 'profile' / '01-build.pstats')
+
+
+def test_frame_name():
+    frame_name = living_wage_profile.frame_name(sys._getframe())
+    assert frame_name == f'test_frame_name (test_living_wage_profile.py:{test_frame_name.__code__.co_firstlineno})'
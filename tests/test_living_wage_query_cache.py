@@ -0,0 +1,191 @@
+''' Tests of the generation-keyed query result cache (living_wage_query_cache.py).
+
+Run from the folder that contains living_wage.py:
+    python3 -m pytest tests
+'''
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import living_wage_query_cache
+from living_wage_query_cache import QueryCache, estimate_size
+
+
+class Database:
+    ''' Stands in for the SQL database: counts the queries and has a generation. '''
+    def __init__(self):
+        self.generation = 1
+        self.query_count = 0
+
+    def rows(self, area_name, row_count=3):
+        self.query_count += 1
+        return [(area_name, self.generation, number) for number in range(row_count)]
+
+
+@pytest.fixture
+def database():
+    return Database()
+
+
+def cached_rows(cache, database):
+    return cache.memoize(lambda: database.generation)(database.rows)
+
+
+##############################################
+################ hits & misses ###############
+##############################################
+def test_repeated_query_is_served_from_the_cache(database):
+    cache = QueryCache()
+    rows = cached_rows(cache, database)
+
+    assert rows('washtenaw county') == rows('washtenaw county')
+    assert database.query_count == 1
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+    assert cache.stats()['hit_rate'] == 0.5
+
+
+def test_arguments_are_part_of_the_key(database):
+    cache = QueryCache()
+    rows = cached_rows(cache, database)
+
+    rows('washtenaw county')
+    rows('wayne county')
+    rows('washtenaw county', row_count=5)
+    rows('washtenaw county', row_count=5)
+
+    assert database.query_count == 3
+    assert rows.uncached('wayne county') == database.rows('wayne county')
+
+
+def test_results_are_copied(database):
+    cache = QueryCache()
+    rows = cached_rows(cache, database)
+
+    rows('washtenaw county').append('changed by the caller')
+
+    assert rows('washtenaw county') == [('washtenaw county', 1, number) for number in range(3)]
+
+
+##############################################
+################ invalidation ################
+##############################################
+def test_new_generation_reads_the_database_again(database):
+    cache = QueryCache()
+    rows = cached_rows(cache, database)
+
+    rows('washtenaw county')
+    database.generation = 2
+
+    assert rows('washtenaw county')[0][1] == 2
+    assert database.query_count == 2
+
+
+def test_old_generation_is_evicted_first(database):
+    cache = QueryCache(max_entries=2)
+    rows = cached_rows(cache, database)
+
+    rows('washtenaw county')
+    rows('wayne county')
+    database.generation = 2
+    rows('washtenaw county')
+    rows('wayne county')
+
+    assert [key[1] for key in cache.entries] == [2, 2]
+    assert cache.stats()['evictions'] == 2
+
+
+def test_clear(database):
+    cache = QueryCache()
+    rows = cached_rows(cache, database)
+    rows('washtenaw county')
+
+    cache.clear()
+
+    assert cache.stats() == dict(cache.stats(), hits=0, misses=0, evictions=0, entries=0, bytes=0)
+    rows('washtenaw county')
+    assert database.query_count == 2
+
+
+##############################################
+################### eviction #################
+##############################################
+def test_least_recently_used_is_evicted(database):
+    cache = QueryCache(max_entries=2)
+    rows = cached_rows(cache, database)
+
+    rows('washtenaw county')
+    rows('wayne county')
+    rows('washtenaw county')
+    rows('ann arbor, mi')
+
+    assert [key[2] for key in cache.entries] == [('washtenaw county',), ('ann arbor, mi',)]
+    rows('wayne county')
+    assert database.query_count == 4
+
+
+def test_eviction_by_bytes(database):
+    row_list = database.rows('washtenaw county')
+    database.query_count = 0
+    cache = QueryCache(max_bytes=2 * estimate_size(row_list) + 1)
+    rows = cached_rows(cache, database)
+
+    for area_name in ('washtenaw county', 'wayne county', 'ann arbor, mi'):
+        rows(area_name)
+
+    assert cache.stats()['entries'] == 2
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['bytes'] <= cache.max_bytes
+
+
+def test_result_larger_than_the_cache_is_not_kept(database):
+    cache = QueryCache(max_bytes=estimate_size(database.rows('washtenaw county')) + 1)
+    rows = cached_rows(cache, database)
+
+    rows('washtenaw county')
+    rows('wayne county', row_count=100)
+
+    assert [key[2] for key in cache.entries] == [('washtenaw county',)]
+    assert cache.stats()['evictions'] == 0
+
+
+##############################################
+############### byte accounting ##############
+##############################################
+def test_bytes_are_the_sum_of_the_entries(database):
+    cache = QueryCache()
+    rows = cached_rows(cache, database)
+
+    rows('washtenaw county')
+    rows('wayne county', row_count=10)
+    rows('wayne county', row_count=10)
+
+    assert cache.size_bytes == sum(size for _, size in cache.entries.values())
+    assert cache.size_bytes == cache.stats()['bytes']
+
+
+def test_rows_are_measured_once_per_function(database, monkeypatch):
+    cache = QueryCache()
+    measured_list = []
+    monkeypatch.setattr(living_wage_query_cache, 'estimate_size',
+        lambda value: measured_list.append(value) or estimate_size(value))
+    rows = cached_rows(cache, database)
+
+    rows('washtenaw county', row_count=2)
+    rows('wayne county', row_count=20)
+
+    assert not any(value and value[0][0] == 'wayne county' for value in measured_list if isinstance(value, list))
+    _, short_size = cache.entries[('rows', 1, ('washtenaw county',), (('row_count', 2),))]
+    _, long_size = cache.entries[('rows', 1, ('wayne county',), (('row_count', 20),))]
+    assert long_size - sys.getsizeof(database.rows('x', 20)) == pytest.approx(
+        10 * (short_size - sys.getsizeof(database.rows('x', 2))), abs=10)
+
+
+def test_estimate_size_counts_every_row():
+    one_row = [(1.0, 'a')]
+    ten_rows = [(1.0, 'a')] * 10
+    assert estimate_size(ten_rows) - sys.getsizeof(ten_rows) == 10 * (estimate_size(one_row) - sys.getsizeof(one_row))
+    assert estimate_size({'a': [1.0, 2.0]}) > sys.getsizeof({'a': [1.0, 2.0]})
+    assert estimate_size(3.5) == sys.getsizeof(3.5)
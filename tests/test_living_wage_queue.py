@@ -0,0 +1,135 @@
+''' Tests of the durable crawl queue (living_wage_queue.py).
+
+Run from the folder that contains living_wage.py:
+    python3 -m pytest tests
+'''
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import living_wage
+import living_wage_queue
+from living_wage_queue import MAX_ATTEMPTS, WorkQueue
+
+
+AREA_URL_DICT = {
+    'washtenaw county': 'https://example.org/counties/26161',
+    'wayne county': 'https://example.org/counties/26163',
+    'ann arbor, mi': 'https://example.org/metros/11460',
+}
+
+
+@pytest.fixture
+def work_queue(tmp_path):
+    work_queue = WorkQueue(str(tmp_path / 'living_wage_queue.sqlite'))
+    work_queue.add_jobs(AREA_URL_DICT)
+    return work_queue
+
+
+def expire_leases(work_queue):
+    conn = work_queue.connect()
+    conn.execute('UPDATE Jobs SET [Lease Expires] = 0 WHERE Status = ?', ['leased'])
+    conn.close()
+
+
+##############################################
+################## add_jobs ##################
+##############################################
+def test_areas_are_added_once(work_queue):
+    assert work_queue.add_jobs(AREA_URL_DICT) == 0
+    assert work_queue.add_jobs({'monroe, mi': 'https://example.org/metros/33780'}) == 1
+    assert work_queue.counts() == {'pending': 4, 'leased': 0, 'done': 0, 'failed': 0}
+
+
+def test_reset_empties_the_queue(work_queue):
+    work_queue.claim('worker-1')
+
+    assert work_queue.add_jobs({'monroe, mi': 'https://example.org/metros/33780'}, reset=True) == 1
+    assert work_queue.counts() == {'pending': 1, 'leased': 0, 'done': 0, 'failed': 0}
+
+
+##############################################
+################ claim & lease ###############
+##############################################
+def test_jobs_are_claimed_in_order_once(work_queue):
+    claimed_list = [work_queue.claim(f'worker-{i}') for i in range(4)]
+
+    assert [job[2] for job in claimed_list[:3]] == list(AREA_URL_DICT)
+    assert claimed_list[3] is None
+    assert work_queue.counts()['leased'] == 3
+
+
+def test_expired_lease_is_claimed_again(work_queue):
+    job_id, _, _ = work_queue.claim('worker-1')
+    expire_leases(work_queue)
+
+    assert work_queue.claim('worker-2')[0] == job_id
+    assert not work_queue.heartbeat('worker-1', job_id)
+    assert not work_queue.complete('worker-1', job_id, {'wages': {}, 'expenses': {}})
+    assert work_queue.heartbeat('worker-2', job_id)
+
+
+def test_final_expired_lease_fails_the_job(work_queue, monkeypatch):
+    monkeypatch.setattr(living_wage_queue, 'MAX_ATTEMPTS', 1)
+    work_queue.claim('worker-1')
+    expire_leases(work_queue)
+
+    work_queue.claim('worker-2')
+
+    assert work_queue.failures() == [(AREA_URL_DICT['washtenaw county'], 'lease expired')]
+
+
+##############################################
+############### complete & fail ##############
+##############################################
+def test_completed_records_are_kept(work_queue):
+    job_id, _, area_name = work_queue.claim('worker-1')
+    record = {'wages': {'one adult': {'0 children': {'living wage': 20.0}}}, 'expenses': {}}
+
+    assert work_queue.complete('worker-1', job_id, record)
+    assert work_queue.records() == [(area_name, record)]
+    assert not work_queue.complete('worker-1', job_id, record)
+
+
+def test_failed_job_is_tried_again_until_max_attempts(work_queue):
+    work_queue.add_jobs({}, reset=True)
+    work_queue.add_jobs({'washtenaw county': AREA_URL_DICT['washtenaw county']})
+
+    for attempt in range(MAX_ATTEMPTS):
+        job_id, _, _ = work_queue.claim('worker-1')
+        work_queue.fail('worker-1', job_id, f'ConnectionError: attempt {attempt + 1}')
+
+    assert work_queue.claim('worker-1') is None
+    assert work_queue.failures() == [(AREA_URL_DICT['washtenaw county'], f'ConnectionError: attempt {MAX_ATTEMPTS}')]
+
+
+##############################################
+############# run_worker & merge #############
+##############################################
+def test_worker_crawls_every_job(work_queue, monkeypatch):
+    def crawl_job(url):
+        if url == AREA_URL_DICT['wayne county']:
+            raise ValueError('the page has no required annual income before taxes')
+        return {'wages': {'url': url}, 'expenses': {}}
+    monkeypatch.setattr(living_wage_queue, 'crawl_job', crawl_job)
+
+    submitted_count = living_wage_queue.run_worker(work_queue, 'worker-1', lease_seconds=30)
+
+    assert submitted_count == 2
+    assert work_queue.counts() == {'pending': 0, 'leased': 0, 'done': 2, 'failed': 1}
+    assert work_queue.failures()[0][1] == 'ValueError: the page has no required annual income before taxes'
+
+
+def test_merge_builds_from_the_records(work_queue, monkeypatch):
+    build_list = []
+    monkeypatch.setattr(living_wage, 'build_database', lambda wages, expenses: build_list.append((wages, expenses)))
+    for _ in AREA_URL_DICT:
+        job_id, url, _ = work_queue.claim('worker-1')
+        work_queue.complete('worker-1', job_id, {'wages': url, 'expenses': url + '#expenses'})
+
+    assert living_wage_queue.merge_records(work_queue) == 3
+    wages, expenses = build_list[0]
+    assert wages == {area_name: url for area_name, url in AREA_URL_DICT.items()}
+    assert expenses['wayne county'] == AREA_URL_DICT['wayne county'] + '#expenses'
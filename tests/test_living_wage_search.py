@@ -0,0 +1,99 @@
+''' Tests of the area search index (living_wage_search.py).
+
+Run from the folder that contains living_wage.py:
+    python3 -m pytest tests
+'''
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import living_wage_search
+from living_wage_search import EXACT_MATCH, FUZZY_MATCH, NAME_PREFIX_MATCH, WORD_PREFIX_MATCH
+
+
+@pytest.fixture
+def index():
+    entries = [
+        living_wage_search.SearchEntry('Washtenaw County', 'County', code='26161', state='MI', value=1),
+        living_wage_search.SearchEntry('Washington County', 'County', code='26999', state='MI', value=2),
+        living_wage_search.SearchEntry('Ann Arbor, MI', 'MSA', code='11460', state='MI', value=3),
+        living_wage_search.SearchEntry('Wayne County', 'County', code='26163', state='MI', value=4),
+        living_wage_search.SearchEntry('Grand Rapids-Kentwood, MI', 'MSA', code='24340', state='MI', value=5),
+    ]
+    return living_wage_search.AreaSearchIndex(entries)
+
+
+def names_and_ranks(results):
+    return [(entry.name, match_rank) for entry, match_rank, _ in results]
+
+
+##############################################
+############### prefix matches ###############
+##############################################
+def test_exact_name_comes_first(index):
+    results = index.search('washtenaw county')
+    assert names_and_ranks(results)[0] == ('Washtenaw County', EXACT_MATCH)
+
+
+def test_exact_code(index):
+    assert names_and_ranks(index.search('11460')) == [('Ann Arbor, MI', EXACT_MATCH)]
+
+
+def test_name_prefixes_rank_before_word_prefixes(index):
+    ## 'wa' starts the names of three areas; no other word starts with it
+    assert names_and_ranks(index.search('wa')) == [
+        ('Washington County', NAME_PREFIX_MATCH),
+        ('Washtenaw County', NAME_PREFIX_MATCH),
+        ('Wayne County', NAME_PREFIX_MATCH),
+    ]
+
+
+def test_word_prefix(index):
+    results = names_and_ranks(index.search('arbor'))
+    assert results[0] == ('Ann Arbor, MI', WORD_PREFIX_MATCH)
+
+
+def test_punctuation_and_case_are_ignored(index):
+    assert names_and_ranks(index.search('ANN ARBOR MI'))[0] == ('Ann Arbor, MI', EXACT_MATCH)
+    assert names_and_ranks(index.search('grand rapids-kentwood'))[0] == ('Grand Rapids-Kentwood, MI', NAME_PREFIX_MATCH)
+
+
+def test_state_prefix_matches_every_area(index):
+    assert len(index.search('mi', limit=10)) == 5
+
+
+##############################################
+############### trigram matches ##############
+##############################################
+def test_typo_finds_the_closest_name(index):
+    results = index.search('washtenow')
+    assert results[0][0].name == 'Washtenaw County'
+    assert results[0][1] == FUZZY_MATCH
+    assert all(results[0][2] >= similarity for _, _, similarity in results)
+
+
+def test_unrelated_query_finds_nothing(index):
+    assert index.search('zzzz') == []
+    assert index.search('  ,, ') == []
+
+
+def test_similarity_is_between_0_and_1(index):
+    for entry, match_rank, similarity in index.search('washingtn county'):
+        assert living_wage_search.MIN_SIMILARITY <= similarity <= 1
+
+
+##############################################
+############## search & helpers ##############
+##############################################
+def test_limit_and_search_many(index):
+    assert len(index.search('county', limit=2)) == 2
+    results = index.search_many(['26163', 'wayn'])
+    assert [entry.value for entry, _, _ in results['26163']] == [4]
+    assert [entry.value for entry, _, _ in results['wayn']] == [4]
+
+
+def test_normalize_and_trigrams():
+    assert living_wage_search.normalize('  Ann Arbor,  MI ') == 'ann arbor mi'
+    assert living_wage_search.trigrams('ab') == {'  a', ' ab', 'ab '}
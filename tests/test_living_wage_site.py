@@ -0,0 +1,134 @@
+''' Tests of the local stand-in site (living_wage_site.py).
+
+Run from the folder that contains living_wage.py:
+    python3 -m pytest tests
+'''
+import json
+import os
+import sys
+import time
+import types
+import urllib.error
+import urllib.request
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import living_wage_site
+from living_wage_site import FakeSite, SiteConfig, TokenBucket
+
+
+CORPUS = {
+    'https://livingwage.mit.edu/states/26/locations': '<html>Michigan</html>',
+    'https://livingwage.mit.edu/counties/26161': '<html>Washtenaw County</html>',
+}
+
+
+@pytest.fixture
+def start_site():
+    ''' Starts FakeSite servers on free ports, and stops them after the test. '''
+    site_list = []
+
+    def start(config=None):
+        site = FakeSite(CORPUS, config)
+        site.start()
+        site_list.append(site)
+        return site
+    yield start
+    for site in site_list:
+        site.stop()
+
+
+def get(url):
+    ''' Returns (status code, headers, text) of a GET request, errors included. '''
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return response.status, response.headers, response.read().decode('utf-8')
+    except urllib.error.HTTPError as error:
+        return error.code, error.headers, error.read().decode('utf-8')
+
+
+def stats(site):
+    return json.loads(get(site.base_url + living_wage_site.STATS_PATH)[2])
+
+
+##############################################
+################## FakeSite ##################
+##############################################
+def test_pages_are_served_by_path(start_site):
+    site = start_site()
+
+    status_code, headers, text = get(site.base_url + '/counties/26161?year=2020')
+
+    assert status_code == 200
+    assert text == '<html>Washtenaw County</html>'
+    assert headers['Content-Type'] == 'text/html; charset=utf-8'
+    assert get(site.base_url + '/counties/99999')[0] == 404
+    assert stats(site) == {'requests': 2, 'served': 1, 'errors': 0, 'throttled': 0, 'not_found': 1}
+
+
+def test_errors(start_site):
+    site = start_site(SiteConfig(error_rate=1.0, seed=1))
+
+    assert get(site.base_url + '/counties/26161')[0] == 500
+    assert stats(site)['errors'] == 1
+
+
+def test_latency(start_site):
+    site = start_site(SiteConfig(latency_ms=100))
+
+    request_start = time.perf_counter()
+    get(site.base_url + '/counties/26161')
+
+    assert time.perf_counter() - request_start >= 0.1
+
+
+def test_seed_repeats_latency_and_errors():
+    config = SiteConfig(latency_ms=50, jitter_ms=20, error_rate=0.5, seed=7)
+    first_site = FakeSite(CORPUS, config)
+    second_site = FakeSite(CORPUS, config)
+    try:
+        draws = [first_site.draw_latency_and_error() for _ in range(20)]
+        assert draws == [second_site.draw_latency_and_error() for _ in range(20)]
+        assert all(0.03 <= latency_seconds <= 0.07 for latency_seconds, _ in draws)
+        assert {fails for _, fails in draws} == {True, False}
+    finally:
+        first_site.server.server_close()
+        second_site.server.server_close()
+
+
+def test_clients_over_the_rate_limit_are_throttled(start_site):
+    site = start_site(SiteConfig(rate_limit=0.5, burst=2))
+
+    status_codes = []
+    for _ in range(3):
+        status_code, headers, _ = get(site.base_url + '/counties/26161')
+        status_codes.append(status_code)
+
+    assert status_codes == [200, 200, 429]
+    assert headers['Retry-After'] == '2'
+    assert stats(site)['throttled'] == 1
+
+
+##############################################
+################# TokenBucket ################
+##############################################
+def test_token_bucket_refills_at_the_rate(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(living_wage_site, 'time', types.SimpleNamespace(monotonic=lambda: clock[0]))
+    bucket = TokenBucket(rate_limit=2, burst=3)
+
+    assert [bucket.take() for _ in range(4)] == [True, True, True, False]
+    clock[0] += 0.5
+    assert [bucket.take() for _ in range(2)] == [True, False]
+    clock[0] += 60
+    assert [bucket.take() for _ in range(4)] == [True, True, True, False]
+
+
+def test_load_corpus(tmp_path):
+    corpus_filename = str(tmp_path / 'pages.json')
+    with open(corpus_filename, 'w') as corpus_file:
+        json.dump(CORPUS, corpus_file)
+
+    assert living_wage_site.load_corpus(corpus_filename) == CORPUS
+    assert len(living_wage_site.load_corpus()) > 1
@@ -0,0 +1,81 @@
+''' Tests of the build snapshot (write_snapshot() and load_snapshot() in living_wage.py).
+
+Run from the folder that contains living_wage.py:
+    python3 -m pytest tests
+'''
+import os
+import pickle
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import living_wage
+
+
+@pytest.fixture
+def sources(tmp_path, monkeypatch):
+    ''' Points the caches, the database and the snapshot at files in a temporary folder. '''
+    monkeypatch.chdir(tmp_path)
+    for name in ('CACHE_FILENAME', 'FRAGMENT_CACHE_FILENAME', 'DB_NAME', 'SNAPSHOT_FILENAME'):
+        monkeypatch.setattr(living_wage, name, str(tmp_path / getattr(living_wage, name)))
+    for name in ('CACHE_FILENAME', 'FRAGMENT_CACHE_FILENAME', 'DB_NAME'):
+        with open(getattr(living_wage, name), 'w') as source_file:
+            source_file.write('{}')
+    return tmp_path
+
+
+AREA_LIST = [
+    living_wage.Area(name='washtenaw county', area_type='County', url='https://example.org/counties/26161'),
+    living_wage.Area(name='ann arbor, mi', area_type='MSA', url='https://example.org/metros/11460'),
+]
+
+
+def area_tuples(area_list):
+    return [(area.name, area.area_type, area.url) for area in area_list]
+
+
+##############################################
+############ write_snapshot / load ###########
+##############################################
+def test_snapshot_round_trip(sources):
+    living_wage.write_snapshot(AREA_LIST)
+
+    assert area_tuples(living_wage.load_snapshot()) == area_tuples(AREA_LIST)
+    assert not os.path.exists(living_wage.SNAPSHOT_FILENAME + '.tmp')
+
+
+def test_no_snapshot(sources):
+    assert living_wage.load_snapshot() is None
+
+
+def test_changed_source_invalidates_the_snapshot(sources):
+    living_wage.write_snapshot(AREA_LIST)
+    with open(living_wage.DB_NAME, 'a') as db_file:
+        db_file.write('more rows')
+
+    assert living_wage.load_snapshot() is None
+
+
+def test_deleted_source_invalidates_the_snapshot(sources):
+    living_wage.write_snapshot(AREA_LIST)
+    os.remove(living_wage.FRAGMENT_CACHE_FILENAME)
+
+    assert living_wage.load_snapshot() is None
+
+
+def test_other_version_invalidates_the_snapshot(sources, monkeypatch):
+    living_wage.write_snapshot(AREA_LIST)
+    monkeypatch.setattr(living_wage, 'SNAPSHOT_VERSION', living_wage.SNAPSHOT_VERSION + 1)
+
+    assert living_wage.load_snapshot() is None
+
+
+def test_unreadable_snapshot(sources):
+    with open(living_wage.SNAPSHOT_FILENAME, 'wb') as snapshot_file:
+        snapshot_file.write(b'not a pickle')
+    assert living_wage.load_snapshot() is None
+
+    with open(living_wage.SNAPSHOT_FILENAME, 'wb') as snapshot_file:
+        pickle.dump(['not', 'a', 'dict'], snapshot_file)
+    assert living_wage.load_snapshot() is None
@@ -0,0 +1,161 @@
+''' Tests of the storage engines (living_wage_storage.py): the DuckDB copy of
+the database and the analyses that every engine runs.
+
+Run from the folder that contains living_wage.py:
+    python3 -m pytest tests
+'''
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import living_wage
+import living_wage_storage
+from living_wage_storage import ANALYSES, COMPOSITIONS
+
+
+## (state, area, type, code): living wage of one adult without children; one code is missing
+AREA_WAGE_DICT = {
+    ('MI', 'alpha county', 'county', '26001'): 20.0,
+    ('MI', 'ann arbor, mi', 'MSA', None): 25.0,
+    ('OH', 'alpha county', 'county', '39001'): 15.0,
+    ('OH', 'beta county', 'county', '39003'): 18.0,
+}
+
+
+@pytest.fixture
+def db_name(tmp_path):
+    db_name = str(tmp_path / 'living_wage.sqlite')
+    living_wage.create_db(db_name)
+    conn = sqlite3.connect(db_name)
+    for (state, area_name, area_type, code), wage in AREA_WAGE_DICT.items():
+        conn.execute('INSERT INTO Areas (State, [Area Type], Area, Code) VALUES (?, ?, ?, ?)',
+            [state, area_type, area_name, code])
+        for number_of_adults, number_of_children in COMPOSITIONS:
+            living_wage_value = wage + number_of_children
+            conn.execute('''INSERT INTO Wages (State, Area, [Number of Adults], [Number of Children],
+                [Living Wage], [Poverty Wage], [Minimum Wage]) VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                [state, area_name, number_of_adults, number_of_children, living_wage_value, 5.0, 10.0])
+            conn.execute('''INSERT INTO Expenses (State, Area, [Number of Adults], [Number of Children],
+                [Required Annual Income Before Taxes]) VALUES (?, ?, ?, ?, ?)''',
+                [state, area_name, number_of_adults, number_of_children, living_wage_value * 2080])
+            for category, share in (('housing', 0.3), ('food', 0.2)):
+                conn.execute('''INSERT INTO ExpenseItems (State, Area, [Number of Adults], [Number of Children],
+                    Category, Amount) VALUES (?, ?, ?, ?, ?, ?)''',
+                    [state, area_name, number_of_adults, number_of_children, category, living_wage_value * 2080 * share])
+    conn.commit()
+    conn.close()
+    living_wage.refresh_aggregates(db_name)
+    living_wage.refresh_household_curves(db_name)
+    return db_name
+
+
+@pytest.fixture
+def duckdb_name(db_name, tmp_path):
+    pytest.importorskip('duckdb')
+    pytest.importorskip('numpy')
+    duckdb_name = str(tmp_path / 'living_wage.duckdb')
+    living_wage_storage.write_duckdb(db_name, duckdb_name)
+    return duckdb_name
+
+
+def rounded(rows):
+    return [tuple(round(value, 6) if isinstance(value, float) else value for value in row) for row in rows]
+
+
+##############################################
+################ write_duckdb ################
+##############################################
+def test_every_table_is_copied_in_order(db_name, duckdb_name, tmp_path):
+    import duckdb
+
+    sqlite_conn = sqlite3.connect(db_name)
+    duck_conn = duckdb.connect(duckdb_name, read_only=True)
+    for table in living_wage_storage.TABLES:
+        sqlite_rows = sqlite_conn.execute(f'SELECT * FROM "{table}"').fetchall()
+        assert sqlite_rows, table
+        assert duck_conn.execute(f'SELECT * FROM "{table}"').fetchall() == sqlite_rows, table
+    sqlite_conn.close()
+    duck_conn.close()
+
+    assert not [filename for filename in os.listdir(tmp_path) if '.building' in filename]
+
+
+def test_nulls_and_types_are_kept(duckdb_name):
+    import duckdb
+
+    duck_conn = duckdb.connect(duckdb_name, read_only=True)
+    assert duck_conn.execute('SELECT Code FROM Areas ORDER BY Id').fetchall() == [
+        ('26001',), (None,), ('39001',), ('39003',)]
+    column_types = dict(duck_conn.execute('''
+        SELECT column_name, data_type FROM information_schema.columns WHERE table_name = 'Wages'
+    ''').fetchall())
+    duck_conn.close()
+
+    assert column_types['Area'] == 'VARCHAR'
+    assert column_types['Number of Children'] == 'BIGINT'
+    assert column_types['Living Wage'] == 'DOUBLE'
+
+
+def test_export_replaces_the_duckdb_file(db_name, duckdb_name):
+    conn = sqlite3.connect(db_name)
+    conn.execute('DELETE FROM ExpenseItems')
+    conn.commit()
+    conn.close()
+
+    living_wage_storage.write_duckdb(db_name, duckdb_name)
+
+    duck_conn = living_wage_storage.connect('duckdb', db_name, duckdb_name)
+    assert duck_conn.execute('SELECT COUNT(*) FROM ExpenseItems').fetchall() == [(0,)]
+    duck_conn.close()
+
+
+##############################################
+################## analyses ##################
+##############################################
+@pytest.mark.parametrize('analysis_name', list(ANALYSES))
+@pytest.mark.parametrize('engine', ['duckdb', 'duckdb-sqlite'])
+def test_engines_give_the_same_rows(db_name, duckdb_name, engine, analysis_name):
+    sqlite_conn = living_wage_storage.connect('sqlite', db_name)
+    duck_conn = living_wage_storage.connect(engine, db_name, duckdb_name)
+
+    for state in (None, 'OH'):
+        sqlite_rows = living_wage_storage.run_analysis(sqlite_conn, analysis_name, state)
+        assert sqlite_rows
+        assert rounded(living_wage_storage.run_analysis(duck_conn, analysis_name, state)) == rounded(sqlite_rows)
+    sqlite_conn.close()
+    duck_conn.close()
+
+
+def test_state_summary(db_name):
+    conn = living_wage_storage.connect('sqlite', db_name)
+    rows = living_wage_storage.run_analysis(conn, 'state_summary', 'OH')
+    conn.close()
+
+    assert len(rows) == len(COMPOSITIONS)
+    assert rows[0][:3] == ('OH', 'one adult', 0)
+    assert rows[0][3:7] == pytest.approx((2, 16.5, 15.0, 18.0))
+
+
+def test_expense_pivot_has_a_column_per_composition(db_name):
+    conn = living_wage_storage.connect('sqlite', db_name)
+    rows = living_wage_storage.run_analysis(conn, 'expense_pivot', 'MI')
+    conn.close()
+
+    assert [row[:2] for row in rows] == [('MI', 'food'), ('MI', 'housing')]
+    assert len(rows[0]) == 2 + len(COMPOSITIONS)
+
+
+def test_sqlite_engine_is_read_only(db_name):
+    conn = living_wage_storage.connect('sqlite', db_name)
+    with pytest.raises(sqlite3.OperationalError):
+        conn.execute('DELETE FROM Areas')
+    conn.close()
+
+
+def test_unknown_engine(db_name):
+    pytest.importorskip('duckdb')
+    with pytest.raises(ValueError):
+        living_wage_storage.connect('postgres', db_name)
@@ -0,0 +1,145 @@
+''' Tests of the adaptive crawl throttle (living_wage_throttle.py).
+
+Run from the folder that contains living_wage.py:
+    python3 -m pytest tests
+'''
+import os
+import sys
+from email.utils import formatdate
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import living_wage_throttle
+from living_wage_throttle import MIN_LATENCY_SAMPLES, AdaptiveThrottle, parse_retry_after
+
+
+class Clock:
+    ''' Stands in for the time module: sleeping moves the clock instead of waiting. '''
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(living_wage_throttle, 'time', clock)
+    return clock
+
+
+##############################################
+#################### wait ####################
+##############################################
+def test_requests_are_spaced_by_the_rate(clock):
+    throttle = AdaptiveThrottle(initial_rate=4, min_rate=1, max_rate=10)
+
+    sleep_list = [throttle.wait() for _ in range(3)]
+
+    assert sleep_list == pytest.approx([0.0, 0.25, 0.25])
+    assert clock.now == pytest.approx(1000.5)
+
+
+def test_initial_rate_is_kept_within_bounds(clock):
+    assert AdaptiveThrottle(initial_rate=50, min_rate=1, max_rate=10).rate == 10
+    assert AdaptiveThrottle(initial_rate=0.1, min_rate=1, max_rate=10).rate == 1
+
+
+##############################################
+############### increase & backoff ###########
+##############################################
+def test_healthy_responses_raise_the_rate_up_to_max_rate(clock):
+    throttle = AdaptiveThrottle(initial_rate=1, min_rate=0.5, max_rate=4)
+
+    throttle.record(0.1, 200)
+    assert throttle.rate == pytest.approx(1 + 4 / living_wage_throttle.INCREASE_SECONDS)
+
+    for _ in range(1000):
+        throttle.record(0.1, 200)
+    assert throttle.rate == 4
+
+
+@pytest.mark.parametrize('status_code', [429, 503])
+def test_pushback_halves_the_rate_down_to_min_rate(clock, status_code):
+    throttle = AdaptiveThrottle(initial_rate=4, min_rate=0.5, max_rate=4)
+
+    throttle.record(0.1, status_code)
+    assert throttle.rate == 2
+
+    for _ in range(10):
+        throttle.record(0.1, status_code)
+    assert throttle.rate == 0.5
+
+
+def test_other_errors_leave_the_rate_alone(clock):
+    throttle = AdaptiveThrottle(initial_rate=2, min_rate=0.5, max_rate=4)
+
+    throttle.record(0.1, 404)
+    throttle.record(0.1, 500)
+
+    assert throttle.rate == 2
+    assert throttle.average_latency is None
+
+
+def test_latency_spike_cuts_the_rate(clock):
+    throttle = AdaptiveThrottle(initial_rate=4, min_rate=0.5, max_rate=4)
+    for _ in range(MIN_LATENCY_SAMPLES):
+        throttle.record(0.1, 200)
+    rate = throttle.rate
+
+    throttle.record(0.1 * living_wage_throttle.LATENCY_SPIKE_FACTOR * 2, 200)
+
+    assert throttle.rate == rate * living_wage_throttle.DECREASE_FACTOR
+
+
+def test_no_spike_before_enough_samples(clock):
+    throttle = AdaptiveThrottle(initial_rate=2, min_rate=0.5, max_rate=4)
+    throttle.record(0.1, 200)
+
+    throttle.record(10.0, 200)
+
+    assert throttle.rate > 2
+
+
+##############################################
+################ Retry-After #################
+##############################################
+def test_retry_after_blocks_every_request(clock):
+    throttle = AdaptiveThrottle(initial_rate=4, min_rate=0.5, max_rate=4)
+    throttle.wait()
+
+    throttle.record(0.1, 429, retry_after_seconds=30)
+
+    assert throttle.wait() == pytest.approx(30)
+    assert throttle.wait() == pytest.approx(1 / throttle.rate)
+
+
+def test_shorter_retry_after_does_not_shorten_the_block(clock):
+    throttle = AdaptiveThrottle(initial_rate=4, min_rate=0.5, max_rate=4)
+
+    throttle.record(0.1, 503, retry_after_seconds=30)
+    throttle.record(0.1, 503, retry_after_seconds=5)
+
+    assert throttle.wait() == pytest.approx(30)
+
+
+def test_parse_retry_after_seconds():
+    assert parse_retry_after('120') == 120.0
+    assert parse_retry_after(' 1.5 ') == 1.5
+    assert parse_retry_after('-3') == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('') is None
+    assert parse_retry_after('soon') is None
+
+
+def test_parse_retry_after_http_date(clock):
+    assert parse_retry_after(formatdate(clock.now + 60, usegmt=True)) == pytest.approx(60)
+    assert parse_retry_after(formatdate(clock.now - 60, usegmt=True)) == 0.0